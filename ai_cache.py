@@ -0,0 +1,311 @@
+"""
+Cache de Respostas da IA em Duas Camadas - Sistema Lopes & Ribeiro
+
+Respostas do Gemini indexadas pelo hash do prompt:
+
+- Camada 1 (memória): LRU limitado em bytes (AI_CACHE_MEMORIA_MAX_MB),
+  compartilhado pelas sessões do processo
+- Camada 2 (ai_cache.db): SQLite em WAL com uma conexão persistente por
+  thread (SQLiteThreadPool), índice em data_criacao, expurgo periódico das
+  respostas vencidas e descarte das mais antigas quando o banco passa de
+  AI_CACHE_DISCO_MAX_MB
+
+Um acerto no disco é promovido para a memória. O expurgo roda no máximo a
+cada AI_CACHE_EXPURGO_INTERVALO segundos, disparado pelas gravações.
+
+Uso:
+    import ai_cache
+    resposta = ai_cache.buscar(hash_prompt)
+    ai_cache.salvar(hash_prompt, resposta)
+    ai_cache.get_stats()
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+import database_adapter
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DB = os.path.join(BASE_DIR, 'ai_cache.db')
+CACHE_VALIDITY_DAYS = int(os.getenv('AI_CACHE_VALIDADE_DIAS', '7'))
+AI_CACHE_MEMORIA_MAX_MB = float(os.getenv('AI_CACHE_MEMORIA_MAX_MB', '16'))
+AI_CACHE_DISCO_MAX_MB = float(os.getenv('AI_CACHE_DISCO_MAX_MB', '200'))
+AI_CACHE_EXPURGO_INTERVALO = float(os.getenv('AI_CACHE_EXPURGO_INTERVALO', '3600'))
+# Após estourar o limite do disco, reduzir até esta fração dele
+_FRACAO_APOS_DESCARTE = 0.8
+
+_memoria: "OrderedDict[str, tuple]" = OrderedDict()   # hash -> (resposta, expira_em, bytes)
+_memoria_bytes = 0
+_lock = threading.Lock()
+
+_pool = None
+_pool_lock = threading.Lock()
+_ultimo_expurgo = 0.0
+
+_stats = {
+    'hits_memoria': 0,
+    'hits_disco': 0,
+    'misses': 0,
+    'gravacoes': 0,
+    'descartes_memoria': 0,
+    'expurgados_validade': 0,
+    'expurgados_tamanho': 0,
+    'erros': 0,
+}
+
+
+def _tamanho(texto: str) -> int:
+    return len(texto.encode('utf-8'))
+
+
+def _limite_memoria() -> int:
+    return int(AI_CACHE_MEMORIA_MAX_MB * 1024 * 1024)
+
+
+# =====================================================
+# CAMADA 1 - MEMÓRIA
+# =====================================================
+
+def _memoria_get(chave: str) -> Optional[str]:
+    global _memoria_bytes
+    with _lock:
+        entrada = _memoria.get(chave)
+        if entrada is None:
+            return None
+        resposta, expira_em, tamanho = entrada
+        if time.time() > expira_em:
+            del _memoria[chave]
+            _memoria_bytes -= tamanho
+            return None
+        _memoria.move_to_end(chave)
+        _stats['hits_memoria'] += 1
+        return resposta
+
+
+def _memoria_put(chave: str, resposta: str, criado_em: float):
+    global _memoria_bytes
+    tamanho = _tamanho(resposta)
+    limite = _limite_memoria()
+    if tamanho > limite:
+        return
+    expira_em = criado_em + CACHE_VALIDITY_DAYS * 86400
+    with _lock:
+        anterior = _memoria.pop(chave, None)
+        if anterior is not None:
+            _memoria_bytes -= anterior[2]
+        _memoria[chave] = (resposta, expira_em, tamanho)
+        _memoria_bytes += tamanho
+        while _memoria_bytes > limite:
+            _, (_, _, removido) = _memoria.popitem(last=False)
+            _memoria_bytes -= removido
+            _stats['descartes_memoria'] += 1
+
+
+# =====================================================
+# CAMADA 2 - SQLITE
+# =====================================================
+
+def _get_pool():
+    global _pool
+    if _pool is not None:
+        return _pool
+    with _pool_lock:
+        if _pool is None:
+            _criar_tabela()
+            database_adapter.register_sqlite_database(CACHE_DB)
+            _pool = database_adapter.SQLiteThreadPool(CACHE_DB)
+    return _pool
+
+
+def _criar_tabela():
+    conn = sqlite3.connect(CACHE_DB)
+    try:
+        if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+            # Só vale antes da primeira escrita; permite devolver espaço ao disco após o descarte
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        database_adapter.apply_sqlite_pragmas(conn)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS ai_cache (
+                hash_input TEXT PRIMARY KEY,
+                resposta TEXT,
+                data_criacao TEXT,
+                validade INTEGER
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_ai_cache_data_criacao ON ai_cache(data_criacao)")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _executar(sql: str, params=(), escrita: bool = False):
+    """Executa na conexão da thread; descarta a conexão em caso de erro."""
+    pool = _get_pool()
+    conn = pool.getconn()
+    try:
+        cursor = conn.execute(sql, params)
+        linhas = cursor.fetchall()
+        if escrita:
+            conn.commit()
+        return linhas, cursor.rowcount
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        pool.putconn(conn, discard=True)
+        raise
+
+
+def _disco_get(chave: str) -> Optional[tuple]:
+    limite = (datetime.now() - timedelta(days=CACHE_VALIDITY_DAYS)).isoformat()
+    linhas, _ = _executar(
+        "SELECT resposta, data_criacao FROM ai_cache WHERE hash_input = ? AND data_criacao > ?",
+        (chave, limite)
+    )
+    return tuple(linhas[0]) if linhas else None
+
+
+# =====================================================
+# API
+# =====================================================
+
+def buscar(chave: str) -> Optional[str]:
+    """
+    Resposta em cache para o hash do prompt (memória, depois disco).
+
+    Returns:
+        Resposta ou None se ausente/vencida
+    """
+    resposta = _memoria_get(chave)
+    if resposta is not None:
+        return resposta
+    try:
+        encontrado = _disco_get(chave)
+    except Exception as e:
+        logger.error(f"Erro ao buscar cache da IA: {e}")
+        with _lock:
+            _stats['erros'] += 1
+        return None
+    with _lock:
+        _stats['hits_disco' if encontrado else 'misses'] += 1
+    if not encontrado:
+        return None
+    resposta, data_criacao = encontrado
+    try:
+        criado_em = datetime.fromisoformat(data_criacao).timestamp()
+    except (TypeError, ValueError):
+        criado_em = time.time()
+    _memoria_put(chave, resposta, criado_em)
+    return resposta
+
+
+def salvar(chave: str, resposta: str):
+    """Grava a resposta nas duas camadas."""
+    if not resposta:
+        return
+    agora = datetime.now()
+    _memoria_put(chave, resposta, agora.timestamp())
+    try:
+        _executar(
+            "INSERT OR REPLACE INTO ai_cache (hash_input, resposta, data_criacao, validade) "
+            "VALUES (?, ?, ?, ?)",
+            (chave, resposta, agora.isoformat(), CACHE_VALIDITY_DAYS),
+            escrita=True
+        )
+        with _lock:
+            _stats['gravacoes'] += 1
+    except Exception as e:
+        logger.error(f"Erro ao salvar cache da IA: {e}")
+        with _lock:
+            _stats['erros'] += 1
+        return
+    _expurgar_se_necessario()
+
+
+def _expurgar_se_necessario():
+    global _ultimo_expurgo
+    agora = time.monotonic()
+    with _lock:
+        if _ultimo_expurgo and agora - _ultimo_expurgo < AI_CACHE_EXPURGO_INTERVALO:
+            return
+        _ultimo_expurgo = agora
+    try:
+        expurgar()
+    except Exception as e:
+        logger.error(f"Erro no expurgo do cache da IA: {e}")
+
+
+def expurgar() -> Dict[str, int]:
+    """
+    Remove do disco as respostas vencidas e, se o banco passar de
+    AI_CACHE_DISCO_MAX_MB, as mais antigas até 80% do limite.
+
+    Returns:
+        Dict com vencidas e descartadas
+    """
+    limite_data = (datetime.now() - timedelta(days=CACHE_VALIDITY_DAYS)).isoformat()
+    _, vencidas = _executar("DELETE FROM ai_cache WHERE data_criacao <= ?", (limite_data,), escrita=True)
+
+    descartadas = 0
+    limite_bytes = int(AI_CACHE_DISCO_MAX_MB * 1024 * 1024)
+    (total,), = _executar("SELECT COALESCE(SUM(LENGTH(CAST(resposta AS BLOB))), 0) FROM ai_cache")[0]
+    if total > limite_bytes:
+        # Mantém as mais recentes cujo tamanho acumulado cabe no alvo
+        _, descartadas = _executar("""
+            DELETE FROM ai_cache WHERE hash_input IN (
+                SELECT hash_input FROM (
+                    SELECT hash_input,
+                           SUM(LENGTH(CAST(resposta AS BLOB))) OVER (
+                               ORDER BY data_criacao DESC, hash_input
+                           ) AS acumulado
+                    FROM ai_cache
+                ) WHERE acumulado > ?
+            )
+        """, (int(limite_bytes * _FRACAO_APOS_DESCARTE),), escrita=True)
+
+    if vencidas or descartadas:
+        _executar("PRAGMA incremental_vacuum")
+        logger.info(f"Cache da IA: {vencidas} vencida(s) e {descartadas} descartada(s) por tamanho")
+    with _lock:
+        _stats['expurgados_validade'] += max(vencidas, 0)
+        _stats['expurgados_tamanho'] += max(descartadas, 0)
+    return {'vencidas': max(vencidas, 0), 'descartadas': max(descartadas, 0)}
+
+
+def limpar():
+    """Esvazia as duas camadas."""
+    global _memoria_bytes
+    with _lock:
+        _memoria.clear()
+        _memoria_bytes = 0
+    _executar("DELETE FROM ai_cache", escrita=True)
+    _executar("PRAGMA incremental_vacuum")
+
+
+def get_stats() -> Dict:
+    """Acertos por camada, falhas e tamanho de cada camada."""
+    try:
+        (itens, tamanho), = _executar(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(resposta AS BLOB))), 0) FROM ai_cache"
+        )[0]
+    except Exception as e:
+        logger.error(f"Erro ao ler estatísticas do cache da IA: {e}")
+        itens, tamanho = 0, 0
+    with _lock:
+        dados = dict(_stats)
+        dados['itens_memoria'] = len(_memoria)
+        dados['memoria_mb'] = round(_memoria_bytes / 1024 / 1024, 2)
+    dados['itens_disco'] = itens
+    dados['disco_mb'] = round(tamanho / 1024 / 1024, 2)
+    consultas = dados['hits_memoria'] + dados['hits_disco'] + dados['misses']
+    dados['taxa_acerto'] = round((dados['hits_memoria'] + dados['hits_disco']) / consultas, 3) if consultas else 0.0
+    return dados
@@ -5,10 +5,13 @@ Sistema Lopes & Ribeiro - Assistente Jurídico Inteligente
 
 import os
 import hashlib
-import sqlite3
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
+import time
 import google.generativeai as genai
+import ai_cache
+import gemini_quota
+from single_flight import SingleFlight
 from dotenv import load_dotenv
 import logging
 
@@ -22,9 +25,76 @@ logger = logging.getLogger(__name__)
 # Configurações
 API_KEY = os.getenv('GEMINI_API_KEY')
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-CACHE_DB = os.path.join(BASE_DIR, 'ai_cache.db')
-CACHE_VALIDITY_DAYS = 7
-MAX_REQUESTS_PER_DAY = 100
+CACHE_DB = ai_cache.CACHE_DB
+CACHE_VALIDITY_DAYS = ai_cache.CACHE_VALIDITY_DAYS
+# Limite diário compartilhado entre processos (ver gemini_quota)
+MAX_REQUESTS_PER_DAY = gemini_quota.GEMINI_RPD
+# Espera máxima por uma chamada idêntica em andamento (cobre as retentativas de 429)
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv('GEMINI_SINGLE_FLIGHT_TIMEOUT', '180'))
+
+# Chamadas em andamento por hash do prompt, compartilhadas por todas as sessões do processo
+_em_voo = SingleFlight(timeout=SINGLE_FLIGHT_TIMEOUT)
+
+# Gatilhos financeiros para detectar oportunidades de receita
+GATILHOS_FINANCEIROS = [
+    "alvará", "levantamento", "sucumbência", "honorários",
+    "trânsito em julgado", "procedente", "acordo homologado",
+    "sentença favorável", "recurso provido", "depósito judicial",
+    "pagamento", "expedição de alvará", "cumprimento de sentença"
+]
+
+# Regras e campos da análise de andamento (prompt unitário e em lote)
+REGRAS_ANALISE_ANDAMENTO = """
+REGRA 1 - ANTI-ALUCINAÇÃO:
+- Se uma informação NÃO estiver EXPLÍCITA no texto, responda "Não informado nos autos"
+- NUNCA presuma, deduza ou invente dados como tipo de documento, valores ou datas
+- Prefira dizer "não identificado" do que arriscar informação incorreta
+
+REGRA 2 - COMUNICAÇÃO HUMANIZADA:
+- Gere uma mensagem pronta para WhatsApp, em linguagem simples e amigável
+- Use emojis para deixar a comunicação leve
+- O cliente é LEIGO, não use termos técnicos
+- Comece com saudação usando o nome do cliente (se disponível)
+
+REGRA 3 - FOCO EM RECEITA:
+- Identifique se há OPORTUNIDADE FINANCEIRA (honorários, sucumbência, alvará, levantamento)
+- Se detectar dinheiro na mesa, sinalize com prioridade ALTA
+- Gatilhos: alvará, levantamento, sucumbência, honorários, trânsito em julgado, acordo homologado
+
+REGRA 4 - TRADUTOR JURÍDICO (EDUCATIVO):
+- No campo "explicacao_didatica", explique O QUE É aquele ato processual
+- Defina o termo para um LEIGO de forma clara e simples
+- Exemplo: Se for "Conclusos para Despacho", a explicação deve ser: "Significa que o processo está na mesa do Juiz para que ele tome uma decisão ou dê uma ordem."
+- Exemplo: Se for "Juntada de AR", explique: "Significa que o correio devolveu o comprovante confirmando se a pessoa recebeu ou não a carta judicial."
+- Exemplo: Se for "Citação", explique: "É o ato oficial que avisa a outra parte que existe um processo contra ela e que ela precisa se defender."
+"""
+
+CAMPOS_ANALISE_ANDAMENTO = """
+"urgente": boolean,
+"acao_requerida": boolean,
+"resumo": "Resumo técnico curto (1 frase)",
+"explicacao_didatica": "Definição do termo jurídico em linguagem simples para leigos - O QUE É esse ato processual",
+"mensagem_cliente": "Mensagem pronta para WhatsApp, humanizada com emojis",
+"gatilho_financeiro": boolean,
+"tipo_gatilho": "Tipo: alvará/sucumbência/honorários/levantamento/nenhum",
+"sugestao_financeira": "Ação financeira sugerida (ex: Lançar recebimento de R$ X) ou null",
+"evolucao_processual": "Explicação CONTEXTUALIZADA do que isso significa no andamento geral (ex: 'O processo saiu da fase de conhecimento e iniciou a execução')",
+"proxima_fase": "Previsão do próximo passo lógico (ex: 'Expedição de mandato', 'Sentença', 'Recurso')",
+"recomendacao_advogado": "Recomendação explícita para o advogado: 'AGUARDAR' ou 'PETICIONAR' ou 'CONTATAR CLIENTE'"
+"""
+
+
+def _aplicar_gatilhos(resultado: Dict, texto_movimentacao: str) -> Dict:
+    """Marca gatilho financeiro por palavra-chave quando a IA não o detectou"""
+    if not resultado.get('gatilho_financeiro'):
+        texto_lower = (texto_movimentacao or "").lower()
+        for gatilho in GATILHOS_FINANCEIROS:
+            if gatilho in texto_lower:
+                resultado['gatilho_financeiro'] = True
+                resultado['tipo_gatilho'] = gatilho
+                break
+    return resultado
+
 
 class GeminiAI:
     """Classe principal para interação com API Gemini"""
@@ -34,7 +104,6 @@ class GeminiAI:
         load_dotenv(override=True)
         self.model = None
         self.inicializado = False
-        self._request_count = 0
         self.api_key = None
 
         import streamlit as st
@@ -91,17 +160,7 @@ class GeminiAI:
     def _init_db(self):
         """Cria tabela de cache se não existir"""
         try:
-            with sqlite3.connect(CACHE_DB) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS ai_cache (
-                        hash_input TEXT PRIMARY KEY,
-                        resposta TEXT,
-                        data_criacao TEXT,
-                        validade INTEGER
-                    )
-                """)
-                conn.commit()
+            ai_cache._get_pool()
         except Exception as e:
             logger.error(f"Erro ao criar tabela de cache: {e}")
 
@@ -110,10 +169,13 @@ class GeminiAI:
         return self.inicializado
     
     def _verificar_limite_requests(self) -> bool:
-        """Verifica se não excedeu limite de requisições"""
-        if self._request_count >= MAX_REQUESTS_PER_DAY:
-            logger.warning("Limite diário de requisições atingido")
-            return False
+        """Verifica se ainda há cota no dia (livro-razão persistente de gemini_quota)"""
+        try:
+            if gemini_quota.restante_hoje(gemini_quota.prioridade_atual()) <= 0:
+                logger.warning("Limite diário de requisições atingido")
+                return False
+        except Exception as e:
+            logger.error(f"Erro ao consultar cota do Gemini: {e}")
         return True
     
     def _gerar_hash(self, texto: str) -> str:
@@ -121,46 +183,54 @@ class GeminiAI:
         return hashlib.md5(texto.encode()).hexdigest()
     
     def _buscar_cache(self, hash_input: str) -> Optional[str]:
-        """Busca resposta em cache"""
-        try:
-            # Usar gerenciador de contexto para conexão segura
-            with sqlite3.connect(CACHE_DB) as conn:
-                cursor = conn.cursor()
-                
-                # Buscar cache válido
-                data_limite = datetime.now() - timedelta(days=CACHE_VALIDITY_DAYS)
-                cursor.execute("""
-                    SELECT resposta FROM ai_cache 
-                    WHERE hash_input = ? AND data_criacao > ?
-                """, (hash_input, data_limite.isoformat()))
-                
-                resultado = cursor.fetchone()
-                
-                if resultado:
-                    logger.info("Resposta encontrada em cache")
-                    return resultado[0]
-            return None
-            
-        except Exception as e:
-            logger.error(f"Erro ao buscar cache: {e}")
-            return None
+        """Busca resposta em cache (memória do processo, depois ai_cache.db)"""
+        resposta = ai_cache.buscar(hash_input)
+        if resposta:
+            logger.info("Resposta encontrada em cache")
+        return resposta
     
     def _salvar_cache(self, hash_input: str, resposta: str):
         """Salva resposta em cache"""
-        try:
-            with sqlite3.connect(CACHE_DB) as conn:
-                cursor = conn.cursor()
-                
-                cursor.execute("""
-                    INSERT OR REPLACE INTO ai_cache (hash_input, resposta, data_criacao, validade)
-                    VALUES (?, ?, ?, ?)
-                """, (hash_input, resposta, datetime.now().isoformat(), CACHE_VALIDITY_DAYS))
-                
-                conn.commit()
-            logger.info("Resposta salva em cache")
-            
-        except Exception as e:
-            logger.error(f"Erro ao salvar cache: {e}")
+        ai_cache.salvar(hash_input, resposta)
+    
+    def _gerar_texto(self, prompt: str, tentativas: int = 1, espera_base: int = 10,
+                     custo: int = 1, rotulo: str = "IA") -> str:
+        """
+        Chama generate_content e retorna o texto, coalescendo prompts idênticos.
+        
+        Se outra sessão já está enviando o mesmo prompt, espera a resposta dela
+        (ou recebe a mesma exceção) em vez de fazer outra requisição. Cada
+        tentativa reserva `custo` requisições em gemini_quota (esperando a
+        reposição do bucket se preciso); erros de cota (429) são repetidos até
+        `tentativas` vezes, com espera progressiva.
+        
+        Args:
+            prompt: Prompt completo
+            tentativas: Tentativas em caso de 429/quota
+            espera_base: Segundos de espera multiplicados pelo nº da tentativa
+            custo: Requisições reservadas na cota por tentativa
+            rotulo: Identificação nos logs
+        """
+        def _chamar():
+            for tentativa in range(1, tentativas + 1):
+                gemini_quota.adquirir(custo)
+                try:
+                    return self.model.generate_content(prompt).text
+                except Exception as e:
+                    erro_str = str(e)
+                    if "429" in erro_str:
+                        gemini_quota.registrar_429()
+                    if ("429" in erro_str or "quota" in erro_str.lower()) and tentativa < tentativas:
+                        tempo_espera = espera_base * tentativa
+                        logger.warning(f"⏳ {rotulo}: Cota atingida (Tentativa {tentativa}/{tentativas}). Aguardando {tempo_espera}s...")
+                        time.sleep(tempo_espera)
+                    else:
+                        raise
+        
+        texto, compartilhado = _em_voo.executar(self._gerar_hash(prompt), _chamar)
+        if compartilhado:
+            logger.info(f"{rotulo}: resposta recebida de chamada idêntica em andamento")
+        return texto
     
     def _construir_prompt_chat(self, mensagem: str, contexto: Optional[Dict] = None) -> str:
         """Constrói o prompt enriquecido com contexto"""
@@ -196,11 +266,20 @@ class GeminiAI:
         return prompt
 
     def chat(self, mensagem: str, contexto: Optional[Dict] = None) -> str:
-        """Chat com assistente jurídico"""
+        """
+        Chat com assistente jurídico.
+        
+        Em segundo plano (gemini_quota.em_segundo_plano), falta de cota levanta
+        CotaEsgotada em vez de virar texto, para quem chama pular ou adiar.
+        """
         if not self.inicializado or not self.model:
             return "❌ IA não inicializada. Verifique a configuração da API."
         
         if not self._verificar_limite_requests():
+            if gemini_quota.prioridade_atual() == gemini_quota.SEGUNDO_PLANO:
+                raise gemini_quota.CotaEsgotada(
+                    "Limite diário de quota do Gemini atingido", retry_em=gemini_quota.segundos_ate_amanha()
+                )
             return "⚠️ Limite diário de requisições atingido."
         
         try:
@@ -214,42 +293,89 @@ class GeminiAI:
                 return resposta_cache
             
             # Gerar resposta com Retry Loop (Tratamento Erro 429)
-            import time
-            max_tentativas = 3
-            tentativa = 0
-            response = None
-            
-            while tentativa < max_tentativas:
-                try:
-                    response = self.model.generate_content(prompt)
-                    break
-                except Exception as e:
-                    tentativa += 1
-                    erro_str = str(e)
-                    
-                    if ("429" in erro_str or "quota" in erro_str.lower()) and tentativa < max_tentativas:
-                        tempo_espera = 10 * tentativa  # Espera progressiva (10s, 20s, 30s)
-                        logger.warning(f"⏳ Chat: Cota atingida (Tentativa {tentativa}/{max_tentativas}). Aguardando {tempo_espera}s...")
-                        time.sleep(tempo_espera)
-                    else:
-                        raise e
-            
-            resposta = response.text
+            resposta = self._gerar_texto(prompt, tentativas=3, espera_base=10, rotulo="Chat")
             
             # Salvar em cache
             self._salvar_cache(hash_input, resposta)
-            self._request_count += 1
             
             return resposta
             
         except Exception as e:
-            erro_str = str(e)
+            if isinstance(e, gemini_quota.CotaEsgotada) and gemini_quota.prioridade_atual() == gemini_quota.SEGUNDO_PLANO:
+                raise
             logger.error(f"Erro no chat: {e}")
+            return self._mensagem_erro_chat(e)
+
+    def chat_stream(self, mensagem: str, contexto: Optional[Dict] = None) -> Iterator[str]:
+        """
+        Chat com assistente jurídico em streaming: devolve a resposta em
+        pedaços à medida que o Gemini gera (para st.write_stream).
+        
+        Mesmo prompt, cache e cota de chat(); a resposta completa vai para o
+        cache ao fim do stream. Não passa pelo single-flight (cada sessão
+        recebe o próprio stream). Erros viram um último pedaço de texto.
+        """
+        if not self.inicializado or not self.model:
+            yield "❌ IA não inicializada. Verifique a configuração da API."
+            return
+        
+        if not self._verificar_limite_requests():
+            yield "⚠️ Limite diário de requisições atingido."
+            return
+        
+        partes = []
+        try:
+            prompt = self._construir_prompt_chat(mensagem, contexto)
             
-            if "429" in erro_str or "quota" in erro_str.lower():
-                return "⏳ Limite de requisições atingido. Aguarde 1 minuto e tente novamente."
+            hash_input = self._gerar_hash(prompt)
+            resposta_cache = self._buscar_cache(hash_input)
+            if resposta_cache:
+                yield resposta_cache
+                return
             
-            return f"❌ Erro ao processar mensagem: {erro_str}"
+            tentativas = 3
+            for tentativa in range(1, tentativas + 1):
+                gemini_quota.adquirir()
+                try:
+                    for pedaco in self.model.generate_content(prompt, stream=True):
+                        try:
+                            texto = pedaco.text
+                        except ValueError:
+                            continue  # pedaço sem texto (ex.: só finish_reason)
+                        if texto:
+                            partes.append(texto)
+                            yield texto
+                    break
+                except Exception as e:
+                    erro_str = str(e)
+                    if "429" in erro_str:
+                        gemini_quota.registrar_429()
+                    # Só repete se nada foi exibido ainda
+                    if not partes and ("429" in erro_str or "quota" in erro_str.lower()) and tentativa < tentativas:
+                        tempo_espera = 10 * tentativa
+                        logger.warning(f"⏳ Chat: Cota atingida (Tentativa {tentativa}/{tentativas}). Aguardando {tempo_espera}s...")
+                        time.sleep(tempo_espera)
+                    else:
+                        raise
+            
+            if partes:
+                self._salvar_cache(hash_input, "".join(partes))
+            
+        except Exception as e:
+            logger.error(f"Erro no chat (stream): {e}")
+            yield ("\n\n" if partes else "") + self._mensagem_erro_chat(e)
+
+    def _mensagem_erro_chat(self, e: Exception) -> str:
+        """Mensagem exibida ao usuário quando o chat falha"""
+        erro_str = str(e)
+        
+        if isinstance(e, gemini_quota.CotaEsgotada):
+            return f"⏳ {erro_str}. Tente novamente em instantes."
+        
+        if "429" in erro_str or "quota" in erro_str.lower():
+            return "⏳ Limite de requisições atingido. Aguarde 1 minuto e tente novamente."
+        
+        return f"❌ Erro ao processar mensagem: {erro_str}"
 
     def analisar_andamento(self, texto_movimentacao: str, contexto_processo: str = "", nome_cliente: str = "") -> Dict:
         """
@@ -261,42 +387,13 @@ class GeminiAI:
         if not self.inicializado or not self.model:
             return {"erro": "IA não inicializada"}
         
-        # Gatilhos financeiros para detectar oportunidades de receita
-        GATILHOS_FINANCEIROS = [
-            "alvará", "levantamento", "sucumbência", "honorários", 
-            "trânsito em julgado", "procedente", "acordo homologado",
-            "sentença favorável", "recurso provido", "depósito judicial",
-            "pagamento", "expedição de alvará", "cumprimento de sentença"
-        ]
-            
         try:
             prompt = f"""
             VOCÊ É O CONSULTOR JURÍDICO-FINANCEIRO DO ESCRITÓRIO LOPES & RIBEIRO.
             
             === REGRAS FUNDAMENTAIS (NUNCA VIOLE) ===
             
-            REGRA 1 - ANTI-ALUCINAÇÃO:
-            - Se uma informação NÃO estiver EXPLÍCITA no texto, responda "Não informado nos autos"
-            - NUNCA presuma, deduza ou invente dados como tipo de documento, valores ou datas
-            - Prefira dizer "não identificado" do que arriscar informação incorreta
-            
-            REGRA 2 - COMUNICAÇÃO HUMANIZADA:
-            - Gere uma mensagem pronta para WhatsApp, em linguagem simples e amigável
-            - Use emojis para deixar a comunicação leve
-            - O cliente é LEIGO, não use termos técnicos
-            - Comece com saudação usando o nome do cliente (se disponível)
-            
-            REGRA 3 - FOCO EM RECEITA:
-            - Identifique se há OPORTUNIDADE FINANCEIRA (honorários, sucumbência, alvará, levantamento)
-            - Se detectar dinheiro na mesa, sinalize com prioridade ALTA
-            - Gatilhos: alvará, levantamento, sucumbência, honorários, trânsito em julgado, acordo homologado
-            
-            REGRA 4 - TRADUTOR JURÍDICO (EDUCATIVO):
-            - No campo "explicacao_didatica", explique O QUE É aquele ato processual
-            - Defina o termo para um LEIGO de forma clara e simples
-            - Exemplo: Se for "Conclusos para Despacho", a explicação deve ser: "Significa que o processo está na mesa do Juiz para que ele tome uma decisão ou dê uma ordem."
-            - Exemplo: Se for "Juntada de AR", explique: "Significa que o correio devolveu o comprovante confirmando se a pessoa recebeu ou não a carta judicial."
-            - Exemplo: Se for "Citação", explique: "É o ato oficial que avisa a outra parte que existe um processo contra ela e que ela precisa se defender."
+            {REGRAS_ANALISE_ANDAMENTO}
             
             === DADOS PARA ANÁLISE ===
             
@@ -308,17 +405,7 @@ class GeminiAI:
             
             === RESPONDA NO FORMATO JSON ===
             {{
-                "urgente": boolean,
-                "acao_requerida": boolean,
-                "resumo": "Resumo técnico curto (1 frase)",
-                "explicacao_didatica": "Definição do termo jurídico em linguagem simples para leigos - O QUE É esse ato processual",
-                "mensagem_cliente": "Mensagem pronta para WhatsApp, humanizada com emojis",
-                "gatilho_financeiro": boolean,
-                "tipo_gatilho": "Tipo: alvará/sucumbência/honorários/levantamento/nenhum",
-                "sugestao_financeira": "Ação financeira sugerida (ex: Lançar recebimento de R$ X) ou null",
-                "evolucao_processual": "Explicação CONTEXTUALIZADA do que isso significa no andamento geral (ex: 'O processo saiu da fase de conhecimento e iniciou a execução')",
-                "proxima_fase": "Previsão do próximo passo lógico (ex: 'Expedição de mandato', 'Sentença', 'Recurso')",
-                "recomendacao_advogado": "Recomendação explícita para o advogado: 'AGUARDAR' ou 'PETICIONAR' ou 'CONTATAR CLIENTE'"
+            {CAMPOS_ANALISE_ANDAMENTO}
             }}
             """
             
@@ -333,44 +420,17 @@ class GeminiAI:
                      pass # Se cache estiver inválido, gera dnovo
             
             # Gerar resposta com Retry Loop (Tratamento Erro 429)
-            import time
-            max_tentativas = 3
-            tentativa = 0
-            response = None
-            
-            while tentativa < max_tentativas:
-                try:
-                    response = self.model.generate_content(prompt)
-                    break
-                except Exception as e:
-                    tentativa += 1
-                    erro_str = str(e)
-                    
-                    if ("429" in erro_str or "quota" in erro_str.lower()) and tentativa < max_tentativas:
-                        tempo_espera = 10 * tentativa
-                        logger.warning(f"⏳ Andamento: Cota atingida (Tentativa {tentativa}/{max_tentativas}). Aguardando {tempo_espera}s...")
-                        time.sleep(tempo_espera)
-                    else:
-                        raise e
-            
-            texto_resp = response.text.replace("```json", "").replace("```", "").strip()
+            texto_resp = self._gerar_texto(
+                prompt, tentativas=3, espera_base=10, rotulo="Andamento"
+            ).replace("```json", "").replace("```", "").strip()
             
             self._salvar_cache(hash_input, texto_resp)
-            self._request_count += 1
             
             import json
             resultado = json.loads(texto_resp)
             
             # Validação adicional: verificar gatilhos por regex como fallback
-            texto_lower = texto_movimentacao.lower()
-            if not resultado.get('gatilho_financeiro'):
-                for gatilho in GATILHOS_FINANCEIROS:
-                    if gatilho in texto_lower:
-                        resultado['gatilho_financeiro'] = True
-                        resultado['tipo_gatilho'] = gatilho
-                        break
-            
-            return resultado
+            return _aplicar_gatilhos(resultado, texto_movimentacao)
             
         except Exception as e:
             error_str = str(e)
@@ -387,6 +447,84 @@ class GeminiAI:
             
             return {"urgente": False, "resumo": f"Erro Técnico: {error_str}", "erro": error_str}
 
+    def analisar_andamentos_lote(self, movimentos: List[Dict], contexto_processo: str = "", nome_cliente: str = "") -> Dict[str, Dict]:
+        """
+        Analisa vários andamentos do mesmo processo em uma única requisição.
+        
+        Mesmas regras e campos de analisar_andamento; a resposta é separada
+        de volta por movimento. Ao contrário dos outros métodos, erros da API
+        (inclusive CotaEsgotada) são propagados para quem chama poder adiar
+        e repetir (ver fila_analise_ia).
+        
+        Args:
+            movimentos: Lista de dicts com 'chave', 'descricao' e opcionalmente 'data'
+            contexto_processo: Número/ação do processo
+            nome_cliente: Nome usado na mensagem para o cliente
+            
+        Returns:
+            Dict {chave: análise}; movimentos ausentes da resposta não aparecem
+        """
+        import json
+        
+        if not self.inicializado or not self.model:
+            raise RuntimeError("IA não inicializada")
+        if not movimentos:
+            return {}
+        
+        # IDs curtos no prompt (m1, m2...) em vez das chaves originais
+        por_id = {f"m{i}": mov for i, mov in enumerate(movimentos, 1)}
+        lista = "\n".join(
+            f'[{id_mov}] {mov.get("data") or "sem data"} - "{mov["descricao"]}"'
+            for id_mov, mov in por_id.items()
+        )
+        
+        prompt = f"""
+            VOCÊ É O CONSULTOR JURÍDICO-FINANCEIRO DO ESCRITÓRIO LOPES & RIBEIRO.
+            
+            === REGRAS FUNDAMENTAIS (NUNCA VIOLE) ===
+            
+            {REGRAS_ANALISE_ANDAMENTO}
+            
+            === DADOS PARA ANÁLISE ===
+            
+            Contexto: {contexto_processo}
+            
+            Nome do Cliente: {nome_cliente if nome_cliente else "Cliente"}
+            
+            Movimentações ({len(por_id)}), cada uma analisada ISOLADAMENTE:
+            {lista}
+            
+            === RESPONDA NO FORMATO JSON ===
+            Um objeto com a chave "analises": lista com UM item por movimentação,
+            com o "id" dela (ex: "m1") e os campos abaixo:
+            {{"analises": [{{
+            "id": "m1",
+            {CAMPOS_ANALISE_ANDAMENTO}
+            }}]}}
+            """
+        
+        hash_input = self._gerar_hash(prompt)
+        texto_resp = self._buscar_cache(hash_input)
+        if not texto_resp:
+            texto_resp = self._gerar_texto(
+                prompt, tentativas=1, rotulo=f"Andamentos em lote ({len(por_id)})"
+            ).replace("```json", "").replace("```", "").strip()
+        
+        dados = json.loads(texto_resp)
+        itens = dados.get('analises', []) if isinstance(dados, dict) else dados
+        
+        resultado = {}
+        for item in itens:
+            mov = por_id.get(str(item.pop('id', '')).strip()) if isinstance(item, dict) else None
+            if mov is None:
+                continue
+            resultado[mov['chave']] = _aplicar_gatilhos(item, mov['descricao'])
+        
+        # Só guarda no cache respostas completas e válidas
+        if len(resultado) == len(por_id):
+            self._salvar_cache(hash_input, texto_resp)
+        return resultado
+
     def extrair_partes_processo(self, movimentos: List[str], classe_processo: str = "", orgao: str = "") -> Dict:
         """
         Extrai partes do processo analisando os movimentos via IA.
@@ -447,11 +585,9 @@ class GeminiAI:
                 except:
                     pass
             
-            response = self.model.generate_content(prompt)
-            texto_resp = response.text.replace("```json", "").replace("```", "").strip()
+            texto_resp = self._gerar_texto(prompt, rotulo="Partes").replace("```json", "").replace("```", "").strip()
             
             self._salvar_cache(hash_input, texto_resp)
-            self._request_count += 1
             
             import json
             resultado = json.loads(texto_resp)
@@ -509,11 +645,9 @@ class GeminiAI:
             if resposta_cache:
                 return {"analise": resposta_cache, "from_cache": True}
             
-            response = self.model.generate_content(prompt)
-            analise = response.text
+            analise = self._gerar_texto(prompt, rotulo="Documento")
             
             self._salvar_cache(hash_input, analise)
-            self._request_count += 1
             
             return {
                 "analise": analise,
@@ -576,14 +710,12 @@ class GeminiAI:
                     return {**json.loads(resposta_cache), "from_cache": True}
                 except: pass
 
-            response = self.model.generate_content(prompt)
-            texto_resp = response.text.replace("```json", "").replace("```", "")
+            texto_resp = self._gerar_texto(prompt, custo=3, rotulo="Estratégia").replace("```json", "").replace("```", "")
             
             import json
             resultado = json.loads(texto_resp)
             
             self._salvar_cache(hash_input, texto_resp)
-            self._request_count += 3 # Conta como 3 requests pois é complexo
             
             return resultado
 
@@ -716,30 +848,10 @@ class GeminiAI:
             IMPORTANTE: Responda APENAS com o JSON, sem texto adicional.
             """
             
-            # Chamar API com Lógica de Retry (Modo Teimoso)
-            max_tentativas = 3
-            tentativa = 0
-            response = None
-            
-            while tentativa < max_tentativas:
-                try:
-                    # Tenta chamar o Google
-                    response = self.model.generate_content(prompt)
-                    break # Se der certo, sai do loop
-                except Exception as e:
-                    tentativa += 1
-                    erro_str = str(e)
-                    
-                    # Se for erro de COTA (429) e ainda tiver tentativas sobrando
-                    if ("429" in erro_str or "quota" in erro_str.lower()) and tentativa < max_tentativas:
-                        tempo_espera = 25 * tentativa # Espera progressiva (25s, 50s...)
-                        logger.warning(f"⏳ Cota atingida (Tentativa {tentativa}/{max_tentativas}). Aguardando {tempo_espera}s...")
-                        import time
-                        time.sleep(tempo_espera)
-                    else:
-                        # Se for outro erro ou se acabaram as tentativas, estoura o erro original
-                        raise e
-            texto_resp = response.text.replace("```json", "").replace("```", "").strip()
+            # Chamar API com Lógica de Retry (Modo Teimoso): 429 espera 25s, 50s...
+            texto_resp = self._gerar_texto(
+                prompt, tentativas=3, espera_base=25, rotulo="Análise completa"
+            ).replace("```json", "").replace("```", "").strip()
             
             resultado = json.loads(texto_resp)
             resultado['from_cache'] = False
@@ -768,7 +880,6 @@ class GeminiAI:
             except Exception as e:
                 logger.warning(f"Erro ao salvar cache: {e}")
             
-            self._request_count += 1  # Conta como 1 requisição apenas!
             
             return resultado
             
@@ -845,11 +956,9 @@ class GeminiAI:
                 except:
                     pass
             
-            response = self.model.generate_content(prompt)
-            texto_resp = response.text.replace("```json", "").replace("```", "").strip()
+            texto_resp = self._gerar_texto(prompt, custo=2, rotulo="Email").replace("```json", "").replace("```", "").strip()
             
             self._salvar_cache(hash_input, texto_resp)
-            self._request_count += 2
             
             import json
             resultado = json.loads(texto_resp)
@@ -898,6 +1007,10 @@ def reset_gemini():
     global _gemini_instance
     _gemini_instance = None
 
+def get_single_flight_stats() -> Dict:
+    """Chamadas à API executadas x compartilhadas entre sessões (prompts idênticos)"""
+    return _em_voo.get_stats()
+
 def inicializar_gemini() -> bool:
     """Função helper para inicializar a instância global"""
     global _gemini_instance
@@ -912,6 +1025,13 @@ def chat_assistente(mensagem: str, contexto: Optional[Dict] = None) -> str:
         inicializar_gemini()
     return _gemini_instance.chat(mensagem, contexto)
 
+def chat_assistente_stream(mensagem: str, contexto: Optional[Dict] = None) -> Iterator[str]:
+    """Wrapper para chat em streaming (pedaços da resposta, para st.write_stream)"""
+    global _gemini_instance
+    if _gemini_instance is None:
+        inicializar_gemini()
+    return _gemini_instance.chat_stream(mensagem, contexto)
+
 def analisar_documento(texto: str, tipo: str = "genérico") -> Dict:
     """Wrapper para função de análise"""
     global _gemini_instance
@@ -926,6 +1046,13 @@ def analisar_andamento(texto: str, contexto: str = "", nome_cliente: str = "") -
         inicializar_gemini()
     return _gemini_instance.analisar_andamento(texto, contexto, nome_cliente)
 
+def analisar_andamentos_lote(movimentos: List[Dict], contexto: str = "", nome_cliente: str = "") -> Dict[str, Dict]:
+    """Wrapper para análise de vários andamentos em uma requisição (propaga erros da API)"""
+    global _gemini_instance
+    if _gemini_instance is None:
+        inicializar_gemini()
+    return _gemini_instance.analisar_andamentos_lote(movimentos, contexto, nome_cliente)
+
 def analisar_estrategia_completa(dados_processo: Dict, historico_movimentos: List[Dict]) -> Dict:
     """Wrapper para análise estratégica"""
     global _gemini_instance
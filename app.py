@@ -10,6 +10,9 @@ from modules import dashboard, clientes, processos, agenda, financeiro, ia_jurid
 from components.ui import load_css
 import rate_limiter as rl
 import lgpd_logger
+import query_profiler
+import crypto
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 # LGPD: Aplicar mascaramento automático em TODOS os logs do sistema
 # Isso protege CPF, CNPJ, emails, telefones, senhas
@@ -23,6 +26,10 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Profiler: consultas deste rerun contam para a sessão atual
+_script_ctx = get_script_run_ctx()
+query_profiler.iniciar_rerun(_script_ctx.session_id if _script_ctx else None)
+
 load_css()
 db.init_db()
 db.criar_backup()
@@ -392,6 +399,8 @@ def login():
             st.markdown("</div>", unsafe_allow_html=True)
 
 def logout():
+    # Textos descriptografados não sobrevivem à sessão
+    crypto.limpar_cache()
     st.session_state.logged_in = False
     st.session_state.user = None
     st.session_state.role = None
@@ -500,17 +509,19 @@ else:
             with st.chat_message("user"):
                 st.write(prompt)
         
-        # Obter resposta da IA
+        # Obter resposta da IA (streaming: o texto aparece conforme é gerado)
         with container:
             with st.chat_message("assistant"):
-                with st.spinner("Pensando..."):
-                    try:
-                        response = ai_proactive.get_copilot_response(prompt)
-                        st.write(response)
-                        # Adicionar resposta ao histórico
-                        st.session_state.sidebar_chat.append({"role": "assistant", "content": response})
-                    except Exception as e:
-                        st.error(f"Erro na IA: {e}")
+                try:
+                    response = st.write_stream(ai_proactive.get_copilot_response_stream(prompt))
+                    # Adicionar resposta ao histórico
+                    st.session_state.sidebar_chat.append({"role": "assistant", "content": response})
+                    db.sql_run(
+                        "INSERT INTO ai_historico (usuario, tipo, input, output, data_hora) VALUES (?, ?, ?, ?, ?)",
+                        (st.session_state.user, 'copiloto', prompt, response, datetime.now().isoformat())
+                    )
+                except Exception as e:
+                    st.error(f"Erro na IA: {e}")
 
     # --- MENU LATERAL ---
     with st.sidebar:
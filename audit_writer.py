@@ -0,0 +1,199 @@
+"""
+Gravação Assíncrona em Lote de Registros de Auditoria
+
+Os registros de auditoria (audit, audit_detalhado, log_acesso_dados) são
+enfileirados em memória e gravados por uma thread em segundo plano, em
+lotes, em vez de um INSERT (e uma conexão) por evento.
+
+Features:
+- Flush por tamanho do lote ou por tempo desde o primeiro item pendente
+- Fila limitada com backpressure: o produtor espera até `put_timeout`;
+  se a fila continuar cheia, o registro é gravado de forma síncrona
+  (nunca descartado)
+- Flush no encerramento do processo (atexit)
+- Contadores para diagnóstico
+
+Uso:
+    writer = AuditWriter(gravar_lote)   # gravar_lote(list[dict]) -> None
+    writer.enqueue({'action': 'LOGIN', ...})
+    writer.flush()                       # força gravação imediata
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', '100'))
+AUDIT_FLUSH_INTERVAL = float(os.getenv('AUDIT_FLUSH_INTERVAL', '2.0'))
+AUDIT_QUEUE_MAX = int(os.getenv('AUDIT_QUEUE_MAX', '10000'))
+AUDIT_PUT_TIMEOUT = float(os.getenv('AUDIT_PUT_TIMEOUT', '1.0'))
+
+
+class _MarcaFlush:
+    """Marca posta na fila por flush(): liberada quando tudo antes dela foi gravado."""
+
+    def __init__(self):
+        self.gravado = threading.Event()
+
+
+class AuditWriter:
+    """Fila de auditoria com thread gravadora em segundo plano."""
+
+    def __init__(self, write_batch: Callable[[List[Dict]], None],
+                 batch_size: int = AUDIT_BATCH_SIZE,
+                 flush_interval: float = AUDIT_FLUSH_INTERVAL,
+                 max_queue: int = AUDIT_QUEUE_MAX,
+                 put_timeout: float = AUDIT_PUT_TIMEOUT):
+        self._write_batch = write_batch
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._write_lock = threading.Lock()  # serializa gravações (thread x flush manual)
+        self._stop = threading.Event()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+        self.stats = {
+            'enqueued': 0,
+            'written': 0,
+            'batches': 0,
+            'sync_fallbacks': 0,
+            'errors': 0,
+        }
+
+    # ---------- Produtor ----------
+
+    def enqueue(self, record: Dict):
+        """Enfileira um registro (bloqueia até put_timeout se a fila estiver cheia)."""
+        self._ensure_thread()
+        try:
+            self._queue.put(record, timeout=self.put_timeout)
+            self.stats['enqueued'] += 1
+        except queue.Full:
+            # Backpressure esgotada: gravar direto para não perder o registro
+            self.stats['sync_fallbacks'] += 1
+            logger.warning("Fila de auditoria cheia, gravando registro de forma síncrona")
+            self._write([record])
+
+    # ---------- Consumidor ----------
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name='audit-writer', daemon=True
+                )
+                self._thread.start()
+
+    def _drain(self, limit: int) -> List[Dict]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, _MarcaFlush):
+                # Tudo antes da marca está neste lote: liberar após gravá-lo
+                self._write(batch)
+                item.gravado.set()
+                batch = []
+                continue
+            batch.append(item)
+        return batch
+
+    def _write(self, batch: List[Dict]):
+        if not batch:
+            return
+        with self._write_lock:
+            try:
+                self._write_batch(batch)
+                self.stats['written'] += len(batch)
+                self.stats['batches'] += 1
+            except Exception as e:
+                # Auditoria nunca deve derrubar a aplicação
+                self.stats['errors'] += 1
+                logger.error(f"Erro ao gravar lote de auditoria ({len(batch)} registros): {e}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            if isinstance(first, _MarcaFlush):
+                first.gravado.set()
+                continue
+
+            # Acumular até completar o lote, vencer o intervalo ou chegar um flush()
+            batch = [first]
+            marca = None
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and not self._stop.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if isinstance(item, _MarcaFlush):
+                    marca = item
+                    break
+                batch.append(item)
+            self._write(batch)
+            if marca is not None:
+                marca.gravado.set()
+
+    # ---------- Controle ----------
+
+    def flush(self, timeout: float = None):
+        """
+        Grava imediatamente tudo o que foi enfileirado até agora, inclusive o
+        lote que a thread já tirou da fila e ainda está acumulando.
+
+        Com a thread ativa, uma marca entra na fila (FIFO) e a thread grava
+        o lote atual assim que a alcança; flush() só retorna depois disso
+        (ou após `timeout`, gravando então o restante diretamente).
+        """
+        if self._thread is not None and self._thread.is_alive() and not self._stop.is_set():
+            marca = _MarcaFlush()
+            self._queue.put(marca)
+            espera = self.flush_interval + 5 if timeout is None else timeout
+            if marca.gravado.wait(espera):
+                return
+            logger.warning("Thread de auditoria não respondeu ao flush; gravando pendentes diretamente")
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                break
+            self._write(batch)
+
+    def close(self):
+        """Para a thread e grava os pendentes (chamado no encerramento)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 1)
+        self.flush()
+
+    def get_stats(self) -> Dict:
+        data = dict(self.stats)
+        data['pending'] = self._queue.qsize()
+        return data
+
+
+def create_writer(write_batch: Callable[[List[Dict]], None], **kwargs) -> AuditWriter:
+    """Cria um AuditWriter registrado para flush no encerramento do processo."""
+    writer = AuditWriter(write_batch, **kwargs)
+    atexit.register(writer.close)
+    return writer
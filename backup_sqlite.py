@@ -0,0 +1,461 @@
+"""
+Backups Online do SQLite - Sistema Lopes & Ribeiro
+
+Snapshots consistentes do banco principal sem parar o sistema:
+
+- Cópia pela API de backup do SQLite (sqlite3.Connection.backup) em passos
+  de BACKUP_PAGINAS_POR_PASSO páginas: o lock de leitura é liberado entre
+  os passos e as escritas continuam durante o backup
+- Compactação gzip e hash SHA-256 calculados no mesmo passe de leitura
+  (blocos de BACKUP_BLOCO bytes, memória constante)
+- Snapshots incrementais entre backups completos: só as páginas cujo hash
+  mudou desde o snapshot anterior são gravadas (deduplicação por página)
+- Restauração em streaming: o backup completo e os incrementais da cadeia
+  são aplicados num arquivo temporário, conferidos pelo SHA-256 e copiados
+  para o banco em uso também pela API de backup
+
+Arquivos em backups/ (mesmo carimbo de data por snapshot):
+    sistema_backup_<ts>.db.gz     banco completo (gzip)
+    sistema_backup_<ts>.inc.gz    páginas alteradas: [nº página (4 bytes) + página]...
+    <arquivo>.sha256              hash do conteúdo descompactado
+    sistema_backup_<ts>.json      manifesto: tipo, base, page_size, page_count, sha256 do banco
+    sistema_backup_<ts>.pages     hashes das páginas (16 bytes cada), base do próximo incremental
+
+Backups antigos (.db.gz + .md5, sem manifesto) continuam verificáveis e
+restauráveis, mas não servem de base para incrementais.
+
+Uso:
+    import backup_sqlite
+    backup_sqlite.criar_snapshot('dados_escritorio.db')
+    backup_sqlite.criar_snapshot('dados_escritorio.db', incremental=True)
+    backup_sqlite.restaurar('backups/sistema_backup_20250101_120000.inc.gz', 'dados_escritorio.db')
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import struct
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = os.getenv('BACKUP_DIR', 'backups')
+BACKUP_PAGINAS_POR_PASSO = int(os.getenv('BACKUP_PAGINAS_POR_PASSO', '256'))
+BACKUP_PAUSA_MS = float(os.getenv('BACKUP_PAUSA_MS', '0'))
+BACKUP_BLOCO = int(os.getenv('BACKUP_BLOCO', str(1024 * 1024)))
+BACKUP_MANTER_COMPLETOS = int(os.getenv('BACKUP_MANTER_COMPLETOS', '7'))
+# Incrementais seguidos antes de forçar um novo backup completo
+BACKUP_MAX_INCREMENTAIS = int(os.getenv('BACKUP_MAX_INCREMENTAIS', '24'))
+
+PREFIXO = 'sistema_backup_'
+EXT_COMPLETO = '.db.gz'
+EXT_INCREMENTAL = '.inc.gz'
+
+_TAM_HASH_PAGINA = 16
+_CABECALHO_PAGINA = struct.Struct('>I')
+
+
+def _hash_pagina(pagina: bytes) -> bytes:
+    return hashlib.blake2b(pagina, digest_size=_TAM_HASH_PAGINA).digest()
+
+
+def _stem(arquivo: str) -> str:
+    """'backups/sistema_backup_X.db.gz' -> 'backups/sistema_backup_X'."""
+    for ext in (EXT_COMPLETO, EXT_INCREMENTAL):
+        if arquivo.endswith(ext):
+            return arquivo[:-len(ext)]
+    return os.path.splitext(arquivo)[0]
+
+
+def _ler_manifesto(arquivo: str) -> Optional[Dict]:
+    caminho = f"{_stem(arquivo)}.json"
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def listar_snapshots(backup_dir: str = BACKUP_DIR) -> List[str]:
+    """Arquivos de backup (completos e incrementais) em ordem cronológica."""
+    if not os.path.isdir(backup_dir):
+        return []
+    return sorted(
+        os.path.join(backup_dir, f) for f in os.listdir(backup_dir)
+        if f.startswith(PREFIXO) and (f.endswith(EXT_COMPLETO) or f.endswith(EXT_INCREMENTAL))
+    )
+
+
+# =====================================================
+# CÓPIA ONLINE
+# =====================================================
+
+def copiar_online(origem: str, destino: str, paginas: int = None):
+    """
+    Copia um banco SQLite em uso para `destino` pela API de backup.
+
+    Cada passo copia `paginas` páginas com um lock de leitura curto; se outra
+    conexão escrever no meio da cópia o SQLite reinicia os passos, então o
+    resultado é sempre um snapshot consistente.
+    """
+    paginas = paginas or BACKUP_PAGINAS_POR_PASSO
+    pausa = BACKUP_PAUSA_MS / 1000
+
+    def _progresso(status, restantes, total):
+        if pausa and restantes:
+            time.sleep(pausa)
+
+    src = sqlite3.connect(origem, timeout=30)
+    dst = sqlite3.connect(destino)
+    try:
+        src.backup(dst, pages=paginas, progress=_progresso, sleep=0.05)
+    finally:
+        dst.close()
+        src.close()
+
+
+# =====================================================
+# SNAPSHOT
+# =====================================================
+
+def _base_incremental(backup_dir: str) -> Optional[Dict]:
+    """Manifesto do último snapshot, se ele puder servir de base."""
+    snapshots = listar_snapshots(backup_dir)
+    if not snapshots:
+        return None
+    ultimo = snapshots[-1]
+    manifesto = _ler_manifesto(ultimo)
+    if not manifesto or not os.path.exists(f"{_stem(ultimo)}.pages"):
+        return None
+    if manifesto.get('cadeia', 0) >= BACKUP_MAX_INCREMENTAIS:
+        return None
+    manifesto['_stem'] = _stem(ultimo)
+    return manifesto
+
+
+def criar_snapshot(db_file: str, incremental: bool = False, backup_dir: str = BACKUP_DIR) -> Dict:
+    """
+    Cria um snapshot do banco (completo ou incremental).
+
+    Um incremental sem base válida (nenhum snapshot anterior com manifesto,
+    ou cadeia longa demais) vira backup completo.
+
+    Args:
+        db_file: Banco SQLite de origem
+        incremental: Gravar só as páginas alteradas desde o último snapshot
+        backup_dir: Pasta dos backups
+
+    Returns:
+        Dict com arquivo, tipo, sha256, tamanho_original, tamanho_arquivo,
+        paginas e paginas_alteradas
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+
+    base = _base_incremental(backup_dir) if incremental else None
+    tipo = 'incremental' if base else 'completo'
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    stem = os.path.join(backup_dir, f"{PREFIXO}{timestamp}")
+    arquivo = stem + (EXT_INCREMENTAL if base else EXT_COMPLETO)
+    temp = f"{stem}.tmp"
+    pages_temp = f"{stem}.pages.tmp"
+
+    try:
+        copiar_online(db_file, temp)
+
+        conn = sqlite3.connect(temp)
+        try:
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        finally:
+            conn.close()
+
+        if base and base['page_size'] != page_size:
+            logger.info("page_size mudou desde o último snapshot, gerando backup completo")
+            base, tipo = None, 'completo'
+            arquivo = stem + EXT_COMPLETO
+
+        hash_banco = hashlib.sha256()
+        hash_arquivo = hashlib.sha256()
+        paginas_por_bloco = max(1, BACKUP_BLOCO // page_size)
+        page_count = 0
+        alteradas = 0
+
+        base_pages = open(f"{base['_stem']}.pages", 'rb') if base else None
+        try:
+            with open(temp, 'rb') as f_in, \
+                    gzip.open(arquivo, 'wb', compresslevel=6) as f_out, \
+                    open(pages_temp, 'wb') as f_pages:
+                while True:
+                    bloco = f_in.read(page_size * paginas_por_bloco)
+                    if not bloco:
+                        break
+                    hash_banco.update(bloco)
+                    saida = []
+                    for i in range(0, len(bloco), page_size):
+                        pagina = bloco[i:i + page_size]
+                        digest = _hash_pagina(pagina)
+                        f_pages.write(digest)
+                        if base_pages is not None:
+                            if base_pages.read(_TAM_HASH_PAGINA) != digest:
+                                saida.append(_CABECALHO_PAGINA.pack(page_count))
+                                saida.append(pagina)
+                                alteradas += 1
+                        page_count += 1
+                    dados = b''.join(saida) if base_pages is not None else bloco
+                    if dados:
+                        hash_arquivo.update(dados)
+                        f_out.write(dados)
+        finally:
+            if base_pages is not None:
+                base_pages.close()
+
+        if base is None:
+            alteradas = page_count
+
+        with open(f"{arquivo}.sha256", 'w') as f:
+            f.write(hash_arquivo.hexdigest())
+        os.replace(pages_temp, f"{stem}.pages")
+
+        manifesto = {
+            'tipo': tipo,
+            'arquivo': os.path.basename(arquivo),
+            'base': os.path.basename(base['arquivo']) if base else None,
+            'cadeia': base.get('cadeia', 0) + 1 if base else 0,
+            'page_size': page_size,
+            'page_count': page_count,
+            'paginas_alteradas': alteradas,
+            'sha256': hash_banco.hexdigest(),
+            'criado_em': datetime.now().isoformat(),
+        }
+        with open(f"{stem}.json", 'w', encoding='utf-8') as f:
+            json.dump(manifesto, f, indent=2)
+
+        tamanho_original = page_count * page_size
+        tamanho_arquivo = os.path.getsize(arquivo)
+        logger.info(
+            f"Snapshot {tipo} criado: {arquivo} | "
+            f"Páginas: {alteradas}/{page_count} | "
+            f"Original: {tamanho_original/1024/1024:.2f}MB | "
+            f"Arquivo: {tamanho_arquivo/1024/1024:.2f}MB"
+        )
+        return {
+            'arquivo': arquivo,
+            'tipo': tipo,
+            'sha256': manifesto['sha256'],
+            'tamanho_original': tamanho_original,
+            'tamanho_arquivo': tamanho_arquivo,
+            'paginas': page_count,
+            'paginas_alteradas': alteradas,
+        }
+    except Exception:
+        for caminho in (arquivo, f"{arquivo}.sha256", pages_temp):
+            if os.path.exists(caminho):
+                os.remove(caminho)
+        raise
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+
+def _remover_snapshot(arquivo: str):
+    stem = _stem(arquivo)
+    for caminho in (arquivo, f"{arquivo}.sha256", f"{arquivo}.md5", f"{stem}.json", f"{stem}.pages"):
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+
+def rotacionar(backup_dir: str = BACKUP_DIR, manter: int = None) -> List[str]:
+    """
+    Mantém os últimos `manter` backups completos e os incrementais
+    posteriores ao mais antigo deles (incrementais sem base são removidos).
+
+    Returns:
+        Arquivos removidos
+    """
+    manter = manter or BACKUP_MANTER_COMPLETOS
+    snapshots = listar_snapshots(backup_dir)
+    completos = [s for s in snapshots if s.endswith(EXT_COMPLETO)]
+    if len(completos) <= manter:
+        return []
+
+    primeiro_mantido = completos[-manter]
+    removidos = [s for s in snapshots if s < primeiro_mantido]
+    for arquivo in removidos:
+        _remover_snapshot(arquivo)
+        logger.info(f"Backup antigo removido (rotação): {os.path.basename(arquivo)}")
+    return removidos
+
+
+# =====================================================
+# VERIFICAÇÃO / RESTAURAÇÃO
+# =====================================================
+
+def verificar(arquivo: str) -> bool:
+    """
+    Confere o hash do conteúdo descompactado de um backup, em streaming.
+
+    Aceita o sidecar .sha256 (atual) ou .md5 (backups antigos).
+    """
+    for ext, algoritmo in (('.sha256', hashlib.sha256), ('.md5', hashlib.md5)):
+        sidecar = f"{arquivo}{ext}"
+        if os.path.exists(sidecar):
+            break
+    else:
+        logger.warning(f"Arquivo de hash não encontrado para {arquivo}")
+        return False
+
+    with open(sidecar, 'r') as f:
+        esperado = f.read().strip()
+
+    h = algoritmo()
+    with gzip.open(arquivo, 'rb') as f:
+        while True:
+            bloco = f.read(BACKUP_BLOCO)
+            if not bloco:
+                break
+            h.update(bloco)
+
+    if h.hexdigest() != esperado:
+        logger.error(f"Backup CORROMPIDO: {arquivo}")
+        return False
+    logger.info(f"Backup verificado OK: {arquivo}")
+    return True
+
+
+def cadeia(arquivo: str) -> List[str]:
+    """Arquivos necessários para restaurar `arquivo`: completo + incrementais, em ordem."""
+    resultado = [arquivo]
+    pasta = os.path.dirname(arquivo)
+    while resultado[0].endswith(EXT_INCREMENTAL):
+        manifesto = _ler_manifesto(resultado[0])
+        if not manifesto or not manifesto.get('base'):
+            raise ValueError(f"Manifesto sem base para o incremental {resultado[0]}")
+        base = os.path.join(pasta, manifesto['base'])
+        if not os.path.exists(base):
+            raise FileNotFoundError(f"Backup base não encontrado: {base}")
+        resultado.insert(0, base)
+    return resultado
+
+
+def montar(arquivo: str, destino: str) -> str:
+    """
+    Reconstrói em `destino` o banco do snapshot `arquivo`, em streaming.
+
+    Verifica os hashes de cada arquivo da cadeia e, havendo manifesto, o
+    SHA-256 do banco reconstruído.
+
+    Returns:
+        Caminho de `destino`
+    """
+    arquivos = cadeia(arquivo)
+    for item in arquivos:
+        if not verificar(item):
+            raise ValueError(f"Backup corrompido: {item}")
+
+    with gzip.open(arquivos[0], 'rb') as f_in, open(destino, 'wb') as f_out:
+        while True:
+            bloco = f_in.read(BACKUP_BLOCO)
+            if not bloco:
+                break
+            f_out.write(bloco)
+
+    manifesto = None
+    with open(destino, 'r+b') as f_out:
+        for item in arquivos[1:]:
+            manifesto = _ler_manifesto(item)
+            page_size = manifesto['page_size']
+            with gzip.open(item, 'rb') as f_in:
+                while True:
+                    cabecalho = f_in.read(_CABECALHO_PAGINA.size)
+                    if not cabecalho:
+                        break
+                    (numero,) = _CABECALHO_PAGINA.unpack(cabecalho)
+                    f_out.seek(numero * page_size)
+                    f_out.write(f_in.read(page_size))
+            f_out.truncate(manifesto['page_count'] * page_size)
+
+    manifesto = manifesto or _ler_manifesto(arquivo)
+    if manifesto:
+        h = hashlib.sha256()
+        with open(destino, 'rb') as f:
+            while True:
+                bloco = f.read(BACKUP_BLOCO)
+                if not bloco:
+                    break
+                h.update(bloco)
+        if h.hexdigest() != manifesto['sha256']:
+            raise ValueError(f"Banco reconstruído não confere com o manifesto: {arquivo}")
+    return destino
+
+
+def restaurar(arquivo: str, db_file: str) -> Optional[str]:
+    """
+    Restaura `db_file` a partir de um snapshot (completo ou incremental).
+
+    O snapshot é montado num arquivo temporário, validado (hash e
+    quick_check) e copiado para o banco em uso pela API de backup, que
+    coordena os locks com as demais conexões abertas. Antes disso o banco
+    atual é salvo em `<db_file>.before_restore_<ts>`.
+
+    Returns:
+        Caminho da cópia de segurança do banco atual (None se não existia)
+    """
+    temp = f"{db_file}.restore_tmp"
+    try:
+        montar(arquivo, temp)
+
+        conn = sqlite3.connect(temp)
+        try:
+            status = conn.execute("PRAGMA quick_check").fetchone()[0]
+        finally:
+            conn.close()
+        if status != 'ok':
+            raise ValueError(f"quick_check falhou no backup {arquivo}: {status}")
+
+        seguranca = None
+        if os.path.exists(db_file):
+            seguranca = f"{db_file}.before_restore_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+            copiar_online(db_file, seguranca)
+
+        src = sqlite3.connect(temp)
+        dst = sqlite3.connect(db_file, timeout=30)
+        try:
+            src.backup(dst, pages=BACKUP_PAGINAS_POR_PASSO, sleep=0.05)
+        finally:
+            dst.close()
+            src.close()
+
+        logger.info(f"Banco restaurado de: {arquivo}")
+        return seguranca
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+
+if __name__ == "__main__":
+    import argparse
+    import database_adapter as adapter
+
+    parser = argparse.ArgumentParser(description="Backups online do banco SQLite")
+    parser.add_argument('--incremental', action='store_true', help='Gravar só as páginas alteradas')
+    parser.add_argument('--verificar', metavar='ARQUIVO', help='Verificar um backup (e sua cadeia)')
+    parser.add_argument('--listar', action='store_true', help='Listar snapshots')
+    args = parser.parse_args()
+
+    if args.listar:
+        for item in listar_snapshots():
+            manifesto = _ler_manifesto(item) or {}
+            print(f"{os.path.basename(item)}  {manifesto.get('tipo', 'completo')}  "
+                  f"{manifesto.get('paginas_alteradas', '-')}/{manifesto.get('page_count', '-')} páginas")
+    elif args.verificar:
+        ok = all(verificar(item) for item in cadeia(args.verificar))
+        print("✅ Backup íntegro" if ok else "❌ Backup corrompido")
+    else:
+        info = criar_snapshot(adapter.get_adapter().db_name, incremental=args.incremental)
+        rotacionar()
+        print(f"✅ Snapshot {info['tipo']}: {info['arquivo']} "
+              f"({info['paginas_alteradas']}/{info['paginas']} páginas)")
@@ -0,0 +1,286 @@
+"""
+Índice de Busca Textual - Sistema Lopes & Ribeiro
+
+Índice full-text usado por database.busca_global() no lugar de varreduras
+LIKE '%termo%' (que não usam índice algum).
+
+- SQLite: tabelas virtuais FTS5 de conteúdo externo (busca_clientes,
+  busca_processos, busca_financeiro), tokenizer unicode61 sem acentos e
+  índices de prefixo; sincronizadas por triggers AFTER INSERT/UPDATE/DELETE
+- PostgreSQL: coluna gerada `busca_tsv` (tsvector 'portuguese' sobre o
+  texto sem acentos) + índice GIN; sincronizada pelo próprio banco
+
+Os termos digitados viram consultas por prefixo ("joa silv" encontra
+"João da Silva"), ordenadas por relevância (bm25 / ts_rank).
+
+Uso:
+    import busca_textual
+    if busca_textual.indice_disponivel():
+        df = busca_textual.buscar('clientes', 'joao silva', limite=10)
+"""
+
+import logging
+import re
+import unicodedata
+from typing import List, Optional
+
+import pandas as pd
+
+import database_adapter as adapter
+
+logger = logging.getLogger(__name__)
+
+# Configuração por tabela: colunas indexadas (a primeira tem peso maior),
+# colunas retornadas e ordenação de desempate
+TABELAS_BUSCA = {
+    'clientes': {
+        # cpf_cnpj é gravado cifrado (Fernet): buscado pelo índice cego, não aqui
+        'indexadas': ['nome', 'email', 'telefone'],
+        'retorno': "id, nome, cpf_cnpj, telefone, email, 'cliente' as tipo_resultado",
+    },
+    'processos': {
+        'indexadas': ['numero', 'cliente_nome', 'acao', 'obs'],
+        'retorno': "id, numero, cliente_nome, acao, fase_processual, 'processo' as tipo_resultado",
+    },
+    'financeiro': {
+        'indexadas': ['descricao', 'cliente', 'categoria'],
+        'retorno': "id, descricao, cliente, valor, tipo, status, 'financeiro' as tipo_resultado",
+    },
+}
+
+# Peso da primeira coluna no ranking (bm25 / setweight 'A')
+PESO_PRINCIPAL = 10.0
+
+# Conversão sem acentos usada nas colunas geradas do PostgreSQL
+# (translate é IMMUTABLE; unaccent() não pode ser usado em colunas geradas)
+_PG_ACENTOS = 'áàâãäéèêëíìîïóòôõöúùûüçñÁÀÂÃÄÉÈÊËÍÌÎÏÓÒÔÕÖÚÙÛÜÇÑ'
+_PG_SEM_ACENTOS = 'aaaaaeeeeiiiiooooouuuucnAAAAAEEEEIIIIOOOOOUUUUCN'
+
+_indice_ok: Optional[bool] = None
+
+
+def _tabela_fts(tabela: str) -> str:
+    return f"busca_{tabela}"
+
+
+# =====================================================
+# CRIAÇÃO DO ÍNDICE (chamado pela migração de schema)
+# =====================================================
+
+def criar_indice_sqlite(cursor) -> bool:
+    """
+    Cria tabelas FTS5, triggers de sincronização e popula o índice.
+
+    Returns:
+        False se o SQLite não tiver suporte a FTS5 (busca usa LIKE)
+    """
+    for tabela, cfg in TABELAS_BUSCA.items():
+        fts = _tabela_fts(tabela)
+        cols = cfg['indexadas']
+        lista = ', '.join(cols)
+        novos = ', '.join(f"new.{c}" for c in cols)
+        antigos = ', '.join(f"old.{c}" for c in cols)
+
+        try:
+            cursor.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                    {lista},
+                    content='{tabela}', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2',
+                    prefix='2 3'
+                )
+            """)
+        except Exception as e:
+            if 'fts5' in str(e).lower():
+                logger.warning(f"SQLite sem suporte a FTS5, busca global usará LIKE: {e}")
+                return False
+            raise
+
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tabela} BEGIN
+                INSERT INTO {fts}(rowid, {lista}) VALUES (new.id, {novos});
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tabela} BEGIN
+                INSERT INTO {fts}({fts}, rowid, {lista}) VALUES ('delete', old.id, {antigos});
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {lista} ON {tabela} BEGIN
+                INSERT INTO {fts}({fts}, rowid, {lista}) VALUES ('delete', old.id, {antigos});
+                INSERT INTO {fts}(rowid, {lista}) VALUES (new.id, {novos});
+            END
+        """)
+
+        # Indexar registros já existentes
+        cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+    return True
+
+
+def remover_indice(cursor, tabela: str):
+    """Remove o índice textual de uma tabela (para recriá-lo com outras colunas)."""
+    if adapter.USE_POSTGRES:
+        cursor.execute(f"DROP INDEX IF EXISTS idx_{tabela}_busca_tsv")
+        cursor.execute(f"ALTER TABLE {tabela} DROP COLUMN IF EXISTS busca_tsv")
+        return
+    fts = _tabela_fts(tabela)
+    for sufixo in ('ai', 'ad', 'au'):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {fts}_{sufixo}")
+    cursor.execute(f"DROP TABLE IF EXISTS {fts}")
+
+
+def criar_indice_postgres(cursor):
+    """Cria a função sem acentos, as colunas tsvector geradas e os índices GIN."""
+    cursor.execute(f"""
+        CREATE OR REPLACE FUNCTION busca_sem_acento(texto TEXT) RETURNS TEXT
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+            SELECT lower(translate(COALESCE(texto, ''), '{_PG_ACENTOS}', '{_PG_SEM_ACENTOS}'))
+        $$
+    """)
+
+    for tabela, cfg in TABELAS_BUSCA.items():
+        principal, *demais = cfg['indexadas']
+        resto = " || ' ' || ".join(f"busca_sem_acento({c})" for c in demais) or "''"
+        cursor.execute(
+            "SELECT 1 FROM information_schema.columns WHERE table_name = %s AND column_name = 'busca_tsv'",
+            (tabela,)
+        )
+        if cursor.fetchone() is None:
+            cursor.execute(f"""
+                ALTER TABLE {tabela} ADD COLUMN busca_tsv tsvector GENERATED ALWAYS AS (
+                    setweight(to_tsvector('portuguese', busca_sem_acento({principal})), 'A') ||
+                    setweight(to_tsvector('portuguese', {resto}), 'B')
+                ) STORED
+            """)
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{tabela}_busca_tsv ON {tabela} USING GIN (busca_tsv)"
+        )
+
+
+# =====================================================
+# CONSULTA
+# =====================================================
+
+def remover_acentos(texto: str) -> str:
+    """Remove acentos e converte para minúsculas ('João' -> 'joao')."""
+    normalizado = unicodedata.normalize('NFKD', str(texto))
+    return ''.join(c for c in normalizado if not unicodedata.combining(c)).lower()
+
+
+def tokenizar(termo: str) -> List[str]:
+    """Quebra o termo em tokens alfanuméricos sem acentos."""
+    return [t for t in re.split(r'[^0-9a-z]+', remover_acentos(termo)) if t]
+
+
+def montar_consulta(termo: str) -> Optional[str]:
+    """
+    Converte o texto digitado em consulta de prefixo do dialeto atual.
+
+    Returns:
+        Expressão MATCH (FTS5) ou to_tsquery (PostgreSQL); None se vazio
+    """
+    tokens = tokenizar(termo)
+    if not tokens:
+        return None
+    if adapter.USE_POSTGRES:
+        return ' & '.join(f"{t}:*" for t in tokens)
+    return ' '.join(f'"{t}"*' for t in tokens)
+
+
+def indice_disponivel() -> bool:
+    """True se o índice de busca existe no banco atual (resultado memorizado)."""
+    global _indice_ok
+    if _indice_ok is not None:
+        return _indice_ok
+    try:
+        if adapter.USE_POSTGRES:
+            row = adapter.get_adapter().fetch_one(
+                "SELECT 1 AS ok FROM information_schema.columns "
+                "WHERE table_name = 'clientes' AND column_name = 'busca_tsv'"
+            )
+        else:
+            row = adapter.get_adapter().fetch_one(
+                "SELECT 1 AS ok FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (_tabela_fts('clientes'),)
+            )
+        _indice_ok = row is not None
+    except Exception as e:
+        logger.debug(f"Não foi possível verificar índice de busca: {e}")
+        _indice_ok = False
+    return _indice_ok
+
+
+def reset_indice_flag():
+    """Força nova verificação do índice (ex.: após restaurar backup)."""
+    global _indice_ok
+    _indice_ok = None
+
+
+def buscar(tabela: str, termo: str, limite: int = 20) -> pd.DataFrame:
+    """
+    Busca por relevância no índice textual de uma tabela.
+
+    Args:
+        tabela: 'clientes', 'processos' ou 'financeiro'
+        termo: Texto digitado (prefixos, sem diferenciar acentos/maiúsculas)
+        limite: Máximo de resultados
+
+    Returns:
+        DataFrame com as colunas de retorno da tabela, mais relevantes primeiro
+    """
+    cfg = TABELAS_BUSCA[tabela]
+    consulta = montar_consulta(termo)
+    if not consulta:
+        return pd.DataFrame()
+
+    if adapter.USE_POSTGRES:
+        sql = f"""
+            SELECT {cfg['retorno']}
+            FROM {tabela}
+            WHERE busca_tsv @@ to_tsquery('portuguese', %s)
+            ORDER BY ts_rank(busca_tsv, to_tsquery('portuguese', %s)) DESC, id DESC
+            LIMIT %s
+        """
+        params = (consulta, consulta, limite)
+    else:
+        fts = _tabela_fts(tabela)
+        pesos = ', '.join([str(PESO_PRINCIPAL)] + ['1.0'] * (len(cfg['indexadas']) - 1))
+        retorno = ', '.join(
+            c.strip() if ' as ' in c.lower() else f"t.{c.strip()}"
+            for c in cfg['retorno'].split(',')
+        )
+        sql = f"""
+            SELECT {retorno}
+            FROM {fts}
+            JOIN {tabela} t ON t.id = {fts}.rowid
+            WHERE {fts} MATCH ?
+            ORDER BY bm25({fts}, {pesos}), t.id DESC
+            LIMIT ?
+        """
+        params = (consulta, limite)
+
+    rows = adapter.get_adapter().fetch_all(sql, params)
+    return pd.DataFrame([dict(r) for r in rows]) if rows else pd.DataFrame()
+
+
+def otimizar_indice(reconstruir: bool = False):
+    """
+    Manutenção do índice FTS5 (no PostgreSQL o GIN é mantido pelo banco).
+
+    Args:
+        reconstruir: Reindexar tudo a partir das tabelas (reparo); por padrão
+            apenas funde os segmentos do índice ('optimize')
+    """
+    if adapter.USE_POSTGRES or not indice_disponivel():
+        return
+    with adapter.get_connection() as conn:
+        cursor = conn.cursor()
+        for tabela in TABELAS_BUSCA:
+            fts = _tabela_fts(tabela)
+            if reconstruir:
+                cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+            cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('optimize')")
+        conn.commit()
+    logger.info(f"Índice de busca textual {'reconstruído' if reconstruir else 'otimizado'}")
@@ -4,6 +4,7 @@ Componentes de UI - Sprint 4
 - load_css(): Carrega estilos globais
 - toggle_theme(): Alterna entre tema claro/escuro
 - get_theme(): Retorna tema atual
+- cursor_pagina() / render_controles_pagina(): Paginação keyset das listagens
 """
 
 import streamlit as st
@@ -119,3 +120,48 @@ def toast_info(message: str):
     """Exibe toast informativo"""
     st.toast(f"ℹ️ {message}", icon="ℹ️")
 
+# ========== PAGINAÇÃO KEYSET ==========
+
+def cursor_pagina(chave: str, filtros) -> object:
+    """
+    Retorna o cursor da página atual de uma listagem (None = primeira).
+    
+    A pilha de cursores fica no session_state; quando os filtros mudam,
+    a listagem volta para a primeira página.
+    
+    Args:
+        chave: Identificador da listagem (ex: 'clientes')
+        filtros: Valor que representa os filtros atuais (comparado por igualdade)
+    """
+    estado = st.session_state.get(f"_pag_{chave}")
+    assinatura = repr(filtros)
+    if estado is None or estado['filtros'] != assinatura:
+        estado = {'filtros': assinatura, 'pilha': []}
+        st.session_state[f"_pag_{chave}"] = estado
+    return estado['pilha'][-1] if estado['pilha'] else None
+
+def render_controles_pagina(chave: str, pagina: dict, limite: int):
+    """
+    Renderiza botões Anterior/Próxima de uma página retornada por db.select_page.
+    
+    Args:
+        chave: Mesmo identificador usado em cursor_pagina()
+        pagina: Retorno de db.select_page
+        limite: Tamanho da página
+    """
+    estado = st.session_state.get(f"_pag_{chave}", {'filtros': None, 'pilha': []})
+    num_pagina = len(estado['pilha']) + 1
+    total = pagina.get('total') or 0
+    total_paginas = max(1, (total + limite - 1) // limite)
+    
+    col_prev, col_info, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if st.button("⬅️ Anterior", key=f"_pag_prev_{chave}", disabled=num_pagina == 1, use_container_width=True):
+            estado['pilha'].pop()
+            st.rerun()
+    with col_info:
+        st.caption(f"Página {num_pagina} de {total_paginas} | {total} registro(s)")
+    with col_next:
+        if st.button("Próxima ➡️", key=f"_pag_next_{chave}", disabled=pagina.get('cursor') is None, use_container_width=True):
+            estado['pilha'].append(pagina['cursor'])
+            st.rerun()
@@ -6,18 +6,44 @@ dados sensíveis como CPF/CNPJ usando Fernet (AES-128-CBC).
 
 A chave é armazenada em variável de ambiente CRYPTO_KEY ou
 em arquivo .crypto_key na raiz do projeto.
+
+Como o Fernet usa IV aleatório, o mesmo CPF gera textos cifrados
+diferentes. Para buscas por igualdade existe o índice cego
+(blind_index): HMAC-SHA256 dos dígitos do documento com chave própria
+(BLIND_INDEX_KEY ou derivada da chave de criptografia), gravado em
+coluna indexada ao lado do valor cifrado.
+
+Textos descriptografados ficam num cache LRU do processo, limitado em
+itens (CRYPTO_CACHE_MAX) e tempo (CRYPTO_CACHE_TTL) e chaveado pelo texto
+cifrado; decrypt_many() descriptografa uma coluna inteira de uma vez.
+O cache é esvaziado no logout (limpar_cache).
+
+Rotação de chaves: a chave acima é a versão 1 (textos "ENC:<token>").
+Novas versões vêm de CRYPTO_KEY_V2, CRYPTO_KEY_V3... e a versão usada
+para cifrar é CRYPTO_KEY_ATIVA (padrão: a maior disponível). Textos de
+versões >= 2 levam o prefixo "ENC:v<n>:"; qualquer versão configurada é
+aceita na leitura (MultiFernet). A recifragem dos dados gravados é feita
+em lotes por crypto_rotacao.
 """
 
 import os
 import base64
+import hashlib
+import hmac
 import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Dict, Iterable, Optional
 
 logger = logging.getLogger(__name__)
 
 # Tentar importar cryptography, se não disponível, usar modo fallback
 try:
-    from cryptography.fernet import Fernet
+    from cryptography.fernet import Fernet, InvalidToken, MultiFernet
     CRYPTO_AVAILABLE = True
 except ImportError:
     CRYPTO_AVAILABLE = False
@@ -26,11 +52,42 @@ except ImportError:
 # Caminho do arquivo de chave
 KEY_FILE = Path(__file__).parent / ".crypto_key"
 KEY_ENV_VAR = "CRYPTO_KEY"
+KEY_VERSION_ENV_PREFIX = "CRYPTO_KEY_V"
+ACTIVE_VERSION_ENV_VAR = "CRYPTO_KEY_ATIVA"
+BLIND_INDEX_KEY_ENV_VAR = "BLIND_INDEX_KEY"
+
+# Dígitos iniciais cobertos pelo índice cego de prefixo (0 desativa a busca parcial)
+BLIND_INDEX_PREFIXO = int(os.getenv('BLIND_INDEX_PREFIXO', '6'))
+
+# Cache de textos descriptografados (0 desativa)
+CRYPTO_CACHE_MAX = int(os.getenv('CRYPTO_CACHE_MAX', '4096'))
+CRYPTO_CACHE_TTL = float(os.getenv('CRYPTO_CACHE_TTL', '900'))
+# A partir de quantos valores distintos decrypt_many usa threads
+CRYPTO_PARALELO_MIN = int(os.getenv('CRYPTO_PARALELO_MIN', '200'))
+CRYPTO_PARALELO_WORKERS = int(os.getenv('CRYPTO_PARALELO_WORKERS', '4'))
 
 _fernet_instance = None
+_chaves: Optional[Dict[int, "Fernet"]] = None
+_versao_ativa: Optional[int] = None
+_multifernet = None
+_chaves_lock = threading.Lock()
+_blind_index_key = None
+
+_RE_VERSAO = re.compile(r'^ENC:v(\d+):')
 
+_cache_lock = threading.Lock()
+_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_cache_stats = {
+    'hits': 0,
+    'misses': 0,
+    'evictions': 0,
+    'expired': 0,
+    'errors': 0,
+    'clears': 0,
+}
 
-def _get_or_create_key() -> bytes:
+
+def _get_or_create_key(criar: bool = True) -> bytes:
     """
     Obtém chave de criptografia do Secret Manager (produção) ou 
     variável de ambiente/arquivo (desenvolvimento).
@@ -40,6 +97,9 @@ def _get_or_create_key() -> bytes:
     2. Variável de ambiente CRYPTO_KEY
     3. Arquivo .crypto_key (fallback dev)
     4. Gera nova chave (apenas dev)
+    
+    Com criar=False os passos 4 e o erro de produção são pulados: retorna
+    None se a chave não estiver configurada (v1 já retirada após rotação).
     """
     if not CRYPTO_AVAILABLE:
         return None
@@ -78,6 +138,9 @@ def _get_or_create_key() -> bytes:
         except Exception as e:
             logger.error(f"Erro ao ler chave do arquivo: {e}")
     
+    if not criar:
+        return None
+    
     # Fallback 3: Gerar nova chave (APENAS DEV)
     environment = os.getenv('ENVIRONMENT', 'development')
     if environment == 'development':
@@ -112,34 +175,131 @@ def _get_or_create_key() -> bytes:
 
 
 
+def _fernet_de(material) -> "Fernet":
+    """Fernet a partir da chave em base64 (str/bytes) ou dos 32 bytes já decodificados."""
+    if isinstance(material, str):
+        material = material.strip().encode('utf-8')
+    try:
+        return Fernet(material)
+    except ValueError:
+        if len(material) == 32:
+            return Fernet(base64.urlsafe_b64encode(material))
+        raise
+
+
+def _carregar_chaves() -> Dict[int, "Fernet"]:
+    """
+    Chaveiro {versão: Fernet}: versão 1 = chave principal, demais de CRYPTO_KEY_V<n>.
+    
+    Com alguma CRYPTO_KEY_V<n> configurada a versão 1 é opcional: ausente,
+    não é gerada nem levanta erro (pode ser retirada após a rotação).
+    """
+    global _chaves, _versao_ativa, _multifernet
+    
+    with _chaves_lock:
+        if _chaves is not None:
+            return _chaves
+        
+        chaves = {}
+        for nome, valor in os.environ.items():
+            if not nome.startswith(KEY_VERSION_ENV_PREFIX) or not valor:
+                continue
+            sufixo = nome[len(KEY_VERSION_ENV_PREFIX):]
+            if not sufixo.isdigit() or int(sufixo) < 2:
+                continue
+            try:
+                chaves[int(sufixo)] = _fernet_de(valor)
+            except Exception as e:
+                logger.error(f"Chave {nome} inválida: {e}")
+        
+        if chaves:
+            try:
+                key = _get_or_create_key(criar=False)
+            except Exception as e:
+                logger.warning(f"Chave v1 indisponível; usando apenas as versões {sorted(chaves)}: {e}")
+                key = None
+        else:
+            key = _get_or_create_key()
+        if key:
+            try:
+                chaves[1] = _fernet_de(key)
+            except Exception as e:
+                logger.error(f"Erro ao inicializar Fernet: {e}")
+        
+        ativa = None
+        if chaves:
+            ativa = max(chaves)
+            pedida = os.environ.get(ACTIVE_VERSION_ENV_VAR)
+            if pedida:
+                if pedida.isdigit() and int(pedida) in chaves:
+                    ativa = int(pedida)
+                else:
+                    logger.error(f"{ACTIVE_VERSION_ENV_VAR}={pedida} sem chave configurada; usando v{ativa}")
+            # Cifra com a ativa; decifra tentando a ativa e depois as demais (mais novas primeiro)
+            ordem = [ativa] + sorted((v for v in chaves if v != ativa), reverse=True)
+            _multifernet = MultiFernet([chaves[v] for v in ordem])
+        
+        _versao_ativa = ativa
+        _chaves = chaves
+        return _chaves
+
+
+def recarregar_chaves():
+    """Relê as chaves (após configurar uma nova versão)."""
+    global _chaves, _versao_ativa, _multifernet, _fernet_instance
+    with _chaves_lock:
+        _chaves = None
+        _versao_ativa = None
+        _multifernet = None
+        _fernet_instance = None
+    limpar_cache()
+
+
+def versao_ativa() -> Optional[int]:
+    """Versão da chave usada para cifrar (None se criptografia indisponível)."""
+    if not CRYPTO_AVAILABLE:
+        return None
+    _carregar_chaves()
+    return _versao_ativa
+
+
+def versao_de(cipher_text: str) -> Optional[int]:
+    """Versão da chave de um texto cifrado (None se não cifrado)."""
+    if not is_encrypted(cipher_text):
+        return None
+    m = _RE_VERSAO.match(cipher_text)
+    return int(m.group(1)) if m else 1
+
+
+def _prefixo(versao: int) -> str:
+    return "ENC:" if versao == 1 else f"ENC:v{versao}:"
+
+
 def _get_fernet():
-    """Retorna instância Fernet singleton"""
+    """Retorna a instância Fernet da chave ativa"""
     global _fernet_instance
     
     if not CRYPTO_AVAILABLE:
         return None
     
     if _fernet_instance is None:
-        key = _get_or_create_key()
-        if key:
-            try:
-                _fernet_instance = Fernet(key)
-            except Exception as e:
-                logger.error(f"Erro ao inicializar Fernet: {e}")
-                return None
+        chaves = _carregar_chaves()
+        if _versao_ativa is not None:
+            _fernet_instance = chaves[_versao_ativa]
     
     return _fernet_instance
 
 
 def encrypt(plain_text: str) -> str:
     """
-    Criptografa um texto.
+    Criptografa um texto com a chave ativa.
     
     Args:
         plain_text: Texto a ser criptografado
         
     Returns:
-        Texto criptografado em base64 ou texto original se criptografia indisponível
+        Texto criptografado em base64 (prefixo ENC: ou ENC:v<n>:) ou texto
+        original se criptografia indisponível
     """
     if not plain_text:
         return plain_text
@@ -155,12 +315,94 @@ def encrypt(plain_text: str) -> str:
     
     try:
         encrypted = fernet.encrypt(plain_text.encode('utf-8'))
-        return f"ENC:{encrypted.decode('utf-8')}"
+        return f"{_prefixo(_versao_ativa)}{encrypted.decode('utf-8')}"
     except Exception as e:
         logger.error(f"Erro ao criptografar: {e}")
         return plain_text
 
 
+def precisa_recifrar(cipher_text: str) -> bool:
+    """True se o texto está cifrado com uma versão diferente da ativa."""
+    versao = versao_de(cipher_text)
+    return versao is not None and versao != versao_ativa()
+
+
+def recifrar(cipher_text: str) -> str:
+    """
+    Recifra um texto com a chave ativa (MultiFernet.rotate).
+    
+    Textos não cifrados são cifrados; os já na versão ativa voltam iguais.
+    
+    Raises:
+        InvalidToken: nenhuma chave configurada decifra o texto
+    """
+    if not cipher_text:
+        return cipher_text
+    if not is_encrypted(cipher_text):
+        return encrypt(cipher_text)
+    if not precisa_recifrar(cipher_text):
+        return cipher_text
+    token = _token(cipher_text)
+    novo = _multifernet.rotate(token.encode('utf-8')).decode('utf-8')
+    return f"{_prefixo(_versao_ativa)}{novo}"
+
+
+def _token(cipher_text: str) -> str:
+    m = _RE_VERSAO.match(cipher_text)
+    return cipher_text[m.end():] if m else cipher_text[4:]
+
+
+def _cache_get(cipher_text: str) -> Optional[str]:
+    if CRYPTO_CACHE_MAX <= 0:
+        return None
+    with _cache_lock:
+        entrada = _cache.get(cipher_text)
+        if entrada is None:
+            _cache_stats['misses'] += 1
+            return None
+        texto, expira_em = entrada
+        if time.monotonic() > expira_em:
+            del _cache[cipher_text]
+            _cache_stats['expired'] += 1
+            _cache_stats['misses'] += 1
+            return None
+        _cache.move_to_end(cipher_text)
+        _cache_stats['hits'] += 1
+        return texto
+
+
+def _cache_put(cipher_text: str, plain_text: str):
+    if CRYPTO_CACHE_MAX <= 0:
+        return
+    with _cache_lock:
+        _cache[cipher_text] = (plain_text, time.monotonic() + CRYPTO_CACHE_TTL)
+        _cache.move_to_end(cipher_text)
+        while len(_cache) > CRYPTO_CACHE_MAX:
+            _cache.popitem(last=False)
+            _cache_stats['evictions'] += 1
+
+
+def _decrypt_fernet(cipher_text: str) -> str:
+    """Descriptografa um valor ENC: (sem cache); devolve o original em caso de erro."""
+    try:
+        token = _token(cipher_text).encode('utf-8')
+        fernet = _carregar_chaves().get(versao_de(cipher_text))
+        try:
+            if fernet is None:
+                raise InvalidToken
+            decrypted = fernet.decrypt(token).decode('utf-8')
+        except InvalidToken:
+            # Versão sem chave ou prefixo inconsistente: tentar todas as chaves
+            decrypted = _multifernet.decrypt(token).decode('utf-8')
+    except Exception as e:
+        logger.error(f"Erro ao descriptografar: {e}")
+        with _cache_lock:
+            _cache_stats['errors'] += 1
+        return cipher_text
+    _cache_put(cipher_text, decrypted)
+    return decrypted
+
+
 def decrypt(cipher_text: str) -> str:
     """
     Descriptografa um texto.
@@ -178,18 +420,152 @@ def decrypt(cipher_text: str) -> str:
     if not isinstance(cipher_text, str) or not cipher_text.startswith("ENC:"):
         return cipher_text
     
+    cached = _cache_get(cipher_text)
+    if cached is not None:
+        return cached
+    
     fernet = _get_fernet()
     if not fernet:
         logger.warning("Criptografia indisponível, não é possível descriptografar")
         return cipher_text  # Retorna criptografado mesmo
     
-    try:
-        encrypted_part = cipher_text[4:]  # Remove "ENC:"
-        decrypted = fernet.decrypt(encrypted_part.encode('utf-8'))
-        return decrypted.decode('utf-8')
-    except Exception as e:
-        logger.error(f"Erro ao descriptografar: {e}")
-        return cipher_text
+    return _decrypt_fernet(cipher_text)
+
+
+def decrypt_many(values: Iterable, workers: int = None):
+    """
+    Descriptografa uma coluna inteira de uma vez.
+    
+    Cada texto cifrado distinto é descriptografado uma única vez (e só se
+    não estiver no cache); acima de CRYPTO_PARALELO_MIN valores pendentes
+    o trabalho é dividido entre threads.
+    
+    Args:
+        values: pandas.Series ou iterável de valores (cifrados ou não)
+        workers: Threads para lotes grandes (padrão: CRYPTO_PARALELO_WORKERS)
+        
+    Returns:
+        Series com o mesmo índice (se recebeu Series) ou lista, na mesma ordem
+    """
+    valores = list(values)
+    resultado: Dict[str, str] = {}
+    pendentes = []
+    for v in set(v for v in valores if isinstance(v, str) and v.startswith("ENC:")):
+        cached = _cache_get(v)
+        if cached is not None:
+            resultado[v] = cached
+        else:
+            pendentes.append(v)
+    
+    if pendentes:
+        fernet = _get_fernet()
+        if not fernet:
+            logger.warning("Criptografia indisponível, não é possível descriptografar")
+        else:
+            workers = workers or CRYPTO_PARALELO_WORKERS
+            if len(pendentes) >= CRYPTO_PARALELO_MIN and workers > 1:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    textos = executor.map(_decrypt_fernet, pendentes)
+                    resultado.update(zip(pendentes, textos))
+            else:
+                for v in pendentes:
+                    resultado[v] = _decrypt_fernet(v)
+    
+    saida = [resultado.get(v, v) if isinstance(v, str) else v for v in valores]
+    if hasattr(values, 'index') and hasattr(values, 'dtype'):
+        import pandas as pd
+        return pd.Series(saida, index=values.index, name=getattr(values, 'name', None), dtype=object)
+    return saida
+
+
+def limpar_cache():
+    """Descarta os textos descriptografados em memória (chamado no logout)."""
+    with _cache_lock:
+        _cache.clear()
+        _cache_stats['clears'] += 1
+
+
+def get_cache_stats() -> Dict:
+    """Métricas do cache de descriptografia: hits, misses, taxa de acerto, itens."""
+    with _cache_lock:
+        dados = dict(_cache_stats)
+        dados['itens'] = len(_cache)
+    total = dados['hits'] + dados['misses']
+    dados['taxa_acerto'] = round(dados['hits'] / total, 3) if total else 0.0
+    return dados
+
+
+def _ha_chaves_versionadas() -> bool:
+    """Há alguma CRYPTO_KEY_V<n> (n >= 2) configurada."""
+    prefixo = len(KEY_VERSION_ENV_PREFIX)
+    return any(
+        nome.startswith(KEY_VERSION_ENV_PREFIX) and nome[prefixo:].isdigit()
+        and int(nome[prefixo:]) >= 2 and valor
+        for nome, valor in os.environ.items()
+    )
+
+
+def _get_blind_index_key() -> Optional[bytes]:
+    """
+    Chave do índice cego: BLIND_INDEX_KEY ou derivada da chave de criptografia.
+    
+    A derivação usa um rótulo próprio, então o HMAC nunca reutiliza a chave
+    do Fernet diretamente.
+    """
+    global _blind_index_key
+    
+    if _blind_index_key is None:
+        key_from_env = os.environ.get(BLIND_INDEX_KEY_ENV_VAR)
+        if key_from_env:
+            _blind_index_key = key_from_env.encode('utf-8')
+        else:
+            try:
+                material = _get_or_create_key(criar=not _ha_chaves_versionadas()) if CRYPTO_AVAILABLE else None
+            except Exception as e:
+                logger.error(f"Chave do índice cego indisponível: {e}")
+                material = None
+            if not material:
+                return None
+            if isinstance(material, str):
+                material = material.encode('utf-8')
+            _blind_index_key = hmac.new(material, b"lopes-ribeiro:blind-index:v1", hashlib.sha256).digest()
+    
+    return _blind_index_key
+
+
+def normalizar_documento(doc: str) -> str:
+    """Apenas os dígitos do documento (descriptografando se necessário)."""
+    if not doc:
+        return ""
+    return ''.join(c for c in decrypt(str(doc)) if c.isdigit())
+
+
+def blind_index(doc: str, prefixo: bool = False) -> Optional[str]:
+    """
+    Índice cego de um CPF/CNPJ para busca por igualdade sem descriptografar.
+    
+    Args:
+        doc: Documento (com ou sem formatação, cifrado ou não)
+        prefixo: Calcular sobre os BLIND_INDEX_PREFIXO primeiros dígitos
+            (busca parcial); None se o documento for mais curto
+        
+    Returns:
+        HMAC-SHA256 em hex (32 caracteres) ou None se vazio/sem chave
+    """
+    digitos = normalizar_documento(doc)
+    if prefixo:
+        if BLIND_INDEX_PREFIXO <= 0 or len(digitos) < BLIND_INDEX_PREFIXO:
+            return None
+        digitos = digitos[:BLIND_INDEX_PREFIXO]
+    if not digitos:
+        return None
+    
+    key = _get_blind_index_key()
+    if not key:
+        return None
+    
+    contexto = b"prefixo:" if prefixo else b"documento:"
+    return hmac.new(key, contexto + digitos.encode('ascii'), hashlib.sha256).hexdigest()[:32]
 
 
 def is_encrypted(text: str) -> bool:
@@ -235,4 +611,4 @@ def is_crypto_available() -> bool:
 
 # Auto-inicialização
 if CRYPTO_AVAILABLE:
-    _get_or_create_key()
+    _carregar_chaves()
@@ -0,0 +1,331 @@
+"""
+Rotação de Chaves de Criptografia - Sistema Lopes & Ribeiro
+
+Recifra com a chave ativa (crypto.versao_ativa) as colunas cifradas que
+ainda estão em versões antigas, sem parar o sistema:
+
+- Lotes de ROTACAO_LOTE linhas lidas por id; a recifragem (CPU) acontece
+  fora da transação e cada lote é gravado numa transação curta com um
+  único executemany
+- Cursor persistido na tabela crypto_rotacao (último id processado por
+  tabela/coluna e versão alvo): se o processo cair, a próxima execução
+  continua de onde parou; trocar a versão ativa recomeça do início
+- UPDATE condicional (WHERE coluna = valor lido): uma linha editada pelo
+  usuário durante a rotação não é sobrescrita (ela já foi gravada com a
+  chave ativa)
+- Pausa de ROTACAO_PAUSA segundos entre lotes para não disputar o banco
+  com a aplicação
+- Execução em thread de segundo plano com progresso consultável
+
+Para rotacionar:
+    1. Configure a nova chave em CRYPTO_KEY_V<n> (mantendo as anteriores)
+    2. Reinicie a aplicação (novos valores já saem com ENC:v<n>:)
+    3. Rode a recifragem (Admin ou scripts/crypto_migration.py --rotate)
+    4. Com pendentes() zerado, as chaves antigas podem ser removidas
+       (inclusive a v1/CRYPTO_KEY: com alguma CRYPTO_KEY_V<n> configurada,
+       crypto não exige nem gera a chave da versão 1)
+
+A chave do índice cego é derivada da chave da versão 1; antes de remover
+a v1, defina BLIND_INDEX_KEY e recalcule o índice
+(schema_migrations.preencher_indice_cego_clientes(cursor, todos=True)).
+Sem a v1 e sem BLIND_INDEX_KEY o índice cego fica indisponível.
+
+Uso:
+    import crypto_rotacao
+    crypto_rotacao.executar()                 # síncrono
+    crypto_rotacao.iniciar_em_background()    # thread
+    crypto_rotacao.progresso()
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+import crypto
+import database as db
+import database_adapter as adapter
+import query_cache
+
+logger = logging.getLogger(__name__)
+
+ROTACAO_LOTE = int(os.getenv('ROTACAO_LOTE', '500'))
+ROTACAO_PAUSA = float(os.getenv('ROTACAO_PAUSA', '0.05'))
+
+# Colunas gravadas com crypto.encrypt: {tabela: [colunas]}
+COLUNAS_CIFRADAS: Dict[str, List[str]] = {
+    'clientes': ['cpf_cnpj'],
+}
+
+_thread: Optional[threading.Thread] = None
+_thread_lock = threading.Lock()
+_parar = threading.Event()
+_status: Dict = {'em_execucao': False, 'erro': None}
+
+
+def _ph() -> str:
+    return '%s' if adapter.USE_POSTGRES else '?'
+
+
+def _filtro_pendentes(coluna: str, versao: int, incluir_texto_puro: bool) -> str:
+    """Condição SQL das linhas que não estão na versão `versao`."""
+    if versao == 1:
+        # Tokens Fernet começam com "gAAAA": "ENC:v" só aparece em versões >= 2
+        cifrado_antigo = f"{coluna} LIKE 'ENC:v%'"
+    else:
+        cifrado_antigo = f"({coluna} LIKE 'ENC:%' AND {coluna} NOT LIKE 'ENC:v{versao}:%')"
+    if incluir_texto_puro:
+        return f"({cifrado_antigo} OR {coluna} NOT LIKE 'ENC:%')"
+    return cifrado_antigo
+
+
+def _ler_cursor(tabela: str, coluna: str) -> Optional[Dict]:
+    ph = _ph()
+    df = db.sql_get_query(
+        f"SELECT * FROM crypto_rotacao WHERE tabela = {ph} AND coluna = {ph}",
+        (tabela, coluna)
+    )
+    return None if df.empty else df.iloc[0].to_dict()
+
+
+def _salvar_cursor(cursor, tabela: str, coluna: str, versao: int, ultimo_id: int,
+                   processados: int, recifrados: int, erros: int, concluido: bool):
+    ph = _ph()
+    agora = datetime.now().isoformat()
+    cursor.execute(
+        f"""INSERT INTO crypto_rotacao
+            (tabela, coluna, versao_alvo, ultimo_id, processados, recifrados, erros,
+             iniciado_em, atualizado_em, concluido_em)
+            VALUES ({ph}, {ph}, {ph}, {ph}, {ph}, {ph}, {ph}, {ph}, {ph}, {ph})
+            ON CONFLICT (tabela, coluna) DO UPDATE SET
+                versao_alvo = excluded.versao_alvo,
+                ultimo_id = excluded.ultimo_id,
+                processados = excluded.processados,
+                recifrados = excluded.recifrados,
+                erros = excluded.erros,
+                atualizado_em = excluded.atualizado_em,
+                concluido_em = excluded.concluido_em""",
+        (tabela, coluna, versao, ultimo_id, processados, recifrados, erros,
+         agora, agora, agora if concluido else None)
+    )
+
+
+def _reiniciar_cursor(tabela: str, coluna: str, versao: int):
+    ph = _ph()
+    agora = datetime.now().isoformat()
+    with db.transaction(), db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"DELETE FROM crypto_rotacao WHERE tabela = {ph} AND coluna = {ph}", (tabela, coluna)
+        )
+        cursor.execute(
+            f"""INSERT INTO crypto_rotacao
+                (tabela, coluna, versao_alvo, ultimo_id, processados, recifrados, erros,
+                 iniciado_em, atualizado_em)
+                VALUES ({ph}, {ph}, {ph}, 0, 0, 0, 0, {ph}, {ph})""",
+            (tabela, coluna, versao, agora, agora)
+        )
+
+
+def recifrar_coluna(tabela: str, coluna: str, lote: int = None, pausa: float = None,
+                    incluir_texto_puro: bool = False,
+                    progresso: Callable[[Dict], None] = None) -> Dict:
+    """
+    Recifra uma coluna com a chave ativa, em lotes, retomando do cursor salvo.
+
+    Args:
+        tabela: Tabela (deve ter chave primária `id`)
+        coluna: Coluna cifrada
+        lote: Linhas por transação (padrão: ROTACAO_LOTE)
+        pausa: Segundos entre lotes (padrão: ROTACAO_PAUSA)
+        incluir_texto_puro: Cifrar também valores ainda sem criptografia
+        progresso: Callback chamado após cada lote com o status atual
+
+    Returns:
+        Dict com tabela, coluna, versao_alvo, processados, recifrados, erros e concluido
+    """
+    versao = crypto.versao_ativa()
+    if versao is None:
+        raise RuntimeError("Criptografia indisponível: nenhuma chave configurada")
+
+    lote = lote or ROTACAO_LOTE
+    pausa = ROTACAO_PAUSA if pausa is None else pausa
+    ph = _ph()
+
+    salvo = _ler_cursor(tabela, coluna)
+    # Versão nova ou passada anterior concluída: varrer de novo (só as pendentes são lidas)
+    if salvo is None or int(salvo['versao_alvo']) != versao or pd.notna(salvo.get('concluido_em')):
+        _reiniciar_cursor(tabela, coluna, versao)
+        salvo = _ler_cursor(tabela, coluna)
+
+    ultimo_id = int(salvo['ultimo_id'])
+    processados = int(salvo['processados'])
+    recifrados = int(salvo['recifrados'])
+    erros = int(salvo['erros'])
+    concluido = False
+
+    filtro = _filtro_pendentes(coluna, versao, incluir_texto_puro)
+    consulta = (
+        f"SELECT id, {coluna} FROM {tabela} WHERE id > {ph} "
+        f"AND {coluna} IS NOT NULL AND {coluna} <> '' AND {filtro} "
+        f"ORDER BY id LIMIT {ph}"
+    )
+
+    while not concluido and not _parar.is_set():
+        # Leitura e recifragem fora da transação: o lock de escrita fica só no UPDATE
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(consulta, (ultimo_id, lote))
+            linhas = [(row['id'], row[coluna]) for row in cursor.fetchall()]
+
+        atualizacoes = []
+        for id_linha, valor in linhas:
+            try:
+                novo = crypto.recifrar(valor)
+            except Exception as e:
+                erros += 1
+                logger.error(f"Não foi possível recifrar {tabela}.{coluna} id={id_linha}: {e}")
+                continue
+            if novo != valor:
+                atualizacoes.append((novo, id_linha, valor))
+
+        concluido = len(linhas) < lote
+        if linhas:
+            ultimo_id = linhas[-1][0]
+        processados += len(linhas)
+
+        with db.transaction() as tx, db.get_connection() as conn:
+            cursor = conn.cursor()
+            if atualizacoes:
+                cursor.executemany(
+                    f"UPDATE {tabela} SET {coluna} = {ph} WHERE id = {ph} AND {coluna} = {ph}",
+                    atualizacoes
+                )
+                tx.on_commit(lambda: query_cache.invalidar(tabela))
+            _salvar_cursor(cursor, tabela, coluna, versao, ultimo_id,
+                           processados, recifrados + len(atualizacoes), erros, concluido)
+        recifrados += len(atualizacoes)
+
+        status = {
+            'tabela': tabela, 'coluna': coluna, 'versao_alvo': versao,
+            'ultimo_id': ultimo_id, 'processados': processados,
+            'recifrados': recifrados, 'erros': erros, 'concluido': concluido,
+        }
+        _status.update(status)
+        if progresso:
+            progresso(status)
+
+        if not concluido and pausa:
+            time.sleep(pausa)
+
+    if concluido:
+        logger.info(
+            f"Rotação de {tabela}.{coluna} para v{versao} concluída: "
+            f"{recifrados} recifrados, {erros} erros"
+        )
+    return {
+        'tabela': tabela, 'coluna': coluna, 'versao_alvo': versao,
+        'processados': processados, 'recifrados': recifrados,
+        'erros': erros, 'concluido': concluido,
+    }
+
+
+def executar(lote: int = None, pausa: float = None, incluir_texto_puro: bool = False,
+             progresso: Callable[[Dict], None] = None) -> List[Dict]:
+    """
+    Recifra todas as colunas de COLUNAS_CIFRADAS com a chave ativa.
+
+    Returns:
+        Lista com o resultado de cada coluna (ver recifrar_coluna)
+    """
+    resultados = []
+    for tabela, colunas in COLUNAS_CIFRADAS.items():
+        for coluna in colunas:
+            if _parar.is_set():
+                return resultados
+            resultados.append(recifrar_coluna(
+                tabela, coluna, lote=lote, pausa=pausa,
+                incluir_texto_puro=incluir_texto_puro, progresso=progresso
+            ))
+    return resultados
+
+
+def pendentes(incluir_texto_puro: bool = False) -> Dict[str, int]:
+    """Linhas fora da versão ativa por 'tabela.coluna'."""
+    versao = crypto.versao_ativa()
+    if versao is None:
+        return {}
+    resultado = {}
+    for tabela, colunas in COLUNAS_CIFRADAS.items():
+        for coluna in colunas:
+            filtro = _filtro_pendentes(coluna, versao, incluir_texto_puro)
+            df = db.sql_get_query(
+                f"SELECT COUNT(*) AS total FROM {tabela} "
+                f"WHERE {coluna} IS NOT NULL AND {coluna} <> '' AND {filtro}"
+            )
+            resultado[f"{tabela}.{coluna}"] = int(df.iloc[0]['total'])
+    return resultado
+
+
+# =====================================================
+# SEGUNDO PLANO
+# =====================================================
+
+def _executar_em_background(kwargs):
+    try:
+        executar(**kwargs)
+        _status['erro'] = None
+    except Exception as e:
+        logger.error(f"Erro na rotação de chaves: {e}")
+        _status['erro'] = str(e)
+    finally:
+        _status['em_execucao'] = False
+
+
+def iniciar_em_background(lote: int = None, pausa: float = None,
+                          incluir_texto_puro: bool = False) -> bool:
+    """
+    Inicia a recifragem numa thread de segundo plano.
+
+    Returns:
+        False se já houver uma rotação em andamento neste processo
+    """
+    global _thread
+    with _thread_lock:
+        if _thread is not None and _thread.is_alive():
+            return False
+        _parar.clear()
+        _status.update({'em_execucao': True, 'erro': None})
+        _thread = threading.Thread(
+            target=_executar_em_background,
+            args=({'lote': lote, 'pausa': pausa, 'incluir_texto_puro': incluir_texto_puro},),
+            name='crypto-rotacao', daemon=True
+        )
+        _thread.start()
+    return True
+
+
+def parar(timeout: float = 10.0):
+    """Interrompe a rotação após o lote atual (o cursor fica salvo)."""
+    _parar.set()
+    if _thread is not None:
+        _thread.join(timeout)
+
+
+def progresso() -> Dict:
+    """
+    Estado da rotação: versão ativa, execução em andamento, cursores
+    persistidos e linhas pendentes por coluna.
+    """
+    cursores = db.sql_get_query("SELECT * FROM crypto_rotacao ORDER BY tabela, coluna")
+    return {
+        'versao_ativa': crypto.versao_ativa(),
+        'em_execucao': _status['em_execucao'],
+        'erro': _status['erro'],
+        'cursores': cursores.to_dict('records'),
+        'pendentes': pendentes(),
+    }
@@ -1,6 +1,10 @@
 import logging
+import re
+import sqlite3
+import threading
 import pandas as pd
 import database_adapter as adapter
+import query_cache
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -12,493 +16,75 @@ try:
 except ImportError:
     pass  # signals é opcional
 
-def init_db():
-    """Inicializa o banco de dados (Schema) se necessário."""
-    if adapter.USE_POSTGRES:
-        # Em produção com Supabase, assumimos que o schema já foi criado via scripts
-        # ou que o usuário vai rodar o script de migração.
-        return
 
-    # Schema para SQLite (Desenvolvimento Local)
-    with adapter.get_connection() as conn:
-        cursor = conn.cursor()
-        
-        # 1. Tabela de Usuários
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS usuarios (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                nome TEXT NOT NULL,
-                role TEXT DEFAULT 'user',
-                ativo INTEGER DEFAULT 1,
-                criado_em TEXT DEFAULT CURRENT_TIMESTAMP,
-                pergunta_secreta TEXT,
-                resposta_secreta_hash TEXT,
-                email TEXT,
-                reset_token TEXT,
-                reset_expiry TEXT
-            )
-        ''')
+def _emitir(evento, dados):
+    """Emite o sinal; dentro de transaction() apenas após o commit."""
+    tx = adapter.current_transaction()
+    if tx is not None:
+        tx.on_commit(lambda: signals.emit(evento, dados))
+    else:
+        signals.emit(evento, dados)
 
-        # Migração: Adicionar colunas se não existirem (para bancos já criados)
-        try:
-            cursor.execute("SELECT pergunta_secreta FROM usuarios LIMIT 1")
-        except:
-            logger.info("Migrando tabela usuarios: adicionando colunas de segurança (pergunta)")
-            try:
-                cursor.execute("ALTER TABLE usuarios ADD COLUMN pergunta_secreta TEXT")
-                cursor.execute("ALTER TABLE usuarios ADD COLUMN resposta_secreta_hash TEXT")
-                conn.commit()
-            except Exception as e:
-                logger.error(f"Erro na migração de usuarios (pergunta): {e}")
 
-        try:
-            cursor.execute("SELECT email FROM usuarios LIMIT 1")
-        except:
-            logger.info("Migrando tabela usuarios: adicionando colunas de email")
-            try:
-                cursor.execute("ALTER TABLE usuarios ADD COLUMN email TEXT")
-                cursor.execute("ALTER TABLE usuarios ADD COLUMN reset_token TEXT")
-                cursor.execute("ALTER TABLE usuarios ADD COLUMN reset_expiry TEXT")
-                conn.commit()
-            except Exception as e:
-                logger.error(f"Erro na migração de usuarios (email): {e}")
-
-        # 2. Tabela de Clientes
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS clientes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome TEXT NOT NULL,
-                cpf_cnpj TEXT,
-                email TEXT,
-                telefone TEXT,
-                telefone_fixo TEXT,
-                profissao TEXT,
-                estado_civil TEXT,
-                cep TEXT,
-                endereco TEXT,
-                numero_casa TEXT,
-                complemento TEXT,
-                bairro TEXT,
-                cidade TEXT,
-                estado TEXT,
-                obs TEXT,
-                status_cliente TEXT DEFAULT 'EM NEGOCIAÇÃO',
-                link_drive TEXT,
-                data_cadastro TEXT,
-                proposta_valor REAL,
-                proposta_entrada REAL,
-                proposta_parcelas INTEGER,
-                proposta_objeto TEXT,
-                proposta_pagamento TEXT,
-                status_proposta TEXT,
-                tipo_pessoa TEXT,
-                proposta_data_pagamento TEXT,
-                link_procuracao TEXT,
-                link_hipossuficiencia TEXT,
-                nacionalidade TEXT,
-                rg TEXT,
-                orgao_emissor TEXT,
-                data_nascimento TEXT
-            )
-        ''')
-        
-        # 3. Tabela de Processos
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS processos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                numero TEXT,
-                cliente_nome TEXT,
-                area TEXT,
-                acao TEXT,
-                vara TEXT,
-                status TEXT DEFAULT 'Ativo',
-                proximo_prazo TEXT,
-                responsavel TEXT,
-                status_processo TEXT,
-                parceiro_nome TEXT,
-                parceiro_percentual REAL,
-                pasta_drive_link TEXT,
-                tipo_honorario TEXT,
-                fase_processual TEXT,
-                id_cliente INTEGER REFERENCES clientes(id),
-                valor_causa REAL,
-                data_distribuicao TEXT,
-                link_drive TEXT,
-                comarca TEXT,
-                obs TEXT
-            )
-        ''')
-        
-        # 4. Tabela de Financeiro (NOVA - necessária para outras tabelas)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS financeiro (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                data TEXT NOT NULL,
-                tipo TEXT NOT NULL,
-                categoria TEXT,
-                descricao TEXT,
-                valor REAL NOT NULL,
-                status_pagamento TEXT DEFAULT 'Pendente',
-                vencimento TEXT,
-                id_cliente INTEGER REFERENCES clientes(id),
-                id_processo INTEGER REFERENCES processos(id),
-                meio_pagamento TEXT,
-                comprovante_link TEXT,
-                obs TEXT,
-                cliente TEXT,
-                status TEXT,
-                criado_em TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # 5. Tabela de Andamentos (CORRIGIDA - removido PRIMARY KEY duplicado)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS andamentos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                id_processo INTEGER NOT NULL REFERENCES processos(id) ON DELETE CASCADE,
-                data TEXT NOT NULL,
-                descricao TEXT NOT NULL,
-                tipo TEXT,
-                responsavel TEXT,
-                criado_em TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # 6. Tabela de Parcelas (NOVA - separada de andamentos)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS parcelas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                id_lancamento_financeiro INTEGER NOT NULL REFERENCES financeiro(id) ON DELETE CASCADE,
-                numero_parcela INTEGER NOT NULL,
-                total_parcelas INTEGER NOT NULL,
-                valor_parcela REAL NOT NULL,
-                vencimento TEXT NOT NULL,
-                status_parcela TEXT DEFAULT 'pendente',
-                pago_em TEXT,
-                obs TEXT
-            )
-        ''')
-        
-        # 7. Tabela de Agenda (NOVA - necessária para get_agenda_eventos)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS agenda (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                titulo TEXT NOT NULL,
-                descricao TEXT,
-                data_evento TEXT NOT NULL,
-                hora_evento TEXT,
-                tipo_evento TEXT,
-                id_processo INTEGER REFERENCES processos(id),
-                id_cliente INTEGER REFERENCES clientes(id),
-                google_event_id TEXT,
-                status TEXT DEFAULT 'pendente',
-                criado_em TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # 8. Tabela de Configurações (NOVA - necessária para get_config/set_config)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS config (
-                key TEXT PRIMARY KEY,
-                value TEXT,
-                criado_em TEXT DEFAULT CURRENT_TIMESTAMP,
-                atualizado_em TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # 9. Tabela de Timeline do Cliente (NOVA - para histórico do cliente)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS cliente_timeline (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                cliente_id INTEGER NOT NULL REFERENCES clientes(id) ON DELETE CASCADE,
-                tipo_evento TEXT NOT NULL,
-                titulo TEXT NOT NULL,
-                descricao TEXT,
-                icone TEXT,
-                data_evento TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # 10. Tabela de Documentos Drive (NOVA - para vincular docs do Drive)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS documentos_drive (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome_arquivo TEXT NOT NULL,
-                tipo_arquivo TEXT,
-                drive_id TEXT,
-                web_link TEXT,
-                id_cliente INTEGER REFERENCES clientes(id),
-                id_processo INTEGER REFERENCES processos(id),
-                data_upload TEXT DEFAULT CURRENT_TIMESTAMP,
-                obs TEXT
-            )
-        ''')
-        
-        # 11. Tabela Modelos de Proposta
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS modelos_proposta (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome_modelo TEXT UNIQUE NOT NULL,
-                area_atuacao TEXT,
-                titulo TEXT,
-                descricao TEXT,
-                lido INTEGER DEFAULT 0,
-                criado_em TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # 12. Tabela Configurações de Aniversários
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS config_aniversarios (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                dias_antecedencia INTEGER DEFAULT 7,
-                template_mensagem TEXT,
-                ativo INTEGER DEFAULT 1
-            )
-        ''')
-
-        # 13. Tabela Histórico de IA (NOVA)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS ai_historico (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                usuario TEXT,
-                tipo TEXT,
-                input TEXT,
-                output TEXT,
-                data_hora TEXT,
-                processo_id INTEGER
-            )
-        ''')
-
-        # 14. Tabela de Logs de Auditoria (EXPANDIDA para Sprint 2)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS audit_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                username TEXT,
-                action TEXT,
-                tabela TEXT,
-                registro_id INTEGER,
-                campo TEXT,
-                valor_anterior TEXT,
-                valor_novo TEXT,
-                details TEXT,
-                timestamp TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Migração: Adicionar colunas novas se tabela já existir
-        try:
-            cursor.execute("SELECT action FROM audit_logs LIMIT 1")
-        except:
-            logger.info("Migrando tabela audit_logs: adicionando coluna action")
-            try:
-                cursor.execute("ALTER TABLE audit_logs ADD COLUMN action TEXT")
-                conn.commit()
-            except Exception as e:
-                logger.error(f"Erro na migração de audit_logs (action): {e}")
+def transaction():
+    """
+    Unidade de trabalho: crud_*, sql_*, select/count e run_query dentro do
+    bloco usam a mesma conexão e são confirmados com um único commit.
+    
+    - Cada passo roda em um SAVEPOINT; uma exceção que sai do bloco desfaz
+      tudo (capturada dentro do bloco, desfaz apenas o passo que falhou)
+    - Sinais, invalidação do query_cache e auditoria só após o commit
+    - sql_run propaga o erro dentro da transação (fora dela retorna False)
+    - Leituras com cache=True vão direto ao banco (enxergam as escritas
+      ainda não confirmadas, que não podem ir para o cache compartilhado)
+    - Blocos aninhados viram SAVEPOINTs da transação externa
+    
+    Uso:
+        with db.transaction():
+            db.crud_update('transacoes_bancarias', {...}, 'id = ?', (id_tb,))
+            db.crud_update('financeiro', {...}, 'id = ?', (id_fin,))
+    """
+    return adapter.transaction()
 
-        try:
-            cursor.execute("SELECT tabela FROM audit_logs LIMIT 1")
-        except:
-            logger.info("Migrando tabela audit_logs: adicionando colunas de auditoria detalhada")
-            try:
-                cursor.execute("ALTER TABLE audit_logs ADD COLUMN tabela TEXT")
-                cursor.execute("ALTER TABLE audit_logs ADD COLUMN registro_id INTEGER")
-                cursor.execute("ALTER TABLE audit_logs ADD COLUMN campo TEXT")
-                cursor.execute("ALTER TABLE audit_logs ADD COLUMN valor_anterior TEXT")
-                cursor.execute("ALTER TABLE audit_logs ADD COLUMN valor_novo TEXT")
-                conn.commit()
-            except Exception as e:
-                logger.error(f"Erro na migração de audit_logs (detalhes): {e}")
-
-        # 15. Tabela Partes do Processo (NOVA - Faltava no Schema)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS partes_processo (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                id_processo INTEGER REFERENCES processos(id) ON DELETE CASCADE,
-                nome TEXT NOT NULL,
-                tipo TEXT,
-                cpf_cnpj TEXT,
-                criado_em TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-
-        # 16. Tabela Modelos de Documentos (NOVA - Faltava no Schema)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS modelos_documentos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                titulo TEXT NOT NULL,
-                categoria TEXT,
-                conteudo TEXT,
-                criado_em TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # 17. Tabela Tokens Públicos (Refatorado para o DB principal)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tokens_publicos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                token TEXT UNIQUE NOT NULL,
-                id_processo INTEGER NOT NULL REFERENCES processos(id) ON DELETE CASCADE,
-                data_criacao TEXT DEFAULT CURRENT_TIMESTAMP,
-                data_expiracao TEXT,
-                ativo INTEGER DEFAULT 1,
-                acessos INTEGER DEFAULT 0,
-                ultimo_acesso TEXT
-            )
-        ''')
-        
-        # 18. Tabela AI Insights (NOVA - Faltava no Schema)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS ai_insights (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                tipo TEXT,
-                titulo TEXT,
-                descricao TEXT,
-                prioridade TEXT DEFAULT 'media',
-                acao_sugerida TEXT,
-                link_acao TEXT,
-                lido INTEGER DEFAULT 0,
-                criado_em TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-
-        # 19. Tabela AI Cache (NOVA - Faltava no Schema)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS ai_cache (
-                hash_input TEXT PRIMARY KEY,
-                resposta TEXT,
-                data_criacao TEXT,
-                validade INTEGER
-            )
-        ''')
-
-        # 20. Tabela Alertas de E-mail (NOVA - Workspace Integration)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS alertas_email (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                tipo TEXT NOT NULL,
-                remetente TEXT,
-                assunto TEXT,
-                numero_processo TEXT,
-                valor_detectado REAL,
-                data_recebimento TEXT,
-                corpo_resumo TEXT,
-                processado INTEGER DEFAULT 0,
-                criado_em TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-
-        # 21. Tabela Transações Bancárias (Conciliação)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS transacoes_bancarias (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                data_transacao TEXT NOT NULL,
-                valor REAL NOT NULL,
-                tipo TEXT NOT NULL,
-                descricao TEXT,
-                transaction_id TEXT UNIQUE NOT NULL,
-                arquivo_origem TEXT,
-                data_importacao TEXT DEFAULT CURRENT_TIMESTAMP,
-                status_conciliacao TEXT DEFAULT 'Pendente',
-                id_financeiro INTEGER REFERENCES financeiro(id),
-                conciliado_por TEXT,
-                data_conciliacao TEXT,
-                link_google_drive TEXT,
-                tipo_origem TEXT,
-                conta_origem TEXT
-            )
-        ''')
+def init_db(force=False):
+    """
+    Inicializa o banco de dados (Schema) se necessário.
+    
+    Aplica as migrações pendentes de schema_migrations uma única vez por
+    processo; chamadas seguintes (reruns do Streamlit) retornam sem DDL.
+    
+    Args:
+        force: Reverificar migrações mesmo se o schema já foi validado
+    """
+    import schema_migrations
+    try:
+        return schema_migrations.ensure_schema(force=force)
+    except Exception as e:
+        logger.error(f"Erro ao aplicar migrações de schema: {e}")
+        return 0
 
+def indices_cegos_cliente(cpf_cnpj):
+    """
+    Colunas de índice cego de um CPF/CNPJ (ver crypto.blind_index).
+    
+    Returns:
+        {'cpf_cnpj_bidx': str|None, 'cpf_cnpj_bidx_prefixo': str|None}
+    """
+    import crypto
+    return {
+        'cpf_cnpj_bidx': crypto.blind_index(cpf_cnpj),
+        'cpf_cnpj_bidx_prefixo': crypto.blind_index(cpf_cnpj, prefixo=True),
+    }
 
-        # Run Migration for Andamentos (IA)
-        check_migration_andamentos(cursor)
-        
-        
-        # --- MIGRAÇÕES AUTOMÁTICAS ---
-        # Garantir que processos tenha coluna 'status'
-        try:
-            cursor.execute("SELECT status FROM processos LIMIT 1")
-        except:
-             logger.info("Migrando tabela processos: adicionando coluna status")
-             try:
-                 cursor.execute("ALTER TABLE processos ADD COLUMN status TEXT DEFAULT 'Ativo'")
-                 conn.commit()
-             except Exception as e:
-                 logger.error(f"Erro na migração de processos (status): {e}")
-
-        # Garantir que processos tenha coluna 'assunto'
-        try:
-            cursor.execute("SELECT assunto FROM processos LIMIT 1")
-        except:
-             logger.info("Migrando tabela processos: adicionando coluna assunto")
-             try:
-                 cursor.execute("ALTER TABLE processos ADD COLUMN assunto TEXT")
-                 conn.commit()
-             except Exception as e:
-                 logger.error(f"Erro na migração de processos (assunto): {e}")
-        
-        # Garantir que processos tenha coluna 'comarca'
-        try:
-            cursor.execute("SELECT comarca FROM processos LIMIT 1")
-        except:
-             logger.info("Migrando tabela processos: adicionando coluna comarca")
-             try:
-                 cursor.execute("ALTER TABLE processos ADD COLUMN comarca TEXT")
-                 conn.commit()
-             except Exception as e:
-                 logger.error(f"Erro na migração de processos (comarca): {e}")
-        
-        # Inserir configuração padrão se não existir
-        cursor.execute("SELECT COUNT(*) as cnt FROM config_aniversarios")
-        if cursor.fetchone()['cnt'] == 0:
-            cursor.execute('''
-                INSERT INTO config_aniversarios (template_mensagem) 
-                VALUES ('Olá {nome}! 🎉🎂\n\nFeliz Aniversário! Desejamos muita saúde, paz e prosperidade neste novo ciclo de vida!\n\nUm abraço da equipe!')
-            ''')
-            conn.commit()
-        
-        # --- MIGRAÇÃO LGPD (Fase 2) ---
-        # Adicionar colunas de consentimento se não existirem
-        try:
-            cursor.execute("SELECT lgpd_consentimento FROM clientes LIMIT 1")
-        except:
-            logger.info("Migrando tabela clientes: adicionando colunas LGPD")
-            try:
-                cursor.execute("ALTER TABLE clientes ADD COLUMN lgpd_consentimento INTEGER DEFAULT 0")
-                cursor.execute("ALTER TABLE clientes ADD COLUMN lgpd_data_consentimento TEXT")
-                cursor.execute("ALTER TABLE clientes ADD COLUMN lgpd_ip_consentimento TEXT")
-                conn.commit()
-                logger.info("Colunas LGPD adicionadas com sucesso")
-            except Exception as e:
-                logger.error(f"Erro na migração LGPD: {e}")
-        
-        # Configuração de prazo de retenção LGPD (5 anos)
-        if not get_config('lgpd_retencao_anos'):
-            try:
-                cursor.execute("INSERT OR REPLACE INTO config (key, value) VALUES ('lgpd_retencao_anos', '5')")
-                conn.commit()
-            except Exception as e:
-                logger.debug(f"Erro ao configurar retenção LGPD: {e}")
+def _com_indices_cegos(table, data):
+    """Completa o índice cego quando uma escrita em clientes traz cpf_cnpj."""
+    if table != 'clientes' or 'cpf_cnpj' not in data or 'cpf_cnpj_bidx' in data:
+        return data
+    return {**data, **indices_cegos_cliente(data['cpf_cnpj'])}
 
-        # --- MIGRAÇÃO TRANSAÇÕES BANCÁRIAS (Novos Campos) ---
-        try:
-            cursor.execute("SELECT tipo_origem FROM transacoes_bancarias LIMIT 1")
-        except:
-             logger.info("Migrando tabela transacoes_bancarias: adicionando colunas de origem")
-             try:
-                 cursor.execute("ALTER TABLE transacoes_bancarias ADD COLUMN tipo_origem TEXT")
-                 cursor.execute("ALTER TABLE transacoes_bancarias ADD COLUMN conta_origem TEXT")
-                 conn.commit()
-             except Exception as e:
-                 # Se a tabela não existir, vai falhar silenciosamente aqui, mas o CREATE TABLE acima já resolveu
-                 pass
-        
 def crud_insert(table, data, log_msg=""):
     """Insere um registro no banco e retorna o ID."""
+    data = _com_indices_cegos(table, data)
     columns = ', '.join(data.keys())
     placeholders = ', '.join(['%s' if adapter.USE_POSTGRES else '?'] * len(data))
     
@@ -521,12 +107,13 @@ def crud_insert(table, data, log_msg=""):
     
     # Emitir sinal
     if signals:
-        signals.emit(f"insert_{table}", {'id': row_id, 'data': data})
+        _emitir(f"insert_{table}", {'id': row_id, 'data': data})
         
     return row_id
 
 def crud_update(table, data, where_clause, params, log_msg=""):
     """Atualiza registros no banco COM auditoria automática."""
+    data = _com_indices_cegos(table, data)
     
     # NOVO: Buscar valores anteriores para auditoria (antes do UPDATE)
     registro_id = None
@@ -536,11 +123,11 @@ def crud_update(table, data, where_clause, params, log_msg=""):
         if params:
             registro_id = params[0] if isinstance(params[0], int) else None
         
-        # Buscar valores anteriores para comparar
-        select_query = f"SELECT * FROM {table} WHERE {where_clause}"
+        # Buscar valores anteriores apenas das colunas alteradas
+        select_query = f"SELECT {', '.join(data.keys())} FROM {table} WHERE {where_clause} LIMIT 1"
         if adapter.USE_POSTGRES:
             select_query = select_query.replace('?', '%s')
-        valores_anteriores = sql_get_query(select_query, params)
+        valores_anteriores = adapter.get_adapter().fetch_one(select_query, params)
     except Exception as e:
         logger.debug(f"Não foi possível obter valores anteriores para auditoria: {e}")
     
@@ -558,10 +145,10 @@ def crud_update(table, data, where_clause, params, log_msg=""):
     adapter.get_adapter().execute_query(query, full_params)
     logger.info(log_msg)
     
-    # NOVO: Registrar alterações na auditoria
-    if valores_anteriores is not None and not valores_anteriores.empty:
+    # NOVO: Registrar alterações na auditoria (enfileiradas, gravadas em lote)
+    if valores_anteriores is not None:
         try:
-            row_anterior = valores_anteriores.iloc[0]
+            row_anterior = dict(valores_anteriores)
             for campo, valor_novo in data.items():
                 valor_anterior = row_anterior.get(campo)
                 # Só registrar se realmente mudou
@@ -579,7 +166,7 @@ def crud_update(table, data, where_clause, params, log_msg=""):
     
     # Emitir sinal
     if signals:
-        signals.emit(f"update_{table}", {'data': data, 'where': where_clause, 'params': params})
+        _emitir(f"update_{table}", {'data': data, 'where': where_clause, 'params': params})
 
 def crud_delete(table, where_clause, params, log_msg=""):
     """Remove registros do banco."""
@@ -597,35 +184,522 @@ def crud_delete(table, where_clause, params, log_msg=""):
     
     # Emitir sinal
     if signals:
-        signals.emit(f"delete_{table}", {'where': where_clause, 'params': params})
+        _emitir(f"delete_{table}", {'where': where_clause, 'params': params})
 
-# --- Funções Restauradas ---
+# --- Escrita em Lote ---
 
-def sql_get_query(query, params=None):
-    """Executa uma query SELECT e retorna um DataFrame."""
-    try:
-        if adapter.USE_POSTGRES:
-            query = query.replace('?', '%s')
+# Linhas por comando (executemany / execute_values)
+BULK_BATCH_SIZE = 1000
+# A partir de quantas linhas o Postgres usa COPY FROM STDIN (sem RETURNING/ON CONFLICT)
+PG_COPY_THRESHOLD = 5000
+# SQLite >= 3.35 suporta RETURNING (necessário para IDs em upsert)
+_SQLITE_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+
+def _valor_sql(valor):
+    """Converte tipos pandas/numpy para tipos aceitos pelos drivers."""
+    if valor is None:
+        return None
+    if isinstance(valor, pd.Timestamp):
+        return valor.to_pydatetime()
+    if hasattr(valor, 'item') and not isinstance(valor, (str, bytes)):
+        # Escalares numpy (int64, float64, bool_)
+        try:
+            valor = valor.item()
+        except (ValueError, TypeError):
+            pass
+    if isinstance(valor, float) and valor != valor:  # NaN
+        return None
+    return valor
+
+
+def _normalizar_linhas(rows):
+    """Aceita lista de dicts ou DataFrame e devolve lista de dicts limpos."""
+    if rows is None:
+        return []
+    if isinstance(rows, pd.DataFrame):
+        if rows.empty:
+            return []
+        rows = rows.to_dict('records')
+    return [{k: _valor_sql(v) for k, v in dict(row).items()} for row in rows]
+
+
+def _pg_copy(cursor, table, colunas, valores):
+    """Insere via COPY FROM STDIN (formato CSV) - caminho mais rápido do Postgres."""
+    import csv
+    import io
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for linha in valores:
+        writer.writerow(['\\N' if v is None else v for v in linha])
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(colunas)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+        buffer
+    )
+
+
+def _insert_em_lote(table, linhas, conflict_sql="", return_ids=True, batch_size=BULK_BATCH_SIZE):
+    """
+    Executa INSERTs em lote em uma única conexão/transação.
+    
+    Linhas com conjuntos de colunas diferentes são agrupadas, para que
+    colunas omitidas continuem recebendo o DEFAULT da tabela.
+    
+    Returns:
+        (ids, total): IDs gravados (na ordem de entrada) e linhas afetadas
+    """
+    grupos = {}
+    for linha in linhas:
+        grupos.setdefault(tuple(linha.keys()), []).append(linha)
+    
+    ids = []
+    total = 0
+    with adapter.get_connection() as conn:
+        cursor = conn.cursor()
+        
+        for colunas, grupo in grupos.items():
+            cols = ', '.join(colunas)
+            valores = [tuple(linha[c] for c in colunas) for linha in grupo]
             
-        rows = adapter.get_adapter().fetch_all(query, params)
+            if adapter.USE_POSTGRES:
+                from psycopg2.extras import execute_values
+                
+                if not conflict_sql and not return_ids and len(valores) >= PG_COPY_THRESHOLD:
+                    _pg_copy(cursor, table, colunas, valores)
+                    total += len(valores)
+                elif conflict_sql or return_ids:
+                    # RETURNING também serve para contar linhas realmente gravadas
+                    query = f"INSERT INTO {table} ({cols}) VALUES %s{conflict_sql} RETURNING id"
+                    result = execute_values(cursor, query, valores, page_size=batch_size, fetch=True)
+                    ids.extend(row['id'] for row in result)
+                    total += len(result)
+                else:
+                    query = f"INSERT INTO {table} ({cols}) VALUES %s"
+                    execute_values(cursor, query, valores, page_size=batch_size)
+                    total += len(valores)
+            else:
+                placeholders = ', '.join(['?'] * len(colunas))
+                query = f"INSERT INTO {table} ({cols}) VALUES ({placeholders}){conflict_sql}"
+                
+                if return_ids and conflict_sql and _SQLITE_RETURNING:
+                    # Upsert: lastrowid não é confiável quando a linha é atualizada
+                    query += " RETURNING id"
+                    for v in valores:
+                        cursor.execute(query, v)
+                        row = cursor.fetchone()
+                        if row:
+                            ids.append(row[0])
+                            total += 1
+                elif return_ids:
+                    for v in valores:
+                        cursor.execute(query, v)
+                        if cursor.rowcount > 0:
+                            ids.append(cursor.lastrowid)
+                            total += 1
+                else:
+                    for inicio in range(0, len(valores), batch_size):
+                        cursor.executemany(query, valores[inicio:inicio + batch_size])
+                        total += max(cursor.rowcount, 0)
         
-        # Converter sqlite3.Row (ou RealDictRow) para dict para preservar nomes das colunas
-        if rows:
-            data = [dict(row) for row in rows]
-            return pd.DataFrame(data)
-        else:
-            return pd.DataFrame()
+        if adapter.USE_POSTGRES:
+            conn.commit()
+    
+    return ids, total
+
+
+def crud_insert_many(table, rows, log_msg="", return_ids=True, on_conflict=None, batch_size=BULK_BATCH_SIZE):
+    """
+    Insere vários registros em uma única transação.
+    
+    Args:
+        table: Nome da tabela
+        rows: Lista de dicts ou DataFrame
+        log_msg: Mensagem de log
+        return_ids: Retornar IDs gerados (False permite COPY no Postgres)
+        on_conflict: None (erro em duplicidade) ou 'ignore' (ON CONFLICT DO NOTHING)
+        batch_size: Linhas por comando
+    
+    Returns:
+        Lista de IDs inseridos (linhas ignoradas por conflito não aparecem)
+        ou, com return_ids=False, o número de linhas inseridas
+    """
+    linhas = [_com_indices_cegos(table, l) for l in _normalizar_linhas(rows)]
+    if not linhas:
+        return [] if return_ids else 0
+    
+    conflict_sql = " ON CONFLICT DO NOTHING" if on_conflict == 'ignore' else ""
+    ids, total = _insert_em_lote(table, linhas, conflict_sql, return_ids, batch_size)
+    
+    logger.info(f"{log_msg} ({total}/{len(linhas)} registros em {table})")
+    
+    # Um único sinal para o lote (em vez de um insert_<tabela> por linha)
+    if signals:
+        _emitir(f"bulk_insert_{table}", {'ids': ids, 'total': total})
+    
+    return ids if return_ids else total
+
+
+def crud_upsert_many(table, rows, conflict_columns, update_columns=None, log_msg="",
+                     return_ids=True, batch_size=BULK_BATCH_SIZE):
+    """
+    Insere ou atualiza vários registros (INSERT ... ON CONFLICT DO UPDATE).
+    
+    Args:
+        table: Nome da tabela
+        rows: Lista de dicts ou DataFrame
+        conflict_columns: Colunas da constraint UNIQUE/PK (ex: ['transaction_id'])
+        update_columns: Colunas a atualizar em conflito (padrão: todas as demais)
+        log_msg: Mensagem de log
+        return_ids: Retornar IDs inseridos/atualizados
+        batch_size: Linhas por comando
+    
+    Returns:
+        Lista de IDs ou, com return_ids=False, o número de linhas gravadas
+    """
+    linhas = [_com_indices_cegos(table, l) for l in _normalizar_linhas(rows)]
+    if not linhas:
+        return [] if return_ids else 0
+    
+    if isinstance(conflict_columns, str):
+        conflict_columns = [conflict_columns]
+    if update_columns is None:
+        update_columns = [c for c in linhas[0].keys() if c not in conflict_columns]
+    
+    alvo = ', '.join(conflict_columns)
+    if update_columns:
+        sets = ', '.join(f"{c} = excluded.{c}" for c in update_columns)
+        conflict_sql = f" ON CONFLICT ({alvo}) DO UPDATE SET {sets}"
+    else:
+        conflict_sql = f" ON CONFLICT ({alvo}) DO NOTHING"
+    
+    ids, total = _insert_em_lote(table, linhas, conflict_sql, return_ids, batch_size)
+    
+    logger.info(f"{log_msg} ({total}/{len(linhas)} registros gravados em {table})")
+    
+    if signals:
+        _emitir(f"bulk_upsert_{table}", {'ids': ids, 'total': total})
+    
+    return ids if return_ids else total
+
+# --- Funções Restauradas ---
+
+def _consultar_df(query, params=None):
+    """Executa a query e monta o DataFrame (exceções propagam)."""
+    if adapter.USE_POSTGRES:
+        query = query.replace('?', '%s')
+        
+    rows = adapter.get_adapter().fetch_all(query, params)
+    
+    # Converter sqlite3.Row (ou RealDictRow) para dict para preservar nomes das colunas
+    if rows:
+        data = [dict(row) for row in rows]
+        return pd.DataFrame(data)
+    return pd.DataFrame()
+
+def sql_get_query(query, params=None, cache=False):
+    """
+    Executa uma query SELECT e retorna um DataFrame.
+    
+    Com cache=True o resultado é compartilhado entre sessões (query_cache)
+    até que alguma tabela lida pela query seja alterada.
+    """
+    try:
+        if cache and adapter.current_transaction() is None:
+            return query_cache.consultar(query, params, _consultar_df)
+        return _consultar_df(query, params)
             
     except Exception as e:
         logger.error(f"Erro no sql_get_query: {e}")
         return pd.DataFrame()
 
-def sql_get(table, order_by=None):
-    """Retorna todos os registros de uma tabela."""
-    query = f"SELECT * FROM {table}"
+def sql_get(table, order_by=None, columns=None, where=None, cache=False):
+    """
+    Retorna os registros de uma tabela.
+    
+    Sem `columns`/`where` equivale a SELECT * da tabela inteira; prefira
+    informar apenas as colunas e filtros usados pela tela (ver select()).
+    """
+    return select(table, columns=columns, where=where, order_by=order_by, cache=cache)
+
+
+# --- Query Builder (projeção de colunas e filtros no banco) ---
+
+_RE_IDENT = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)?$')
+_RE_COLUNA = re.compile(
+    r'^((?P<col>[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)?)'
+    r'|(COUNT|SUM|AVG|MIN|MAX)\(\s*(\*|[A-Za-z_][A-Za-z0-9_.]*)\s*\))'
+    r'(\s+AS\s+(?P<alias>[A-Za-z_][A-Za-z0-9_]*))?$',
+    re.IGNORECASE
+)
+_RE_ORDER_BY = re.compile(
+    r'^\s*[A-Za-z_][A-Za-z0-9_.]*(\s+(ASC|DESC))?'
+    r'(\s*,\s*[A-Za-z_][A-Za-z0-9_.]*(\s+(ASC|DESC))?)*\s*$',
+    re.IGNORECASE
+)
+
+# Operadores aceitos nas chaves de `where` ("coluna op": valor)
+_OPERADORES_WHERE = {
+    '=': '=', '==': '=', '!=': '!=', '<>': '!=',
+    '<': '<', '<=': '<=', '>': '>', '>=': '>=',
+    'like': 'LIKE', 'not like': 'NOT LIKE',
+    'in': 'IN', 'not in': 'NOT IN',
+    'is': 'IS', 'is not': 'IS NOT',
+}
+
+
+def _validar_identificador(nome):
+    if not isinstance(nome, str) or not _RE_IDENT.match(nome):
+        raise ValueError(f"Identificador SQL inválido: {nome!r}")
+    return nome
+
+
+def _montar_condicao(chave, valor):
+    """
+    Converte um item de `where` em (fragmento SQL, parâmetros).
+    
+    Chave "coluna" compara por igualdade; "coluna op" usa o operador
+    informado (ex: "vencimento <", "status in", "nome like").
+    Valor None vira IS NULL / IS NOT NULL; listas viram IN (...).
+    "is"/"is not" com valor comparam tratando NULL como valor comum.
+    """
+    partes = chave.strip().split(None, 1)
+    coluna = _validar_identificador(partes[0])
+    op_txt = partes[1].strip().lower() if len(partes) > 1 else '='
+    op_txt = ' '.join(op_txt.split())
+    if op_txt not in _OPERADORES_WHERE:
+        raise ValueError(f"Operador inválido em where: {chave!r}")
+    op = _OPERADORES_WHERE[op_txt]
+    
+    if isinstance(valor, (list, tuple, set)):
+        valores = list(valor)
+        if op not in ('IN', 'NOT IN', '=', '!='):
+            raise ValueError(f"Lista de valores requer operador IN em where: {chave!r}")
+        negado = op in ('NOT IN', '!=')
+        if not valores:
+            # IN () vazio: nenhuma linha (ou todas, se negado)
+            return ('1=1' if negado else '1=0'), []
+        marcadores = ', '.join('?' for _ in valores)
+        return f"{coluna} {'NOT IN' if negado else 'IN'} ({marcadores})", valores
+    
+    if valor is None:
+        negado = op in ('!=', 'IS NOT', 'NOT IN', 'NOT LIKE')
+        return f"{coluna} IS {'NOT ' if negado else ''}NULL", []
+    
+    if op in ('IN', 'NOT IN'):
+        op = '=' if op == 'IN' else '!='
+    if op in ('IS', 'IS NOT') and adapter.USE_POSTGRES:
+        # PostgreSQL só aceita IS com NULL/booleanos
+        op = 'IS NOT DISTINCT FROM' if op == 'IS' else 'IS DISTINCT FROM'
+    return f"{coluna} {op} ?", [valor]
+
+
+def _montar_where(where, search=None, search_columns=None, extra=None):
+    """
+    Converte o dict `where` em (" WHERE ...", params) combinando com AND.
+    
+    `search` adiciona um filtro texto (LIKE sem diferenciar maiúsculas) em
+    qualquer uma das `search_columns`; `extra` são pares (fragmento, params)
+    já montados internamente (ex: condição de keyset).
+    """
+    condicoes = []
+    params = []
+    for chave, valor in (where or {}).items():
+        fragmento, valores = _montar_condicao(chave, valor)
+        condicoes.append(fragmento)
+        params.extend(valores)
+    
+    if search and search_columns:
+        termo = f"%{str(search).strip().lower()}%"
+        alternativas = [f"LOWER({_validar_identificador(c)}) LIKE ?" for c in search_columns]
+        condicoes.append("(" + " OR ".join(alternativas) + ")")
+        params.extend([termo] * len(alternativas))
+    
+    for fragmento, valores in (extra or []):
+        condicoes.append(fragmento)
+        params.extend(valores)
+    
+    if not condicoes:
+        return "", []
+    return " WHERE " + " AND ".join(condicoes), params
+
+
+def _montar_colunas(columns):
+    if not columns:
+        return '*'
+    if isinstance(columns, str):
+        columns = [c.strip() for c in columns.split(',')]
+    for col in columns:
+        if not _RE_COLUNA.match(col.strip()):
+            raise ValueError(f"Coluna inválida: {col!r}")
+    return ', '.join(c.strip() for c in columns)
+
+
+def build_select(table, columns=None, where=None, order_by=None, limit=None, offset=None,
+                 distinct=False, group_by=None, search=None, search_columns=None):
+    """
+    Monta um SELECT parametrizado (placeholders '?').
+    
+    Args:
+        table: Nome da tabela
+        columns: Lista de colunas ("col", "col AS alias" ou agregação simples
+            como "SUM(valor) AS total"); None = todas
+        where: Dict {"coluna [op]": valor} combinado com AND
+        order_by: "col [ASC|DESC], ..." (somente nomes de colunas)
+        limit: Máximo de linhas
+        offset: Linhas a pular
+        distinct: SELECT DISTINCT
+        group_by: Lista de colunas para GROUP BY
+        search: Texto buscado (LIKE) em qualquer uma das search_columns
+        search_columns: Colunas consideradas na busca textual
+    
+    Returns:
+        Tupla (query, params)
+    
+    Raises:
+        ValueError: Identificador, operador ou ordenação inválidos
+    """
+    _validar_identificador(table)
+    colunas_sql = _montar_colunas(columns)
+    
+    where_sql, params = _montar_where(where, search, search_columns)
+    query = f"SELECT {'DISTINCT ' if distinct else ''}{colunas_sql} FROM {table}{where_sql}"
+    
+    if group_by:
+        if isinstance(group_by, str):
+            group_by = [g.strip() for g in group_by.split(',')]
+        query += " GROUP BY " + ", ".join(_validar_identificador(g) for g in group_by)
+    
     if order_by:
-        query += f" ORDER BY {order_by}"
-    return sql_get_query(query)
+        if not _RE_ORDER_BY.match(order_by):
+            raise ValueError(f"ORDER BY inválido: {order_by!r}")
+        query += f" ORDER BY {order_by.strip()}"
+    
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(int(limit))
+        if offset:
+            query += " OFFSET ?"
+            params.append(int(offset))
+    
+    return query, params
+
+
+def select(table, columns=None, where=None, order_by=None, limit=None, offset=None,
+           distinct=False, group_by=None, search=None, search_columns=None, cache=False):
+    """
+    SELECT com projeção de colunas e filtros executados no banco.
+    
+    Exemplo:
+        select('financeiro', columns=['valor', 'vencimento'],
+               where={'tipo': 'Entrada', 'status_pagamento': 'Pendente',
+                      'vencimento <': hoje},
+               order_by='vencimento DESC', limit=50)
+    
+    Args:
+        table, columns, where, order_by, limit, offset, distinct, group_by,
+        search, search_columns: ver build_select()
+        cache: Reaproveitar o resultado até a próxima escrita na tabela
+    
+    Returns:
+        DataFrame (vazio em caso de erro)
+    """
+    query, params = build_select(table, columns, where, order_by, limit, offset,
+                                 distinct, group_by, search, search_columns)
+    return sql_get_query(query, params or None, cache=cache)
+
+
+def count(table, where=None, search=None, search_columns=None, cache=False):
+    """
+    Conta registros de uma tabela com os filtros de `where` (ver build_select).
+    
+    Returns:
+        Número de registros (0 em caso de erro)
+    """
+    where_sql, params = _montar_where(where, search, search_columns)
+    query = f"SELECT COUNT(*) AS total FROM {_validar_identificador(table)}{where_sql}"
+    df = sql_get_query(query, params or None, cache=cache)
+    if df.empty:
+        return 0
+    return int(df.iloc[0]['total'] or 0)
+
+
+def select_page(table, columns=None, where=None, search=None, search_columns=None,
+                sort='id', descending=False, limit=20, after=None, with_total=True):
+    """
+    Página de uma listagem com paginação por keyset (seek).
+    
+    Em vez de OFFSET (custo cresce com o número da página), a próxima página
+    começa depois da última chave exibida: WHERE (sort, id) > (?, ?).
+    O `id` desempata registros com o mesmo valor de ordenação. NULLs vêm
+    depois dos demais valores (antes, em ordem decrescente), sem sentinela
+    de COALESCE: a coluna pode ser de qualquer tipo.
+    
+    Args:
+        table: Nome da tabela
+        columns: Colunas da listagem ('id' é incluído automaticamente)
+        where, search, search_columns: Filtros (ver build_select)
+        sort: Coluna de ordenação
+        descending: Ordem decrescente
+        limit: Tamanho da página
+        after: Cursor retornado pela página anterior (None = primeira página)
+        with_total: Calcular o total filtrado (COUNT)
+    
+    Returns:
+        Dict {'dados': DataFrame, 'cursor': cursor da próxima página ou None,
+              'total': int ou None}
+    """
+    _validar_identificador(sort)
+    if columns:
+        columns = [c.strip() for c in (columns.split(',') if isinstance(columns, str) else columns)]
+        if 'id' not in columns:
+            columns = ['id'] + columns
+    colunas_sql = _montar_colunas(columns)
+    
+    direcao = 'DESC' if descending else 'ASC'
+    comp = '<' if descending else '>'
+    
+    extra = []
+    if after is not None:
+        if sort == 'id':
+            extra.append((f"id {comp} ?", [after[-1]]))
+        elif after[0] is None:
+            # Cursor dentro do bloco de NULLs (último em ASC, primeiro em DESC)
+            seguintes = f" OR {sort} IS NOT NULL" if descending else ""
+            extra.append((f"(({sort} IS NULL AND id {comp} ?){seguintes})", [after[-1]]))
+        else:
+            nulos = f"{sort} IS NOT NULL AND " if descending else f"{sort} IS NULL OR "
+            extra.append((
+                f"({nulos}({sort} {comp} ? OR ({sort} = ? AND id {comp} ?)))",
+                [after[0], after[0], after[-1]]
+            ))
+    
+    where_sql, params = _montar_where(where, search, search_columns, extra)
+    # (sort IS NULL) primeiro: mesma posição dos NULLs no SQLite e no PostgreSQL
+    ordem = "id" if sort == 'id' else f"({sort} IS NULL) {direcao}, {sort} {direcao}, id"
+    query = (
+        f"SELECT {colunas_sql}, {sort} AS _chave_pagina FROM {_validar_identificador(table)}"
+        f"{where_sql} ORDER BY {ordem} {direcao} LIMIT ?"
+    )
+    # Uma linha a mais indica se existe próxima página
+    df = sql_get_query(query, params + [int(limit) + 1])
+    
+    cursor = None
+    if len(df) > limit:
+        df = df.iloc[:limit]
+        ultima = df.iloc[-1]
+        valor_chave = ultima['_chave_pagina']
+        if pd.isna(valor_chave):
+            valor_chave = None
+        elif hasattr(valor_chave, 'item'):
+            valor_chave = valor_chave.item()  # numpy -> tipo nativo (parâmetro do driver)
+        cursor = (valor_chave, int(ultima['id']))
+    if not df.empty:
+        df = df.drop(columns=['_chave_pagina']).reset_index(drop=True)
+    
+    total = count(table, where, search, search_columns) if with_total else None
+    return {'dados': df, 'cursor': cursor, 'total': total}
 
 def sql_run(query, params=None):
     """Executa uma query que não retorna dados (INSERT, UPDATE, DELETE)."""
@@ -634,9 +708,16 @@ def sql_run(query, params=None):
             query = query.replace('?', '%s')
             
         adapter.get_adapter().execute_query(query, params)
+        tx = adapter.current_transaction()
+        if tx is not None:
+            tx.on_commit(lambda: query_cache.invalidar_sql(query))
+        else:
+            query_cache.invalidar_sql(query)
         return True
     except Exception as e:
         logger.error(f"Erro no sql_run: {e}")
+        if adapter.current_transaction() is not None:
+            raise
         return False
 
 def salvar_modelo_documento(titulo, categoria, conteudo):
@@ -691,6 +772,36 @@ def busca_global(termo: str, limite: int = 20) -> dict:
     if not termo or len(termo) < 2:
         return resultado
     
+    # CPF/CNPJ é gravado cifrado: clientes pelo índice cego, antes dos demais
+    df_documento = pd.DataFrame()
+    if termo_documento(termo):
+        ids = clientes_por_documento(termo, limite)
+        if ids:
+            marcadores = ', '.join(['?'] * len(ids))
+            df_documento = sql_get_query(
+                f"SELECT id, nome, cpf_cnpj, telefone, email, 'cliente' as tipo_resultado "
+                f"FROM clientes WHERE id IN ({marcadores}) ORDER BY nome ASC", tuple(ids)
+            )
+    
+    def _com_documentos(df_clientes):
+        if df_documento.empty:
+            return df_clientes
+        df = pd.concat([df_documento, df_clientes], ignore_index=True)
+        return df.drop_duplicates(subset='id').head(limite).reset_index(drop=True)
+    
+    # Índice textual (FTS5 / tsvector): prefixos, sem acentos, por relevância
+    import busca_textual
+    if busca_textual.indice_disponivel():
+        for tabela in ('clientes', 'processos', 'financeiro'):
+            try:
+                resultado[tabela] = busca_textual.buscar(tabela, termo, limite)
+            except Exception as e:
+                logger.debug(f"Erro na busca textual de {tabela}: {e}")
+        resultado['clientes'] = _com_documentos(resultado['clientes'])
+        resultado['total'] = sum(len(resultado[t]) for t in ('clientes', 'processos', 'financeiro'))
+        return resultado
+    
+    # Fallback sem índice: varredura LIKE
     termo_like = f"%{termo}%"
     
     try:
@@ -698,12 +809,13 @@ def busca_global(termo: str, limite: int = 20) -> dict:
         resultado['clientes'] = sql_get_query("""
             SELECT id, nome, cpf_cnpj, telefone, email, 'cliente' as tipo_resultado
             FROM clientes 
-            WHERE nome LIKE ? OR cpf_cnpj LIKE ? OR email LIKE ? OR telefone LIKE ?
+            WHERE nome LIKE ? OR email LIKE ? OR telefone LIKE ?
             ORDER BY nome ASC
             LIMIT ?
-        """, (termo_like, termo_like, termo_like, termo_like, limite))
+        """, (termo_like, termo_like, termo_like, limite))
     except Exception as e:
         logger.debug(f"Erro na busca de clientes: {e}")
+    resultado['clientes'] = _com_documentos(resultado['clientes'])
     
     try:
         # Buscar em processos
@@ -776,36 +888,14 @@ def get_historico(id_processo):
     return sql_get_query(query, (id_processo,))
 
 def get_dre_data(data_inicio, data_fim):
-    """Retorna dados para o DRE."""
-    query = """
-        SELECT tipo, categoria, SUM(valor) as total
-        FROM financeiro
-        WHERE data BETWEEN ? AND ?
-        AND status_pagamento = 'Pago'
-        GROUP BY tipo, categoria
-    """
-    if adapter.USE_POSTGRES:
-        query = query.replace('?', '%s')
-    
-    return sql_get_query(query, (data_inicio, data_fim))
+    """Retorna dados para o DRE (tipo, categoria, total pago no período)."""
+    import financeiro_rollup
+    return financeiro_rollup.dre(data_inicio, data_fim)
 
 def get_rentabilidade_clientes(data_inicio, data_fim):
     """Retorna dados de rentabilidade por cliente."""
-    query = """
-        SELECT 
-            c.nome as cliente,
-            SUM(CASE WHEN f.tipo = 'Entrada' THEN f.valor ELSE 0 END) as receita,
-            SUM(CASE WHEN f.tipo = 'Saída' THEN f.valor ELSE 0 END) as despesa
-        FROM financeiro f
-        JOIN clientes c ON f.id_cliente = c.id
-        WHERE f.data BETWEEN ? AND ?
-        AND f.status_pagamento = 'Pago'
-        GROUP BY c.nome
-    """
-    if adapter.USE_POSTGRES:
-        query = query.replace('?', '%s')
-        
-    df = sql_get_query(query, (data_inicio, data_fim))
+    import financeiro_rollup
+    df = financeiro_rollup.rentabilidade_clientes(data_inicio, data_fim)
     if not df.empty:
         df['lucro'] = df['receita'] - df['despesa']
         df['margem'] = (df['lucro'] / df['receita']) * 100
@@ -832,31 +922,128 @@ def relatorio_inadimplencia():
     return sql_get_query(query)
 
 def cpf_existe(cpf_cnpj):
-    """Verifica se um CPF/CNPJ já existe no banco."""
-    query = "SELECT id FROM clientes WHERE cpf_cnpj = ?"
-    res = adapter.get_adapter().fetch_one(query, (cpf_cnpj,))
-    return res is not None
+    """
+    Verifica se um CPF/CNPJ já existe no banco.
+    
+    O documento é gravado cifrado (IV aleatório): a comparação é feita pelo
+    índice cego, e também pelo texto puro para registros antigos não cifrados.
+    """
+    import crypto
+    bidx = crypto.blind_index(cpf_cnpj)
+    if bidx:
+        query = "SELECT id FROM clientes WHERE cpf_cnpj_bidx = ? OR cpf_cnpj = ? LIMIT 1"
+        params = (bidx, cpf_cnpj)
+    else:
+        query = "SELECT id FROM clientes WHERE cpf_cnpj = ? LIMIT 1"
+        params = (cpf_cnpj,)
+    return not sql_get_query(query, params).empty
+
+_RE_TERMO_DOCUMENTO = re.compile(r'^[\d.\-/\s]+$')
+
+def termo_documento(termo):
+    """True se o termo de busca parece um CPF/CNPJ (completo ou início)."""
+    import crypto
+    if not termo or not _RE_TERMO_DOCUMENTO.match(termo.strip()):
+        return False
+    digitos = sum(c.isdigit() for c in termo)
+    minimo = crypto.BLIND_INDEX_PREFIXO if crypto.BLIND_INDEX_PREFIXO > 0 else 11
+    return digitos >= min(minimo, 11)
+
+def clientes_por_documento(termo, limite=50):
+    """
+    IDs dos clientes cujo CPF/CNPJ é o termo ou começa com ele.
+    
+    Documento completo usa o índice cego exato; início de documento usa o
+    índice de prefixo e confirma os candidatos descriptografando só eles.
+    
+    Args:
+        termo: CPF/CNPJ, com ou sem formatação
+        limite: Máximo de IDs
+    
+    Returns:
+        Lista de IDs (vazia se nada for encontrado)
+    """
+    import crypto
+    digitos = crypto.normalizar_documento(termo)
+    if not digitos:
+        return []
+    
+    if len(digitos) in (11, 14):
+        bidx = crypto.blind_index(digitos)
+        if bidx:
+            df = sql_get_query(
+                "SELECT id FROM clientes WHERE cpf_cnpj_bidx = ? ORDER BY nome LIMIT ?", (bidx, limite)
+            )
+            if not df.empty:
+                return [int(i) for i in df['id']]
+    
+    prefixo = crypto.blind_index(digitos, prefixo=True)
+    if not prefixo:
+        return []
+    df = sql_get_query(
+        "SELECT id, cpf_cnpj FROM clientes WHERE cpf_cnpj_bidx_prefixo = ? ORDER BY nome", (prefixo,)
+    )
+    ids = [
+        int(row['id']) for _, row in df.iterrows()
+        if crypto.normalizar_documento(row['cpf_cnpj']).startswith(digitos)
+    ]
+    return ids[:limite]
+
+def id_cliente_por_nome(nome):
+    """
+    ID do cliente com o nome exato (telas que só conhecem o nome).
+    
+    Processos se ligam a clientes por processos.id_cliente; cliente_nome é
+    apenas o nome para exibição, mantido em sincronia por triggers.
+    
+    Returns:
+        ID ou None se não houver cliente com esse nome
+    """
+    if not nome:
+        return None
+    query = "SELECT MIN(id) AS id FROM clientes WHERE nome = ?"
+    if adapter.USE_POSTGRES:
+        query = query.replace('?', '%s')
+    res = adapter.get_adapter().fetch_one(query, (nome,))
+    return dict(res)['id'] if res else None
+
+def cliente_do_processo(processo, columns=None):
+    """
+    Registro do cliente vinculado a um processo (via id_cliente).
+    
+    Args:
+        processo: Registro do processo (dict/Series com id_cliente)
+        columns: Colunas desejadas de clientes (padrão: todas)
+    
+    Returns:
+        dict ou None se o processo não tiver cliente vinculado
+    """
+    id_cliente = processo.get('id_cliente') if hasattr(processo, 'get') else None
+    if id_cliente is None or pd.isna(id_cliente):
+        return None
+    df = select('clientes', columns=columns, where={'id': int(id_cliente)}, limit=1)
+    return df.iloc[0].to_dict() if not df.empty else None
 
-def criar_backup(force: bool = False) -> dict:
+def criar_backup(force: bool = False, incremental: bool = False) -> dict:
     """
-    Cria um backup do banco de dados com melhorias Sprint 3.
+    Cria um backup online do banco de dados (ver backup_sqlite).
     
     Features:
-    - Compressão gzip para economizar espaço
-    - Rotação automática (mantém últimos 7 dias)
-    - Verificação de integridade
+    - Cópia consistente pela API de backup do SQLite, sem parar as escritas
+    - Compressão gzip e hash SHA-256 no mesmo passe (memória constante)
+    - Snapshots incrementais: só as páginas alteradas desde o anterior
+    - Rotação automática (mantém últimos 7 backups completos)
     - Log de auditoria
     
     Args:
         force: Forçar backup mesmo se já existe um do dia
+        incremental: Gravar apenas as páginas alteradas desde o último snapshot
         
     Returns:
         dict: {'success': bool, 'file': str, 'size_mb': float, 'message': str}
     """
-    import shutil
     import os
-    import gzip
-    import hashlib
+    import backup_sqlite
     
     result = {'success': False, 'file': None, 'size_mb': 0, 'message': ''}
     
@@ -866,98 +1053,48 @@ def criar_backup(force: bool = False) -> dict:
         return result
         
     try:
-        db_file = 'sistema.db'
+        db_file = adapter.get_adapter().db_name
         if not os.path.exists(db_file):
             result['message'] = 'Banco de dados não encontrado'
             return result
-            
-        backup_dir = 'backups'
-        if not os.path.exists(backup_dir):
-            os.makedirs(backup_dir)
         
         # Verificar se já existe backup do dia (evitar duplicados)
         today = datetime.now().strftime('%Y%m%d')
-        existing_today = [f for f in os.listdir(backup_dir) if today in f]
+        existing_today = [
+            os.path.basename(f) for f in backup_sqlite.listar_snapshots()
+            if today in os.path.basename(f)
+        ]
         
         if existing_today and not force:
             result['message'] = f'Backup do dia já existe: {existing_today[0]}'
             result['success'] = True  # Não é erro, apenas skip
             return result
         
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_file = f"{backup_dir}/sistema_backup_{timestamp}.db.gz"
-        backup_temp = f"{backup_dir}/sistema_backup_{timestamp}.db"
-        
-        # 1. Copiar banco de dados
-        shutil.copy2(db_file, backup_temp)
-        
-        # 2. Verificar integridade do backup
-        original_size = os.path.getsize(db_file)
-        backup_size = os.path.getsize(backup_temp)
-        
-        if backup_size != original_size:
-            os.remove(backup_temp)
-            result['message'] = 'Erro: tamanho do backup não corresponde ao original'
-            return result
-        
-        # 3. Compactar com gzip
-        with open(backup_temp, 'rb') as f_in:
-            with gzip.open(backup_file, 'wb', compresslevel=9) as f_out:
-                shutil.copyfileobj(f_in, f_out)
-        
-        # Remover arquivo temporário não compactado
-        os.remove(backup_temp)
-        
-        # 4. Calcular hash para verificação futura
-        with gzip.open(backup_file, 'rb') as f:
-            file_hash = hashlib.md5(f.read()).hexdigest()
+        info = backup_sqlite.criar_snapshot(db_file, incremental=incremental)
+        backup_sqlite.rotacionar()
         
-        # Salvar hash em arquivo separado
-        with open(f"{backup_file}.md5", 'w') as f:
-            f.write(file_hash)
-        
-        compressed_size = os.path.getsize(backup_file)
-        compression_ratio = (1 - compressed_size / original_size) * 100 if original_size > 0 else 0
-        
-        logger.info(
-            f"Backup criado: {backup_file} | "
-            f"Original: {original_size/1024/1024:.2f}MB | "
-            f"Compactado: {compressed_size/1024/1024:.2f}MB | "
-            f"Compressão: {compression_ratio:.1f}%"
-        )
-        
-        # 5. Rotação: manter últimos 7 backups
-        backups = sorted([
-            f for f in os.listdir(backup_dir) 
-            if f.startswith('sistema_backup_') and f.endswith('.db.gz')
-        ])
-        
-        while len(backups) > 7:
-            old_backup = backups.pop(0)
-            old_path = os.path.join(backup_dir, old_backup)
-            old_md5 = f"{old_path}.md5"
-            
-            os.remove(old_path)
-            if os.path.exists(old_md5):
-                os.remove(old_md5)
-            
-            logger.info(f"Backup antigo removido (rotação): {old_backup}")
+        size_mb = round(info['tamanho_arquivo'] / 1024 / 1024, 2)
+        if info['tipo'] == 'incremental':
+            detalhe = f"{info['paginas_alteradas']}/{info['paginas']} páginas alteradas"
+        else:
+            ratio = (1 - info['tamanho_arquivo'] / info['tamanho_original']) * 100 if info['tamanho_original'] else 0
+            detalhe = f'{ratio:.1f}% compressão'
         
-        # 6. Log de auditoria
         try:
             audit('backup_created', {
-                'file': backup_file,
-                'size_mb': round(compressed_size / 1024 / 1024, 2),
-                'hash': file_hash,
-                'compression': f'{compression_ratio:.1f}%'
+                'file': info['arquivo'],
+                'tipo': info['tipo'],
+                'size_mb': size_mb,
+                'hash': info['sha256'],
+                'paginas': f"{info['paginas_alteradas']}/{info['paginas']}"
             })
         except:
             pass  # Não falhar se auditoria falhar
         
         result['success'] = True
-        result['file'] = backup_file
-        result['size_mb'] = round(compressed_size / 1024 / 1024, 2)
-        result['message'] = f'Backup criado com sucesso ({compression_ratio:.1f}% compressão)'
+        result['file'] = info['arquivo']
+        result['size_mb'] = size_mb
+        result['message'] = f"Backup {info['tipo']} criado com sucesso ({detalhe})"
         
         return result
         
@@ -968,82 +1105,53 @@ def criar_backup(force: bool = False) -> dict:
 
 def verificar_backup(backup_file: str) -> bool:
     """
-    Verifica integridade de um backup.
+    Verifica integridade de um backup (e dos snapshots dos quais depende).
     
     Args:
-        backup_file: Caminho do arquivo de backup (.db.gz)
+        backup_file: Caminho do arquivo de backup (.db.gz ou .inc.gz)
         
     Returns:
         True se backup está íntegro
     """
-    import gzip
-    import hashlib
+    import backup_sqlite
     
     try:
-        md5_file = f"{backup_file}.md5"
-        
-        if not os.path.exists(md5_file):
-            logger.warning(f"Arquivo MD5 não encontrado para {backup_file}")
-            return False
-        
-        # Ler hash esperado
-        with open(md5_file, 'r') as f:
-            expected_hash = f.read().strip()
-        
-        # Calcular hash atual
-        with gzip.open(backup_file, 'rb') as f:
-            actual_hash = hashlib.md5(f.read()).hexdigest()
-        
-        if actual_hash == expected_hash:
-            logger.info(f"Backup verificado OK: {backup_file}")
-            return True
-        else:
-            logger.error(f"Backup CORROMPIDO: {backup_file}")
-            return False
-            
+        return all(backup_sqlite.verificar(f) for f in backup_sqlite.cadeia(backup_file))
     except Exception as e:
         logger.error(f"Erro ao verificar backup: {e}")
         return False
 
 def restaurar_backup(backup_file: str) -> bool:
     """
-    Restaura banco de dados a partir de um backup.
+    Restaura banco de dados a partir de um backup completo ou incremental.
     
     Args:
-        backup_file: Caminho do arquivo de backup (.db.gz)
+        backup_file: Caminho do arquivo de backup (.db.gz ou .inc.gz)
         
     Returns:
         True se restauração foi bem-sucedida
     """
-    import gzip
-    import shutil
+    import backup_sqlite
     
     if adapter.USE_POSTGRES:
         logger.error("Restauração não disponível para PostgreSQL")
         return False
     
     try:
-        db_file = 'sistema.db'
-        
-        # 1. Verificar integridade do backup
-        if not verificar_backup(backup_file):
-            return False
-        
-        # 2. Fazer backup do banco atual (segurança)
-        if os.path.exists(db_file):
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            shutil.copy2(db_file, f'{db_file}.before_restore_{timestamp}')
+        # Verifica, monta em arquivo temporário e copia para o banco em uso
+        seguranca = backup_sqlite.restaurar(backup_file, adapter.get_adapter().db_name)
+        
+        # Banco restaurado pode estar em versão de schema anterior
+        import schema_migrations
+        import busca_textual
+        import financeiro_rollup
+        schema_migrations.reset_schema_flag()
+        busca_textual.reset_indice_flag()
+        financeiro_rollup.reset_flag()
+        query_cache.limpar()
         
-        # 3. Descompactar e restaurar
-        with gzip.open(backup_file, 'rb') as f_in:
-            with open(db_file, 'wb') as f_out:
-                shutil.copyfileobj(f_in, f_out)
-        
-        logger.info(f"Banco restaurado de: {backup_file}")
-        
-        # 4. Auditoria
         try:
-            audit('backup_restored', {'file': backup_file})
+            audit('backup_restored', {'file': backup_file, 'before_restore': seguranca})
         except:
             pass
         
@@ -1054,9 +1162,57 @@ def restaurar_backup(backup_file: str) -> bool:
         return False
 
 
+# --- Fila de Auditoria (gravação assíncrona em lote) ---
+
+_AUDIT_COLUNAS = (
+    'user_id', 'username', 'action', 'tabela', 'registro_id', 'campo',
+    'valor_anterior', 'valor_novo', 'details', 'timestamp'
+)
+_audit_writer = None
+_audit_writer_lock = threading.Lock()
+
+
+def _gravar_lote_auditoria(registros):
+    """Grava um lote de registros de auditoria com um único executemany."""
+    linhas = [{col: reg.get(col) for col in _AUDIT_COLUNAS} for reg in registros]
+    _insert_em_lote('audit_logs', linhas, return_ids=False)
+
+
+def _get_audit_writer():
+    """Retorna o gravador de auditoria do processo (criado sob demanda)."""
+    global _audit_writer
+    if _audit_writer is None:
+        with _audit_writer_lock:
+            if _audit_writer is None:
+                import audit_writer
+                _audit_writer = audit_writer.create_writer(_gravar_lote_auditoria)
+    return _audit_writer
+
+
+def _enfileirar_auditoria(registro):
+    # Timestamp no momento do evento (a gravação acontece depois)
+    registro.setdefault('timestamp', datetime.now().isoformat())
+    tx = adapter.current_transaction()
+    if tx is not None:
+        # Alteração desfeita não deixa rastro na auditoria
+        tx.on_commit(lambda: _get_audit_writer().enqueue(registro))
+    else:
+        _get_audit_writer().enqueue(registro)
+
+
+def flush_auditoria():
+    """Grava imediatamente os registros de auditoria pendentes."""
+    if _audit_writer is not None:
+        _audit_writer.flush()
+
+
+def get_audit_stats():
+    """Retorna contadores da fila de auditoria (enfileirados, gravados, pendentes...)."""
+    return _get_audit_writer().get_stats()
+
 
 def audit(action, details, user_id=None, username=None):
-    """Registra um evento de auditoria."""
+    """Registra um evento de auditoria (gravação assíncrona em lote)."""
     try:
         import json
         
@@ -1071,8 +1227,12 @@ def audit(action, details, user_id=None, username=None):
                  if not user_id: user_id = st.session_state.user_data.get('id')
                  if not username: username = st.session_state.user_data.get('username')
                  
-        query = "INSERT INTO audit_logs (user_id, username, action, details) VALUES (?, ?, ?, ?)"
-        sql_run(query, (user_id, username, action, details))
+        _enfileirar_auditoria({
+            'user_id': user_id,
+            'username': username,
+            'action': action,
+            'details': details
+        })
     except Exception as e:
         logger.error(f"Erro ao auditar: {e}")
 
@@ -1130,27 +1290,21 @@ def audit_detalhado(tabela, registro_id, campo, valor_anterior, valor_novo, acao
             if 'user_data' in st.session_state:
                 user_id = st.session_state.user_data.get('id')
         
-        query = """
-            INSERT INTO audit_logs 
-            (user_id, username, action, tabela, registro_id, campo, valor_anterior, valor_novo, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """
-        
         # Limitar tamanho dos valores para não sobrecarregar o banco
         val_ant = str(valor_anterior)[:500] if valor_anterior is not None else None
         val_novo = str(valor_novo)[:500] if valor_novo is not None else None
         
-        sql_run(query, (
-            user_id, 
-            username, 
-            acao, 
-            tabela, 
-            registro_id, 
-            campo, 
-            val_ant, 
-            val_novo,
-            datetime.now().isoformat()
-        ))
+        _enfileirar_auditoria({
+            'user_id': user_id,
+            'username': username,
+            'action': acao,
+            'tabela': tabela,
+            'registro_id': registro_id,
+            'campo': campo,
+            'valor_anterior': val_ant,
+            'valor_novo': val_novo,
+            'timestamp': datetime.now().isoformat()
+        })
         
         logger.debug(f"Auditoria: {acao} em {tabela}.{campo} (ID {registro_id})")
         
@@ -1170,6 +1324,9 @@ def get_audit_logs(limite=100, filtro_tabela=None, filtro_usuario=None):
     Returns:
         DataFrame com os logs de auditoria
     """
+    # Incluir eventos ainda na fila de gravação
+    flush_auditoria()
+    
     query = "SELECT * FROM audit_logs WHERE 1=1"
     params = []
     
@@ -1193,65 +1350,11 @@ def get_usuario_by_username(username):
     res = adapter.get_adapter().fetch_one(query, (username,))
     return res
 
-def check_migration_andamentos(cursor):
-    """
-    Verifica e aplica migração na tabela de andamentos para suportar IA.
-    Adiciona colunas: hash_id, analise_ia, urgente, data_analise
-    """
-    try:
-        cursor.execute("PRAGMA table_info(andamentos)")
-        cols = [c[1] for c in cursor.fetchall()]
-        
-        # Mapeamento de colunas novas
-        new_cols = {
-            'hash_id': 'TEXT',
-            'analise_ia': 'TEXT',
-            'urgente': 'BOOLEAN DEFAULT 0',
-            'data_analise': 'TEXT'
-        }
-        
-        for col, dtype in new_cols.items():
-            if col not in cols:
-                print(f"Migrating 'andamentos': Adding {col}...")
-                try:
-                    cursor.execute(f"ALTER TABLE andamentos ADD COLUMN {col} {dtype}")
-                except Exception as e:
-                    print(f"Error adding {col}: {e}")
-        
-        # Criar índice único separadamente
-        try:
-            cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_andamentos_hash ON andamentos(hash_id)")
-        except Exception as e:
-            print(f"Error creating index for hash_id: {e}")
-                    
-    except Exception as e:
-        print(f"Migration check failed: {e}")
-
-
 # ==================== CACHE DE PARTES POR NÚMERO CNJ ====================
 
 def criar_tabela_partes_cache():
-    """Cria tabela de cache de partes por número CNJ"""
-    with adapter.get_connection() as conn:
-        cursor = conn.cursor()
-        try:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS partes_cache (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    numero_cnj TEXT NOT NULL,
-                    nome TEXT NOT NULL,
-                    tipo TEXT,
-                    cpf_cnpj TEXT,
-                    tipo_pessoa TEXT DEFAULT 'Física',
-                    is_cliente INTEGER DEFAULT 0,
-                    criado_em TEXT DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(numero_cnj, nome)
-                )
-            ''')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_partes_cache_cnj ON partes_cache(numero_cnj)')
-            conn.commit()
-        except Exception as e:
-            print(f"Erro ao criar tabela partes_cache: {e}")
+    """Garante a tabela de cache de partes por número CNJ (migração 2)."""
+    init_db()
 
 
 def salvar_partes_cache(numero_cnj: str, partes: list):
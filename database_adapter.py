@@ -1,12 +1,42 @@
 """
 Database Adapter - Suporta SQLite (local) e PostgreSQL (produção)
 Detecta automaticamente o ambiente e usa o banco apropriado
+
+Pooling de conexões:
+- PostgreSQL: pool thread-safe (mín/máx configuráveis) com health check
+  de conexões ociosas e reciclagem por tempo de vida
+- SQLite: uma conexão persistente por thread
+
+Configuração via variáveis de ambiente:
+    DB_POOL_MIN (padrão 1), DB_POOL_MAX (padrão 10),
+    DB_POOL_TIMEOUT (segundos de espera por conexão livre, padrão 30),
+    DB_POOL_RECYCLE (tempo de vida máximo em segundos, padrão 1800),
+    DB_POOL_HEALTHCHECK (ociosidade em segundos antes de testar, padrão 30)
+
+Perfil de performance do SQLite (aplicado a cada conexão aberta):
+    SQLITE_JOURNAL_MODE (WAL), SQLITE_SYNCHRONOUS (NORMAL),
+    SQLITE_BUSY_TIMEOUT (ms, 5000), SQLITE_CACHE_SIZE (-20000 = ~20MB),
+    SQLITE_MMAP_SIZE (bytes, 128MB), SQLITE_TEMP_STORE (MEMORY),
+    SQLITE_MAINTENANCE_INTERVAL (segundos entre checkpoint/optimize, 21600)
+
+Unidade de trabalho (transaction()):
+- Todas as chamadas de banco da thread dentro do bloco usam a mesma conexão
+  e o commit acontece uma única vez, no fim do bloco
+- Cada get_connection() interno vira um SAVEPOINT: um passo que falha é
+  desfeito sozinho e a exceção segue para quem chamou
+- Ações registradas com on_commit() (sinais, invalidação de cache,
+  auditoria) só rodam após o commit; se a transação é desfeita, são descartadas
 """
 import os
 import sqlite3
+import threading
+import time
+import atexit
 from contextlib import contextmanager
 import logging
 
+import query_profiler
+
 logger = logging.getLogger(__name__)
 
 # Detectar ambiente - Prioridade: env var -> streamlit secrets -> SQLite
@@ -35,6 +65,494 @@ if USE_POSTGRES:
 else:
     logger.info("🗄️  Usando SQLite (Desenvolvimento Local)")
 
+# Configuração do pool
+POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN', '1'))
+POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX', '10'))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+POOL_RECYCLE_SECONDS = float(os.getenv('DB_POOL_RECYCLE', '1800'))
+POOL_HEALTHCHECK_IDLE = float(os.getenv('DB_POOL_HEALTHCHECK', '30'))
+
+# Perfil de PRAGMAs do SQLite. A ordem importa: busy_timeout antes de
+# journal_mode, pois a troca para WAL precisa de lock exclusivo.
+SQLITE_PRAGMAS = {
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', '5000')),
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', '-20000')),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(128 * 1024 * 1024))),
+    'temp_store': os.getenv('SQLITE_TEMP_STORE', 'MEMORY'),
+}
+SQLITE_MAINTENANCE_INTERVAL = float(os.getenv('SQLITE_MAINTENANCE_INTERVAL', '21600'))
+
+# Bancos SQLite auxiliares (ai_cache.db, rate_limit_events.db...) incluídos na manutenção
+_sqlite_databases = set()
+_sqlite_databases_lock = threading.Lock()
+
+
+def apply_sqlite_pragmas(conn, pragmas=None):
+    """
+    Aplica o perfil de PRAGMAs em uma conexão SQLite.
+    
+    Args:
+        conn: Conexão sqlite3
+        pragmas: Dict {pragma: valor} (padrão: SQLITE_PRAGMAS)
+    """
+    for name, value in (pragmas or SQLITE_PRAGMAS).items():
+        if value is None or value == '':
+            continue
+        try:
+            conn.execute(f"PRAGMA {name} = {value}")
+        except sqlite3.Error as e:
+            # Ex.: journal_mode com o banco ocupado; a conexão segue utilizável
+            logger.debug(f"PRAGMA {name}={value} não aplicado: {e}")
+
+
+def register_sqlite_database(path):
+    """Inclui um banco SQLite auxiliar na manutenção periódica."""
+    with _sqlite_databases_lock:
+        _sqlite_databases.add(os.path.abspath(path))
+
+
+def connect_sqlite(path, row_factory=sqlite3.Row, pragmas=None, **kwargs):
+    """
+    Abre conexão SQLite já com o perfil de performance aplicado.
+    
+    Usado pelos bancos auxiliares (ai_cache.db, rate_limit_events.db) para
+    terem o mesmo comportamento (WAL, busy_timeout) do banco principal.
+    """
+    conn = sqlite3.connect(path, **kwargs)
+    if row_factory is not None:
+        conn.row_factory = row_factory
+    apply_sqlite_pragmas(conn, pragmas)
+    register_sqlite_database(path)
+    return conn
+
+
+def sqlite_maintenance(paths=None, checkpoint_mode='TRUNCATE'):
+    """
+    Executa wal_checkpoint e optimize nos bancos SQLite.
+    
+    Args:
+        paths: Lista de arquivos (padrão: banco principal + auxiliares registrados)
+        checkpoint_mode: PASSIVE, FULL, RESTART ou TRUNCATE
+    
+    Returns:
+        Dict {arquivo: {'checkpoint': (busy, log, checkpointed), 'ok': bool}}
+    """
+    if paths is None:
+        with _sqlite_databases_lock:
+            paths = sorted(_sqlite_databases)
+        if not USE_POSTGRES:
+            main_db = os.path.abspath(db_adapter.db_name)
+            if main_db not in paths:
+                paths.insert(0, main_db)
+
+    resultado = {}
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        conn = None
+        try:
+            conn = sqlite3.connect(path)
+            conn.execute(f"PRAGMA busy_timeout = {SQLITE_PRAGMAS.get('busy_timeout') or 5000}")
+            checkpoint = conn.execute(f"PRAGMA wal_checkpoint({checkpoint_mode})").fetchone()
+            conn.execute("PRAGMA optimize")
+            resultado[path] = {'checkpoint': tuple(checkpoint) if checkpoint else None, 'ok': True}
+            logger.info(f"Manutenção SQLite OK: {os.path.basename(path)} (checkpoint={resultado[path]['checkpoint']})")
+        except Exception as e:
+            resultado[path] = {'checkpoint': None, 'ok': False, 'erro': str(e)}
+            logger.warning(f"Falha na manutenção SQLite de {path}: {e}")
+        finally:
+            if conn:
+                conn.close()
+    return resultado
+
+
+_maintenance_timer = None
+
+
+def _start_maintenance_timer(_reschedule=False):
+    """Agenda sqlite_maintenance() periodicamente em thread daemon (uma por processo)."""
+    global _maintenance_timer
+    if SQLITE_MAINTENANCE_INTERVAL <= 0:
+        return
+    if _maintenance_timer is not None and not _reschedule:
+        return
+
+    def _run():
+        try:
+            sqlite_maintenance()
+        finally:
+            _start_maintenance_timer(_reschedule=True)
+
+    _maintenance_timer = threading.Timer(SQLITE_MAINTENANCE_INTERVAL, _run)
+    _maintenance_timer.daemon = True
+    _maintenance_timer.start()
+
+
+class PoolTimeoutError(Exception):
+    """Nenhuma conexão ficou livre dentro do tempo limite do pool."""
+
+
+class _PoolStats:
+    """Contadores do pool (protegidos pelo lock do próprio pool)."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.checkouts = 0
+        self.hits = 0            # conexão reaproveitada
+        self.misses = 0          # conexão nova aberta
+        self.waits = 0           # checkouts que precisaram esperar
+        self.wait_time = 0.0
+        self.timeouts = 0
+        self.healthcheck_failures = 0
+        self.recycled = 0
+        self.discarded = 0
+
+    def as_dict(self):
+        return {
+            'checkouts': self.checkouts,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / self.checkouts, 4) if self.checkouts else 0.0,
+            'waits': self.waits,
+            'avg_wait_ms': round(self.wait_time / self.waits * 1000, 2) if self.waits else 0.0,
+            'timeouts': self.timeouts,
+            'healthcheck_failures': self.healthcheck_failures,
+            'recycled': self.recycled,
+            'discarded': self.discarded,
+        }
+
+
+class PostgresPool:
+    """
+    Pool thread-safe de conexões psycopg2.
+    
+    - Mantém entre min_size e max_size conexões abertas
+    - Quando esgotado, aguarda até `timeout` segundos por uma devolução
+    - Testa (SELECT 1) conexões ociosas há mais de `healthcheck_idle` segundos
+    - Recicla conexões com mais de `recycle_seconds` de vida
+    """
+
+    def __init__(self, dsn, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE,
+                 timeout=POOL_TIMEOUT, recycle_seconds=POOL_RECYCLE_SECONDS,
+                 healthcheck_idle=POOL_HEALTHCHECK_IDLE):
+        self.dsn = dsn
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.timeout = timeout
+        self.recycle_seconds = recycle_seconds
+        self.healthcheck_idle = healthcheck_idle
+
+        self._idle = []      # [(conn, criada_em, devolvida_em)]
+        self._in_use = {}    # id(conn) -> criada_em
+        self._cond = threading.Condition(threading.Lock())
+        self._closed = False
+        self.stats = _PoolStats()
+
+    @property
+    def size(self):
+        return len(self._idle) + len(self._in_use)
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn)
+        conn.cursor_factory = RealDictCursor
+        return conn
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.healthcheck_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception as e:
+            logger.debug(f"Health check do pool falhou: {e}")
+            return False
+
+    def getconn(self):
+        """Obtém uma conexão do pool (bloqueia até `timeout` se esgotado)."""
+        deadline = None
+        waited = False
+        start = time.monotonic()
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Pool de conexões encerrado")
+            self.stats.checkouts += 1
+
+        while True:
+            conn = None
+            with self._cond:
+                while True:
+                    # 1. Reaproveitar conexão ociosa (a vaga fica reservada
+                    #    em _in_use enquanto ela é testada fora do lock)
+                    if self._idle:
+                        conn, created_at, idle_since = self._idle.pop()
+                        self._in_use[id(conn)] = created_at
+                        break
+
+                    # 2. Abrir conexão nova se houver espaço
+                    if self.size < self.max_size:
+                        # Reservar a vaga antes de conectar (fora do lock)
+                        placeholder = object()
+                        self._in_use[id(placeholder)] = None
+                        break
+
+                    # 3. Esperar devolução
+                    if not waited:
+                        waited = True
+                        self.stats.waits += 1
+                        deadline = start + self.timeout
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats.timeouts += 1
+                        self.stats.wait_time += time.monotonic() - start
+                        raise PoolTimeoutError(
+                            f"Pool esgotado: {self.max_size} conexões em uso há mais de {self.timeout}s"
+                        )
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                break
+
+            # Reciclagem e health check (SELECT 1) rodam sem segurar o lock,
+            # para não serializar os outros checkouts atrás de I/O de rede
+            reciclar = time.monotonic() - created_at > self.recycle_seconds
+            if reciclar or not self._is_healthy(conn, idle_since):
+                self._close_quietly(conn)
+                with self._cond:
+                    self._in_use.pop(id(conn), None)
+                    if reciclar:
+                        self.stats.recycled += 1
+                    else:
+                        self.stats.healthcheck_failures += 1
+                    self._cond.notify()
+                continue
+
+            with self._cond:
+                self.stats.hits += 1
+                if waited:
+                    self.stats.wait_time += time.monotonic() - start
+            return conn
+
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._in_use.pop(id(placeholder), None)
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._in_use.pop(id(placeholder), None)
+            self._in_use[id(conn)] = time.monotonic()
+            self.stats.misses += 1
+            if waited:
+                self.stats.wait_time += time.monotonic() - start
+        return conn
+
+    def putconn(self, conn, discard=False):
+        """Devolve a conexão ao pool (ou descarta se quebrada)."""
+        if not discard and not conn.closed:
+            try:
+                # Nunca devolver conexão com transação aberta
+                conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            created_at = self._in_use.pop(id(conn), None)
+            if discard or conn.closed or self._closed or created_at is None:
+                self.stats.discarded += 1
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+
+    def fill(self):
+        """Abre conexões até atingir min_size."""
+        while self.size < self.min_size:
+            conn = self._connect()
+            with self._cond:
+                self._idle.append((conn, time.monotonic(), time.monotonic()))
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            self._close_quietly(conn)
+
+    def get_stats(self):
+        with self._cond:
+            data = self.stats.as_dict()
+            data.update({
+                'backend': 'postgresql',
+                'size': self.size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            })
+        return data
+
+
+class SQLiteThreadPool:
+    """
+    Uma conexão SQLite persistente por thread.
+    
+    Conexões de threads encerradas (Streamlit cria uma thread por execução
+    do script) são fechadas na próxima abertura de conexão.
+    """
+
+    def __init__(self, db_name):
+        self.db_name = db_name
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._by_thread = {}   # thread -> conn
+        self.stats = _PoolStats()
+
+    def _connect(self):
+        # Cada conexão é usada só pela thread dona (threading.local); liberar
+        # o check permite que _reap_dead_threads/closeall a fechem de outra thread
+        conn = sqlite3.connect(self.db_name, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        apply_sqlite_pragmas(conn)
+        return conn
+
+    def _reap_dead_threads(self):
+        dead = [t for t in self._by_thread if not t.is_alive()]
+        for t in dead:
+            conn = self._by_thread.pop(t)
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def getconn(self):
+        conn = getattr(self._local, 'conn', None)
+        with self._lock:
+            self.stats.checkouts += 1
+            if conn is not None:
+                self.stats.hits += 1
+                return conn
+            self._reap_dead_threads()
+            self.stats.misses += 1
+
+        conn = self._connect()
+        self._local.conn = conn
+        with self._lock:
+            self._by_thread[threading.current_thread()] = conn
+        return conn
+
+    def putconn(self, conn, discard=False):
+        if not discard:
+            return
+        with self._lock:
+            self.stats.discarded += 1
+            self._by_thread.pop(threading.current_thread(), None)
+        self._local.conn = None
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def closeall(self):
+        with self._lock:
+            conns = list(self._by_thread.values())
+            self._by_thread.clear()
+        self._local = threading.local()
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def get_stats(self):
+        with self._lock:
+            data = self.stats.as_dict()
+            data.update({
+                'backend': 'sqlite',
+                'size': len(self._by_thread),
+                'idle': 0,
+                'in_use': len(self._by_thread),
+            })
+        return data
+
+
+class _TransactionConnection:
+    """
+    Conexão entregue por get_connection() dentro de uma transação.
+    
+    commit() não faz nada (o commit é da transação) e rollback() desfaz
+    apenas até o SAVEPOINT do bloco atual.
+    """
+
+    def __init__(self, conn, savepoint):
+        self._conn = conn
+        self._savepoint = savepoint
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        cursor = self._conn.cursor()
+        cursor.execute(f"ROLLBACK TO SAVEPOINT {self._savepoint}")
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class Transaction:
+    """Unidade de trabalho aberta por DatabaseAdapter.transaction()."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._seq = 0
+        self._on_commit = []
+
+    def on_commit(self, callback):
+        """Agenda `callback()` para depois do commit (descartado em rollback)."""
+        self._on_commit.append(callback)
+
+    @contextmanager
+    def savepoint(self):
+        """Bloco desfeito isoladamente em caso de exceção (SAVEPOINT)."""
+        self._seq += 1
+        name = f"sp_{self._seq}"
+        pending = len(self._on_commit)
+        cursor = self.conn.cursor()
+        cursor.execute(f"SAVEPOINT {name}")
+        try:
+            yield _TransactionConnection(self.conn, name)
+        except BaseException:
+            cursor.execute(f"ROLLBACK TO SAVEPOINT {name}")
+            cursor.execute(f"RELEASE SAVEPOINT {name}")
+            del self._on_commit[pending:]
+            raise
+        cursor.execute(f"RELEASE SAVEPOINT {name}")
+
+    def _run_on_commit(self):
+        callbacks, self._on_commit = self._on_commit, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Erro em ação pós-commit: {e}")
+
 
 class DatabaseAdapter:
     """Adaptador que abstrai SQLite e PostgreSQL"""
@@ -42,21 +560,91 @@ class DatabaseAdapter:
     def __init__(self):
         self.db_type = 'postgresql' if USE_POSTGRES else 'sqlite'
         self.db_name = 'dados_escritorio.db'  # Apenas para SQLite
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._tx_local = threading.local()
+    
+    @property
+    def pool(self):
+        """Pool criado sob demanda (evita conectar no import)."""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    if USE_POSTGRES:
+                        pool = PostgresPool(DATABASE_URL)
+                        try:
+                            pool.fill()
+                        except Exception as e:
+                            logger.warning(f"Não foi possível pré-abrir conexões do pool: {e}")
+                    else:
+                        pool = SQLiteThreadPool(self.db_name)
+                        _start_maintenance_timer()
+                    self._pool = pool
+        return self._pool
+    
+    def current_transaction(self):
+        """Transação aberta na thread atual (ou None)."""
+        return getattr(self._tx_local, 'transaction', None)
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Abre uma unidade de trabalho na thread atual.
+        
+        Dentro do bloco, get_connection() (e portanto fetch_*, execute_query
+        e tudo de database.py) usa a conexão da transação. Um commit no fim;
+        qualquer exceção desfaz tudo. Blocos aninhados viram SAVEPOINTs.
+        
+        Uso:
+            with adapter.get_adapter().transaction() as tx:
+                ...
+                tx.on_commit(lambda: signals.emit(...))
+        """
+        tx = self.current_transaction()
+        if tx is not None:
+            with tx.savepoint():
+                yield tx
+            return
+        
+        pool = self.pool
+        conn = pool.getconn()
+        discard = False
+        tx = Transaction(conn)
+        self._tx_local.transaction = tx
+        try:
+            if not USE_POSTGRES:
+                # Lock de escrita já no início: evita SQLITE_BUSY ao promover o lock no meio
+                conn.execute("BEGIN IMMEDIATE")
+            yield tx
+            conn.commit()
+        except BaseException as e:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            if USE_POSTGRES and isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+                discard = True
+            logger.error(f"Transação desfeita: {e!r}")
+            raise
+        finally:
+            self._tx_local.transaction = None
+            pool.putconn(conn, discard=discard)
+        
+        tx._run_on_commit()
     
     @contextmanager
     def get_connection(self):
-        """Retorna conexão apropriada baseada no ambiente"""
-        conn = None
+        """Retorna conexão apropriada baseada no ambiente (emprestada do pool)"""
+        tx = self.current_transaction()
+        if tx is not None:
+            with tx.savepoint() as conn:
+                yield conn
+            return
+        
+        pool = self.pool
+        conn = pool.getconn()
+        discard = False
         try:
-            if USE_POSTGRES:
-                # Conexão PostgreSQL
-                conn = psycopg2.connect(DATABASE_URL)
-                conn.cursor_factory = RealDictCursor
-            else:
-                # Conexão SQLite
-                conn = sqlite3.connect(self.db_name)
-                conn.row_factory = sqlite3.Row
-            
             yield conn
             
             if not USE_POSTGRES:
@@ -64,26 +652,46 @@ class DatabaseAdapter:
                 conn.commit()
         
         except Exception as e:
-            if conn:
+            try:
                 conn.rollback()
+            except Exception:
+                discard = True
+            if USE_POSTGRES and isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+                # Conexão possivelmente quebrada: não devolver ao pool
+                discard = True
             logger.error(f"Erro na conexão: {e}")
             raise
         
         finally:
-            if conn:
-                conn.close()
+            pool.putconn(conn, discard=discard)
+    
+    def get_pool_stats(self):
+        """Retorna estatísticas do pool (checkouts, esperas, hit ratio...)."""
+        return self.pool.get_stats()
+    
+    def reset_pool_stats(self):
+        """Zera os contadores do pool."""
+        self.pool.stats.reset()
+    
+    def close_pool(self):
+        """Fecha todas as conexões do pool (chamado no encerramento)."""
+        if self._pool is not None:
+            self._pool.closeall()
+            self._pool = None
     
     def execute_query(self, query, params=None):
         """Executa query e retorna cursor"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
-            
-            if USE_POSTGRES:
-                conn.commit()
+            with query_profiler.medir(query, params) as m:
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
+                
+                if USE_POSTGRES:
+                    conn.commit()
+                m['linhas'] = cursor.rowcount
             
             return cursor
     
@@ -91,21 +699,27 @@ class DatabaseAdapter:
         """Executa query e retorna todos os resultados"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
-            return cursor.fetchall()
+            with query_profiler.medir(query, params) as m:
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
+                rows = cursor.fetchall()
+                m['linhas'] = len(rows)
+            return rows
     
     def fetch_one(self, query, params=None):
         """Executa query e retorna um resultado"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
-            return cursor.fetchone()
+            with query_profiler.medir(query, params) as m:
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
+                row = cursor.fetchone()
+                m['linhas'] = 1 if row is not None else 0
+            return row
     
     def adapt_sql(self, sqlite_sql):
         """
@@ -127,11 +741,24 @@ class DatabaseAdapter:
 
 # Singleton global
 db_adapter = DatabaseAdapter()
+atexit.register(db_adapter.close_pool)
 
 def get_adapter():
     """Retorna instância do adaptador"""
     return db_adapter
 
+def get_pool_stats():
+    """Retorna estatísticas do pool de conexões do adaptador global"""
+    return db_adapter.get_pool_stats()
+
+def transaction():
+    """Unidade de trabalho no adaptador global (ver DatabaseAdapter.transaction)."""
+    return db_adapter.transaction()
+
+def current_transaction():
+    """Transação aberta na thread atual (ou None)."""
+    return db_adapter.current_transaction()
+
 # Função helper para compatibilidade
 @contextmanager
 def get_connection():
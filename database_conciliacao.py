@@ -286,21 +286,8 @@ def get_pendentes_antigos(dias):
 # =====================================================
 
 def _criar_tabela_regras():
-    """Cria tabela de regras se não existir"""
-    try:
-        db.sql_run("""
-            CREATE TABLE IF NOT EXISTS regras_conciliacao (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome TEXT NOT NULL,
-                padrao_descricao TEXT NOT NULL,
-                id_cliente INTEGER,
-                categoria TEXT,
-                ativo INTEGER DEFAULT 1,
-                criado_em TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-    except:
-        pass
+    """Garante a tabela de regras (migração 4 em schema_migrations)"""
+    db.init_db()
 
 # Garantir que tabela existe
 _criar_tabela_regras()
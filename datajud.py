@@ -20,6 +20,8 @@ import hashlib
 import json
 import database as db
 import ai_gemini as ai
+import fila_analise_ia
+import query_cache
 
 logger = logging.getLogger(__name__)
 
@@ -914,7 +916,7 @@ def gerar_hash_movimentacao(data, descricao, processo_ref):
     return hashlib.md5(texto.encode()).hexdigest()
 
 def atualizar_processo_ia(processo_id, numero_cnj, token):
-    """Atualiza andamentos e analisa com IA"""
+    """Atualiza andamentos e coloca os novos/com erro na fila de análise por IA"""
     # Forçar recarga da IA (garante uso da chave mais recente)
     try:
         ai.reset_gemini()
@@ -933,7 +935,8 @@ def atualizar_processo_ia(processo_id, numero_cnj, token):
     
     # 2. Buscar hashes existentes
     try:
-        with db.get_connection() as conn:
+        # Leitura, reprocessamentos e novos andamentos em uma única transação
+        with db.transaction(), db.get_connection() as conn:
             cursor = conn.cursor()
             
             # 2. Buscar hashes existentes e suas análises
@@ -944,16 +947,10 @@ def atualizar_processo_ia(processo_id, numero_cnj, token):
             
             # 3. Processar Movimentos
             
-            # Contexto para IA
-            nome_cliente = ""
-            try:
-                df_proc = db.sql_get_query(f"SELECT * FROM processos WHERE id={processo_id}")
-                proc_dict = df_proc.iloc[0].to_dict() if not df_proc.empty else {}
-                contexto = f"Processo: {proc_dict.get('numero')} - Ação: {proc_dict.get('acao')}"
-                nome_cliente = proc_dict.get('cliente_nome', '')
-            except:
-                contexto = f"Processo CNJ: {numero_cnj}"
-    
+            inserir = []
+            atualizar = []
+            enfileirar = []
+            
             for mov in movimentos:
                 # CORREÇÃO: Incluir numero_cnj no hash para ser único globalmente
                 h_id = gerar_hash_movimentacao(mov['data'], mov['descricao'], numero_cnj)
@@ -1012,41 +1009,56 @@ def atualizar_processo_ia(processo_id, numero_cnj, token):
                 
                 if processar:
                     
-                    # --- ALTERAÇÃO: ANÁLISE AUTOMÁTICA DESATIVADA ---
-                    # Motivo: Evitar erro 429 (Quota Exceeded) na API Gemini
-                    # A análise agora é sob demanda (botão na interface)
-                    
-                    # analise = ai.analisar_andamento(mov['descricao'], contexto, nome_cliente)
-                    # analise_json = json.dumps(analise, ensure_ascii=False)
-                    # urgente = 1 if analise.get('urgente') else 0
-                    
-                    # Placeholders para inserção sem IA
+                    # Grava sem análise; a IA analisa depois, em lote, pela fila
+                    # (fila_analise_ia) em vez de uma requisição por movimento
                     analise_json = None
                     urgente = 0
+                    enfileirar.append((processo_id, h_id))
                     
-                    try:
-                        if mode == 'INSERT':
-                            cursor.execute("""
-                                INSERT INTO andamentos (id_processo, data, descricao, tipo, hash_id, analise_ia, urgente, data_analise)
-                                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                            """, (processo_id, mov['data'], mov['descricao'], 'DataJud', h_id, analise_json, urgente, datetime.now().isoformat()))
-                            novos += 1
-                        else:
-                            # Update existing record
-                            cursor.execute("""
-                                UPDATE andamentos 
-                                SET analise_ia = ?, urgente = ?, data_analise = ?
-                                WHERE hash_id = ? AND id_processo = ?
-                            """, (analise_json, urgente, datetime.now().isoformat(), h_id, processo_id))
-                        
-                        analisados += 0 # Não contamos como analisado pois foi apenas salvo
-
-                    except Exception as e_ins:
-                        print(f"Erro ao salvar movimento: {e_ins}")
-                        pass
+                    # Acumular para gravação em lote
+                    if mode == 'INSERT':
+                        inserir.append({
+                            "id_processo": processo_id,
+                            "data": mov['data'],
+                            "descricao": mov['descricao'],
+                            "tipo": 'DataJud',
+                            "hash_id": h_id,
+                            "analise_ia": analise_json,
+                            "urgente": urgente,
+                            "data_analise": datetime.now().isoformat()
+                        })
+                    else:
+                        # Update existing record
+                        atualizar.append((analise_json, urgente, datetime.now().isoformat(), h_id, processo_id))
+                    
+            
+            if atualizar:
+                query_update = """
+                    UPDATE andamentos 
+                    SET analise_ia = ?, urgente = ?, data_analise = ?
+                    WHERE hash_id = ? AND id_processo = ?
+                """
+                if db.adapter.USE_POSTGRES:
+                    query_update = query_update.replace('?', '%s')
+                try:
+                    # SAVEPOINT: uma falha aqui não invalida a transação
+                    with db.transaction() as tx:
+                        cursor.executemany(query_update, atualizar)
+                        # UPDATE direto não passa pelo crud: invalidar o cache de andamentos
+                        tx.on_commit(lambda: query_cache.invalidar('andamentos'))
+                except Exception as e_upd:
+                    logger.error(f"Erro ao atualizar movimentos: {e_upd}")
+            
+            # Novos movimentos: um INSERT em lote (hash_id duplicado é ignorado)
+            if inserir:
+                novos = len(db.crud_insert_many(
+                    "andamentos", inserir, f"Andamentos DataJud do processo {processo_id}",
+                    on_conflict='ignore'
+                ))
             
-            conn.commit()
+            # Fila de análise gravada na mesma transação dos andamentos
+            enfileirados = fila_analise_ia.enfileirar(enfileirar)
             
-        return {"novos": novos, "analisados": analisados}
+        return {"novos": novos, "analisados": analisados, "enfileirados": enfileirados}
     except Exception as e:
         return {"erro": str(e)}
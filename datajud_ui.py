@@ -349,11 +349,10 @@ def render_busca_datajud():
                                         doc_cliente = parte_selecionada.get('cpf_cnpj', '')
                                         nome_cliente = parte_selecionada['nome']
                                         
-                                        # Tenta buscar por CPF/CNPJ ou por nome
+                                        # Tenta buscar por CPF/CNPJ (índice cego) ou por nome
                                         if doc_cliente:
-                                            df_cliente = db.sql_get_query(
-                                                "SELECT id FROM clientes WHERE cpf_cnpj=?",
-                                                (doc_cliente,)
+                                            df_cliente = pd.DataFrame(
+                                                {'id': db.clientes_por_documento(doc_cliente, limite=1)}
                                             )
                                         else:
                                             # Buscar por nome exato (case insensitive)
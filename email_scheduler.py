@@ -88,16 +88,18 @@ def verificar_emails():
                     
                     try:
                         from ai_gemini import analisar_email_juridico
+                        import gemini_quota
                         
                         # Obter corpo completo do email
                         corpo_email = email_data.get('corpo', '') if email_data else alerta.corpo_resumo
                         
-                        # Analisar com IA
-                        ia_resultado = analisar_email_juridico(
-                            assunto=alerta.assunto,
-                            corpo=corpo_email,
-                            remetente=alerta.remetente
-                        )
+                        # Analisar com IA (segundo plano: cede a cota ao uso interativo)
+                        with gemini_quota.em_segundo_plano():
+                            ia_resultado = analisar_email_juridico(
+                                assunto=alerta.assunto,
+                                corpo=corpo_email,
+                                remetente=alerta.remetente
+                            )
                         logger.info(f"IA analisou email: prazo={ia_resultado.get('prazo_dias')} dias")
                         
                         # Buscar processo vinculado pelo número CNJ
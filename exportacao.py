@@ -0,0 +1,358 @@
+"""
+Exportação em Streaming - Sistema Lopes & Ribeiro
+
+Gera arquivos de exportação lendo as tabelas em lotes (EXPORT_LOTE linhas)
+e gravando direto em arquivo temporário, com memória constante mesmo para
+tabelas grandes como andamentos e audit_logs:
+
+- Leitura: cursor do servidor no PostgreSQL (cursor nomeado, itersize) e
+  fetchmany no SQLite
+- CSV compactado (.csv.gz), Parquet em row groups (requer pyarrow) e
+  Excel com xlsxwriter em modo constant_memory
+- Várias tabelas num único ZIP
+- Dump SQL do SQLite (iterdump) direto para .sql.gz
+
+Os arquivos ficam em EXPORT_TMP_DIR (padrão: pasta temporária do sistema);
+quem chama é responsável por removê-los após o download.
+
+Uso:
+    import exportacao
+    caminho = exportacao.exportar('andamentos', 'csv.gz')
+    caminho = exportacao.exportar_zip(['clientes', 'processos'], 'xlsx')
+"""
+
+import csv
+import gzip
+import io
+import logging
+import os
+import re
+import tempfile
+import uuid
+import zipfile
+from contextlib import contextmanager
+from typing import Iterator, List, Sequence, Tuple
+
+import pandas as pd
+
+import database_adapter as adapter
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_DISPONIVEL = True
+except ImportError:
+    PARQUET_DISPONIVEL = False
+
+EXPORT_LOTE = int(os.getenv('EXPORT_LOTE', '5000'))
+EXPORT_TMP_DIR = os.getenv('EXPORT_TMP_DIR') or None
+
+# Limite de linhas por planilha do Excel (cabeçalho incluído)
+XLSX_MAX_LINHAS = 1048576
+
+FORMATOS = {
+    'csv.gz': {'extensao': '.csv.gz', 'mime': 'application/gzip'},
+    'parquet': {'extensao': '.parquet', 'mime': 'application/octet-stream'},
+    'xlsx': {'extensao': '.xlsx', 'mime': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'},
+}
+
+_RE_TABELA = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def formatos_disponiveis() -> List[str]:
+    """Formatos suportados no ambiente atual (parquet depende do pyarrow)."""
+    return [f for f in FORMATOS if f != 'parquet' or PARQUET_DISPONIVEL]
+
+
+def tabelas_existentes(tabelas: Sequence[str]) -> List[str]:
+    """Filtra as tabelas que existem no banco atual (mantendo a ordem)."""
+    from schema_migrations import table_exists
+    with adapter.get_connection() as conn:
+        cursor = conn.cursor()
+        return [t for t in tabelas if table_exists(cursor, t)]
+
+
+def _validar_tabela(tabela: str) -> str:
+    if not isinstance(tabela, str) or not _RE_TABELA.match(tabela):
+        raise ValueError(f"Nome de tabela inválido: {tabela!r}")
+    return tabela
+
+
+def _arquivo_temporario(sufixo: str) -> str:
+    fd, caminho = tempfile.mkstemp(prefix='export_', suffix=sufixo, dir=EXPORT_TMP_DIR)
+    os.close(fd)
+    return caminho
+
+
+# =====================================================
+# LEITURA EM LOTES
+# =====================================================
+
+@contextmanager
+def _cursor_streaming(sql: str, params=None):
+    """Cursor que entrega as linhas sob demanda (servidor no PostgreSQL)."""
+    with adapter.get_connection() as conn:
+        if adapter.USE_POSTGRES:
+            import psycopg2.extensions
+            cursor = conn.cursor(
+                name=f"export_{uuid.uuid4().hex[:12]}",
+                cursor_factory=psycopg2.extensions.cursor
+            )
+            cursor.itersize = EXPORT_LOTE
+            sql = sql.replace('?', '%s')
+        else:
+            cursor = conn.cursor()
+        try:
+            cursor.execute(sql, params or ())
+            yield cursor
+        finally:
+            cursor.close()
+
+
+def iterar_lotes(tabela: str, tamanho: int = None) -> Iterator[Tuple[List[str], List[tuple]]]:
+    """
+    Percorre a tabela em lotes de `tamanho` linhas.
+
+    Yields:
+        (colunas, linhas) - pelo menos um lote, mesmo com a tabela vazia
+    """
+    tamanho = tamanho or EXPORT_LOTE
+    sql = f"SELECT * FROM {_validar_tabela(tabela)}"
+    with _cursor_streaming(sql) as cursor:
+        primeiro = cursor.fetchmany(tamanho)
+        # Cursor nomeado do psycopg2 só preenche description após o primeiro fetch
+        colunas = [d[0] for d in cursor.description]
+        linhas = primeiro
+        while True:
+            yield colunas, [tuple(l) for l in linhas]
+            linhas = cursor.fetchmany(tamanho)
+            if not linhas:
+                break
+
+
+def iterar_dataframes(tabela: str, tamanho: int = None) -> Iterator[pd.DataFrame]:
+    """Como iterar_lotes, mas cada lote como DataFrame."""
+    for colunas, linhas in iterar_lotes(tabela, tamanho):
+        yield pd.DataFrame.from_records(linhas, columns=colunas)
+
+
+# =====================================================
+# FORMATOS
+# =====================================================
+
+def _gravar_csv(tabela: str, arquivo_texto):
+    escritor = csv.writer(arquivo_texto)
+    for i, (colunas, linhas) in enumerate(iterar_lotes(tabela)):
+        if i == 0:
+            escritor.writerow(colunas)
+        escritor.writerows(linhas)
+
+
+def exportar_csv_gz(tabela: str, destino: str) -> str:
+    """Exporta a tabela para CSV (UTF-8 com BOM, compatível com Excel) compactado."""
+    with gzip.open(destino, 'wt', encoding='utf-8-sig', newline='', compresslevel=6) as f:
+        _gravar_csv(tabela, f)
+    return destino
+
+
+def _tipo_arrow(serie: pd.Series):
+    """Tipo Arrow de uma coluna; colunas vazias ou mistas viram texto."""
+    try:
+        tipo = pa.array(serie, from_pandas=True).type
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.string()
+    return pa.string() if pa.types.is_null(tipo) else tipo
+
+
+def _coluna_arrow(serie: pd.Series, tipo):
+    if pa.types.is_string(tipo):
+        valores = [None if pd.isna(v) else str(v) for v in serie]
+        return pa.array(valores, type=tipo)
+    # safe=True: um valor que não cabe no tipo do primeiro lote (ex.: 150.75
+    # numa coluna int64) levanta ArrowInvalid em vez de ser truncado
+    return pa.array(serie, from_pandas=True).cast(tipo, safe=True)
+
+
+def exportar_parquet(tabela: str, destino: str) -> str:
+    """
+    Exporta a tabela para Parquet, um row group por lote.
+
+    O schema vem do primeiro lote; lotes seguintes são convertidos para ele
+    sem perda (um valor que não cabe levanta ValueError sugerindo CSV).
+    """
+    if not PARQUET_DISPONIVEL:
+        raise RuntimeError("Exportação Parquet requer o pacote pyarrow")
+
+    writer = None
+    try:
+        for df in iterar_dataframes(tabela):
+            if writer is None:
+                schema = pa.schema([(str(c), _tipo_arrow(df[c])) for c in df.columns])
+                writer = pq.ParquetWriter(destino, schema, compression='snappy')
+            try:
+                arrays = [_coluna_arrow(df[campo.name], campo.type) for campo in schema]
+            except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                raise ValueError(
+                    f"Tipos inconsistentes em {tabela} para Parquet ({e}); use CSV"
+                ) from e
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+    finally:
+        if writer is not None:
+            writer.close()
+    return destino
+
+
+def _valor_excel(valor):
+    if isinstance(valor, (bytes, memoryview)):
+        return bytes(valor).decode('utf-8', 'replace')
+    return valor
+
+
+def _adicionar_planilhas(workbook, tabela: str, nome: str = None):
+    """Grava a tabela em uma ou mais planilhas (quebra no limite do Excel)."""
+    nome = (nome or tabela)[:31]
+    negrito = workbook.add_format({'bold': True})
+    planilha, linha, parte = None, 0, 1
+    for colunas, linhas in iterar_lotes(tabela):
+        if planilha is None:
+            planilha = workbook.add_worksheet(nome)
+            planilha.write_row(0, 0, colunas, negrito)
+            linha = 1
+        for registro in linhas:
+            if linha >= XLSX_MAX_LINHAS:
+                parte += 1
+                sufixo = f"_{parte}"
+                planilha = workbook.add_worksheet(f"{nome[:31 - len(sufixo)]}{sufixo}")
+                planilha.write_row(0, 0, colunas, negrito)
+                linha = 1
+            planilha.write_row(linha, 0, [_valor_excel(v) for v in registro])
+            linha += 1
+
+
+def exportar_xlsx(tabelas: Sequence[str], destino: str = None, nomes: Sequence[str] = None) -> str:
+    """
+    Exporta uma ou mais tabelas para um Excel (uma planilha por tabela).
+
+    Usa o modo constant_memory do xlsxwriter: cada linha é gravada em disco
+    assim que escrita, em vez de manter a planilha inteira em memória.
+    """
+    import xlsxwriter
+
+    if isinstance(tabelas, str):
+        tabelas = [tabelas]
+    nomes = list(nomes) if nomes else list(tabelas)
+    destino = destino or _arquivo_temporario(FORMATOS['xlsx']['extensao'])
+    workbook = xlsxwriter.Workbook(destino, {
+        'constant_memory': True,
+        'tmpdir': EXPORT_TMP_DIR or tempfile.gettempdir(),
+        'strings_to_numbers': False,
+        'strings_to_formulas': False,
+        'strings_to_urls': False,
+        'remove_timezone': True,
+        'default_date_format': 'dd/mm/yyyy hh:mm',
+    })
+    try:
+        for tabela, nome in zip(tabelas, nomes):
+            _adicionar_planilhas(workbook, tabela, nome)
+    finally:
+        workbook.close()
+    return destino
+
+
+def exportar(tabela: str, formato: str, destino: str = None) -> str:
+    """
+    Exporta uma tabela para arquivo no formato informado.
+
+    Args:
+        tabela: Nome da tabela
+        formato: 'csv.gz', 'parquet' ou 'xlsx'
+        destino: Caminho do arquivo (padrão: temporário em EXPORT_TMP_DIR)
+
+    Returns:
+        Caminho do arquivo gerado
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de exportação inválido: {formato}")
+    destino = destino or _arquivo_temporario(FORMATOS[formato]['extensao'])
+    try:
+        if formato == 'csv.gz':
+            exportar_csv_gz(tabela, destino)
+        elif formato == 'parquet':
+            exportar_parquet(tabela, destino)
+        else:
+            exportar_xlsx([tabela], destino)
+    except Exception:
+        if os.path.exists(destino):
+            os.remove(destino)
+        raise
+    logger.info(f"Exportação {formato} de {tabela}: {os.path.getsize(destino)/1024/1024:.2f}MB")
+    return destino
+
+
+def exportar_zip(tabelas: Sequence[str], formato: str, destino: str = None) -> str:
+    """
+    Exporta várias tabelas num único ZIP, um arquivo por tabela.
+
+    CSV é gravado direto na entrada do ZIP (deflate, sem gzip duplo);
+    Parquet e Excel passam por um temporário por tabela.
+
+    Returns:
+        Caminho do ZIP gerado
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de exportação inválido: {formato}")
+    destino = destino or _arquivo_temporario('.zip')
+    try:
+        with zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+            for tabela in tabelas:
+                if formato == 'csv.gz':
+                    with zf.open(f"{tabela}.csv", 'w', force_zip64=True) as entrada:
+                        with io.TextIOWrapper(entrada, encoding='utf-8-sig', newline='') as f:
+                            _gravar_csv(tabela, f)
+                    continue
+                temp = exportar(tabela, formato)
+                try:
+                    # Parquet (snappy) e xlsx (zip) já são compactados
+                    zf.write(temp, f"{tabela}{FORMATOS[formato]['extensao']}",
+                             compress_type=zipfile.ZIP_STORED)
+                finally:
+                    os.remove(temp)
+    except Exception:
+        if os.path.exists(destino):
+            os.remove(destino)
+        raise
+    logger.info(f"Exportação ZIP ({formato}) de {len(tabelas)} tabelas: "
+                f"{os.path.getsize(destino)/1024/1024:.2f}MB")
+    return destino
+
+
+def exportar_sql_dump(destino: str = None) -> str:
+    """
+    Dump SQL completo do SQLite (estrutura e dados) compactado em gzip.
+
+    As linhas do iterdump() são gravadas conforme geradas.
+    """
+    if adapter.USE_POSTGRES:
+        raise RuntimeError("Dump SQL disponível apenas para SQLite (use pg_dump no PostgreSQL)")
+    destino = destino or _arquivo_temporario('.sql.gz')
+    try:
+        with adapter.get_connection() as conn, \
+                gzip.open(destino, 'wt', encoding='utf-8', compresslevel=6) as f:
+            for linha in conn.iterdump():
+                f.write(f"{linha}\n")
+    except Exception:
+        if os.path.exists(destino):
+            os.remove(destino)
+        raise
+    return destino
+
+
+def ler_e_remover(caminho: str) -> bytes:
+    """Lê o arquivo gerado (para st.download_button) e remove o temporário."""
+    try:
+        with open(caminho, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(caminho)
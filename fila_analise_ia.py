@@ -0,0 +1,393 @@
+"""
+Fila de Análise por IA dos Andamentos - Sistema Lopes & Ribeiro
+
+Os andamentos trazidos do DataJud são gravados sem análise e entram na
+tabela fila_analise_ia (durável: sobrevive a reinícios e é compartilhada
+entre o app e scheduled_tasks.py). Um worker esvazia a fila:
+
+- Agrupa os pendentes por processo e envia até FILA_IA_LOTE movimentos em
+  um único prompt (ai_gemini.analisar_andamentos_lote), separando a
+  resposta JSON de volta por hash_id
+- Reserva o lote adiando proxima_tentativa em FILA_IA_RESERVA segundos:
+  outro worker (outro processo) não pega os mesmos itens, e um worker que
+  cair devolve os itens à fila quando a reserva vence
+- Grava as análises com um executemany e remove os itens numa transação
+- Falhas (erro da API, JSON inválido, movimento ausente da resposta) são
+  repetidas com backoff exponencial; após FILA_IA_MAX_TENTATIVAS o item
+  fica como 'falhou' (reenfileirar_falhas() devolve à fila)
+- Roda com prioridade de segundo plano em gemini_quota; sem cota, o lote
+  é adiado até `retry_em` sem contar tentativa e a execução termina
+
+Uso:
+    import fila_analise_ia
+    fila_analise_ia.enfileirar([(id_processo, hash_id), ...])
+    fila_analise_ia.processar()               # síncrono (scheduled_tasks)
+    fila_analise_ia.iniciar_em_background()   # thread (após sincronizar no app)
+    fila_analise_ia.status()
+"""
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import ai_gemini as ai
+import database as db
+import database_adapter as adapter
+import gemini_quota
+import query_cache
+
+logger = logging.getLogger(__name__)
+
+# Movimentos por prompt (todos do mesmo processo)
+FILA_IA_LOTE = int(os.getenv('FILA_IA_LOTE', '10'))
+FILA_IA_MAX_TENTATIVAS = int(os.getenv('FILA_IA_MAX_TENTATIVAS', '5'))
+FILA_IA_BACKOFF_BASE = float(os.getenv('FILA_IA_BACKOFF_BASE', '60'))
+FILA_IA_BACKOFF_MAX = float(os.getenv('FILA_IA_BACKOFF_MAX', '21600'))
+# Segundos que um lote fica reservado para o worker que o pegou
+FILA_IA_RESERVA = float(os.getenv('FILA_IA_RESERVA', '600'))
+
+PENDENTE = 'pendente'
+FALHOU = 'falhou'
+
+_thread: Optional[threading.Thread] = None
+_thread_lock = threading.Lock()
+_parar = threading.Event()
+_status: Dict = {'em_execucao': False, 'erro': None, 'ultima_execucao': None}
+
+
+def _ph() -> str:
+    return '%s' if adapter.USE_POSTGRES else '?'
+
+
+def _agora() -> datetime:
+    return datetime.now()
+
+
+# =====================================================
+# ENFILEIRAR
+# =====================================================
+
+def enfileirar(itens: List[Tuple[int, str]]) -> int:
+    """
+    Coloca andamentos na fila (hash_id já enfileirado é ignorado).
+
+    Pode ser chamado dentro de uma db.transaction(): a fila é gravada
+    junto com os andamentos.
+
+    Args:
+        itens: Lista de (id_processo, hash_id)
+
+    Returns:
+        Número de itens novos na fila
+    """
+    agora = _agora().isoformat()
+    por_hash = {hash_id: id_processo for id_processo, hash_id in itens if hash_id}
+    linhas = [
+        {'hash_id': hash_id, 'id_processo': id_processo, 'status': PENDENTE,
+         'tentativas': 0, 'proxima_tentativa': agora, 'criado_em': agora}
+        for hash_id, id_processo in por_hash.items()
+    ]
+    if not linhas:
+        return 0
+    return db.crud_insert_many(
+        'fila_analise_ia', linhas, "Andamentos na fila de análise por IA",
+        return_ids=False, on_conflict='ignore'
+    )
+
+
+def reenfileirar_falhas() -> int:
+    """Devolve à fila os itens que esgotaram as tentativas."""
+    ph = _ph()
+    with db.transaction() as tx, db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"UPDATE fila_analise_ia SET status = {ph}, tentativas = 0, proxima_tentativa = {ph} "
+            f"WHERE status = {ph}",
+            (PENDENTE, _agora().isoformat(), FALHOU)
+        )
+        total = cursor.rowcount
+        tx.on_commit(lambda: query_cache.invalidar('fila_analise_ia'))
+    return total
+
+
+# =====================================================
+# WORKER
+# =====================================================
+
+def _reservar_lote(lote: int) -> Tuple[Optional[int], List[Dict]]:
+    """
+    Reserva até `lote` itens vencidos do processo com o item mais antigo.
+
+    Returns:
+        (id_processo, [{'hash_id', 'tentativas'}]) ou (None, []) se nada venceu
+    """
+    ph = _ph()
+    agora = _agora()
+    pular = " FOR UPDATE SKIP LOCKED" if adapter.USE_POSTGRES else ""
+    with db.transaction(), db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT id_processo FROM fila_analise_ia WHERE status = {ph} AND proxima_tentativa <= {ph} "
+            f"ORDER BY proxima_tentativa LIMIT 1{pular}",
+            (PENDENTE, agora.isoformat())
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None, []
+        id_processo = row['id_processo']
+
+        cursor.execute(
+            f"SELECT hash_id, tentativas FROM fila_analise_ia "
+            f"WHERE id_processo = {ph} AND status = {ph} AND proxima_tentativa <= {ph} "
+            f"ORDER BY criado_em LIMIT {ph}{pular}",
+            (id_processo, PENDENTE, agora.isoformat(), lote)
+        )
+        itens = [{'hash_id': r['hash_id'], 'tentativas': int(r['tentativas'] or 0)} for r in cursor.fetchall()]
+
+        reserva = (agora + timedelta(seconds=FILA_IA_RESERVA)).isoformat()
+        cursor.executemany(
+            f"UPDATE fila_analise_ia SET proxima_tentativa = {ph} WHERE hash_id = {ph}",
+            [(reserva, item['hash_id']) for item in itens]
+        )
+    return id_processo, itens
+
+
+def _carregar_movimentos(id_processo: int, hashes: List[str]) -> List[Dict]:
+    """Andamentos do lote ainda sem análise (os já analisados saem da fila)."""
+    ph = _ph()
+    marcadores = ", ".join([ph] * len(hashes))
+    df = db.sql_get_query(
+        f"SELECT hash_id, data, descricao FROM andamentos "
+        f"WHERE id_processo = {ph} AND hash_id IN ({marcadores}) AND analise_ia IS NULL "
+        f"ORDER BY data",
+        (id_processo, *hashes)
+    )
+    return [
+        {'chave': r['hash_id'], 'data': r['data'], 'descricao': r['descricao'] or ''}
+        for r in df.to_dict('records')
+    ]
+
+
+def _contexto_processo(id_processo: int) -> Tuple[str, str]:
+    """(contexto, nome do cliente) usados no prompt."""
+    df = db.select('processos', columns=['numero', 'acao', 'cliente_nome'],
+                   where={'id': id_processo}, limit=1)
+    if df.empty:
+        return f"Processo ID {id_processo}", ""
+    proc = df.iloc[0]
+    return f"Processo: {proc['numero']} - Ação: {proc['acao']}", proc['cliente_nome'] or ""
+
+
+def _gravar_resultados(id_processo: int, analises: Dict[str, Dict], remover: List[str]):
+    """Grava as análises e tira da fila os itens concluídos, numa transação."""
+    ph = _ph()
+    agora = _agora().isoformat()
+    with db.transaction() as tx, db.get_connection() as conn:
+        cursor = conn.cursor()
+        if analises:
+            cursor.executemany(
+                f"UPDATE andamentos SET analise_ia = {ph}, urgente = {ph}, data_analise = {ph} "
+                f"WHERE hash_id = {ph} AND id_processo = {ph}",
+                [
+                    (json.dumps(analise, ensure_ascii=False), 1 if analise.get('urgente') else 0,
+                     agora, hash_id, id_processo)
+                    for hash_id, analise in analises.items()
+                ]
+            )
+            tx.on_commit(lambda: query_cache.invalidar('andamentos'))
+        if remover:
+            cursor.executemany(
+                f"DELETE FROM fila_analise_ia WHERE hash_id = {ph}", [(h,) for h in remover]
+            )
+
+
+def _backoff(tentativas: int) -> float:
+    return min(FILA_IA_BACKOFF_BASE * (2 ** max(tentativas - 1, 0)), FILA_IA_BACKOFF_MAX)
+
+
+def _registrar_falha(itens: List[Dict], erro: str):
+    """Conta uma tentativa e reagenda com backoff (ou marca como falhou)."""
+    ph = _ph()
+    agora = _agora()
+    valores = []
+    for item in itens:
+        tentativas = item['tentativas'] + 1
+        status = FALHOU if tentativas >= FILA_IA_MAX_TENTATIVAS else PENDENTE
+        proxima = (agora + timedelta(seconds=_backoff(tentativas))).isoformat()
+        valores.append((status, tentativas, proxima, erro[:500], item['hash_id']))
+    with db.transaction(), db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            f"UPDATE fila_analise_ia SET status = {ph}, tentativas = {ph}, proxima_tentativa = {ph}, "
+            f"ultimo_erro = {ph} WHERE hash_id = {ph}",
+            valores
+        )
+
+
+def _adiar(itens: List[Dict], segundos: float, motivo: str):
+    """Reagenda sem contar tentativa (falta de cota não é falha do item)."""
+    ph = _ph()
+    proxima = (_agora() + timedelta(seconds=segundos)).isoformat()
+    with db.transaction(), db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            f"UPDATE fila_analise_ia SET proxima_tentativa = {ph}, ultimo_erro = {ph} WHERE hash_id = {ph}",
+            [(proxima, motivo[:500], item['hash_id']) for item in itens]
+        )
+
+
+def processar_lote(lote: int = None) -> Optional[Dict]:
+    """
+    Reserva, analisa e grava um lote.
+
+    Returns:
+        Dict com analisados, falhas, chamadas e sem_cota; None se a fila não
+        tem itens vencidos
+    """
+    id_processo, itens = _reservar_lote(lote or FILA_IA_LOTE)
+    if not itens:
+        return None
+
+    resultado = {'analisados': 0, 'falhas': 0, 'chamadas': 0, 'sem_cota': False}
+    movimentos = _carregar_movimentos(id_processo, [i['hash_id'] for i in itens])
+    com_movimento = {m['chave'] for m in movimentos}
+    # Já analisados (ex.: botão manual) ou apagados: só saem da fila
+    descartados = [i['hash_id'] for i in itens if i['hash_id'] not in com_movimento]
+    itens = [i for i in itens if i['hash_id'] in com_movimento]
+    if not itens:
+        _gravar_resultados(id_processo, {}, descartados)
+        return resultado
+
+    contexto, nome_cliente = _contexto_processo(id_processo)
+    try:
+        resultado['chamadas'] = 1
+        with gemini_quota.em_segundo_plano():
+            analises = ai.analisar_andamentos_lote(movimentos, contexto, nome_cliente)
+    except gemini_quota.CotaEsgotada as e:
+        _adiar(itens, e.retry_em, str(e))
+        _gravar_resultados(id_processo, {}, descartados)
+        resultado.update({'chamadas': 0, 'sem_cota': True})
+        return resultado
+    except Exception as e:
+        erro_str = str(e)
+        if "429" in erro_str or "quota" in erro_str.lower():
+            # A API recusou por cota: adia sem contar tentativa
+            _adiar(itens, FILA_IA_BACKOFF_BASE, erro_str)
+            _gravar_resultados(id_processo, {}, descartados)
+            resultado['sem_cota'] = True
+            return resultado
+        logger.error(f"Análise em lote do processo {id_processo} falhou: {e}")
+        _registrar_falha(itens, str(e))
+        _gravar_resultados(id_processo, {}, descartados)
+        resultado['falhas'] = len(itens)
+        return resultado
+
+    _gravar_resultados(id_processo, analises, descartados + list(analises))
+    faltantes = [i for i in itens if i['hash_id'] not in analises]
+    if faltantes:
+        _registrar_falha(faltantes, "Movimento ausente da resposta da IA")
+    resultado['analisados'] = len(analises)
+    resultado['falhas'] = len(faltantes)
+    return resultado
+
+
+def processar(max_lotes: int = None, lote: int = None) -> Dict:
+    """
+    Esvazia a fila (itens vencidos) lote a lote.
+
+    Para quando a fila não tem itens vencidos, a cota acaba, `max_lotes`
+    é atingido ou parar() é chamado.
+
+    Returns:
+        Totais: lotes, analisados, falhas, chamadas e sem_cota
+    """
+    totais = {'lotes': 0, 'analisados': 0, 'falhas': 0, 'chamadas': 0, 'sem_cota': False}
+    if not ai.inicializar_gemini():
+        logger.warning("Fila de análise por IA não processada: Gemini não inicializado")
+        return totais
+
+    while not _parar.is_set() and (max_lotes is None or totais['lotes'] < max_lotes):
+        resultado = processar_lote(lote)
+        if resultado is None:
+            break
+        totais['lotes'] += 1
+        for chave in ('analisados', 'falhas', 'chamadas'):
+            totais[chave] += resultado[chave]
+        if resultado['sem_cota']:
+            totais['sem_cota'] = True
+            break
+
+    if totais['lotes']:
+        logger.info(
+            f"Fila de análise por IA: {totais['analisados']} andamentos analisados em "
+            f"{totais['chamadas']} chamadas, {totais['falhas']} falhas"
+            + (" (cota esgotada, restante adiado)" if totais['sem_cota'] else "")
+        )
+    return totais
+
+
+# =====================================================
+# SEGUNDO PLANO
+# =====================================================
+
+def _executar_em_background(kwargs):
+    try:
+        _status['ultima_execucao'] = processar(**kwargs)
+        _status['erro'] = None
+    except Exception as e:
+        logger.error(f"Erro na fila de análise por IA: {e}")
+        _status['erro'] = str(e)
+    finally:
+        _status['em_execucao'] = False
+
+
+def iniciar_em_background(max_lotes: int = None) -> bool:
+    """
+    Processa a fila numa thread de segundo plano.
+
+    Returns:
+        False se o worker já estiver rodando neste processo
+    """
+    global _thread
+    with _thread_lock:
+        if _thread is not None and _thread.is_alive():
+            return False
+        _parar.clear()
+        _status.update({'em_execucao': True, 'erro': None})
+        _thread = threading.Thread(
+            target=_executar_em_background, args=({'max_lotes': max_lotes},),
+            name='fila-analise-ia', daemon=True
+        )
+        _thread.start()
+    return True
+
+
+def parar(timeout: float = 10.0):
+    """Interrompe o worker após o lote atual (os itens seguem na fila)."""
+    _parar.set()
+    if _thread is not None:
+        _thread.join(timeout)
+
+
+def status() -> Dict:
+    """Itens pendentes/vencidos/com falha, worker em execução e última execução."""
+    ph = _ph()
+    df = db.sql_get_query(
+        f"SELECT status, COUNT(*) AS total, "
+        f"SUM(CASE WHEN proxima_tentativa <= {ph} THEN 1 ELSE 0 END) AS vencidos "
+        f"FROM fila_analise_ia GROUP BY status",
+        (_agora().isoformat(),)
+    )
+    contagem = {r['status']: r for r in df.to_dict('records')}
+    pendente = contagem.get(PENDENTE, {})
+    return {
+        'pendentes': int(pendente.get('total') or 0),
+        'vencidos': int(pendente.get('vencidos') or 0),
+        'falhas': int(contagem.get(FALHOU, {}).get('total') or 0),
+        'em_execucao': _status['em_execucao'],
+        'erro': _status['erro'],
+        'ultima_execucao': _status['ultima_execucao'],
+    }
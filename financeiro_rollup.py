@@ -0,0 +1,472 @@
+"""
+Agregados Financeiros Incrementais - Sistema Lopes & Ribeiro
+
+Tabelas de rollup mantidas por triggers a cada INSERT/UPDATE/DELETE em
+`financeiro`, para que DRE, fluxo de caixa e rentabilidade leiam algumas
+centenas de linhas pré-agregadas em vez de varrer o livro-caixa:
+
+- fin_rollup_dia: dia x tipo x categoria x status_pagamento -> total, qtd
+- fin_rollup_cliente_mes: id_cliente x mês x tipo x status_pagamento -> total, qtd
+
+O dia vem da coluna `data` (texto): 'AAAA-MM-DD[...]' ou 'DD/MM/AAAA[...]';
+outros formatos ficam no dia ''. Valores nulos de tipo/categoria/status
+viram '' e cliente nulo vira 0 (chaves primárias sem NULL).
+
+Os triggers funcionam para qualquer escrita (crud_*, sql_run, lotes,
+scripts). reconstruir() recalcula tudo a partir do livro-caixa e
+verificar_consistencia() compara os dois.
+
+Uso:
+    import financeiro_rollup as rollup
+    df = rollup.dre('2025-01-01', '2025-12-31')
+    rollup.verificar_consistencia()
+"""
+
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+import database_adapter as adapter
+import query_cache
+
+logger = logging.getLogger(__name__)
+
+TABELA_DIA = 'fin_rollup_dia'
+TABELA_CLIENTE_MES = 'fin_rollup_cliente_mes'
+
+# Colunas de financeiro que afetam os agregados (UPDATE OF ...)
+COLUNAS_ORIGEM = ['data', 'tipo', 'categoria', 'status_pagamento', 'valor', 'id_cliente']
+
+# Diferença máxima aceita entre rollup e livro-caixa (arredondamento de REAL)
+TOLERANCIA = 0.01
+
+_disponivel: Optional[bool] = None
+
+# Escritas em financeiro invalidam consultas em cache sobre os rollups
+query_cache.registrar_dependencia(TABELA_DIA, 'financeiro')
+query_cache.registrar_dependencia(TABELA_CLIENTE_MES, 'financeiro')
+
+
+def _dia(r: str) -> str:
+    """Expressão SQL do dia (AAAA-MM-DD) de uma linha de financeiro (alias `r`)."""
+    return (
+        f"(CASE WHEN {r}.data LIKE '____-__-__%' THEN substr({r}.data, 1, 10) "
+        f"WHEN {r}.data LIKE '__/__/____%' THEN "
+        f"substr({r}.data, 7, 4) || '-' || substr({r}.data, 4, 2) || '-' || substr({r}.data, 1, 2) "
+        f"ELSE '' END)"
+    )
+
+
+def _chaves(r: str) -> Dict[str, str]:
+    return {
+        'dia': _dia(r),
+        'mes': f"substr({_dia(r)}, 1, 7)",
+        'tipo': f"COALESCE({r}.tipo, '')",
+        'categoria': f"COALESCE({r}.categoria, '')",
+        'status_pagamento': f"COALESCE({r}.status_pagamento, '')",
+        'id_cliente': f"COALESCE({r}.id_cliente, 0)",
+        'valor': f"COALESCE({r}.valor, 0)",
+    }
+
+
+def _sql_aplicar(r: str, sinal: int) -> List[str]:
+    """
+    Comandos que somam (sinal=1) ou subtraem (sinal=-1) a linha `r`
+    (new/old) dos dois rollups, removendo grupos que ficaram vazios.
+    """
+    k = _chaves(r)
+    valor = k['valor'] if sinal > 0 else f"-{k['valor']}"
+    return [
+        f"""INSERT INTO {TABELA_DIA} (dia, tipo, categoria, status_pagamento, total, qtd)
+            VALUES ({k['dia']}, {k['tipo']}, {k['categoria']}, {k['status_pagamento']}, {valor}, {sinal})
+            ON CONFLICT (dia, tipo, categoria, status_pagamento) DO UPDATE SET
+                total = {TABELA_DIA}.total + excluded.total,
+                qtd = {TABELA_DIA}.qtd + excluded.qtd""",
+        f"""INSERT INTO {TABELA_CLIENTE_MES} (id_cliente, mes, tipo, status_pagamento, total, qtd)
+            VALUES ({k['id_cliente']}, {k['mes']}, {k['tipo']}, {k['status_pagamento']}, {valor}, {sinal})
+            ON CONFLICT (id_cliente, mes, tipo, status_pagamento) DO UPDATE SET
+                total = {TABELA_CLIENTE_MES}.total + excluded.total,
+                qtd = {TABELA_CLIENTE_MES}.qtd + excluded.qtd""",
+    ] + ([
+        f"""DELETE FROM {TABELA_DIA} WHERE qtd <= 0 AND dia = {k['dia']} AND tipo = {k['tipo']}
+            AND categoria = {k['categoria']} AND status_pagamento = {k['status_pagamento']}""",
+        f"""DELETE FROM {TABELA_CLIENTE_MES} WHERE qtd <= 0 AND id_cliente = {k['id_cliente']}
+            AND mes = {k['mes']} AND tipo = {k['tipo']} AND status_pagamento = {k['status_pagamento']}""",
+    ] if sinal < 0 else [])
+
+
+def _sql_agregar_dia() -> str:
+    k = _chaves('f')
+    return f"""
+        SELECT dia, tipo, categoria, status_pagamento, SUM(valor) AS total, COUNT(*) AS qtd
+        FROM (
+            SELECT {k['dia']} AS dia, {k['tipo']} AS tipo, {k['categoria']} AS categoria,
+                   {k['status_pagamento']} AS status_pagamento, {k['valor']} AS valor
+            FROM financeiro f
+        ) x
+        GROUP BY dia, tipo, categoria, status_pagamento
+    """
+
+
+def _sql_agregar_cliente_mes() -> str:
+    k = _chaves('f')
+    return f"""
+        SELECT id_cliente, mes, tipo, status_pagamento, SUM(valor) AS total, COUNT(*) AS qtd
+        FROM (
+            SELECT {k['id_cliente']} AS id_cliente, {k['mes']} AS mes, {k['tipo']} AS tipo,
+                   {k['status_pagamento']} AS status_pagamento, {k['valor']} AS valor
+            FROM financeiro f
+        ) x
+        GROUP BY id_cliente, mes, tipo, status_pagamento
+    """
+
+
+# =====================================================
+# CRIAÇÃO (chamado pela migração de schema)
+# =====================================================
+
+def criar_estrutura(cursor):
+    """Cria as tabelas de rollup, os triggers e popula a partir do livro-caixa."""
+    tipo_total = 'DOUBLE PRECISION' if adapter.USE_POSTGRES else 'REAL'
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TABELA_DIA} (
+            dia TEXT NOT NULL,
+            tipo TEXT NOT NULL,
+            categoria TEXT NOT NULL,
+            status_pagamento TEXT NOT NULL,
+            total {tipo_total} NOT NULL DEFAULT 0,
+            qtd INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dia, tipo, categoria, status_pagamento)
+        )
+    """)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TABELA_CLIENTE_MES} (
+            id_cliente INTEGER NOT NULL,
+            mes TEXT NOT NULL,
+            tipo TEXT NOT NULL,
+            status_pagamento TEXT NOT NULL,
+            total {tipo_total} NOT NULL DEFAULT 0,
+            qtd INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (id_cliente, mes, tipo, status_pagamento)
+        )
+    """)
+    cursor.execute(
+        f"CREATE INDEX IF NOT EXISTS idx_{TABELA_CLIENTE_MES}_mes ON {TABELA_CLIENTE_MES}(mes)"
+    )
+
+    if adapter.USE_POSTGRES:
+        _criar_trigger_postgres(cursor)
+    else:
+        _criar_triggers_sqlite(cursor)
+
+    _reconstruir(cursor)
+
+
+def _criar_triggers_sqlite(cursor):
+    colunas = ', '.join(COLUNAS_ORIGEM)
+    corpo = lambda comandos: ''.join(f"{c};\n" for c in comandos)
+
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS fin_rollup_ai AFTER INSERT ON financeiro BEGIN
+            {corpo(_sql_aplicar('new', 1))}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS fin_rollup_ad AFTER DELETE ON financeiro BEGIN
+            {corpo(_sql_aplicar('old', -1))}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS fin_rollup_au AFTER UPDATE OF {colunas} ON financeiro BEGIN
+            {corpo(_sql_aplicar('old', -1))}
+            {corpo(_sql_aplicar('new', 1))}
+        END
+    """)
+
+
+def _criar_trigger_postgres(cursor):
+    remover = ''.join(f"{c};\n" for c in _sql_aplicar('OLD', -1))
+    somar = ''.join(f"{c};\n" for c in _sql_aplicar('NEW', 1))
+    cursor.execute(f"""
+        CREATE OR REPLACE FUNCTION fin_rollup_trg() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                {remover}
+            END IF;
+            IF TG_OP IN ('UPDATE', 'INSERT') THEN
+                {somar}
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    cursor.execute("DROP TRIGGER IF EXISTS fin_rollup ON financeiro")
+    cursor.execute(f"""
+        CREATE TRIGGER fin_rollup
+        AFTER INSERT OR DELETE OR UPDATE OF {', '.join(COLUNAS_ORIGEM)} ON financeiro
+        FOR EACH ROW EXECUTE FUNCTION fin_rollup_trg()
+    """)
+
+
+# =====================================================
+# MANUTENÇÃO
+# =====================================================
+
+def _reconstruir(cursor):
+    cursor.execute(f"DELETE FROM {TABELA_DIA}")
+    cursor.execute(f"""
+        INSERT INTO {TABELA_DIA} (dia, tipo, categoria, status_pagamento, total, qtd)
+        {_sql_agregar_dia()}
+    """)
+    cursor.execute(f"DELETE FROM {TABELA_CLIENTE_MES}")
+    cursor.execute(f"""
+        INSERT INTO {TABELA_CLIENTE_MES} (id_cliente, mes, tipo, status_pagamento, total, qtd)
+        {_sql_agregar_cliente_mes()}
+    """)
+
+
+def reconstruir():
+    """Recalcula os rollups a partir do livro-caixa (em uma transação)."""
+    with adapter.get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            _reconstruir(cursor)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    query_cache.invalidar(TABELA_DIA)
+    query_cache.invalidar(TABELA_CLIENTE_MES)
+    logger.info("Rollups financeiros reconstruídos")
+
+
+def _diferencas(esperado: pd.DataFrame, atual: pd.DataFrame, chaves: List[str]) -> pd.DataFrame:
+    colunas = chaves + ['total', 'qtd']
+    esperado = esperado if not esperado.empty else pd.DataFrame(columns=colunas)
+    atual = atual if not atual.empty else pd.DataFrame(columns=colunas)
+    df = esperado[colunas].merge(atual[colunas], on=chaves, how='outer', suffixes=('_livro', '_rollup'))
+    df = df.fillna({'total_livro': 0, 'total_rollup': 0, 'qtd_livro': 0, 'qtd_rollup': 0})
+    divergente = ((df['total_livro'].astype(float) - df['total_rollup'].astype(float)).abs() > TOLERANCIA) | \
+                 (df['qtd_livro'].astype(int) != df['qtd_rollup'].astype(int))
+    return df[divergente]
+
+
+def verificar_consistencia() -> Dict:
+    """
+    Compara os rollups com o agregado calculado do livro-caixa.
+
+    Returns:
+        {'ok': bool, 'divergencias_dia': int, 'divergencias_cliente_mes': int,
+         'amostra': lista com até 10 grupos divergentes}
+    """
+    db = adapter.get_adapter()
+    rows = lambda sql: pd.DataFrame([dict(r) for r in db.fetch_all(sql)])
+
+    div_dia = _diferencas(
+        rows(_sql_agregar_dia()), rows(f"SELECT * FROM {TABELA_DIA}"),
+        ['dia', 'tipo', 'categoria', 'status_pagamento']
+    )
+    div_cli = _diferencas(
+        rows(_sql_agregar_cliente_mes()), rows(f"SELECT * FROM {TABELA_CLIENTE_MES}"),
+        ['id_cliente', 'mes', 'tipo', 'status_pagamento']
+    )
+    resultado = {
+        'ok': div_dia.empty and div_cli.empty,
+        'divergencias_dia': len(div_dia),
+        'divergencias_cliente_mes': len(div_cli),
+        'amostra': (div_dia.head(5).to_dict('records') + div_cli.head(5).to_dict('records')),
+    }
+    if not resultado['ok']:
+        logger.warning(
+            f"Rollups financeiros divergentes: {resultado['divergencias_dia']} (dia), "
+            f"{resultado['divergencias_cliente_mes']} (cliente/mês)"
+        )
+    return resultado
+
+
+def disponivel() -> bool:
+    """True se as tabelas de rollup existem no banco atual (resultado memorizado)."""
+    global _disponivel
+    if _disponivel is not None:
+        return _disponivel
+    try:
+        if adapter.USE_POSTGRES:
+            row = adapter.get_adapter().fetch_one(
+                "SELECT 1 AS ok FROM information_schema.tables WHERE table_name = %s", (TABELA_DIA,)
+            )
+        else:
+            row = adapter.get_adapter().fetch_one(
+                "SELECT 1 AS ok FROM sqlite_master WHERE type = 'table' AND name = ?", (TABELA_DIA,)
+            )
+        _disponivel = row is not None
+    except Exception as e:
+        logger.debug(f"Não foi possível verificar rollups financeiros: {e}")
+        _disponivel = False
+    return _disponivel
+
+
+def reset_flag():
+    """Força nova verificação das tabelas (ex.: após restaurar backup)."""
+    global _disponivel
+    _disponivel = None
+
+
+# =====================================================
+# CONSULTAS
+# =====================================================
+
+def _iso(valor) -> str:
+    if isinstance(valor, (date, datetime)):
+        return valor.strftime('%Y-%m-%d')
+    return str(valor)[:10]
+
+
+def _consultar(sql: str, params: tuple) -> pd.DataFrame:
+    import database as db
+    return db.sql_get_query(sql, params, cache=True)
+
+
+def _fonte_dia() -> str:
+    """Tabela com o agregado diário (rollup ou, na falta dele, o livro-caixa agregado)."""
+    return TABELA_DIA if disponivel() else f"({_sql_agregar_dia()}) agg"
+
+
+def fluxo_diario(data_inicio, data_fim) -> pd.DataFrame:
+    """
+    Agregado por dia x tipo x categoria x status no período (inclusive).
+
+    Returns:
+        DataFrame dia, tipo, categoria, status_pagamento, total, qtd
+    """
+    return _consultar(
+        f"SELECT dia, tipo, categoria, status_pagamento, total, qtd FROM {_fonte_dia()} "
+        f"WHERE dia BETWEEN ? AND ? ORDER BY dia",
+        (_iso(data_inicio), _iso(data_fim))
+    )
+
+
+def fluxo_mensal(data_inicio, data_fim) -> pd.DataFrame:
+    """
+    Agregado por mês x tipo x status no período (inclusive).
+
+    Returns:
+        DataFrame mes ('AAAA-MM'), tipo, status_pagamento, total, qtd
+    """
+    return _consultar(
+        f"SELECT substr(dia, 1, 7) AS mes, tipo, status_pagamento, SUM(total) AS total, SUM(qtd) AS qtd "
+        f"FROM {_fonte_dia()} WHERE dia BETWEEN ? AND ? "
+        f"GROUP BY substr(dia, 1, 7), tipo, status_pagamento ORDER BY mes",
+        (_iso(data_inicio), _iso(data_fim))
+    )
+
+
+def dre(data_inicio, data_fim) -> pd.DataFrame:
+    """
+    Totais pagos por tipo e categoria no período (base do DRE).
+
+    Returns:
+        DataFrame tipo, categoria, total (categoria vazia = None)
+    """
+    df = _consultar(
+        f"SELECT tipo, categoria, SUM(total) AS total FROM {_fonte_dia()} "
+        f"WHERE dia BETWEEN ? AND ? AND status_pagamento = 'Pago' "
+        f"GROUP BY tipo, categoria",
+        (_iso(data_inicio), _iso(data_fim))
+    )
+    if not df.empty:
+        df['categoria'] = df['categoria'].replace('', None)
+    return df
+
+
+def _meses_completos(inicio: date, fim: date) -> Tuple[Optional[str], Optional[str]]:
+    """Primeiro e último mês ('AAAA-MM') inteiramente contidos no período."""
+    primeiro = inicio if inicio.day == 1 else (inicio.replace(day=28) + timedelta(days=4)).replace(day=1)
+    fim_mes = (fim.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    ultimo = fim if fim == fim_mes else fim.replace(day=1) - timedelta(days=1)
+    if primeiro > ultimo:
+        return None, None
+    return primeiro.strftime('%Y-%m'), ultimo.strftime('%Y-%m')
+
+
+def rentabilidade_clientes(data_inicio, data_fim) -> pd.DataFrame:
+    """
+    Receita e despesa pagas por cliente no período.
+
+    Meses completos vêm de fin_rollup_cliente_mes; as pontas parciais do
+    período (ex.: 15/01 a 31/01) são somadas direto do livro-caixa.
+
+    Returns:
+        DataFrame cliente, receita, despesa
+    """
+    inicio = datetime.strptime(_iso(data_inicio), '%Y-%m-%d').date()
+    fim = datetime.strptime(_iso(data_fim), '%Y-%m-%d').date()
+    soma_cliente = (
+        "SUM(CASE WHEN tipo = 'Entrada' THEN {v} ELSE 0 END) AS receita, "
+        "SUM(CASE WHEN tipo = 'Saída' THEN {v} ELSE 0 END) AS despesa"
+    )
+
+    partes = []
+    faixas_livro = []
+    mes_ini, mes_fim = _meses_completos(inicio, fim) if disponivel() else (None, None)
+    if mes_ini:
+        partes.append(_consultar(
+            f"SELECT id_cliente, {soma_cliente.format(v='total')} FROM {TABELA_CLIENTE_MES} "
+            f"WHERE mes BETWEEN ? AND ? AND status_pagamento = 'Pago' AND id_cliente <> 0 "
+            f"GROUP BY id_cliente",
+            (mes_ini, mes_fim)
+        ))
+        primeiro_dia = datetime.strptime(mes_ini + '-01', '%Y-%m-%d').date()
+        ultimo_dia = (datetime.strptime(mes_fim + '-28', '%Y-%m-%d').date() + timedelta(days=4)).replace(day=1)
+        if inicio < primeiro_dia:
+            faixas_livro.append((inicio, primeiro_dia))
+        if ultimo_dia <= fim:
+            faixas_livro.append((ultimo_dia, fim + timedelta(days=1)))
+    else:
+        faixas_livro.append((inicio, fim + timedelta(days=1)))
+
+    for de, ate in faixas_livro:
+        partes.append(_consultar(
+            f"SELECT id_cliente, {soma_cliente.format(v='valor')} FROM financeiro f "
+            f"WHERE {_dia('f')} >= ? AND {_dia('f')} < ? "
+            f"AND status_pagamento = 'Pago' AND id_cliente IS NOT NULL "
+            f"GROUP BY id_cliente",
+            (_iso(de), _iso(ate))
+        ))
+
+    partes = [p for p in partes if not p.empty]
+    if not partes:
+        return pd.DataFrame()
+    por_cliente = pd.concat(partes).groupby('id_cliente', as_index=False)[['receita', 'despesa']].sum()
+
+    nomes = _consultar("SELECT id, nome FROM clientes", ())
+    if nomes.empty:
+        return pd.DataFrame()
+    df = por_cliente.merge(nomes, left_on='id_cliente', right_on='id')
+    return df.groupby('nome', as_index=False)[['receita', 'despesa']].sum().rename(columns={'nome': 'cliente'})
+
+
+if __name__ == "__main__":
+    import argparse
+    import database as db
+
+    parser = argparse.ArgumentParser(description="Rollups financeiros (DRE / fluxo de caixa / rentabilidade)")
+    parser.add_argument('--rebuild', action='store_true', help='Recalcular os rollups a partir do livro-caixa')
+    parser.add_argument('--check', action='store_true', help='Comparar rollups com o livro-caixa')
+    args = parser.parse_args()
+
+    db.init_db()
+
+    if args.rebuild:
+        reconstruir()
+        print("✅ Rollups reconstruídos")
+    if args.check or not args.rebuild:
+        resultado = verificar_consistencia()
+        if resultado['ok']:
+            print("✅ Rollups consistentes com o livro-caixa")
+        else:
+            print(f"❌ Divergências: {resultado['divergencias_dia']} (dia), "
+                  f"{resultado['divergencias_cliente_mes']} (cliente/mês)")
+            for item in resultado['amostra']:
+                print(f"   {item}")
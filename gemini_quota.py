@@ -0,0 +1,292 @@
+"""
+Cota Persistente da API Gemini - Sistema Lopes & Ribeiro
+
+Controla o consumo da API do Gemini entre todos os processos que usam o
+mesmo banco (app Streamlit, scheduled_tasks.py, email_scheduler...):
+
+- Livro-razão diário (gemini_cota_diaria): requisições usadas por dia,
+  limite GEMINI_RPD
+- Token bucket por minuto (gemini_token_bucket): capacidade e reposição de
+  GEMINI_RPM fichas por minuto, persistido no banco e atualizado numa
+  transação (BEGIN IMMEDIATE no SQLite, SELECT ... FOR UPDATE no PostgreSQL)
+- Prioridades: chamadas interativas (chat, botões) podem usar toda a cota;
+  as de segundo plano deixam GEMINI_RESERVA_INTERATIVA requisições do dia e
+  uma ficha do bucket livres, e cedem a vez a interativas esperando neste
+  processo
+- Sem ficha disponível a chamada espera a reposição (até
+  GEMINI_ESPERA_INTERATIVA / GEMINI_ESPERA_SEGUNDO_PLANO segundos); além
+  disso levanta CotaEsgotada com `retry_em` para o chamador adiar
+- Um 429 da API esvazia o bucket para todos os processos recuarem
+
+Não chamar dentro de uma db.transaction() aberta: a reserva viraria um
+savepoint da transação de quem chama e a espera a manteria aberta.
+
+Uso:
+    import gemini_quota
+    gemini_quota.adquirir()                      # interativa
+    with gemini_quota.em_segundo_plano():
+        ai.analisar_andamento(...)               # chamadas internas usam a prioridade baixa
+    with gemini_quota.em_segundo_plano(espera_max=0):
+        ...                                      # sem cota agora: CotaEsgotada na hora
+    gemini_quota.status()
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Dict
+
+import database as db
+import database_adapter as adapter
+
+logger = logging.getLogger(__name__)
+
+GEMINI_RPD = int(os.getenv('GEMINI_RPD', '100'))
+GEMINI_RPM = float(os.getenv('GEMINI_RPM', '10'))
+GEMINI_RESERVA_INTERATIVA = int(os.getenv('GEMINI_RESERVA_INTERATIVA', '20'))
+GEMINI_ESPERA_INTERATIVA = float(os.getenv('GEMINI_ESPERA_INTERATIVA', '30'))
+GEMINI_ESPERA_SEGUNDO_PLANO = float(os.getenv('GEMINI_ESPERA_SEGUNDO_PLANO', '120'))
+# Dias de histórico mantidos no livro-razão
+GEMINI_COTA_HISTORICO_DIAS = 30
+
+INTERATIVA = 'interativa'
+SEGUNDO_PLANO = 'segundo_plano'
+
+_local = threading.local()
+_aguardando_lock = threading.Lock()
+_interativas_aguardando = 0
+
+
+class CotaEsgotada(Exception):
+    """Sem cota do Gemini agora; `retry_em` = segundos até valer a pena tentar de novo."""
+
+    def __init__(self, mensagem: str, retry_em: float):
+        super().__init__(mensagem)
+        self.retry_em = retry_em
+
+
+def _ph() -> str:
+    return '%s' if adapter.USE_POSTGRES else '?'
+
+
+def _capacidade() -> float:
+    return max(GEMINI_RPM, 1.0)
+
+
+def _reposicao_por_segundo() -> float:
+    return GEMINI_RPM / 60.0
+
+
+# =====================================================
+# PRIORIDADE
+# =====================================================
+
+def prioridade_atual() -> str:
+    return getattr(_local, 'prioridade', INTERATIVA)
+
+
+@contextmanager
+def em_segundo_plano(espera_max: float = None):
+    """
+    Chamadas ao Gemini dentro do bloco (nesta thread) usam prioridade baixa.
+
+    Args:
+        espera_max: Espera máxima por cota dentro do bloco (0 = falhar na
+            hora; padrão GEMINI_ESPERA_SEGUNDO_PLANO). Use 0 em código que
+            roda na thread da requisição do usuário (ex.: handlers de sinais)
+    """
+    anterior = (prioridade_atual(), getattr(_local, 'espera_max', None))
+    _local.prioridade = SEGUNDO_PLANO
+    _local.espera_max = espera_max
+    try:
+        yield
+    finally:
+        _local.prioridade, _local.espera_max = anterior
+
+
+# =====================================================
+# RESERVA
+# =====================================================
+
+def _ler_bucket(cursor, agora: float) -> float:
+    """Fichas disponíveis agora (com a reposição desde a última atualização)."""
+    ph = _ph()
+    trava = " FOR UPDATE" if adapter.USE_POSTGRES else ""
+    cursor.execute(f"SELECT tokens, atualizado_em FROM gemini_token_bucket WHERE id = 1{trava}")
+    row = cursor.fetchone()
+    if row is None:
+        cursor.execute(
+            f"INSERT INTO gemini_token_bucket (id, tokens, atualizado_em) VALUES (1, {ph}, {ph})",
+            (_capacidade(), agora)
+        )
+        return _capacidade()
+    decorrido = max(0.0, agora - float(row['atualizado_em']))
+    return min(_capacidade(), float(row['tokens']) + decorrido * _reposicao_por_segundo())
+
+
+def _gravar_bucket(cursor, tokens: float, agora: float):
+    ph = _ph()
+    cursor.execute(
+        f"UPDATE gemini_token_bucket SET tokens = {ph}, atualizado_em = {ph} WHERE id = 1",
+        (tokens, agora)
+    )
+
+
+def _ler_dia(cursor, dia: str) -> Dict:
+    ph = _ph()
+    cursor.execute(f"SELECT usado, usado_segundo_plano FROM gemini_cota_diaria WHERE dia = {ph}", (dia,))
+    row = cursor.fetchone()
+    if row is None:
+        cursor.execute(
+            f"INSERT INTO gemini_cota_diaria (dia, usado, usado_segundo_plano, atualizado_em) "
+            f"VALUES ({ph}, 0, 0, {ph})",
+            (dia, datetime.now().isoformat())
+        )
+        limite = (date.today() - timedelta(days=GEMINI_COTA_HISTORICO_DIAS)).isoformat()
+        cursor.execute(f"DELETE FROM gemini_cota_diaria WHERE dia < {ph}", (limite,))
+        return {'usado': 0, 'usado_segundo_plano': 0}
+    return {'usado': int(row['usado']), 'usado_segundo_plano': int(row['usado_segundo_plano'])}
+
+
+def segundos_ate_amanha() -> float:
+    """Segundos até a virada do dia (quando a cota diária recomeça)."""
+    amanha = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+    return (amanha - datetime.now()).total_seconds()
+
+
+def _tentar_reservar(custo: int, prioridade: str) -> float:
+    """
+    Uma tentativa de reserva (transação curta).
+
+    Returns:
+        0 se reservou; senão segundos até a próxima ficha
+
+    Raises:
+        CotaEsgotada: limite do dia atingido para esta prioridade
+    """
+    dia = date.today().isoformat()
+    agora = time.time()
+    segundo_plano = prioridade == SEGUNDO_PLANO
+    ph = _ph()
+    with db.transaction(), db.get_connection() as conn:
+        cursor = conn.cursor()
+        uso = _ler_dia(cursor, dia)
+        limite_dia = GEMINI_RPD - (GEMINI_RESERVA_INTERATIVA if segundo_plano else 0)
+        if uso['usado'] + custo > limite_dia:
+            raise CotaEsgotada(
+                f"Limite diário de quota do Gemini atingido ({uso['usado']}/{GEMINI_RPD})",
+                retry_em=segundos_ate_amanha()
+            )
+
+        tokens = _ler_bucket(cursor, agora)
+        # Segundo plano deixa uma ficha para quem está na frente da tela
+        necessario = custo + (1 if segundo_plano else 0)
+        if tokens < min(necessario, _capacidade()):
+            return (min(necessario, _capacidade()) - tokens) / _reposicao_por_segundo()
+
+        _gravar_bucket(cursor, tokens - custo, agora)
+        cursor.execute(
+            f"UPDATE gemini_cota_diaria SET usado = usado + {ph}, "
+            f"usado_segundo_plano = usado_segundo_plano + {ph}, atualizado_em = {ph} WHERE dia = {ph}",
+            (custo, custo if segundo_plano else 0, datetime.now().isoformat(), dia)
+        )
+    return 0.0
+
+
+def adquirir(custo: int = 1, prioridade: str = None, espera_max: float = None):
+    """
+    Reserva `custo` requisições, esperando a reposição do bucket se preciso.
+
+    Args:
+        custo: Requisições a consumir
+        prioridade: INTERATIVA ou SEGUNDO_PLANO (padrão: a da thread, ver em_segundo_plano)
+        espera_max: Espera máxima em segundos (padrão: a de em_segundo_plano
+            ou conforme a prioridade)
+
+    Raises:
+        CotaEsgotada: cota do dia esgotada ou espera maior que espera_max
+    """
+    global _interativas_aguardando
+    prioridade = prioridade or prioridade_atual()
+    if espera_max is None and prioridade == SEGUNDO_PLANO:
+        espera_max = getattr(_local, 'espera_max', None)
+    if espera_max is None:
+        espera_max = GEMINI_ESPERA_INTERATIVA if prioridade == INTERATIVA else GEMINI_ESPERA_SEGUNDO_PLANO
+    limite = time.monotonic() + espera_max
+    interativa = prioridade == INTERATIVA
+
+    if interativa:
+        with _aguardando_lock:
+            _interativas_aguardando += 1
+    try:
+        while True:
+            if not interativa and _interativas_aguardando:
+                espera = 0.5
+            else:
+                espera = _tentar_reservar(custo, prioridade)
+                if not espera:
+                    return
+            restante = limite - time.monotonic()
+            if espera > restante:
+                raise CotaEsgotada(
+                    f"Limite de requisições por minuto do Gemini (quota); nova ficha em {espera:.0f}s",
+                    retry_em=espera
+                )
+            time.sleep(min(espera, 1.0))
+    finally:
+        if interativa:
+            with _aguardando_lock:
+                _interativas_aguardando -= 1
+
+
+def registrar_429():
+    """A API recusou por cota: esvazia o bucket para todos os processos recuarem."""
+    try:
+        with db.transaction(), db.get_connection() as conn:
+            cursor = conn.cursor()
+            _ler_bucket(cursor, time.time())
+            _gravar_bucket(cursor, 0.0, time.time())
+    except Exception as e:
+        logger.error(f"Erro ao registrar 429 do Gemini: {e}")
+
+
+# =====================================================
+# CONSULTA
+# =====================================================
+
+def restante_hoje(prioridade: str = INTERATIVA) -> int:
+    """Requisições ainda disponíveis hoje para a prioridade."""
+    return status()['restante_interativa' if prioridade == INTERATIVA else 'restante_segundo_plano']
+
+
+def status() -> Dict:
+    """Uso do dia, fichas do bucket e quanto resta por prioridade."""
+    ph = _ph()
+    dia = date.today().isoformat()
+    uso = db.sql_get_query(
+        f"SELECT usado, usado_segundo_plano FROM gemini_cota_diaria WHERE dia = {ph}", (dia,)
+    )
+    usado = int(uso.iloc[0]['usado']) if not uso.empty else 0
+    usado_segundo_plano = int(uso.iloc[0]['usado_segundo_plano']) if not uso.empty else 0
+
+    bucket = db.sql_get_query("SELECT tokens, atualizado_em FROM gemini_token_bucket WHERE id = 1")
+    if bucket.empty:
+        tokens = _capacidade()
+    else:
+        decorrido = max(0.0, time.time() - float(bucket.iloc[0]['atualizado_em']))
+        tokens = min(_capacidade(), float(bucket.iloc[0]['tokens']) + decorrido * _reposicao_por_segundo())
+
+    return {
+        'dia': dia,
+        'usado': usado,
+        'usado_segundo_plano': usado_segundo_plano,
+        'limite_dia': GEMINI_RPD,
+        'restante_interativa': max(0, GEMINI_RPD - usado),
+        'restante_segundo_plano': max(0, GEMINI_RPD - GEMINI_RESERVA_INTERATIVA - usado),
+        'fichas': round(tokens, 2),
+        'rpm': GEMINI_RPM,
+        'proxima_ficha_s': 0.0 if tokens >= 1 else round((1 - tokens) / _reposicao_por_segundo(), 1),
+    }
@@ -0,0 +1,288 @@
+"""
+Consultor de Índices - Sistema Lopes & Ribeiro
+
+Observa as consultas de leitura registradas pelo query_profiler, agrupa-as
+por formato (literais trocados por '?') e, para as lentas, executa EXPLAIN
+(QUERY PLAN) uma única vez por formato. Varreduras completas de tabela
+viram sugestões de índice montadas a partir dos predicados do WHERE:
+colunas de igualdade primeiro, depois a de intervalo (ou a do ORDER BY).
+
+Features:
+- Registro leve (perf_counter + regex), limitado a ADVISOR_MAX_CONSULTAS formatos
+- EXPLAIN apenas para consultas acima de ADVISOR_SLOW_MS, em segundo plano
+- Sugestões ignoram índices já existentes com as mesmas colunas iniciais
+
+Uso:
+    import index_advisor
+    for item in index_advisor.relatorio():
+        print(item['consulta'], item['sugestoes'])
+"""
+
+import logging
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import database_adapter as adapter
+from query_profiler import em_segundo_plano, impressao_digital, sem_registro
+
+logger = logging.getLogger(__name__)
+
+ADVISOR_ATIVO = os.getenv('INDEX_ADVISOR', '1') != '0'
+ADVISOR_SLOW_MS = float(os.getenv('ADVISOR_SLOW_MS', '50'))
+ADVISOR_MAX_CONSULTAS = int(os.getenv('ADVISOR_MAX_CONSULTAS', '500'))
+
+_lock = threading.Lock()
+_consultas: Dict[str, Dict] = {}
+
+_RE_ESPACOS = re.compile(r'\s+')
+_RE_TABELAS = re.compile(
+    r'\b(?:FROM|JOIN)\s+([A-Za-z_][A-Za-z0-9_]*)(?:\s+(?:AS\s+)?([A-Za-z_][A-Za-z0-9_]*))?',
+    re.IGNORECASE
+)
+_RE_WHERE = re.compile(
+    r'\bWHERE\b(.*?)(?:\bGROUP\s+BY\b|\bORDER\s+BY\b|\bLIMIT\b|\bUNION\b|\)\s*$|$)',
+    re.IGNORECASE | re.DOTALL
+)
+_RE_PREDICADO = re.compile(
+    r'(?:\b([A-Za-z_][A-Za-z0-9_]*)\.)?\b([A-Za-z_][A-Za-z0-9_]*)\s*'
+    r'(=|!=|<>|<=|>=|<|>|\bNOT\s+LIKE\b|\bLIKE\b|\bNOT\s+IN\b|\bIN\b|\bBETWEEN\b|\bIS\b)',
+    re.IGNORECASE
+)
+_RE_ORDER_BY = re.compile(
+    r'\bORDER\s+BY\s+(?:([A-Za-z_][A-Za-z0-9_]*)\.)?([A-Za-z_][A-Za-z0-9_]*)',
+    re.IGNORECASE
+)
+# SQLite: "SCAN financeiro" / "SCAN TABLE financeiro AS f" (sem USING INDEX)
+_RE_SCAN_SQLITE = re.compile(r'^SCAN (?:TABLE )?([A-Za-z_][A-Za-z0-9_]*)', re.IGNORECASE)
+# PostgreSQL: "Seq Scan on financeiro f"
+_RE_SCAN_PG = re.compile(r'Seq Scan on ([A-Za-z_][A-Za-z0-9_]*)', re.IGNORECASE)
+
+_PALAVRAS_SQL = {
+    'and', 'or', 'not', 'null', 'case', 'when', 'then', 'else', 'end',
+    'lower', 'upper', 'date', 'coalesce', 'cast', 'strftime', 'extract',
+    'select', 'from', 'where', 'exists',
+}
+_PALAVRAS_JUNCAO = {'on', 'join', 'left', 'right', 'inner', 'outer', 'order', 'group', 'limit'}
+_OPERADORES_IGUALDADE = {'=', 'in', 'is'}
+
+
+# =====================================================
+# REGISTRO
+# =====================================================
+
+def registrar(sql: str, params, duracao_ms: float):
+    """
+    Registra uma execução de leitura (chamado pelo query_profiler).
+
+    Args:
+        sql: Consulta no formato do banco atual
+        params: Parâmetros usados (para o EXPLAIN)
+        duracao_ms: Tempo de execução em milissegundos
+    """
+    if not ADVISOR_ATIVO:
+        return
+    formato = impressao_digital(sql)
+    with _lock:
+        item = _consultas.get(formato)
+        if item is None:
+            if len(_consultas) >= ADVISOR_MAX_CONSULTAS:
+                return
+            item = _consultas[formato] = {
+                'consulta': formato,
+                'chamadas': 0,
+                'tempo_total_ms': 0.0,
+                'tempo_max_ms': 0.0,
+                'plano': None,
+            }
+        item['chamadas'] += 1
+        item['tempo_total_ms'] += duracao_ms
+        item['tempo_max_ms'] = max(item['tempo_max_ms'], duracao_ms)
+        analisar = duracao_ms >= ADVISOR_SLOW_MS and item['plano'] is None
+        if analisar:
+            item['plano'] = []  # reserva: evita EXPLAIN concorrente do mesmo formato
+
+    # EXPLAIN no worker do profiler, fora do caminho da consulta
+    if analisar and not em_segundo_plano(lambda: _analisar(item, sql, params)):
+        with _lock:
+            item['plano'] = None  # fila cheia: tenta de novo na próxima execução lenta
+
+
+def _analisar(item: Dict, sql: str, params):
+    plano = explicar(sql, params)
+    with _lock:
+        item['plano'] = plano
+
+
+def explicar(sql: str, params=None) -> List[str]:
+    """Executa EXPLAIN (QUERY PLAN) e retorna as linhas do plano."""
+    try:
+        with sem_registro():
+            if adapter.USE_POSTGRES:
+                rows = adapter.get_adapter().fetch_all(f"EXPLAIN {sql}", params)
+                return [list(dict(r).values())[0] for r in rows]
+            rows = adapter.get_adapter().fetch_all(f"EXPLAIN QUERY PLAN {sql}", params)
+            return [dict(r)['detail'] for r in rows]
+    except Exception as e:
+        logger.debug(f"EXPLAIN falhou: {e}")
+        return []
+
+
+# =====================================================
+# ANÁLISE
+# =====================================================
+
+def tabelas_varridas(plano: List[str], sql: str = '') -> List[str]:
+    """Tabelas lidas por varredura completa segundo o plano (aliases resolvidos)."""
+    _, aliases = _aliases(sql)
+    varridas = []
+    for linha in plano:
+        texto = str(linha).strip()
+        if adapter.USE_POSTGRES:
+            m = _RE_SCAN_PG.search(texto)
+        else:
+            m = _RE_SCAN_SQLITE.match(texto)
+            if m and ' USING ' in texto.upper():
+                m = None
+        if m:
+            tabela = aliases.get(m.group(1).lower(), m.group(1))
+            if tabela not in varridas:
+                varridas.append(tabela)
+    return varridas
+
+
+def _aliases(sql: str) -> Tuple[List[str], Dict[str, str]]:
+    """Tabelas do FROM/JOIN e o mapa alias -> tabela."""
+    tabelas = []
+    aliases = {}
+    for tabela, alias in _RE_TABELAS.findall(sql):
+        tabelas.append(tabela)
+        aliases[tabela.lower()] = tabela
+        if alias and alias.lower() not in _PALAVRAS_SQL | _PALAVRAS_JUNCAO:
+            aliases[alias.lower()] = tabela
+    return tabelas, aliases
+
+
+def extrair_predicados(sql: str) -> Dict[str, List[Tuple[str, str]]]:
+    """
+    Colunas filtradas no WHERE, por tabela.
+
+    Returns:
+        {tabela: [(coluna, operador), ...]} na ordem em que aparecem
+    """
+    tabelas, aliases = _aliases(sql)
+    resultado: Dict[str, List[Tuple[str, str]]] = {}
+    m = _RE_WHERE.search(sql)
+    if not m or not tabelas:
+        return resultado
+
+    for prefixo, coluna, operador in _RE_PREDICADO.findall(m.group(1)):
+        if coluna.lower() in _PALAVRAS_SQL:
+            continue
+        if prefixo:
+            tabela = aliases.get(prefixo.lower())
+            if tabela is None:
+                continue
+        elif len(set(tabelas)) == 1:
+            tabela = tabelas[0]
+        else:
+            continue
+        op = _RE_ESPACOS.sub(' ', operador.lower())
+        if all(c != coluna for c, _ in resultado.get(tabela, [])):
+            resultado.setdefault(tabela, []).append((coluna, op))
+    return resultado
+
+
+def _indices_existentes(tabela: str) -> List[List[str]]:
+    """Colunas (em ordem) de cada índice existente na tabela."""
+    db = adapter.get_adapter()
+    indices = []
+    try:
+        with sem_registro():
+            if adapter.USE_POSTGRES:
+                rows = db.fetch_all(
+                    "SELECT indexdef FROM pg_indexes WHERE tablename = %s", (tabela,)
+                )
+                for r in rows:
+                    m = re.search(r'\((.*)\)', dict(r)['indexdef'])
+                    if m:
+                        indices.append([c.strip().strip('"').split()[0] for c in m.group(1).split(',')])
+            else:
+                for idx in db.fetch_all(f"PRAGMA index_list({tabela})"):
+                    cols = db.fetch_all(f"PRAGMA index_info({dict(idx)['name']})")
+                    indices.append([dict(c)['name'] for c in cols])
+        return indices
+    except Exception as e:
+        logger.debug(f"Não foi possível listar índices de {tabela}: {e}")
+        return []
+
+
+def sugerir_indice(sql: str, tabela: str) -> Optional[str]:
+    """
+    Monta o CREATE INDEX sugerido para uma tabela varrida pela consulta.
+
+    Igualdades primeiro; em seguida a primeira coluna de intervalo ou, na
+    falta dela, a coluna do ORDER BY. LIKE/NOT IN/!= não entram (não usam
+    índice B-tree de forma útil).
+    """
+    predicados = extrair_predicados(sql).get(tabela, [])
+    igualdades = [c for c, op in predicados if op in _OPERADORES_IGUALDADE]
+    intervalos = [c for c, op in predicados if op in {'<', '>', '<=', '>=', 'between'}]
+
+    colunas = list(igualdades)
+    if intervalos:
+        colunas.append(intervalos[0])
+    else:
+        m = _RE_ORDER_BY.search(sql)
+        if m and m.group(2) not in colunas:
+            _, aliases = _aliases(sql)
+            if m.group(1) is None or aliases.get(m.group(1).lower()) == tabela:
+                colunas.append(m.group(2))
+    if not colunas:
+        return None
+
+    for existente in _indices_existentes(tabela):
+        if existente[:len(colunas)] == colunas:
+            return None
+    return f"CREATE INDEX IF NOT EXISTS idx_{tabela}_{'_'.join(colunas)} ON {tabela}({', '.join(colunas)})"
+
+
+# =====================================================
+# RELATÓRIO
+# =====================================================
+
+def relatorio() -> List[Dict]:
+    """
+    Consultas lentas com varredura completa e o índice sugerido.
+
+    Returns:
+        Lista ordenada por tempo total: consulta, chamadas, tempo_total_ms,
+        tempo_max_ms, tabelas_varridas, sugestoes
+    """
+    with _lock:
+        itens = [dict(i) for i in _consultas.values() if i['plano']]
+
+    saida = []
+    for item in itens:
+        varridas = tabelas_varridas(item['plano'], item['consulta'])
+        if not varridas:
+            continue
+        sugestoes = [s for s in (sugerir_indice(item['consulta'], t) for t in varridas) if s]
+        saida.append({
+            'consulta': item['consulta'],
+            'chamadas': item['chamadas'],
+            'tempo_total_ms': round(item['tempo_total_ms'], 2),
+            'tempo_max_ms': round(item['tempo_max_ms'], 2),
+            'tabelas_varridas': varridas,
+            'sugestoes': sugestoes,
+        })
+    saida.sort(key=lambda i: i['tempo_total_ms'], reverse=True)
+    return saida
+
+
+def limpar():
+    """Descarta as consultas registradas."""
+    with _lock:
+        _consultas.clear()
+
@@ -86,6 +86,8 @@ def anonymize_client(client_id: int, reason: str = "LGPD - Prazo de retenção e
             UPDATE clientes SET
                 nome = ?,
                 cpf_cnpj = '***.***.***-**',
+                cpf_cnpj_bidx = NULL,
+                cpf_cnpj_bidx_prefixo = NULL,
                 email = NULL,
                 telefone = NULL,
                 telefone_fixo = NULL,
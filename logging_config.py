@@ -90,3 +90,7 @@ def get_tasks_logger():
 def get_datajud_logger():
     """Logger para integração DataJud"""
     return get_logger('datajud', 'datajud.log')
+
+def get_slow_query_logger():
+    """Logger para consultas lentas (query_profiler)"""
+    return get_logger('slow_queries', 'slow_queries.log')
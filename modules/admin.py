@@ -5,6 +5,12 @@ import bcrypt
 import re
 import os
 import time
+import crypto
+import crypto_rotacao
+import fila_analise_ia
+import index_advisor
+import query_cache
+import query_profiler
 
 def render():
     st.markdown("<h1 style='color: var(--text-main);'>⚙️ Administração</h1>", unsafe_allow_html=True)
@@ -13,7 +19,7 @@ def render():
     is_admin = st.session_state.role == 'admin'
     
     if is_admin:
-        tab_users, tab_config, tab_audit = st.tabs(["👥 Usuários", "🏢 Configurações", "📝 Auditoria"])
+        tab_users, tab_config, tab_audit, tab_perf = st.tabs(["👥 Usuários", "🏢 Configurações", "📝 Auditoria", "⚡ Performance"])
         
         with tab_users:
             render_usuarios(is_admin=True)
@@ -23,6 +29,9 @@ def render():
             
         with tab_audit:
             render_auditoria()
+        
+        with tab_perf:
+            render_performance()
     else:
         # Usuário comum vê apenas abas relevantes (apenas Usuários no momento per user request)
         # "a aba MEUPERFIL, se confunde com a aba usuarios, deveria ser excluida a aba perfil e tudo se concentrar na ba USUARIOS"
@@ -49,6 +58,9 @@ def render_auditoria():
     with col4:
         limite = st.number_input("Limite", min_value=20, max_value=500, value=100)
     
+    # Incluir eventos ainda na fila de gravação
+    db.flush_auditoria()
+    
     # Construir query
     query = """
         SELECT 
@@ -134,6 +146,151 @@ def render_auditoria():
         st.caption("As alterações começarão a ser registradas automaticamente a partir de agora.")
 
 
+def render_performance():
+    resumo = query_profiler.resumo()
+    
+    st.markdown("### ⚡ Performance do Banco de Dados")
+    st.caption(
+        f"Consultas executadas por este processo desde {resumo['desde']}. "
+        f"Lentas: acima de {query_profiler.SLOW_QUERY_MS:.0f} ms."
+    )
+    
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("Consultas", resumo['consultas'])
+    col2.metric("Tempo Total", f"{resumo['tempo_total_ms'] / 1000:.1f} s")
+    col3.metric("p50", f"{resumo['p50_ms']} ms")
+    col4.metric("p95", f"{resumo['p95_ms']} ms")
+    col5.metric("Lentas", resumo['lentas'])
+    
+    # Sessão atual (por rerun)
+    sessao = query_profiler.sessao()
+    if sessao:
+        st.markdown("#### 🔄 Esta Sessão")
+        atual = sessao['rerun_atual'] or {'consultas': 0, 'tempo_ms': 0}
+        col_s1, col_s2, col_s3, col_s4 = st.columns(4)
+        col_s1.metric("Consultas neste rerun", atual['consultas'])
+        col_s2.metric("Média por rerun", sessao['media_consultas_rerun'])
+        col_s3.metric("p50 da sessão", f"{sessao['p50_ms']} ms")
+        col_s4.metric("p95 da sessão", f"{sessao['p95_ms']} ms")
+        if sessao['reruns']:
+            df_reruns = pd.DataFrame(sessao['reruns'])
+            st.bar_chart(df_reruns.set_index('inicio')['consultas'], height=180)
+    
+    # Cache de resultados (query_cache)
+    cache = query_cache.get_stats()
+    st.markdown("#### 🗃️ Cache de Consultas")
+    col_c1, col_c2, col_c3, col_c4 = st.columns(4)
+    col_c1.metric("Taxa de acerto", f"{cache['taxa_acerto']:.0%}")
+    col_c2.metric("Hits / Misses", f"{cache['hits']} / {cache['misses']}")
+    col_c3.metric("Entradas", cache['entradas'])
+    col_c4.metric("Memória", f"{cache['memoria_mb']} MB")
+    
+    # Cache de descriptografia (crypto.decrypt / decrypt_many)
+    cache_crypto = crypto.get_cache_stats()
+    st.markdown("#### 🔐 Cache de Descriptografia")
+    col_d1, col_d2, col_d3, col_d4 = st.columns(4)
+    col_d1.metric("Taxa de acerto", f"{cache_crypto['taxa_acerto']:.0%}")
+    col_d2.metric("Hits / Misses", f"{cache_crypto['hits']} / {cache_crypto['misses']}")
+    col_d3.metric("Itens", cache_crypto['itens'])
+    col_d4.metric("Erros", cache_crypto['errors'])
+    
+    # Rotação de chaves (recifragem em segundo plano)
+    rotacao = crypto_rotacao.progresso()
+    pendentes_rotacao = sum(rotacao['pendentes'].values())
+    col_r1, col_r2, col_r3 = st.columns([1, 1, 2])
+    col_r1.metric("Chave ativa", f"v{rotacao['versao_ativa']}" if rotacao['versao_ativa'] else "-")
+    col_r2.metric("Em chave antiga", pendentes_rotacao)
+    with col_r3:
+        if rotacao['em_execucao']:
+            st.info("🔄 Recifragem em andamento...")
+        elif rotacao['erro']:
+            st.error(f"Última recifragem falhou: {rotacao['erro']}")
+        if pendentes_rotacao and not rotacao['em_execucao']:
+            if st.button("🔑 Recifrar com a chave ativa", key="perf_rotacao"):
+                crypto_rotacao.iniciar_em_background()
+                st.rerun()
+    for cursor_rotacao in rotacao['cursores']:
+        st.caption(
+            f"{cursor_rotacao['tabela']}.{cursor_rotacao['coluna']} → v{cursor_rotacao['versao_alvo']}: "
+            f"{cursor_rotacao['recifrados']} recifrados, {cursor_rotacao['erros']} erros "
+            f"(até id {cursor_rotacao['ultimo_id']})"
+        )
+    
+    # Fila de análise por IA dos andamentos (DataJud)
+    fila = fila_analise_ia.status()
+    col_f1, col_f2, col_f3, col_f4 = st.columns([1, 1, 1, 2])
+    col_f1.metric("Fila IA pendentes", fila['pendentes'])
+    col_f2.metric("Prontos agora", fila['vencidos'])
+    col_f3.metric("Falharam", fila['falhas'])
+    with col_f4:
+        if fila['em_execucao']:
+            st.info("🤖 Analisando andamentos em lote...")
+        elif fila['erro']:
+            st.error(f"Última execução da fila falhou: {fila['erro']}")
+        elif fila['vencidos'] and st.button("🤖 Processar fila de IA", key="perf_fila_ia"):
+            fila_analise_ia.iniciar_em_background()
+            st.rerun()
+        if fila['falhas'] and st.button("↩️ Reenfileirar falhas", key="perf_fila_ia_falhas"):
+            fila_analise_ia.reenfileirar_falhas()
+            st.rerun()
+    
+    st.markdown("#### 🔝 Consultas Mais Custosas")
+    ordenar = st.radio(
+        "Ordenar por", ["Tempo total", "p95", "Chamadas"], horizontal=True, key="perf_ordenar"
+    )
+    chave = {"Tempo total": 'tempo_total_ms', "p95": 'p95_ms', "Chamadas": 'chamadas'}[ordenar]
+    top = query_profiler.top_consultas(limite=30, ordenar_por=chave)
+    if top:
+        st.dataframe(
+            pd.DataFrame(top)[['consulta', 'chamadas', 'tempo_total_ms', 'p50_ms', 'p95_ms', 'tempo_max_ms', 'linhas', 'origem']],
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "consulta": st.column_config.TextColumn("SQL", width="large"),
+                "chamadas": st.column_config.NumberColumn("Chamadas", width="small"),
+                "tempo_total_ms": st.column_config.NumberColumn("Total (ms)", format="%.1f"),
+                "p50_ms": st.column_config.NumberColumn("p50 (ms)", format="%.2f"),
+                "p95_ms": st.column_config.NumberColumn("p95 (ms)", format="%.2f"),
+                "tempo_max_ms": st.column_config.NumberColumn("Máx (ms)", format="%.2f"),
+                "linhas": st.column_config.NumberColumn("Linhas"),
+                "origem": st.column_config.TextColumn("Origem", width="medium"),
+            }
+        )
+    else:
+        st.info("Nenhuma consulta registrada ainda.")
+    
+    st.markdown("#### 🐢 Consultas Lentas")
+    lentas = query_profiler.consultas_lentas()
+    if lentas:
+        for item in lentas:
+            with st.expander(f"{item['quando']} · {item['tempo_ms']} ms · {item['origem']}"):
+                st.code(item['consulta'], language="sql")
+                if item['plano']:
+                    st.caption("Plano de execução")
+                    st.code("\n".join(str(linha) for linha in item['plano']), language="text")
+    else:
+        st.success("Nenhuma consulta lenta registrada.")
+    
+    st.markdown("#### 🧭 Sugestões de Índice")
+    sugestoes = index_advisor.relatorio()
+    if sugestoes:
+        for item in sugestoes:
+            st.markdown(
+                f"**{', '.join(item['tabelas_varridas'])}** · {item['chamadas']} chamada(s) · "
+                f"{item['tempo_total_ms']} ms no total"
+            )
+            st.caption(item['consulta'][:300])
+            for sugestao in item['sugestoes']:
+                st.code(sugestao, language="sql")
+    else:
+        st.info("Nenhuma varredura completa em consultas lentas.")
+    
+    if st.button("🧹 Zerar Estatísticas", key="perf_limpar"):
+        query_profiler.limpar()
+        index_advisor.limpar()
+        st.rerun()
+
+
 def render_configuracoes():
     st.markdown("### 🏢 Dados do Escritório")
     # ... (Manter código existente de configurações, adicionando logs de auditoria nas ações)
@@ -73,20 +73,16 @@ def render_calendario():
     ultimo_dia = cal.monthrange(ano, mes)[1]
     data_fim = f"{ano}-{mes:02d}-{ultimo_dia}"
     
-    eventos_df = db.get_agenda_eventos()
-    
-    if not eventos_df.empty:
-        # Aplicar filtros
-        eventos_filtrados = eventos_df[
-            (eventos_df['data_evento'] >= data_inicio) &
-            (eventos_df['data_evento'] <= data_fim)
-        ]
-        
-        if filtro_tipo:
-            eventos_filtrados = eventos_filtrados[eventos_filtrados['tipo'].isin(filtro_tipo)]
-        if filtro_status:
-            eventos_filtrados = eventos_filtrados[eventos_filtrados['status'].isin(filtro_status)]
-        if filtro_responsavel:
+    # Período, tipo e status filtrados no banco
+    filtros = {'data_evento >=': data_inicio, 'data_evento <=': data_fim}
+    if filtro_tipo:
+        filtros['tipo in'] = filtro_tipo
+    if filtro_status:
+        filtros['status in'] = filtro_status
+    eventos_filtrados = db.select('agenda', where=filtros)
+    
+    if db.count('agenda') > 0:
+        if filtro_responsavel and not eventos_filtrados.empty:
             eventos_filtrados = eventos_filtrados[
                 eventos_filtrados['responsavel'].str.contains(filtro_responsavel, case=False, na=False)
             ]
@@ -651,7 +647,7 @@ def render_novo_evento():
         descricao = st.text_area("Descrição")
         
         # Vincular a processo (opcional)
-        processos_df = db.sql_get('processos', 'id, acao, cliente_nome')
+        processos_df = db.select('processos', columns=['id', 'acao', 'cliente_nome'], order_by='id', cache=True)
         if not processos_df.empty:
             # Criar lista formatada "[ID] Cliente - Ação" para garantir unicidade
             processos_df['label'] = "[ID: " + processos_df['id'].astype(str) + "] " + processos_df['cliente_nome'] + " - " + processos_df['acao']
@@ -781,7 +777,11 @@ def render_config_google():
                         importados = 0
                         
                         # OTIMIZAÇÃO: Buscar existentes UMA VEZ antes do loop
-                        eventos_existentes = db.sql_get('agenda')
+                        eventos_existentes = db.select(
+                            'agenda',
+                            columns=['google_calendar_id'],
+                            where={'google_calendar_id !=': None}
+                        )
                         ids_existentes = set()
                         if not eventos_existentes.empty and 'google_calendar_id' in eventos_existentes.columns:
                             ids_existentes = set(eventos_existentes['google_calendar_id'].dropna().tolist())
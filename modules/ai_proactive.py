@@ -7,17 +7,22 @@ import logging
 import modules.signals as signals
 import database as db
 import ai_gemini as ai
+import gemini_quota
 from datetime import datetime
 import time
 import random
 
 logger = logging.getLogger(__name__)
 
+# Saídas acima deste valor geram alerta de alta despesa
+LIMITE_SAIDA_ALTA = 5000
+
 def inicializar():
     """Inscreve as funções de IA nos eventos do sistema."""
     signals.subscribe("insert_clientes", analisar_novo_cliente)
     signals.subscribe("insert_processos", analisar_novo_processo)
     signals.subscribe("insert_financeiro", analisar_financeiro)
+    signals.subscribe("bulk_insert_financeiro", analisar_financeiro_lote)
     logger.info("IA Proativa inicializada e escutando eventos.")
 
 def salvar_insight(titulo, descricao, prioridade='media', acao_sugerida=None, link_acao=None):
@@ -36,6 +41,9 @@ def executar_com_retry(func, *args, max_retries=3, **kwargs):
     for attempt in range(max_retries):
         try:
             return func(*args, **kwargs)
+        except gemini_quota.CotaEsgotada:
+            # Sem cota: repetir só atrasaria quem está esperando
+            raise
         except Exception as e:
             if attempt == max_retries - 1:
                 logger.error(f"Falha final após {max_retries} tentativas: {e}")
@@ -77,8 +85,9 @@ def analisar_novo_cliente(payload):
             2. Potenciais demandas jurídicas (baseado na profissão/estado civil)
             3. Tom de voz recomendado
             """
-            # Usando Retry
-            analise = executar_com_retry(ai.chat_assistente, prompt, contexto={"origem": "novo_cliente"})
+            # Roda na thread do usuário: prioridade baixa e sem esperar cota (usa o fallback)
+            with gemini_quota.em_segundo_plano(espera_max=0):
+                analise = executar_com_retry(ai.chat_assistente, prompt, contexto={"origem": "novo_cliente"})
             
             salvar_insight(
                 titulo=f"Análise de Perfil: {nome}",
@@ -124,8 +133,9 @@ def analisar_novo_processo(payload):
             2. Documentos indispensáveis que devem ser solicitados ao cliente.
             3. Riscos comuns neste tipo de demanda.
             """
-            # Usando Retry
-            analise = executar_com_retry(ai.chat_assistente, prompt, contexto={"origem": "novo_processo"})
+            # Roda na thread do usuário: prioridade baixa e sem esperar cota (usa o fallback)
+            with gemini_quota.em_segundo_plano(espera_max=0):
+                analise = executar_com_retry(ai.chat_assistente, prompt, contexto={"origem": "novo_processo"})
             
             salvar_insight(
                 titulo=f"Estratégia Processual: {acao}",
@@ -159,7 +169,7 @@ def analisar_financeiro(payload):
         categoria = data.get('categoria')
         
         # Regra de Valor Alto
-        if tipo == 'Saída' and valor > 5000:
+        if tipo == 'Saída' and valor > LIMITE_SAIDA_ALTA:
             # Análise de Impacto (Gemini)
             try:
                 prompt = f"""
@@ -170,8 +180,9 @@ def analisar_financeiro(payload):
                 
                 Analise se isso é comum para um escritório de advocacia e sugira medidas de controle de fluxo de caixa.
                 """
-                # Usando Retry
-                analise = executar_com_retry(ai.chat_assistente, prompt, contexto={"origem": "financeiro_alto_valor"})
+                # Roda na thread do usuário: prioridade baixa e sem esperar cota (usa o fallback)
+                with gemini_quota.em_segundo_plano(espera_max=0):
+                    analise = executar_com_retry(ai.chat_assistente, prompt, contexto={"origem": "financeiro_alto_valor"})
                 
                 salvar_insight(
                     titulo="Alerta de Alta Despesa",
@@ -193,6 +204,22 @@ def analisar_financeiro(payload):
     except Exception as e:
         logger.error(f"Erro na análise financeira: {e}")
 
+def analisar_financeiro_lote(payload):
+    """Lançamentos em lote (importação, recorrências): analisa as saídas de alto valor."""
+    try:
+        ids = payload.get('ids')
+        if not ids: return
+        
+        df = db.select(
+            'financeiro', columns=['id', 'valor', 'tipo', 'categoria', 'descricao'],
+            where={'id': list(ids), 'tipo': 'Saída', 'valor >': LIMITE_SAIDA_ALTA}
+        )
+        for row in df.to_dict('records'):
+            analisar_financeiro({'id': row['id'], 'data': row})
+            
+    except Exception as e:
+        logger.error(f"Erro na análise financeira em lote: {e}")
+
 def analyze_event(event_type, data):
     """
     Ponto central para análise de eventos.
@@ -393,6 +420,8 @@ Top devedores:
     logger.info(f"=== Geração concluída: {insights_gerados} insights gerados ===")
     return insights_gerados
 
+MSG_FALHA_COPILOTO = "Desculpe, estou com dificuldades para processar sua solicitação no momento. Tente novamente em alguns instantes."
+
 def get_copilot_response(message, context=None):
     """
     Obtém resposta do Copiloto (Gemini).
@@ -403,4 +432,15 @@ def get_copilot_response(message, context=None):
         return executar_com_retry(ai.chat_assistente, message, contexto=context)
     except Exception as e:
         logger.error(f"Erro no Copiloto: {e}")
-        return "Desculpe, estou com dificuldades para processar sua solicitação no momento. Tente novamente em alguns instantes."
+        return MSG_FALHA_COPILOTO
+
+def get_copilot_response_stream(message, context=None):
+    """
+    Resposta do Copiloto em streaming: gera os pedaços do texto conforme
+    chegam do Gemini (para st.write_stream).
+    """
+    try:
+        yield from ai.chat_assistente_stream(message, contexto=context)
+    except Exception as e:
+        logger.error(f"Erro no Copiloto: {e}")
+        yield MSG_FALHA_COPILOTO
@@ -47,32 +47,8 @@ def render():
         render_configuracoes()
 
 def _criar_tabela_config():
-    """Cria tabela de configuração se não existir"""
-    try:
-        db.sql_run("""
-            CREATE TABLE IF NOT EXISTS config_aniversarios (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                dias_antecedencia INTEGER DEFAULT 7,
-                template_mensagem TEXT,
-                ativo INTEGER DEFAULT 1
-            )
-        """)
-        
-        # Tabela de histórico de mensagens enviadas
-        db.sql_run("""
-            CREATE TABLE IF NOT EXISTS historico_aniversarios (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                id_cliente INTEGER NOT NULL,
-                nome_cliente TEXT,
-                data_envio TEXT NOT NULL,
-                tipo_envio TEXT DEFAULT 'whatsapp',
-                ano_referencia INTEGER,
-                sucesso INTEGER DEFAULT 1,
-                observacao TEXT
-            )
-        """)
-    except:
-        pass
+    """Garante as tabelas de configuração/histórico (migração 5 em schema_migrations)"""
+    db.init_db()
 
 def _registrar_envio(id_cliente, nome_cliente, tipo_envio='whatsapp', sucesso=True, observacao=''):
     """Registra envio de mensagem de aniversário"""
@@ -15,6 +15,7 @@ import token_manager as tm
 import utils_email
 import email_templates
 from components.cliente_styles import get_cliente_css
+from components import ui
 
 logger = logging.getLogger(__name__)
 
@@ -312,24 +313,23 @@ def render_novo_cadastro():
          st.button("💾 SALVAR CADASTRO", type="primary", on_click=salvar_cliente_callback, use_container_width=True)
 
 
-def render_gestao_clientes():
-    df = db.sql_get("clientes", order_by="nome ASC")
-    
-    # Prevenir erro de colunas duplicadas que causa "Series is ambiguous"
-    if not df.empty:
-        df = df.loc[:, ~df.columns.duplicated()]
+COLUNAS_LISTAGEM_CLIENTES = ['nome', 'cpf_cnpj', 'telefone', 'status_cliente', 'link_drive']
+# cpf_cnpj é cifrado: documentos são buscados pelo índice cego (db.clientes_por_documento)
+CAMPOS_BUSCA_CLIENTES = ['nome', 'email']
+
 
-    if df.empty:
+def render_gestao_clientes():
+    # --- MÉTRICAS NO TOPO (contagens no banco) ---
+    total_clientes = db.count("clientes", cache=True)
+    if total_clientes == 0:
         st.info("Nenhum cliente cadastrado.")
         return
     
-    # --- MÉTRICAS NO TOPO ---
     col_m1, col_m2, col_m3, col_m4 = st.columns(4)
     
-    total_clientes = len(df)
-    ativos = len(df[df['status_cliente'] == 'ATIVO'])
-    em_negociacao = len(df[df['status_cliente'] == 'EM NEGOCIAÇÃO'])
-    inativos = len(df[df['status_cliente'] == 'INATIVO'])
+    ativos = db.count("clientes", where={'status_cliente': 'ATIVO'}, cache=True)
+    em_negociacao = db.count("clientes", where={'status_cliente': 'EM NEGOCIAÇÃO'}, cache=True)
+    inativos = db.count("clientes", where={'status_cliente': 'INATIVO'}, cache=True)
     
     col_m1.metric("👥 Total", total_clientes)
     col_m2.metric("✅ Ativos", ativos)
@@ -350,10 +350,12 @@ def render_gestao_clientes():
         )
         
         # Filtro por Cidade (dinâmico)
-        cidades_unicas = df['cidade'].dropna().unique().tolist()
+        df_cidades = db.select("clientes", columns=['cidade'], where={'cidade !=': None},
+                               distinct=True, order_by="cidade", cache=True)
+        cidades_unicas = df_cidades['cidade'].tolist() if not df_cidades.empty else []
         filtro_cidade = col_f2.multiselect(
             "Cidade",
-            options=sorted(cidades_unicas),
+            options=cidades_unicas,
             default=[]
         )
         
@@ -364,89 +366,92 @@ def render_gestao_clientes():
             default=[]
         )
     
-    # Aplicar filtros
-    df_filtrado = df.copy()
-    
+    # Filtros aplicados no banco
+    filtros = {}
     if filtro_status:
-        df_filtrado = df_filtrado[df_filtrado['status_cliente'].isin(filtro_status)]
-    
+        filtros['status_cliente in'] = filtro_status
     if filtro_cidade:
-        df_filtrado = df_filtrado[df_filtrado['cidade'].isin(filtro_cidade)]
-    
+        filtros['cidade in'] = filtro_cidade
     if filtro_tipo:
-        df_filtrado = df_filtrado[df_filtrado['tipo_pessoa'].isin(filtro_tipo)]
+        filtros['tipo_pessoa in'] = filtro_tipo
     
     # Busca por texto (SPRINT 3 - #F1: Incluir e-mail na busca)
     pesq = st.text_input("🔍 Buscar Cliente (Nome, CPF, CNPJ ou E-mail):", key="busca_cliente")
-    if pesq:
-        # Tratamento de NaN para evitar erros na busca
-        df_filtrado = df_filtrado[
-            (df_filtrado['nome'].fillna('').str.contains(pesq, case=False)) | 
-            (df_filtrado['cpf_cnpj'].fillna('').str.contains(pesq)) |
-            (df_filtrado['email'].fillna('').str.contains(pesq, case=False))  # ← NOVO: busca por email
-        ]
-    
-    # --- PAGINAÇÃO ---
-    ITENS_POR_PAGINA = 20
-    total_registros = len(df_filtrado)
-    total_paginas = max(1, (total_registros + ITENS_POR_PAGINA - 1) // ITENS_POR_PAGINA)
-    
-    # Controle de página no session_state
-    if 'pagina_atual' not in st.session_state:
-        st.session_state.pagina_atual = 1
     
-    # Resetar página se filtros mudarem
-    if st.session_state.pagina_atual > total_paginas:
-        st.session_state.pagina_atual = 1
+    # CPF/CNPJ (completo ou início): pelo índice cego, sem descriptografar a tabela
+    if db.termo_documento(pesq):
+        ids_documento = db.clientes_por_documento(pesq, limite=500)
+        if ids_documento:
+            filtros['id in'] = ids_documento
+            pesq = ""
     
-    # Calcular índices de slice
-    inicio = (st.session_state.pagina_atual - 1) * ITENS_POR_PAGINA
-    fim = inicio + ITENS_POR_PAGINA
-    
-    df_pagina = df_filtrado.iloc[inicio:fim]
+    # --- PAGINAÇÃO (keyset: só a página visível é carregada) ---
+    ITENS_POR_PAGINA = 20
+    cursor = ui.cursor_pagina("clientes", (filtros, pesq))
+    pagina = db.select_page(
+        "clientes",
+        columns=COLUNAS_LISTAGEM_CLIENTES,
+        where=filtros,
+        search=pesq,
+        search_columns=CAMPOS_BUSCA_CLIENTES,
+        sort="nome",
+        limit=ITENS_POR_PAGINA,
+        after=cursor
+    )
+    df_pagina = pagina['dados']
+    total_registros = pagina['total']
     
     # Preparar DataFrame para visualização
     df_vis = df_pagina.copy()
     
-    # Formatação segura de documentos (descriptografar se necessário)
-    def formatar_doc_seguro(cpf_cnpj):
-        """Descriptografa e formata documento de forma segura"""
+    # Formatação segura de documentos (descriptografados em lote, com cache)
+    def formatar_doc_seguro(cpf_descriptografado):
+        """Formata documento já descriptografado de forma segura"""
         try:
-            # SPRINT 2 - #M4: Usar helper
-            cpf_descriptografado = decrypt_cpf_safe(cpf_cnpj)
-            return ut.formatar_documento(cpf_descriptografado)
+            if crypto.is_encrypted(cpf_descriptografado):
+                return "***ERRO***"
+            return ut.formatar_documento(cpf_descriptografado or "")
         except Exception as e:
-            logger.error(f"Erro ao formatar CPF/CNPJ: {e}")
+            logger.error(f"Erro ao formatar CPF/CNPJ: {type(e).__name__}")
             return "***ERRO***"
     
-    df_vis['Documento'] = df_vis['cpf_cnpj'].apply(formatar_doc_seguro)
-    df_vis['Celular'] = df_vis['telefone'].apply(ut.formatar_celular)
-    df_vis['Status'] = df_vis['status_cliente']
-    
-    # Adicionar coluna de link para o Drive
-    df_vis['Drive'] = df_vis['link_drive'].astype(str).str.strip()
-    # Converter vazios/nan para None para não gerar links quebrados
-    df_vis.loc[df_vis['Drive'].isin(['', 'nan', 'None']), 'Drive'] = None
-
-    # --- SELEÇÃO DE CLIENTE ---
-    opcoes = ["Selecione para Abrir..."] + df_filtrado['nome'].tolist()
-    sel = st.selectbox("Ficha do Cliente:", opcoes, key="select_cliente")
-    
-    if sel != "Selecione para Abrir...":
-        dd = df_filtrado[df_filtrado['nome'] == sel].iloc[0]
-        # Garantir unicidade do índice para evitar Series ambígua
-        if hasattr(dd, 'index') and dd.index.duplicated().any():
-            dd = dd[~dd.index.duplicated(keep='first')]
-        
-        # LGPD: Registrar acesso a dados pessoais
-        try:
-            db.log_acesso_dados("clientes", int(dd['id']), "VIEW")
-        except Exception as e:
-            logger.warning(f"Falha ao registrar log de acesso LGPD: {e}")
+    if not df_vis.empty:
+        df_vis['Documento'] = crypto.decrypt_many(df_vis['cpf_cnpj']).apply(formatar_doc_seguro)
+        df_vis['Celular'] = df_vis['telefone'].apply(ut.formatar_celular)
+        df_vis['Status'] = df_vis['status_cliente']
         
-        # SOLUÇÃO DEFINITIVA: Converter Series para dict para eliminar qualquer ambiguidade
-        dd_dict = dd.to_dict()
-        render_ficha_cliente(dd_dict)
+        # Adicionar coluna de link para o Drive
+        df_vis['Drive'] = df_vis['link_drive'].astype(str).str.strip()
+        # Converter vazios/nan para None para não gerar links quebrados
+        df_vis.loc[df_vis['Drive'].isin(['', 'nan', 'None']), 'Drive'] = None
+
+    # --- SELEÇÃO DE CLIENTE (clientes da página atual; use a busca para os demais) ---
+    ids_pagina = df_pagina['id'].tolist() if not df_pagina.empty else []
+    nomes_pagina = dict(zip(ids_pagina, df_pagina['nome'].tolist())) if ids_pagina else {}
+    sel = st.selectbox(
+        "Ficha do Cliente:",
+        [None] + ids_pagina,
+        format_func=lambda cid: "Selecione para Abrir..." if cid is None else nomes_pagina.get(cid, str(cid)),
+        key="select_cliente"
+    )
+    
+    if sel is not None:
+        df_ficha = db.select("clientes", where={'id': int(sel)}, limit=1)
+        if not df_ficha.empty:
+            dd = df_ficha.iloc[0]
+            # Garantir unicidade do índice para evitar Series ambígua
+            if hasattr(dd, 'index') and dd.index.duplicated().any():
+                dd = dd[~dd.index.duplicated(keep='first')]
+            
+            # LGPD: Registrar acesso a dados pessoais
+            try:
+                db.log_acesso_dados("clientes", int(dd['id']), "VIEW")
+            except Exception as e:
+                logger.warning(f"Falha ao registrar log de acesso LGPD: {e}")
+            
+            # SOLUÇÃO DEFINITIVA: Converter Series para dict para eliminar qualquer ambiguidade
+            dd_dict = dd.to_dict()
+            render_ficha_cliente(dd_dict)
 
     st.markdown("### Base de Clientes")
     
@@ -454,20 +459,24 @@ def render_gestao_clientes():
     col_info, col_export = st.columns([3, 1])
     
     with col_info:
-        st.caption(f"Mostrando {len(df_pagina)} de {total_registros} clientes | Página {st.session_state.pagina_atual} de {total_paginas}")
+        st.caption(f"Mostrando {len(df_pagina)} de {total_registros} clientes")
     
     with col_export:
         # Botão de exportação Excel
         if st.button("📄 Exportar Excel", use_container_width=True):
+            # Selecionar colunas relevantes
+            colunas_export = ['nome', 'cpf_cnpj', 'email', 'telefone', 'telefone_fixo', 
+                            'cidade', 'estado', 'status_cliente', 'data_cadastro']
+            
             # Preparar dados para exportação (todos os filtrados, não apenas a página)
-            df_export = df_filtrado.copy()
-            df_export['Documento'] = df_export['cpf_cnpj'].apply(formatar_doc_seguro)
+            df_export = db.select("clientes", columns=colunas_export, where=filtros,
+                                  search=pesq, search_columns=CAMPOS_BUSCA_CLIENTES,
+                                  order_by="nome ASC")
+            df_export['Documento'] = crypto.decrypt_many(df_export['cpf_cnpj']).apply(formatar_doc_seguro)
             df_export['Celular'] = df_export['telefone'].apply(ut.formatar_celular)
             
-            # Selecionar colunas relevantes
-            colunas_export = ['nome', 'Documento', 'email', 'Celular', 'telefone_fixo', 
-                            'cidade', 'estado', 'status_cliente', 'data_cadastro']
-            df_export_final = df_export[colunas_export]
+            df_export_final = df_export[['nome', 'Documento', 'email', 'Celular', 'telefone_fixo', 
+                                         'cidade', 'estado', 'status_cliente', 'data_cadastro']]
             
             # Renomear colunas para português
             df_export_final.columns = ['Nome', 'CPF/CNPJ', 'E-mail', 'Celular', 'Fixo', 
@@ -489,45 +498,25 @@ def render_gestao_clientes():
                 use_container_width=True
             )
     
-    # Configuração das colunas para o Dataframe
-    st.dataframe(
-        df_vis[['nome', 'Documento', 'Celular', 'Status', 'Drive']], 
-        use_container_width=True,
-        hide_index=True,
-        column_config={
-            "Drive": st.column_config.LinkColumn(
-                "Drive",
-                help="Clique para abrir a pasta do Drive",
-                display_text="📂 Abrir"
-            )
-        }
-    )
+    if df_vis.empty:
+        st.info("Nenhum cliente encontrado com os filtros atuais.")
+    else:
+        # Configuração das colunas para o Dataframe
+        st.dataframe(
+            df_vis[['nome', 'Documento', 'Celular', 'Status', 'Drive']], 
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "Drive": st.column_config.LinkColumn(
+                    "Drive",
+                    help="Clique para abrir a pasta do Drive",
+                    display_text="📂 Abrir"
+                )
+            }
+        )
     
     # Controles de paginação
-    if total_paginas > 1:
-        col_prev, col_page_info, col_next = st.columns([1, 2, 1])
-        
-        with col_prev:
-            if st.button("⬅️ Anterior", disabled=st.session_state.pagina_atual == 1, use_container_width=True):
-                st.session_state.pagina_atual -= 1
-                st.rerun()
-        
-        with col_page_info:
-            # Seletor de página
-            nova_pagina = st.selectbox(
-                "Ir para página:",
-                range(1, total_paginas + 1),
-                index=st.session_state.pagina_atual - 1,
-                key="page_selector"
-            )
-            if nova_pagina != st.session_state.pagina_atual:
-                st.session_state.pagina_atual = nova_pagina
-                st.rerun()
-        
-        with col_next:
-            if st.button("Próxima ➡️", disabled=st.session_state.pagina_atual == total_paginas, use_container_width=True):
-                st.session_state.pagina_atual += 1
-                st.rerun()
+    ui.render_controles_pagina("clientes", pagina, ITENS_POR_PAGINA)
     
     # Hack para tornar o ícone clicável na tabela (se o Streamlit suportar LinkColumn corretamente com dados do DF)
     # Caso contrário, o usuário pode copiar o link da ficha.
@@ -653,15 +642,18 @@ def render_ficha_cliente(dd_cru):
                 edoc_save = edoc
                 if edoc and not str(edoc).startswith('ENC:'):
                     edoc_save = crypto.encrypt(edoc)
+                bidx = db.indices_cegos_cliente(edoc)
 
                 db.sql_run("""
                     UPDATE clientes SET 
-                    nome=?, tipo_pessoa=?, cpf_cnpj=?, status_cliente=?, email=?, telefone=?, telefone_fixo=?, 
+                    nome=?, tipo_pessoa=?, cpf_cnpj=?, cpf_cnpj_bidx=?, cpf_cnpj_bidx_prefixo=?, 
+                    status_cliente=?, email=?, telefone=?, telefone_fixo=?, 
                     profissao=?, estado_civil=?, cep=?, endereco=?, numero_casa=?, complemento=?, 
                     bairro=?, cidade=?, estado=?, link_drive=?, obs=?, 
                     rg=?, orgao_emissor=?, nacionalidade=?, data_nascimento=?
                     WHERE id=?
-                """, (enm, etipo, edoc_save, estt, eemail, etel, efix, eprof, eec, ecep, erua, enum, ecomp, ebairro, ecid, euf, edrive, eobs, erg, eorgao, enac, data_nasc_str, int(safe_get(dd, 'id'))))
+                """, (enm, etipo, edoc_save, bidx['cpf_cnpj_bidx'], bidx['cpf_cnpj_bidx_prefixo'], 
+                      estt, eemail, etel, efix, eprof, eec, ecep, erua, enum, ecomp, ebairro, ecid, euf, edrive, eobs, erg, eorgao, enac, data_nasc_str, int(safe_get(dd, 'id'))))
                 
                 st.success("Dados atualizados com sucesso!")
                 st.rerun()
@@ -1004,11 +996,7 @@ def render_timeline_avancada(cliente_id):
 def render_cliente_card(dd):
     """Card de resumo visual do cliente"""
     try:
-        processos = db.sql_get_query(
-            "SELECT COUNT(*) as total FROM processos WHERE cliente_nome = ?", 
-            (safe_get(dd, 'nome'),)
-        )
-        processos_count = processos.iloc[0]['total'] if not processos.empty else 0
+        processos_count = db.count("processos", where={'id_cliente': int(safe_get(dd, 'id'))})
     except Exception as e:
         logger.error(f"Erro ao buscar processos do cliente: {e}")
         processos_count = 0
@@ -1030,7 +1018,6 @@ def render_cliente_card(dd):
     fonte_interacao = ""
     
     cliente_id = safe_get(dd, 'id')
-    cliente_nome = safe_get(dd, 'nome')
     
     # OTIMIZAÇÃO: Consolidar 4 queries em uma só com UNION
     try:
@@ -1045,7 +1032,7 @@ def render_cliente_card(dd):
                 SELECT MAX(a.data_evento) as data_interacao, 'agenda' as fonte 
                 FROM agenda a 
                 JOIN processos p ON a.id_processo = p.id 
-                WHERE p.cliente_nome = ?
+                WHERE p.id_cliente = ?
             ) AS todas_interacoes
             WHERE data_interacao IS NOT NULL
             GROUP BY fonte
@@ -1053,7 +1040,7 @@ def render_cliente_card(dd):
             LIMIT 1
         """
         
-        resultado = db.sql_get_query(query_consolidada, (cliente_id, cliente_id, cliente_nome))
+        resultado = db.sql_get_query(query_consolidada, (cliente_id, cliente_id, cliente_id))
         
         if not resultado.empty and resultado.iloc[0]['ultima']:
             data_str = resultado.iloc[0]['ultima']
@@ -1085,7 +1072,7 @@ def render_cliente_card(dd):
     links_ativos_count = 0
     try:
         # Buscar IDs dos processos do cliente
-        procs_cli = db.sql_get_query("SELECT id FROM processos WHERE cliente_nome = ?", (cliente_nome,))
+        procs_cli = db.select("processos", columns=['id'], where={'id_cliente': int(cliente_id)})
         if not procs_cli.empty:
             for pid in procs_cli['id'].tolist():
                 ts = tm.listar_tokens_processo(pid)
@@ -1148,7 +1135,7 @@ def render_cliente_card(dd):
     # --- LINKS PÚBLICOS ATIVOS DOS PROCESSOS DO CLIENTE ---
     try:
         # Buscar processos do cliente
-        processos_cliente = db.sql_get_query("SELECT id, numero, acao FROM processos WHERE cliente_nome = ?", (cliente_nome,))
+        processos_cliente = db.select("processos", columns=['id', 'numero', 'acao'], where={'id_cliente': int(cliente_id)})
         
         if not processos_cliente.empty:
             links_ativos = []
@@ -1275,8 +1262,9 @@ def salvar_cliente_callback():
         if st.session_state.get('cad_data_nascimento'):
             data_nasc = st.session_state.cad_data_nascimento.strftime("%Y-%m-%d")
         
-        # Criptografar CPF/CNPJ antes de salvar (LGPD)
+        # Criptografar CPF/CNPJ antes de salvar (LGPD) + índice cego para buscas
         cpf_cnpj_encrypted = crypto.encrypt(cpf_cnpj)
+        bidx = db.indices_cegos_cliente(cpf_cnpj)
         
         # --- CRIAR PASTA NO GOOGLE DRIVE AUTOMATICAMENTE ---
         drive_link = st.session_state.get('cad_drive', '')  # Link manual, se fornecido
@@ -1308,13 +1296,14 @@ def salvar_cliente_callback():
                 st.warning(f"⚠️ Erro no Drive: {e}")
         
         db.sql_run('''INSERT INTO clientes (
-            nome, tipo_pessoa, cpf_cnpj, email, telefone, telefone_fixo, profissao, estado_civil, 
-            cep, endereco, numero_casa, complemento, bairro, cidade, estado, obs, 
+            nome, tipo_pessoa, cpf_cnpj, cpf_cnpj_bidx, cpf_cnpj_bidx_prefixo, email, telefone, telefone_fixo, 
+            profissao, estado_civil, cep, endereco, numero_casa, complemento, bairro, cidade, estado, obs, 
             status_cliente, link_drive, data_cadastro, rg, orgao_emissor, nacionalidade, data_nascimento,
             lgpd_consentimento, lgpd_data_consentimento
-        ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)''', 
+        ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)''', 
         (
-            nome, tipo_pessoa, cpf_cnpj_encrypted, st.session_state.cad_email, st.session_state.cad_tel, 
+            nome, tipo_pessoa, cpf_cnpj_encrypted, bidx['cpf_cnpj_bidx'], bidx['cpf_cnpj_bidx_prefixo'], 
+            st.session_state.cad_email, st.session_state.cad_tel, 
             st.session_state.cad_fixo, st.session_state.cad_prof, st.session_state.cad_ec, 
             st.session_state.cad_cep, st.session_state.cad_rua, st.session_state.cad_num, 
             st.session_state.cad_comp, st.session_state.cad_bairro, st.session_state.cad_cid, 
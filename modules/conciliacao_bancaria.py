@@ -272,7 +272,13 @@ def processar_upload_ofx(arquivo, extras=None):
         erros = 0
         transacoes_novas = []
         
-        # Processar cada transação
+        # Verificar duplicidade pelo FITID (uma consulta para o arquivo todo)
+        existentes = ofx_utils.filtrar_transacoes_existentes(
+            [t['transaction_id'] for t in transacoes]
+        )
+        data_importacao = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        vistos = set()
+        
         for trans in transacoes:
             # Adicionar Link do Drive se existir
             if link_drive:
@@ -281,31 +287,28 @@ def processar_upload_ofx(arquivo, extras=None):
             # Adicionar Extras (Origem)
             if extras:
                 trans.update(extras)
-                
-            # Verificar duplicidade pelo FITID
-            if ofx_utils.verificar_transacao_duplicada(trans['transaction_id']):
+            
+            fitid = trans['transaction_id']
+            if fitid in existentes or fitid in vistos:
                 duplicadas += 1
                 continue
+            vistos.add(fitid)
             
-            # Salvar no banco
+            trans['data_importacao'] = data_importacao
+            trans['status_conciliacao'] = 'Pendente'
+            transacoes_novas.append(trans)
+        
+        # Salvar no banco em lote (uma transação)
+        if transacoes_novas:
             try:
-                trans['data_importacao'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                trans['status_conciliacao'] = 'Pendente'
-                id_trans = ofx_utils.salvar_transacao_bancaria(trans)
-                
-                if id_trans:
-                    importadas += 1
-                    transacoes_novas.append(trans)
-                else:
-                    erros += 1
+                ids = ofx_utils.salvar_transacoes_bancarias(transacoes_novas)
+                importadas = len(ids)
+                # Conflitos de última hora (importação concorrente) são ignorados pelo banco
+                duplicadas += len(transacoes_novas) - importadas
             except Exception as e:
-                msg_erro = str(e)
-                if "UNIQUE constraint failed" in msg_erro or "Duplicate entry" in msg_erro:
-                    duplicadas += 1
-                    # Não exibir warning para duplicatas, é esperado
-                else:
-                    erros += 1
-                    st.warning(f"Erro ao salvar transação: {e}")
+                erros = len(transacoes_novas)
+                transacoes_novas = []
+                st.warning(f"Erro ao salvar transações: {e}")
         
         return {
             'sucesso': True,
@@ -930,18 +933,20 @@ def render_upload_csv():
                 transacoes = processar_csv(arquivo_bytes, uploaded_csv.name, mapeamento)
                 
                 if transacoes:
-                    # Salvar transações
-                    importadas = 0
-                    duplicadas = 0
-                    
+                    # Salvar transações em lote (duplicadas são ignoradas)
+                    existentes = ofx_utils.filtrar_transacoes_existentes(
+                        [t['transaction_id'] for t in transacoes]
+                    )
+                    data_importacao = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    novas = []
                     for trans in transacoes:
-                        if not ofx_utils.verificar_transacao_duplicada(trans['transaction_id']):
-                            trans['data_importacao'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                        if trans['transaction_id'] not in existentes:
+                            trans['data_importacao'] = data_importacao
                             trans['status_conciliacao'] = 'Pendente'
-                            ofx_utils.salvar_transacao_bancaria(trans)
-                            importadas += 1
-                        else:
-                            duplicadas += 1
+                            novas.append(trans)
+                    
+                    importadas = len(ofx_utils.salvar_transacoes_bancarias(novas))
+                    duplicadas = len(transacoes) - importadas
                     
                     st.success(f"✅ {importadas} transações importadas, {duplicadas} duplicadas ignoradas.")
                     st.rerun()
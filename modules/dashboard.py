@@ -236,40 +236,31 @@ def render():
     a_receber_vencidos_count = 0
     
     try:
-        # Prazos e Audiências
-        agenda_df = db.get_agenda_eventos()
-        if not agenda_df.empty:
-            hoje = datetime.now().strftime('%Y-%m-%d')
-            limite_7_dias = (datetime.now() + timedelta(days=7)).strftime('%Y-%m-%d')
-            
-            # Prazos próximos
-            prazos = agenda_df[
-                (agenda_df['tipo'] == 'prazo') & 
-                (agenda_df['status'] == 'pendente') &
-                (agenda_df['data_evento'] >= hoje) &
-                (agenda_df['data_evento'] <= limite_7_dias)
-            ]
-            prazos_count = len(prazos)
-            
-            # Audiências próximas (qualquer data futura próxima)
-            audiencias = agenda_df[
-                (agenda_df['tipo'] == 'audiencia') & 
-                (agenda_df['status'] == 'pendente') &
-                (agenda_df['data_evento'] >= hoje)
-            ]
-            audiencias_count = len(audiencias)
+        # Prazos e Audiências (filtrados e contados no banco)
+        hoje = datetime.now().strftime('%Y-%m-%d')
+        limite_7_dias = (datetime.now() + timedelta(days=7)).strftime('%Y-%m-%d')
+        
+        # Prazos próximos
+        prazos_count = db.count('agenda', where={
+            'tipo': 'prazo',
+            'status': 'pendente',
+            'data_evento >=': hoje,
+            'data_evento <=': limite_7_dias,
+        }, cache=True)
+        
+        # Audiências próximas (qualquer data futura próxima)
+        audiencias_count = db.count('agenda', where={
+            'tipo': 'audiencia',
+            'status': 'pendente',
+            'data_evento >=': hoje,
+        }, cache=True)
             
         # Financeiro Vencido
-        # (Assumindo que existe função ou query para isso, se não, usar 0 por segurança)
-        # Implementação simplificada:
-        fin_df = db.sql_get('financeiro')
-        if not fin_df.empty:
-            vencidos = fin_df[
-                (fin_df['tipo'] == 'Entrada') &
-                (fin_df['status_pagamento'] == 'Pendente') &
-                (fin_df['vencimento'] < hoje)
-            ]
-            a_receber_vencidos_count = len(vencidos)
+        a_receber_vencidos_count = db.count('financeiro', where={
+            'tipo': 'Entrada',
+            'status_pagamento': 'Pendente',
+            'vencimento <': hoje,
+        }, cache=True)
             
     except Exception as e:
         # Silencioso em prod, mas bom saber
@@ -283,24 +274,21 @@ def render():
     # NOVO: Processos Ativos
     processos_ativos_count = 0
     try:
-        proc_df = db.sql_get('processos')
-        if not proc_df.empty:
-            processos_ativos_count = len(proc_df[proc_df['status'] != 'Arquivado']) if 'status' in proc_df.columns else len(proc_df)
+        # IS NOT: processos sem status também contam como ativos
+        processos_ativos_count = db.count('processos', where={'status is not': 'Arquivado'}, cache=True)
     except Exception as e:
         logger.warning(f"Erro ao contar processos: {e}")
     
     # NOVO: Faturamento do Mês (pagos este mês)
     faturamento_mes = 0.0
     try:
-        fin_df = db.sql_get('financeiro')
-        if not fin_df.empty:
-            mes_atual = datetime.now().strftime('%Y-%m')
-            pagos = fin_df[
-                (fin_df['tipo'] == 'Entrada') &
-                (fin_df['status_pagamento'] == 'Pago') &
-                (fin_df['data_pagamento'].astype(str).str.startswith(mes_atual))
-            ]
-            faturamento_mes = pagos['valor'].sum() if not pagos.empty else 0.0
+        mes_atual = datetime.now().strftime('%Y-%m')
+        pagos = db.select('financeiro', columns=['valor'], where={
+            'tipo': 'Entrada',
+            'status_pagamento': 'Pago',
+            'data_pagamento like': f"{mes_atual}%",
+        }, cache=True)
+        faturamento_mes = pagos['valor'].sum() if not pagos.empty else 0.0
     except Exception as e:
         logger.warning(f"Erro ao calcular faturamento: {e}")
     
@@ -509,7 +497,7 @@ def render():
     
         with tab_graf1:
             try:
-                proc_df = db.sql_get('processos')
+                proc_df = db.select('processos', columns=['fase_processual AS fase'], cache=True)
                 if not proc_df.empty and 'fase' in proc_df.columns:
                     fase_counts = proc_df['fase'].value_counts().reset_index()
                     fase_counts.columns = ['Fase', 'Quantidade']
@@ -531,14 +519,17 @@ def render():
     
         with tab_graf2:
             try:
-                fin_df = db.sql_get('financeiro')
+                data_limite = datetime.now() - timedelta(days=180)
+                fin_df = db.select(
+                    'financeiro',
+                    columns=['vencimento', 'tipo', 'valor'],
+                    where={'vencimento >=': data_limite.strftime('%Y-%m-%d')},
+                    cache=True
+                )
                 if not fin_df.empty and 'vencimento' in fin_df.columns:
                     fin_df['vencimento'] = pd.to_datetime(fin_df['vencimento'], errors='coerce')
                     fin_df = fin_df.dropna(subset=['vencimento'])
                 
-                    data_limite = datetime.now() - timedelta(days=180)
-                    fin_df = fin_df[fin_df['vencimento'] >= data_limite]
-                
                     if not fin_df.empty:
                         fin_df['mes'] = fin_df['vencimento'].dt.to_period('M').astype(str)
                     
@@ -582,7 +573,7 @@ def render():
     
         with tab_graf3:
             try:
-                cli_df = db.sql_get('clientes')
+                cli_df = db.select('clientes', columns=['data_cadastro'], cache=True)
                 if not cli_df.empty and 'data_cadastro' in cli_df.columns:
                     cli_df['data_cadastro'] = pd.to_datetime(cli_df['data_cadastro'], errors='coerce')
                     cli_df = cli_df.dropna(subset=['data_cadastro'])
@@ -682,6 +673,18 @@ def render():
                 else:
                     st.error(f"❌ {result['message']}")
             
+            # Snapshot incremental: só as páginas alteradas desde o último backup
+            if st.button("🧩 Snapshot Incremental", use_container_width=True):
+                with st.spinner("Criando snapshot..."):
+                    result = db.criar_backup(force=True, incremental=True)
+                    
+                if result['success']:
+                    st.success(f"✅ {result['message']}")
+                    registrar_backup()
+                    st.rerun()
+                else:
+                    st.error(f"❌ {result['message']}")
+            
             # Botão de download manual (arquivo raw)
             if db_path.exists() and db_path.stat().st_size > 0:
                 with open(db_path, "rb") as fp:
@@ -701,13 +704,14 @@ def render():
             if backup_dir.exists():
                 backups = sorted([
                     f for f in os.listdir(backup_dir) 
-                    if f.startswith('sistema_backup_') and f.endswith('.db.gz')
+                    if f.startswith('sistema_backup_') and f.endswith(('.db.gz', '.inc.gz'))
                 ], reverse=True)
                 
                 if backups:
                     for bkp in backups[:3]:  # Mostrar últimos 3
                         size_mb = (backup_dir / bkp).stat().st_size / (1024 * 1024)
-                        st.caption(f"📦 {bkp[:30]}... ({size_mb:.2f}MB)")
+                        icone = "🧩" if bkp.endswith('.inc.gz') else "📦"
+                        st.caption(f"{icone} {bkp[:30]}... ({size_mb:.2f}MB)")
                 else:
                     st.caption("Nenhum backup compactado encontrado")
             
@@ -722,6 +726,7 @@ def render():
             else:
                 st.warning("⚠️ Nenhum backup registrado recentemente.")
             
-            st.caption("💡 Backups são compactados com gzip e mantidos por 7 dias.")
+            st.caption("💡 Backups online (API de backup do SQLite), compactados com gzip; "
+                       "mantidos os 7 últimos completos e seus incrementais.")
 
 
@@ -578,18 +578,5 @@ def salvar_documento_historico(id_cliente, cliente_nome, modelo_nome, categoria,
 
 
 def criar_tabela_historico():
-    """Cria tabela de histórico de documentos se não existir."""
-    try:
-        db.sql_run("""
-            CREATE TABLE IF NOT EXISTS documentos_historico (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                id_cliente INTEGER REFERENCES clientes(id),
-                modelo_nome TEXT,
-                categoria TEXT,
-                conteudo TEXT,
-                link_drive TEXT,
-                criado_em TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-    except Exception as e:
-        pass  # Tabela pode já existir
+    """Garante a tabela de histórico de documentos (migração 6 em schema_migrations)."""
+    db.init_db()
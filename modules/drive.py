@@ -10,6 +10,7 @@ Interface visual para:
 
 import streamlit as st
 import database as db
+import pandas as pd
 import google_drive as gd
 from datetime import datetime
 import os
@@ -65,10 +66,10 @@ def render_navegacao(service):
     with col2:
         # Listar processos do cliente selecionado
         if cliente_sel and cliente_sel != "-- Selecione --" and cliente_sel != "-- Sem clientes --":
-            processos = db.sql_get_query(
-                "SELECT numero, acao FROM processos WHERE cliente_nome = ?",
-                (cliente_sel,)
-            )
+            id_cli = db.id_cliente_por_nome(cliente_sel)
+            processos = db.select(
+                "processos", columns=['numero', 'acao'], where={'id_cliente': id_cli}
+            ) if id_cli else pd.DataFrame()
             proc_opts = ["Todos"] + [f"{r['numero']} - {r['acao'][:30]}" for _, r in processos.iterrows()] if not processos.empty else ["-- Sem processos --"]
             proc_sel = st.selectbox("Filtrar por Processo", proc_opts)
         else:
@@ -152,10 +153,10 @@ def render_upload(service):
     
     with col2:
         if cliente_dest and cliente_dest != "-- Pasta Raiz --":
-            processos = db.sql_get_query(
-                "SELECT numero, acao FROM processos WHERE cliente_nome = ?",
-                (cliente_dest,)
-            )
+            id_cli = db.id_cliente_por_nome(cliente_dest)
+            processos = db.select(
+                "processos", columns=['numero'], where={'id_cliente': id_cli}
+            ) if id_cli else pd.DataFrame()
             proc_opts = ["-- Pasta do Cliente --"] + [r['numero'] for _, r in processos.iterrows()] if not processos.empty else ["-- Pasta do Cliente --"]
             proc_dest = st.selectbox("Subpasta (Processo)", proc_opts, key="upload_proc")
         else:
@@ -12,6 +12,7 @@ import utils_recibo as ur
 import urllib.parse
 import utils_email
 import email_templates
+from components import ui
 
 logger = logging.getLogger(__name__)
 
@@ -39,7 +40,8 @@ def render():
 
 def render_dashboard_header():
     """Renderiza os Big Numbers e Gráfico Resumo no topo."""
-    df = db.sql_get("financeiro")
+    df = db.select("financeiro", columns=['data', 'vencimento', 'valor', 'tipo', 'status_pagamento', 'descricao'],
+                   cache=True)
     
     if df.empty:
         st.info("👋 Bem-vindo ao seu Financeiro! Comece lançando sua primeira receita ou despesa na aba abaixo para ver os indicadores.")
@@ -170,7 +172,7 @@ def render_form_lancamento():
         tipo = st.radio("Tipo", ["Entrada", "Saída"], horizontal=True)
         
         # Carregar Clientes
-        dfc = db.sql_get("clientes")
+        dfc = db.select("clientes", columns=['nome'], cache=True)
         lista_clientes = ["Avulso"] + dfc['nome'].tolist() if not dfc.empty else ["Avulso"]
         
         categoria = None
@@ -339,15 +341,10 @@ def render_form_lancamento():
                 st.error(f"Erro ao salvar: {e}")
 
 def render_extrato_lista():
-    df = db.sql_get("financeiro", "vencimento DESC")
-    
-    if df.empty:
+    if db.count("financeiro", cache=True) == 0:
         st.info("📭 Nenhum lançamento encontrado.")
         return
     
-    # Converter datas para filtros
-    df['vencimento_dt'] = pd.to_datetime(df['vencimento'], errors='coerce')
-    
     # ===== FILTROS AVANÇADOS =====
     with st.expander("🔍 Filtros Avançados", expanded=False):
         # Linha 1: Busca e Período
@@ -359,52 +356,68 @@ def render_extrato_lista():
         with col_data_fim:
             data_fim = st.date_input("Data fim", value=None, key="fin_data_fim")
         
-        # Linha 2: Tipo, Categoria, Status
+        # Linha 2: Tipo, Categoria, Status (opções distintas vindas do banco)
+        def _opcoes(coluna):
+            df_op = db.select("financeiro", columns=[coluna], where={f"{coluna} !=": None},
+                              distinct=True, order_by=coluna, cache=True)
+            return df_op[coluna].tolist() if not df_op.empty else []
+        
         c1, c2, c3 = st.columns(3)
-        f_tipo = c1.multiselect("Tipo", df['tipo'].unique(), key="fin_tipo")
-        f_cat = c2.multiselect("Categoria", df['categoria'].dropna().unique(), key="fin_cat")
-        f_status = c3.multiselect("Status", df['status_pagamento'].unique(), key="fin_status")
-    
-    # ===== APLICAR FILTROS =====
-    df_filtrado = df.copy()
+        f_tipo = c1.multiselect("Tipo", _opcoes('tipo'), key="fin_tipo")
+        f_cat = c2.multiselect("Categoria", _opcoes('categoria'), key="fin_cat")
+        f_status = c3.multiselect("Status", _opcoes('status_pagamento'), key="fin_status")
     
-    if busca_texto:
-        df_filtrado = df_filtrado[df_filtrado['descricao'].str.contains(busca_texto, case=False, na=False)]
+    # ===== FILTROS APLICADOS NO BANCO =====
+    filtros = {}
     if data_ini:
-        df_filtrado = df_filtrado[df_filtrado['vencimento_dt'] >= pd.Timestamp(data_ini)]
+        filtros['vencimento >='] = data_ini.strftime('%Y-%m-%d')
     if data_fim:
-        df_filtrado = df_filtrado[df_filtrado['vencimento_dt'] <= pd.Timestamp(data_fim)]
+        # Inclui vencimentos com hora no último dia
+        filtros['vencimento <'] = (data_fim + timedelta(days=1)).strftime('%Y-%m-%d')
     if f_tipo:
-        df_filtrado = df_filtrado[df_filtrado['tipo'].isin(f_tipo)]
+        filtros['tipo in'] = f_tipo
     if f_cat:
-        df_filtrado = df_filtrado[df_filtrado['categoria'].isin(f_cat)]
+        filtros['categoria in'] = f_cat
     if f_status:
-        df_filtrado = df_filtrado[df_filtrado['status_pagamento'].isin(f_status)]
+        filtros['status_pagamento in'] = f_status
     
-    # ===== RESUMO DOS FILTROS =====
-    total_entradas = df_filtrado[df_filtrado['tipo'] == 'Entrada']['valor'].sum()
-    total_saidas = df_filtrado[df_filtrado['tipo'] == 'Saída']['valor'].sum()
+    # ===== RESUMO DOS FILTROS (agregado no banco) =====
+    df_tot = db.select("financeiro", columns=['tipo', 'COUNT(*) AS qtd', 'SUM(valor) AS total'],
+                       where=filtros, search=busca_texto, search_columns=['descricao'],
+                       group_by=['tipo'], cache=True)
+    totais = {r['tipo']: (r['total'] or 0) for _, r in df_tot.iterrows()} if not df_tot.empty else {}
+    total_registros = int(df_tot['qtd'].sum()) if not df_tot.empty else 0
+    total_entradas = totais.get('Entrada', 0)
+    total_saidas = totais.get('Saída', 0)
     saldo = total_entradas - total_saidas
     
     col_res1, col_res2, col_res3, col_res4 = st.columns(4)
-    col_res1.metric("Registros", len(df_filtrado))
+    col_res1.metric("Registros", total_registros)
     col_res2.metric("🟢 Entradas", ut.formatar_moeda(total_entradas))
     col_res3.metric("🔴 Saídas", ut.formatar_moeda(total_saidas))
     col_res4.metric("Saldo", ut.formatar_moeda(saldo))
     
     st.divider()
     
-    # ===== PAGINAÇÃO =====
+    # ===== PAGINAÇÃO (keyset: só a página visível é carregada) =====
     ITENS_POR_PAGINA = 15
-    total_paginas = max(1, (len(df_filtrado) + ITENS_POR_PAGINA - 1) // ITENS_POR_PAGINA)
+    cursor = ui.cursor_pagina("financeiro", (filtros, busca_texto))
+    pagina = db.select_page(
+        "financeiro",
+        where=filtros,
+        search=busca_texto,
+        search_columns=['descricao'],
+        sort="vencimento",
+        descending=True,
+        limit=ITENS_POR_PAGINA,
+        after=cursor,
+        with_total=False
+    )
+    pagina['total'] = total_registros
+    df_pagina = pagina['dados']
     
-    col_pg1, col_pg2, col_pg3 = st.columns([1, 2, 1])
-    with col_pg2:
-        pagina_atual = st.number_input(f"Página (de {total_paginas})", min_value=1, max_value=total_paginas, value=1, key="fin_pagina")
-    
-    inicio = (pagina_atual - 1) * ITENS_POR_PAGINA
-    fim = inicio + ITENS_POR_PAGINA
-    df_pagina = df_filtrado.iloc[inicio:fim]
+    if df_pagina.empty:
+        st.info("📭 Nenhum lançamento encontrado com os filtros atuais.")
     
     # ===== EXIBIÇÃO =====
     for index, row in df_pagina.iterrows():
@@ -525,6 +538,8 @@ def render_extrato_lista():
                                     st.success(f"✅ Lembrete enviado!")
                                 else:
                                     st.error(f"❌ Falha: {erro}")
+    
+    ui.render_controles_pagina("financeiro", pagina, ITENS_POR_PAGINA)
 
 def render_relatorios_tab():
     st.markdown("### 📊 Análise Financeira Detalhada")
@@ -889,7 +904,7 @@ def render_recibos_tab():
     dados_recibo = {}
     
     if origem == "Selecionar Cliente Cadastrado":
-        dfc = db.sql_get("clientes")
+        dfc = db.select("clientes", columns=['nome', 'cpf_cnpj'], cache=True)
         if dfc.empty:
             st.warning("Nenhum cliente cadastrado.")
             return
@@ -950,8 +965,7 @@ def render_recibos_tab():
 
     elif origem == "Selecionar Lançamento Existente":
         # Buscar entradas
-        df = db.sql_get("financeiro", "vencimento DESC")
-        df_entradas = df[df['tipo'] == 'Entrada']
+        df_entradas = db.select("financeiro", where={'tipo': 'Entrada'}, order_by="vencimento DESC")
         
         if df_entradas.empty:
             st.warning("Nenhuma entrada registrada para gerar recibo.")
@@ -1091,6 +1105,9 @@ def verificar_recorrencias():
             return
 
         hoje = datetime.now().date()
+        novos_lancamentos = []
+        ids_encerrados = []
+        gerados = set()  # (descricao, vencimento) já enfileirados neste lote
         
         for idx, row in df_rec.iterrows():
             venc_atual = datetime.strptime(row['vencimento'], '%Y-%m-%d').date()
@@ -1108,7 +1125,8 @@ def verificar_recorrencias():
                 (row['descricao'], proximo_venc.strftime('%Y-%m-%d'))
             )
             
-            if exists.empty:
+            chave = (row['descricao'], proximo_venc.strftime('%Y-%m-%d'))
+            if exists.empty and chave not in gerados:
                 # Se não existe e a data original já passou (ou está próxima, ex: 5 dias antes)
                 # Vamos gerar se o próximo vencimento for até daqui a 35 dias (para garantir que gere o do mês seguinte)
                 
@@ -1133,13 +1151,22 @@ def verificar_recorrencias():
                         "comprovante_link": None
                     }
                     
-                    db.crud_insert("financeiro", novos_dados, f"Recorrência gerada: {row['descricao']}")
+                    novos_lancamentos.append(novos_dados)
+                    gerados.add(chave)
                     # Opcional: Desativar recorrencia do anterior? Não, pois usamos a cadeia.
                     # Mas para evitar crescimento exponencial se tivermos varios antigos,
                     # idealmente só o ÚLTIMO deveria ser recorrente=1.
                     # Ajuste: Ao gerar o novo, removemos a flag recorrente do antigo.
-                    
-                    db.sql_run("UPDATE financeiro SET recorrente=0 WHERE id=?", (row['id'],))
+                    ids_encerrados.append(int(row['id']))
+        
+        # Gravar em lote, em uma transação: um INSERT em massa + um UPDATE para os
+        # anteriores (falha no meio não deixa a cadeia com dois recorrentes)
+        if novos_lancamentos:
+            with db.transaction():
+                # Com ids: o sinal bulk_insert_financeiro leva os ids para a IA proativa
+                db.crud_insert_many("financeiro", novos_lancamentos, "Recorrências geradas")
+                placeholders = ', '.join(['?'] * len(ids_encerrados))
+                db.sql_run(f"UPDATE financeiro SET recorrente=0 WHERE id IN ({placeholders})", tuple(ids_encerrados))
                     
     except Exception as e:
         print(f"Erro ao verificar recorrências: {e}")
@@ -1213,6 +1240,7 @@ def render_importar_tab():
                 with st.spinner("Importando..."):
                     importados = 0
                     erros = 0
+                    lancamentos = []
                     
                     for idx, row in df_import.iterrows():
                         try:
@@ -1244,13 +1272,18 @@ def render_importar_tab():
                                 "recorrente": 0
                             }
                             
-                            db.crud_insert("financeiro", dados, "Importação Excel")
-                            importados += 1
+                            lancamentos.append(dados)
                             
                         except Exception as e:
                             logger.error(f"Erro na linha {idx}: {e}")
                             erros += 1
                     
+                    # Gravar todas as linhas válidas em uma única transação
+                    if lancamentos:
+                        importados = len(db.crud_insert_many(
+                            "financeiro", lancamentos, "Importação Excel"
+                        ))
+                    
                     st.success(f"✅ {importados} lançamentos importados com sucesso!")
                     if erros > 0:
                         st.warning(f"⚠️ {erros} linhas com erro foram ignoradas.")
@@ -5,6 +5,8 @@ Sistema Lopes &  Ribeiro
 
 import streamlit as st
 import ai_gemini as ai
+import ai_cache
+import gemini_quota
 from datetime import datetime
 import database as db
 import pandas as pd
@@ -92,6 +94,8 @@ def render():
     
     # TAB 4: Histórico
     with tab4:
+        render_quota_status()
+        render_cache_stats()
         render_historico()
 
 
@@ -124,19 +128,17 @@ def render_chat():
         with st.chat_message("user"):
             st.markdown(prompt)
         
-        # Gerar resposta da IA
+        # Gerar resposta da IA (streaming: o texto aparece conforme é gerado)
         with st.chat_message("assistant"):
-            with st.spinner("Pensando..."):
-                resposta = ai.chat_assistente(prompt)
-                st.markdown(resposta)
-                
-                # Botão de Download
-                st.download_button(
-                    label="📥 Baixar Parecer em Word (.docx)",
-                    data=gerar_docx(resposta),
-                    file_name="parecer_lopes_ribeiro_IA.docx",
-                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                )
+            resposta = st.write_stream(ai.chat_assistente_stream(prompt))
+            
+            # Botão de Download
+            st.download_button(
+                label="📥 Baixar Parecer em Word (.docx)",
+                data=gerar_docx(resposta),
+                file_name="parecer_lopes_ribeiro_IA.docx",
+                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+            )
         
         # Adicionar resposta ao histórico
         st.session_state.chat_history.append({"role": "assistant", "content": resposta})
@@ -370,6 +372,51 @@ def render_historico():
     except Exception as e:
         st.error(f"Erro ao carregar histórico: {e}")
 
+def render_quota_status():
+    """Cota restante do Gemini (compartilhada com as tarefas agendadas)"""
+    try:
+        cota = gemini_quota.status()
+    except Exception as e:
+        st.caption(f"Cota do Gemini indisponível: {e}")
+        return
+    with st.expander(f"📊 Cota Gemini — {cota['restante_interativa']} requisições restantes hoje", expanded=False):
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Usadas hoje", f"{cota['usado']}/{cota['limite_dia']}")
+        col2.metric("Segundo plano", cota['usado_segundo_plano'])
+        col3.metric("Restantes (automáticas)", cota['restante_segundo_plano'])
+        col4.metric("Fichas no minuto", f"{cota['fichas']:.0f}/{cota['rpm']:.0f}")
+        if cota['proxima_ficha_s']:
+            st.caption(f"Próxima ficha em {cota['proxima_ficha_s']:.0f}s")
+        st.caption(
+            f"Reserva para uso interativo: {gemini_quota.GEMINI_RESERVA_INTERATIVA} requisições/dia | "
+            f"Limite: {gemini_quota.GEMINI_RPM:.0f} por minuto"
+        )
+
+def render_cache_stats():
+    """Estatísticas do cache de respostas da IA (memória + disco)"""
+    stats = ai_cache.get_stats()
+    with st.expander(f"⚡ Cache de Respostas — acerto {stats['taxa_acerto']:.0%}", expanded=False):
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Hits memória", stats['hits_memoria'])
+        col2.metric("Hits disco", stats['hits_disco'])
+        col3.metric("Misses", stats['misses'])
+        col4.metric("Gravações", stats['gravacoes'])
+        col5, col6, col7 = st.columns(3)
+        col5.metric("Memória", f"{stats['itens_memoria']} itens", f"{stats['memoria_mb']} MB", delta_color="off")
+        col6.metric("Disco", f"{stats['itens_disco']} itens", f"{stats['disco_mb']} MB", delta_color="off")
+        col7.metric("Expurgadas", stats['expurgados_validade'] + stats['expurgados_tamanho'])
+        em_voo = ai.get_single_flight_stats()
+        st.caption(
+            f"Chamadas à API: {em_voo['lideres']} | "
+            f"Prompts idênticos compartilhados: {em_voo['compartilhadas']} | "
+            f"Em andamento: {em_voo['em_andamento']}"
+        )
+        st.caption(
+            f"Validade: {ai_cache.CACHE_VALIDITY_DAYS} dias | "
+            f"Limites: {ai_cache.AI_CACHE_MEMORIA_MAX_MB:.0f} MB em memória, "
+            f"{ai_cache.AI_CACHE_DISCO_MAX_MB:.0f} MB em disco"
+        )
+
 # --- FUNÇÕES DE CONTEXTO ---
 
 def get_contexto_financeiro():
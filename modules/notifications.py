@@ -26,25 +26,8 @@ TIPOS_NOTIFICACAO = {
 
 
 def criar_tabela_notificacoes():
-    """Cria tabela de notificações se não existir"""
-    try:
-        db.sql_run("""
-            CREATE TABLE IF NOT EXISTS notificacoes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                tipo TEXT NOT NULL,
-                titulo TEXT NOT NULL,
-                mensagem TEXT,
-                link_acao TEXT,
-                prioridade TEXT DEFAULT 'media',
-                lida INTEGER DEFAULT 0,
-                arquivada INTEGER DEFAULT 0,
-                usuario_destino TEXT,
-                criado_em TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        logger.info("Tabela notificacoes verificada/criada")
-    except Exception as e:
-        logger.error(f"Erro ao criar tabela notificacoes: {e}")
+    """Garante a tabela de notificações (migração 3 em schema_migrations)"""
+    db.init_db()
 
 
 def criar_notificacao(tipo: str, titulo: str, mensagem: str = "", 
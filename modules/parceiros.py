@@ -231,17 +231,19 @@ def render_historico_repasses():
     # Buscar processos com esse parceiro
     if parceiro_selecionado == "Todos":
         processos = db.sql_get_query("""
-            SELECT p.id, p.numero, p.cliente_nome, p.acao, p.parceiro_nome, 
+            SELECT p.id, p.numero, COALESCE(c.nome, p.cliente_nome) AS cliente_nome, p.acao, p.parceiro_nome, 
                    p.parceiro_percentual, p.valor_causa, p.fase_processual
             FROM processos p
+            LEFT JOIN clientes c ON c.id = p.id_cliente
             WHERE p.parceiro_nome IS NOT NULL AND p.parceiro_nome != ''
             ORDER BY p.id DESC
         """)
     else:
         processos = db.sql_get_query("""
-            SELECT p.id, p.numero, p.cliente_nome, p.acao, p.parceiro_nome, 
+            SELECT p.id, p.numero, COALESCE(c.nome, p.cliente_nome) AS cliente_nome, p.acao, p.parceiro_nome, 
                    p.parceiro_percentual, p.valor_causa, p.fase_processual
             FROM processos p
+            LEFT JOIN clientes c ON c.id = p.id_cliente
             WHERE p.parceiro_nome = ?
             ORDER BY p.id DESC
         """, (parceiro_selecionado,))
@@ -310,9 +312,10 @@ def render_relatorio_pagamentos():
     if st.button("🔄 Gerar Relatório", type="primary"):
         # Buscar todos os processos com parceiros
         processos = db.sql_get_query("""
-            SELECT p.parceiro_nome, p.parceiro_percentual, p.valor_causa, p.cliente_nome, p.acao,
+            SELECT p.parceiro_nome, p.parceiro_percentual, p.valor_causa, COALESCE(c.nome, p.cliente_nome) AS cliente_nome, p.acao,
                    f.valor as valor_pago, f.data as data_pagamento
             FROM processos p
+            LEFT JOIN clientes c ON c.id = p.id_cliente
             LEFT JOIN financeiro f ON f.id_processo = p.id AND f.status_pagamento = 'Pago'
             WHERE p.parceiro_nome IS NOT NULL AND p.parceiro_nome != ''
             AND (f.data IS NULL OR (f.data >= ? AND f.data <= ?))
@@ -361,10 +364,12 @@ def render_relatorio_pagamentos():
 def get_processos_parceiro(nome_parceiro: str) -> pd.DataFrame:
     """Retorna processos vinculados a um parceiro."""
     return db.sql_get_query("""
-        SELECT id, numero, cliente_nome, acao, parceiro_percentual, fase_processual
-        FROM processos
-        WHERE parceiro_nome = ?
-        ORDER BY id DESC
+        SELECT p.id, p.numero, COALESCE(c.nome, p.cliente_nome) AS cliente_nome, p.acao,
+               p.parceiro_percentual, p.fase_processual
+        FROM processos p
+        LEFT JOIN clientes c ON c.id = p.id_cliente
+        WHERE p.parceiro_nome = ?
+        ORDER BY p.id DESC
     """, (nome_parceiro,))
 
 
@@ -9,7 +9,9 @@ import token_manager as tm
 import pandas as pd
 import time
 import ai_gemini as ai
+import fila_analise_ia
 import permissions  # Sistema de permissões
+from components import ui
 
 # --- CONSTANTES ---
 FASES_PROCESSUAIS = ["Distribuído", "A Ajuizar", "Aguardando Liminar", "Audiência Marcada", "Sentença", "Arquivado", "Em Andamento", "Suspenso"]
@@ -326,25 +328,25 @@ def render_novo_processo():
                     except:
                         pass
                 
-                # Salvar
+                # Salvar: processo, parte e movimentações em uma única transação
                 try:
-                    processo_id = db.crud_insert("processos", dados_processo)
-                    
-                    if processo_id:
-                        # Parte contrária
-                        if cadastrar_parte and nome_parte:
-                            try:
-                                db.sql_run(
-                                    "INSERT INTO partes_processo (id_processo, nome, tipo, cpf_cnpj) VALUES (?,?,?,?)",
-                                    (processo_id, nome_parte, tipo_parte, cpf_parte)
-                                )
-                            except:
-                                pass
+                    count = 0
+                    with db.transaction():
+                        processo_id = db.crud_insert("processos", dados_processo)
                         
-                        # Importar movimentações
-                        if st.session_state.form_movimentos:
-                            count = 0
-                            for mov in st.session_state.form_movimentos:
+                        if processo_id:
+                            # Parte contrária
+                            if cadastrar_parte and nome_parte:
+                                try:
+                                    db.sql_run(
+                                        "INSERT INTO partes_processo (id_processo, nome, tipo, cpf_cnpj) VALUES (?,?,?,?)",
+                                        (processo_id, nome_parte, tipo_parte, cpf_parte)
+                                    )
+                                except:
+                                    pass
+                            
+                            # Importar movimentações
+                            for mov in st.session_state.form_movimentos or []:
                                 try:
                                     data_mov = mov.get('data', '')[:10] if mov.get('data') else None
                                     if data_mov:
@@ -359,8 +361,10 @@ def render_novo_processo():
                                         count += 1
                                 except:
                                     pass
-                            if count > 0:
-                                st.toast(f"📄 {count} movimentações importadas!")
+                    
+                    if processo_id:
+                        if count > 0:
+                            st.toast(f"📄 {count} movimentações importadas!")
                         
                         st.success("✅ Processo salvo com sucesso!")
                         if link_drive:
@@ -386,10 +390,16 @@ def render_novo_processo():
 
 
 
+# Colunas usadas pela listagem/kanban (detalhes carregam o registro completo)
+COLUNAS_LISTAGEM = [
+    'id', 'numero', 'cliente_nome', 'acao', 'assunto',
+    'responsavel', 'proximo_prazo', 'fase_processual'
+]
+CAMPOS_BUSCA_PROCESSOS = ['cliente_nome', 'numero', 'acao', 'assunto']
+
+
 def render_gerenciar_processos():
-    # Carregar dados
-    df = db.sql_get("processos")
-    if df.empty:
+    if db.count("processos", cache=True) == 0:
         st.info("Nenhum processo cadastrado.")
         return
 
@@ -398,43 +408,38 @@ def render_gerenciar_processos():
         col_f1, col_f2, col_f3 = st.columns([2, 1, 1])
         
         termo_busca = col_f1.text_input("Buscar (Cliente, Ação...)", placeholder="Digite para filtrar...")
-        responsavel_filtro = col_f2.selectbox("Responsável", ["Todos"] + list(df['responsavel'].unique()) if 'responsavel' in df.columns else ["Todos"])
+        df_resp = db.select("processos", columns=['responsavel'], where={'responsavel !=': None},
+                            distinct=True, cache=True)
+        responsavel_filtro = col_f2.selectbox("Responsável", ["Todos"] + (df_resp['responsavel'].tolist() if not df_resp.empty else []))
         
         # Toggle Visualização
         view_mode = col_f3.radio("Visualização", ["Lista / Cards", "Kanban"], horizontal=True, index=0, help="Lista é melhor para Mobile")
 
-    # Aplicar Filtros
-    df_filtered = df.copy()
-    if termo_busca:
-        termo = termo_busca.lower()
-        df_filtered = df_filtered[
-            df_filtered['cliente_nome'].str.lower().str.contains(termo, na=False) |
-            df_filtered['numero'].astype(str).str.lower().str.contains(termo, na=False) |
-            df_filtered['acao'].str.lower().str.contains(termo, na=False) |
-            df_filtered['assunto'].str.lower().str.contains(termo, na=False)
-        ]
-    
+    # Filtros aplicados no banco
+    filtros = {}
     if responsavel_filtro != "Todos":
-        df_filtered = df_filtered[df_filtered['responsavel'] == responsavel_filtro]
+        filtros['responsavel'] = responsavel_filtro
         
-    # --- PAGINAÇÃO (Performance Mobile) ---
-    total_items = len(df_filtered)
+    # --- PAGINAÇÃO (keyset: só a página visível é carregada) ---
     ITEMS_PER_PAGE = 10 if view_mode == "Lista / Cards" else 50 # Kanban precisa de mais itens para ser útil
     
+    cursor = ui.cursor_pagina("processos", (filtros, termo_busca, view_mode))
+    pagina = db.select_page(
+        "processos",
+        columns=COLUNAS_LISTAGEM,
+        where=filtros,
+        search=termo_busca,
+        search_columns=CAMPOS_BUSCA_PROCESSOS,
+        sort="id",
+        limit=ITEMS_PER_PAGE,
+        after=cursor
+    )
+    df_filtered = pagina['dados']
+    df_display = df_filtered
+    total_items = pagina['total']
+    
     if total_items > ITEMS_PER_PAGE:
-        total_pages = (total_items - 1) // ITEMS_PER_PAGE + 1
-        col_pag1, col_pag2 = st.columns([4, 1])
-        with col_pag2:
-            page = st.number_input(f"Página (Total {total_pages})", min_value=1, max_value=total_pages, value=1)
-        
-        start_idx = (page - 1) * ITEMS_PER_PAGE
-        end_idx = start_idx + ITEMS_PER_PAGE
-        
-        # Slice do dataframe para exibição
-        df_display = df_filtered.iloc[start_idx:end_idx]
-        st.caption(f"Mostrando {start_idx+1}-{min(end_idx, total_items)} de {total_items} processos.")
-    else:
-        df_display = df_filtered
+        st.caption(f"Mostrando {len(df_display)} de {total_items} processos.")
 
     st.divider()
 
@@ -512,6 +517,9 @@ def render_gerenciar_processos():
                         else:
                             st.caption("🔒 Apenas advogados")
 
+    if total_items > ITEMS_PER_PAGE:
+        ui.render_controles_pagina("processos", pagina, ITEMS_PER_PAGE)
+
     st.divider()
     
     # --- DETALHES DO PROCESSO SELECIONADO ---
@@ -519,6 +527,14 @@ def render_gerenciar_processos():
     # Seletor Principal para Detalhes (Permite busca também)
     st.markdown("### 📂 Detalhes e Gerenciamento")
     
+    # Opções: processos da página atual + o selecionado no card (se estiver fora dela)
+    df = df_display
+    pid_sel = st.session_state.get('selected_process_id')
+    if pid_sel is not None and (df.empty or pid_sel not in df['id'].values):
+        df = pd.concat([db.select("processos", columns=COLUNAS_LISTAGEM, where={'id': int(pid_sel)}), df], ignore_index=True)
+    if df.empty:
+        return
+    df = df.copy()
     df['lbl'] = df['cliente_nome'] + " - " + df['numero'].fillna(df['acao'])
     
     # Tenta pré-selecionar se veio do clique no card
@@ -535,7 +551,7 @@ def render_gerenciar_processos():
     
     if sel_p:
         pid = int(df[df['lbl'] == sel_p].iloc[0]['id'])
-        render_processo_detalhes(pid, df)
+        render_processo_detalhes(pid)
 
 def render_process_card_kanban(row, fases):
     """Renderiza um card simples para o Kanban."""
@@ -586,8 +602,12 @@ def render_process_card_kanban(row, fases):
             st.toast(f"Processo movido para {nova_fase}")
             st.rerun()
 
-def render_processo_detalhes(pid, df_all):
-    processo_row = df_all[df_all['id'] == pid].iloc[0]
+def render_processo_detalhes(pid):
+    df_proc = db.select("processos", where={'id': pid}, limit=1)
+    if df_proc.empty:
+        st.warning("Processo não encontrado.")
+        return
+    processo_row = df_proc.iloc[0]
     
     # --- CABEÇALHO E AÇÕES ---
     c_info, c_action = st.columns([3, 1])
@@ -615,7 +635,10 @@ def render_processo_detalhes(pid, df_all):
                      if "erro" in res:
                          st.error(f"Erro: {res['erro']}")
                      else:
-                         st.toast(f"✅ Concluído! {res['novos']} novos, {res['analisados']} analisados.")
+                         # Análise em lote pela fila, sem segurar a tela
+                         if res.get('enfileirados'):
+                             fila_analise_ia.iniciar_em_background()
+                         st.toast(f"✅ Concluído! {res['novos']} novos, {res.get('enfileirados', 0)} na fila de análise da IA.")
                          st.rerun()
 
         # Botão EDITAR
@@ -975,9 +998,9 @@ def render_processo_detalhes(pid, df_all):
         # Buscar telefone do cliente para WhatsApp
         cliente_telefone = None
         try:
-            cliente_info = db.sql_get_query("SELECT telefone FROM clientes WHERE nome = ?", (processo_row['cliente_nome'],))
-            if not cliente_info.empty:
-                cliente_telefone = cliente_info.iloc[0].get('telefone', '')
+            cliente_info = db.cliente_do_processo(processo_row, columns=['telefone'])
+            if cliente_info:
+                cliente_telefone = cliente_info.get('telefone', '')
         except:
             pass
         
@@ -1255,9 +1278,9 @@ def render_tab_estrategia(pid, processo_row):
             tel_cliente = processo_row.get('cliente_telefone', '')
             if not tel_cliente:
                 try:
-                    cli_info = db.sql_get_query("SELECT telefone FROM clientes WHERE nome=?", (processo_row['cliente_nome'],))
-                    if not cli_info.empty:
-                        tel_cliente = cli_info.iloc[0].get('telefone', '')
+                    cli_info = db.cliente_do_processo(processo_row, columns=['telefone'])
+                    if cli_info:
+                        tel_cliente = cli_info.get('telefone', '')
                 except:
                     pass
             
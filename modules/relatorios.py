@@ -1,5 +1,8 @@
 import streamlit as st
 import database as db
+import query_cache
+import financeiro_rollup
+import exportacao
 import pandas as pd
 import logging
 import plotly.express as px
@@ -14,7 +17,6 @@ logger = logging.getLogger(__name__)
 # ========== CONFIGURAÇÕES E CONSTANTES ==========
 PRAZO_ALERTA_DIAS = 15  # Dias para alerta de prazo fatal
 MAX_LOGS_LGPD_EXIBIR = 100  # Máximo de logs LGPD a exibir
-CACHE_TTL_SEGUNDOS = 300  # 5 minutos de cache
 CATEGORIAS_COMISSAO = ['Repasse de Parceria', 'Comissão Parceria']
 
 def safe_to_datetime(series: pd.Series) -> pd.Series:
@@ -189,30 +191,49 @@ def _detectar_anomalias_financeiras(df: pd.DataFrame) -> pd.DataFrame:
 
 # ========== FUNÇÕES CACHED PARA PERFORMANCE ==========
 
-@st.cache_data(ttl=CACHE_TTL_SEGUNDOS, show_spinner="Carregando dados...")
+# Colunas usadas pelos relatórios (projeção feita no banco)
+COLUNAS_CLIENTES = ['id', 'nome', 'telefone', 'status_cliente', 'proposta_valor', 'proposta_objeto']
+COLUNAS_PROCESSOS = ['id', 'cliente_nome', 'acao', 'responsavel', 'status', 'proximo_prazo']
+COLUNAS_FINANCEIRO = ['id', 'data', 'tipo', 'categoria', 'descricao', 'valor', 'status_pagamento']
+COLUNAS_AGENDA = ['id', 'data_evento', 'status', 'responsavel']
+COLUNAS_ANDAMENTOS = ['id', 'data', 'responsavel']
+
 def get_clientes_cached():
-    """Retorna clientes com cache de 5 minutos"""
-    return db.sql_get("clientes")
+    """Retorna clientes (cache compartilhado, invalidado a cada escrita)"""
+    return db.select("clientes", columns=COLUNAS_CLIENTES, cache=True)
 
-@st.cache_data(ttl=CACHE_TTL_SEGUNDOS, show_spinner="Carregando dados...")
 def get_processos_cached():
-    """Retorna processos com cache de 5 minutos"""
-    return db.sql_get("processos")
+    """Retorna processos (cache compartilhado, invalidado a cada escrita)"""
+    return db.select("processos", columns=COLUNAS_PROCESSOS, cache=True)
 
-@st.cache_data(ttl=CACHE_TTL_SEGUNDOS, show_spinner="Carregando dados...")
 def get_financeiro_cached():
-    """Retorna registros financeiros com cache de 5 minutos"""
-    return db.sql_get("financeiro")
+    """Retorna registros financeiros (cache compartilhado, invalidado a cada escrita)"""
+    return db.select("financeiro", columns=COLUNAS_FINANCEIRO, cache=True)
 
-@st.cache_data(ttl=CACHE_TTL_SEGUNDOS, show_spinner="Carregando dados...")
 def get_agenda_cached():
-    """Retorna agenda com cache de 5 minutos"""
-    return db.sql_get("agenda")
+    """Retorna agenda (cache compartilhado, invalidado a cada escrita)"""
+    return db.select("agenda", columns=COLUNAS_AGENDA, cache=True)
 
-@st.cache_data(ttl=CACHE_TTL_SEGUNDOS, show_spinner="Carregando dados...")
 def get_andamentos_cached():
-    """Retorna andamentos com cache de 5 minutos"""
-    return db.sql_get("andamentos")
+    """Retorna andamentos (cache compartilhado, invalidado a cada escrita)"""
+    return db.select("andamentos", columns=COLUNAS_ANDAMENTOS, cache=True)
+
+def get_metricas_rapidas_cached():
+    """Retorna contagens e faturamento do mês (agregados no banco, via cache compartilhado)"""
+    total_clientes = db.count("clientes", cache=True)
+    total_processos = db.count("processos", cache=True)
+    # IS NOT: processos sem status também contam como ativos
+    processos_ativos = db.count("processos", where={'status is not': 'Arquivado'}, cache=True)
+    
+    # Faturamento do mês atual (rollup diário, sem ler o livro-caixa)
+    mes_atual = datetime.now().strftime('%Y-%m')
+    df_mes = financeiro_rollup.fluxo_mensal(f"{mes_atual}-01", f"{mes_atual}-31")
+    fat_mes = 0.0
+    if not df_mes.empty:
+        pagos_mes = df_mes[(df_mes['tipo'] == 'Entrada') & (df_mes['status_pagamento'] == 'Pago')]
+        fat_mes = float(pagos_mes['total'].sum())
+    
+    return total_clientes, total_processos, processos_ativos, fat_mes
 
 def render():
     st.markdown("<h1 style='color: var(--text-main);'>📊 Relatórios e Inteligência</h1>", unsafe_allow_html=True)
@@ -221,33 +242,15 @@ def render():
     col_refresh, col_info = st.columns([1, 5])
     with col_refresh:
         if st.button("🔄 Atualizar", help="Força atualização dos dados"):
-            st.cache_data.clear()
+            query_cache.limpar()
             st.rerun()
     with col_info:
-        st.caption("📊 Dados atualizados a cada 5 minutos")
+        st.caption("📊 Dados em cache até a próxima alteração")
     
     # NOVO: Métricas Rápidas no Topo
     try:
         # P2: Usar funções cached
-        df_cli = get_clientes_cached()
-        df_proc = get_processos_cached()
-        df_fin = get_financeiro_cached()
-        
-        total_clientes = len(df_cli) if not df_cli.empty else 0
-        total_processos = len(df_proc) if not df_proc.empty else 0
-        processos_ativos = len(df_proc[df_proc['status'] != 'Arquivado']) if not df_proc.empty and 'status' in df_proc.columns else total_processos
-        
-        # Faturamento do mês atual
-        fat_mes = 0.0
-        if not df_fin.empty:
-            df_fin['data'] = safe_to_datetime(df_fin['data'])
-            mes_atual = datetime.now().strftime('%Y-%m')
-            pagos_mes = df_fin[
-                (df_fin['tipo'] == 'Entrada') & 
-                (df_fin['status_pagamento'] == 'Pago') &
-                (df_fin['data'].dt.strftime('%Y-%m') == mes_atual)
-            ]
-            fat_mes = pagos_mes['valor'].sum() if not pagos_mes.empty else 0.0
+        total_clientes, total_processos, processos_ativos, fat_mes = get_metricas_rapidas_cached()
         
         m1, m2, m3, m4 = st.columns(4)
         m1.metric("👥 Clientes", total_clientes)
@@ -314,13 +317,9 @@ def render():
 def render_financeiro():
     st.markdown("### Fluxo de Caixa")
     
-    # P2: Dados com cache
-    df = get_financeiro_cached()
-    if df.empty:
+    if db.count("financeiro", cache=True) == 0:
         st.info("Sem dados financeiros para exibir.")
         return
-
-    df['data'] = safe_to_datetime(df['data'])
     
     # NOVO: Filtro de Período
     col_f1, col_f2, col_f3 = st.columns([1, 1, 2])
@@ -334,22 +333,21 @@ def render_financeiro():
     if not validar_periodo(data_inicio, data_fim):
         return
     
-    # Aplicar filtro
-    data_inicio_ts = pd.Timestamp(data_inicio)
-    data_fim_ts = pd.Timestamp(data_fim)
-    df_filtrado = df[(df['data'] >= data_inicio_ts) & (df['data'] <= data_fim_ts)]
+    # Agregados mensais do período (rollup incremental: mês x tipo x status)
+    df_mensal = financeiro_rollup.fluxo_mensal(data_inicio, data_fim)
     
-    if df_filtrado.empty:
+    if df_mensal.empty:
         st.warning("Nenhum dado no período selecionado.")
         return
     
-    df_filtrado['mes_ano'] = df_filtrado['data'].dt.strftime('%Y-%m')
+    df_mensal = df_mensal.rename(columns={'mes': 'mes_ano', 'total': 'valor'})
+    df_pago = df_mensal[df_mensal['status_pagamento'] == 'Pago']
     
     # KPI Cards
-    entradas = df_filtrado[(df_filtrado['tipo']=='Entrada') & (df_filtrado['status_pagamento']=='Pago')]['valor'].sum()
-    saidas = df_filtrado[(df_filtrado['tipo']=='Saída') & (df_filtrado['status_pagamento']=='Pago')]['valor'].sum()
+    entradas = df_pago[df_pago['tipo'] == 'Entrada']['valor'].sum()
+    saidas = df_pago[df_pago['tipo'] == 'Saída']['valor'].sum()
     saldo = entradas - saidas
-    receber = df_filtrado[(df_filtrado['tipo']=='Entrada') & (df_filtrado['status_pagamento']=='Pendente')]['valor'].sum()
+    receber = df_mensal[(df_mensal['tipo']=='Entrada') & (df_mensal['status_pagamento']=='Pendente')]['valor'].sum()
     
     k1, k2, k3, k4 = st.columns(4)
     k1.metric("Entradas (Período)", f"R$ {entradas:,.2f}")
@@ -364,7 +362,7 @@ def render_financeiro():
     
     with tab_bar:
         # Gráfico de Fluxo de Caixa Mensal (Barras)
-        fluxo_mensal = df_filtrado[df_filtrado['status_pagamento']=='Pago'].groupby(['mes_ano', 'tipo'])['valor'].sum().reset_index()
+        fluxo_mensal = df_pago.groupby(['mes_ano', 'tipo'])['valor'].sum().reset_index()
         
         fig = px.bar(fluxo_mensal, x='mes_ano', y='valor', color='tipo', barmode='group',
                      title="Entradas vs Saídas (Mensal)",
@@ -372,12 +370,7 @@ def render_financeiro():
         st.plotly_chart(fig, use_container_width=True)
     
     with tab_line:
-        # P3: Gráfico de Tendência OTIMIZADO (10-33x mais rápido)
-        
-        # Filtrar dados pagos uma vez
-        df_pago = df_filtrado[df_filtrado['status_pagamento']=='Pago']
-        
-        # Separar entradas e saídas ANTES de agregar (O(n) ao invés de O(n²))
+        # Gráfico de Tendência (já agregado por mês no rollup)
         entradas_mes = df_pago[df_pago['tipo']=='Entrada'].groupby('mes_ano')['valor'].sum()
         saidas_mes = df_pago[df_pago['tipo']=='Saída'].groupby('mes_ano')['valor'].sum()
         
@@ -450,8 +443,7 @@ def render_financeiro():
     st.divider()
     st.markdown("#### 📊 Comparativo Mensal")
     
-    df_filtrado['mes_ano'] = df_filtrado['data'].dt.strftime('%Y-%m')
-    meses_disponiveis = sorted(df_filtrado['mes_ano'].unique().tolist(), reverse=True)
+    meses_disponiveis = sorted(df_mensal['mes_ano'].unique().tolist(), reverse=True)
     
     if len(meses_disponiveis) >= 2:
         col_comp1, col_comp2 = st.columns(2)
@@ -462,11 +454,8 @@ def render_financeiro():
             mes2 = st.selectbox("Segundo Mês", meses_disponiveis, index=0, key="comp_mes2")
         
         # Calcular métricas para cada mês
-        df_mes1 = df_filtrado[df_filtrado['mes_ano'] == mes1]
-        df_mes2 = df_filtrado[df_filtrado['mes_ano'] == mes2]
-        
-        df_pago1 = df_mes1[df_mes1['status_pagamento'] == 'Pago']
-        df_pago2 = df_mes2[df_mes2['status_pagamento'] == 'Pago']
+        df_pago1 = df_pago[df_pago['mes_ano'] == mes1]
+        df_pago2 = df_pago[df_pago['mes_ano'] == mes2]
         
         entradas1 = df_pago1[df_pago1['tipo'] == 'Entrada']['valor'].sum()
         saidas1 = df_pago1[df_pago1['tipo'] == 'Saída']['valor'].sum()
@@ -530,7 +519,13 @@ def render_financeiro():
     st.markdown("#### ⚠️ Alertas de Anomalias Financeiras")
     st.caption("Detecta gastos acima de 50% da média por categoria")
     
-    df_anomalias = _detectar_anomalias_financeiras(df_filtrado)
+    # Anomalias precisam dos lançamentos individuais: apenas saídas pagas
+    df_saidas = db.select("financeiro", columns=['data', 'tipo', 'categoria', 'descricao', 'valor', 'status_pagamento'],
+                          where={'tipo': 'Saída', 'status_pagamento': 'Pago'}, cache=True)
+    if not df_saidas.empty:
+        df_saidas['data'] = safe_to_datetime(df_saidas['data'])
+        df_saidas = df_saidas[(df_saidas['data'] >= pd.Timestamp(data_inicio)) & (df_saidas['data'] <= pd.Timestamp(data_fim))]
+    df_anomalias = _detectar_anomalias_financeiras(df_saidas)
     
     if not df_anomalias.empty:
         st.warning(f"🚨 **{len(df_anomalias)} anomalia(s) detectada(s)!**")
@@ -994,6 +989,7 @@ def render_lgpd():
     st.markdown("#### 📋 Histórico de Acessos a Dados Pessoais")
     
     try:
+        db.flush_auditoria()
         logs = db.sql_get_query("""
             SELECT 
                 timestamp,
@@ -1177,108 +1173,96 @@ def render_comissoes():
 
 def render_exportacao_backup():
     st.markdown("### 📤 Exportação de Dados")
-    st.caption("Baixe os dados completos do sistema em formato Excel.")
+    st.caption("Baixe os dados completos do sistema. Os arquivos são gerados em lotes, "
+               "direto em disco, mesmo para tabelas grandes.")
     
     tabelas = {
         "Clientes": "clientes",
         "Processos": "processos",
         "Financeiro": "financeiro",
         "Agenda": "agenda",
-        "Parceiros": "parceiros"
+        "Parceiros": "parceiros",
+        "Andamentos": "andamentos",
+        "Auditoria": "audit_logs"
+    }
+    existentes = exportacao.tabelas_existentes(list(tabelas.values()))
+    tabelas = {label: t for label, t in tabelas.items() if t in existentes}
+    rotulos_formato = {
+        'xlsx': "Excel (.xlsx)",
+        'csv.gz': "CSV compactado (.csv.gz)",
+        'parquet': "Parquet (.parquet)"
     }
     
-    # P1: Carregar tabelas em paralelo para melhor performance
-    from concurrent.futures import ThreadPoolExecutor
+    c1, c2 = st.columns([2, 1])
+    selecionadas = c1.multiselect(
+        "Tabelas", list(tabelas.keys()),
+        default=[label for label in ("Clientes", "Processos", "Financeiro", "Agenda", "Parceiros") if label in tabelas]
+    )
+    formato = c2.selectbox(
+        "Formato", exportacao.formatos_disponiveis(),
+        format_func=lambda f: rotulos_formato[f]
+    )
     
-    def carregar_tabela(nome_tabela):
-        """Carrega uma tabela do banco de dados"""
+    if st.button("📦 Gerar Exportação", disabled=not selecionadas):
+        nomes = [tabelas[label] for label in selecionadas]
+        data_ref = datetime.now().strftime('%Y%m%d')
         try:
-            return nome_tabela, db.sql_get(nome_tabela)
-        except Exception as e:
-            logger.error(f"Erro ao carregar tabela {nome_tabela}: {e}")
-            return nome_tabela, pd.DataFrame()
-    
-    # Carregar todas as tabelas em paralelo
-    with st.spinner("Carregando dados para exportação..."):
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            resultados_futures = {executor.submit(carregar_tabela, table): label 
-                                  for label, table in tabelas.items()}
+            with st.spinner("Gerando arquivo..."):
+                if len(nomes) == 1:
+                    caminho = exportacao.exportar(nomes[0], formato)
+                    file_name = f"{selecionadas[0]}_{data_ref}{exportacao.FORMATOS[formato]['extensao']}"
+                    mime = exportacao.FORMATOS[formato]['mime']
+                else:
+                    caminho = exportacao.exportar_zip(nomes, formato)
+                    file_name = f"Exportacao_LopesRibeiro_{data_ref}.zip"
+                    mime = "application/zip"
+                dados = exportacao.ler_e_remover(caminho)
             
-            resultados = {}
-            for future in resultados_futures:
-                label = resultados_futures[future]
-                _, df = future.result()
-                resultados[label] = df
-    
-    # Gerar botões de download
-    cols = st.columns(len(tabelas))
-    
-    for i, (label, table) in enumerate(tabelas.items()):
-        with cols[i]:
-            df = resultados[label]
-            
-            buffer = io.BytesIO()
-            with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                df.to_excel(writer, sheet_name=label, index=False)
-                
             st.download_button(
-                label=f"📥 {label}",
-                data=buffer.getvalue(),
-                file_name=f"{label}_{datetime.now().strftime('%Y%m%d')}.xlsx",
-                mime="application/vnd.ms-excel",
+                label=f"📥 Baixar {file_name}",
+                data=dados,
+                file_name=file_name,
+                mime=mime,
                 use_container_width=True
             )
+        except Exception as e:
+            logger.error(f"Erro ao gerar exportação: {e}")
+            st.error(f"Erro ao gerar exportação: {e}")
             
     st.divider()
     st.markdown("### 🛡️ Backup Completo do Sistema")
-    st.caption("Gera um arquivo SQL contendo toda a estrutura e dados do banco de dados.")
     
-    if st.button("📦 Gerar Backup Completo (SQL)"):
-        # Bug #3: Melhorar tratamento de erro is_postgres()
-        try:
-            is_postgres = db.is_postgres()
-        except AttributeError:
-            logger.warning("Função is_postgres() não encontrada em database.py")
-            is_postgres = False
-        except Exception as e:
-            logger.warning(f"Erro ao verificar tipo de banco: {e}")
-            is_postgres = False
-        
+    import database_adapter as adapter
+    
+    if adapter.USE_POSTGRES:
+        st.caption("Gera um Excel com todas as tabelas principais do banco de dados.")
+    else:
+        st.caption("Gera um arquivo SQL compactado contendo toda a estrutura e dados do banco de dados.")
+    
+    if st.button("📦 Gerar Backup Completo"):
         try:
+            with st.spinner("Gerando backup..."):
+                if adapter.USE_POSTGRES:
+                    # Para PostgreSQL, exportar como Excel completo
+                    caminho = exportacao.exportar_xlsx(
+                        list(tabelas.values()), nomes=list(tabelas.keys())
+                    )
+                    file_name = f"Backup_LopesRibeiro_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
+                    mime = exportacao.FORMATOS['xlsx']['mime']
+                else:
+                    # Dump do SQLite
+                    caminho = exportacao.exportar_sql_dump()
+                    file_name = f"Backup_LopesRibeiro_{datetime.now().strftime('%Y%m%d_%H%M')}.sql.gz"
+                    mime = "application/gzip"
+                dados = exportacao.ler_e_remover(caminho)
             
-            if is_postgres:
-                # Para PostgreSQL, exportar como Excel completo
-                buffer = io.BytesIO()
-                with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                    for table in ['clientes', 'processos', 'financeiro', 'agenda', 'parceiros', 'andamentos']:
-                        try:
-                            df = db.sql_get(table)
-                            df.to_excel(writer, sheet_name=table[:31], index=False)
-                        except:
-                            pass
-                
-                st.download_button(
-                    label="⬇️ Baixar Backup Excel",
-                    data=buffer.getvalue(),
-                    file_name=f"Backup_LopesRibeiro_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
-                    mime="application/vnd.ms-excel"
-                )
-                st.success("Backup gerado com sucesso (Excel)!")
-            else:
-                # Dump do SQLite
-                conn = db.get_connection()
-                with io.StringIO() as f:
-                    for line in conn.iterdump():
-                        f.write('%s\n' % line)
-                    sql_dump = f.getvalue()
-                    
-                st.download_button(
-                    label="⬇️ Baixar Backup SQL",
-                    data=sql_dump,
-                    file_name=f"Backup_LopesRibeiro_{datetime.now().strftime('%Y%m%d_%H%M')}.sql",
-                    mime="application/sql"
-                )
-                st.success("Backup gerado com sucesso!")
+            st.download_button(
+                label="⬇️ Baixar Backup",
+                data=dados,
+                file_name=file_name,
+                mime=mime
+            )
+            st.success("Backup gerado com sucesso!")
             
         except Exception as e:
             logger.error(f"Erro ao gerar backup: {e}")
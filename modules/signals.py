@@ -118,9 +118,9 @@ def _sanitize_data(data: Any) -> Optional[Dict]:
 
 def _get_event_type(event_name: str) -> str:
     """Classifica o tipo do evento."""
-    if event_name.startswith('insert_'):
+    if event_name.startswith('insert_') or event_name.startswith('bulk_insert_'):
         return 'create'
-    elif event_name.startswith('update_'):
+    elif event_name.startswith('update_') or event_name.startswith('bulk_upsert_'):
         return 'update'
     elif event_name.startswith('delete_'):
         return 'delete'
@@ -181,6 +181,20 @@ EVENT_DELETE_FINANCEIRO = 'delete_financeiro'
 EVENT_INSERT_AGENDA = 'insert_agenda'
 EVENT_UPDATE_AGENDA = 'update_agenda'
 
+# Escritas em lote (crud_insert_many / crud_upsert_many): um evento por lote
+EVENT_BULK_INSERT_PREFIX = 'bulk_insert_'
+EVENT_BULK_UPSERT_PREFIX = 'bulk_upsert_'
+
+_EVENT_PREFIXES = ('bulk_insert_', 'bulk_upsert_', 'insert_', 'update_', 'delete_')
+
+
+def event_table(event_name: str) -> str:
+    """Extrai o nome da tabela de um evento (ex: 'bulk_insert_financeiro' -> 'financeiro')."""
+    for prefix in _EVENT_PREFIXES:
+        if event_name.startswith(prefix):
+            return event_name[len(prefix):]
+    return event_name
+
 
 def get_activity_summary() -> Dict[str, Any]:
     """
@@ -199,7 +213,7 @@ def get_activity_summary() -> Dict[str, Any]:
     # Eventos por tabela
     tables = {}
     for e in events:
-        table = e['event'].replace('insert_', '').replace('update_', '').replace('delete_', '')
+        table = event_table(e['event'])
         tables[table] = tables.get(table, 0) + 1
     
     return {
@@ -0,0 +1,229 @@
+"""
+Cache de Resultados de Consultas - Sistema Lopes & Ribeiro
+
+Cache read-through compartilhado por todas as sessões Streamlit do
+processo, usado por database.sql_get_query(..., cache=True) e pelos
+helpers select()/count().
+
+Invalidação exata por versão de tabela:
+- Cada tabela tem um contador de versão
+- A chave do cache é (SQL normalizado, parâmetros, versões das tabelas lidas)
+- Toda escrita incrementa a versão da tabela: crud_insert/update/delete e
+  escritas em lote via modules.signals (insert_/update_/delete_/bulk_*),
+  sql_run via invalidar_sql(); escritas fora dessas funções devem chamar
+  invalidar(tabela)
+- Tabelas derivadas (mantidas por trigger) acompanham a versão da origem
+  (registrar_dependencia)
+- Entradas de versões antigas nunca mais são encontradas e saem por LRU
+
+Limites: número de entradas (QUERY_CACHE_MAX_ITENS), memória estimada dos
+DataFrames (QUERY_CACHE_MAX_MB) e um TTL de segurança (QUERY_CACHE_TTL)
+para escritas feitas por outros processos (ex.: scheduled_tasks).
+
+Uso:
+    df = query_cache.consultar(sql, params, carregar)   # carregar(sql, params) -> DataFrame
+    query_cache.invalidar('financeiro')
+    query_cache.get_stats()
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+QUERY_CACHE_ATIVO = os.getenv('QUERY_CACHE', '1') != '0'
+QUERY_CACHE_MAX_ITENS = int(os.getenv('QUERY_CACHE_MAX_ITENS', '512'))
+QUERY_CACHE_MAX_MB = float(os.getenv('QUERY_CACHE_MAX_MB', '64'))
+QUERY_CACHE_TTL = float(os.getenv('QUERY_CACHE_TTL', '300'))
+
+# Eventos de escrita emitidos por database.py (modules.signals)
+EVENTOS_ESCRITA = ('insert_', 'update_', 'delete_', 'bulk_insert_', 'bulk_upsert_')
+
+_RE_TABELAS = re.compile(r'\b(?:FROM|JOIN)\s+([A-Za-z_][A-Za-z0-9_]*)', re.IGNORECASE)
+_RE_ALVO_ESCRITA = re.compile(
+    r'^\s*(?:INSERT\s+(?:OR\s+\w+\s+)?INTO|UPDATE|DELETE\s+FROM|REPLACE\s+INTO)\s+([A-Za-z_][A-Za-z0-9_]*)',
+    re.IGNORECASE
+)
+_RE_ESPACOS = re.compile(r'\s+')
+
+_lock = threading.Lock()
+_versoes: Dict[str, int] = {}
+_entradas: "OrderedDict[tuple, Dict]" = OrderedDict()
+_bytes = 0
+_assinados: Dict[str, Callable] = {}
+_derivadas: Dict[str, set] = {}
+
+_stats = {
+    'hits': 0,
+    'misses': 0,
+    'evictions': 0,
+    'expired': 0,
+    'invalidations': 0,
+}
+
+
+# =====================================================
+# VERSÕES / INVALIDAÇÃO
+# =====================================================
+
+def tabelas_da_consulta(sql: str) -> List[str]:
+    """Tabelas lidas pela consulta (FROM / JOIN), sem repetição."""
+    tabelas = []
+    for tabela in _RE_TABELAS.findall(sql):
+        tabela = tabela.lower()
+        if tabela not in tabelas:
+            tabelas.append(tabela)
+    return tabelas
+
+
+def invalidar(tabela: str):
+    """Incrementa a versão da tabela e das tabelas derivadas dela."""
+    tabela = tabela.lower()
+    with _lock:
+        for alvo in (tabela, *_derivadas.get(tabela, ())):
+            _versoes[alvo] = _versoes.get(alvo, 0) + 1
+        _stats['invalidations'] += 1
+
+
+def registrar_dependencia(derivada: str, origem: str):
+    """
+    Declara uma tabela mantida pelo banco a partir de outra (ex.: rollups
+    atualizados por trigger): escrever na origem invalida a derivada.
+    """
+    with _lock:
+        _derivadas.setdefault(origem.lower(), set()).add(derivada.lower())
+    _assinar(origem.lower())
+
+
+def invalidar_sql(sql: str):
+    """Invalida a tabela alvo de um INSERT/UPDATE/DELETE (usado por sql_run)."""
+    m = _RE_ALVO_ESCRITA.match(sql)
+    if m:
+        invalidar(m.group(1))
+
+
+def _assinar(tabela: str):
+    """Inscreve a invalidação da tabela nos eventos de escrita (uma vez)."""
+    if tabela in _assinados:
+        return
+    try:
+        from modules import signals
+    except ImportError:
+        return
+
+    def _invalidar_tabela(_data=None):
+        invalidar(tabela)
+    _invalidar_tabela.__name__ = f"query_cache_invalidar_{tabela}"
+    _assinados[tabela] = _invalidar_tabela
+
+    for prefixo in EVENTOS_ESCRITA:
+        signals.subscribe(f"{prefixo}{tabela}", _invalidar_tabela)
+
+
+# =====================================================
+# CONSULTA
+# =====================================================
+
+def _tamanho(df: pd.DataFrame) -> int:
+    try:
+        return int(df.memory_usage(index=True, deep=True).sum())
+    except Exception:
+        return 0
+
+
+def _remover(chave):
+    global _bytes
+    entrada = _entradas.pop(chave, None)
+    if entrada is not None:
+        _bytes -= entrada['bytes']
+
+
+def _evitar_excesso():
+    """Remove as entradas menos usadas até caber nos limites."""
+    limite_bytes = QUERY_CACHE_MAX_MB * 1024 * 1024
+    while _entradas and (len(_entradas) > QUERY_CACHE_MAX_ITENS or _bytes > limite_bytes):
+        chave = next(iter(_entradas))
+        _remover(chave)
+        _stats['evictions'] += 1
+
+
+def _chave(sql: str, params, tabelas: Iterable[str]) -> tuple:
+    if params is not None and not isinstance(params, (list, tuple)):
+        params = (params,)
+    with _lock:
+        versoes = tuple((t, _versoes.get(t, 0)) for t in tabelas)
+    return (_RE_ESPACOS.sub(' ', sql).strip(), tuple(params or ()), versoes)
+
+
+def consultar(sql: str, params, carregar: Callable[[str, Optional[tuple]], pd.DataFrame]) -> pd.DataFrame:
+    """
+    Retorna o resultado em cache ou executa `carregar(sql, params)` e guarda.
+
+    As versões das tabelas são lidas antes de executar: um resultado que
+    concorreu com uma escrita fica associado à versão anterior e nunca é
+    servido depois dela.
+
+    Returns:
+        Cópia do DataFrame (quem chama pode alterá-lo livremente)
+    """
+    tabelas = tabelas_da_consulta(sql)
+    if not QUERY_CACHE_ATIVO or not tabelas:
+        return carregar(sql, params)
+
+    for tabela in tabelas:
+        _assinar(tabela)
+
+    chave = _chave(sql, params, tabelas)
+    agora = time.monotonic()
+    with _lock:
+        entrada = _entradas.get(chave)
+        if entrada is not None:
+            if agora - entrada['criado_em'] <= QUERY_CACHE_TTL:
+                _entradas.move_to_end(chave)
+                _stats['hits'] += 1
+                return entrada['df'].copy()
+            _remover(chave)
+            _stats['expired'] += 1
+        _stats['misses'] += 1
+
+    df = carregar(sql, params)
+
+    global _bytes
+    tamanho = _tamanho(df)
+    with _lock:
+        _remover(chave)
+        _entradas[chave] = {'df': df, 'bytes': tamanho, 'criado_em': agora}
+        _bytes += tamanho
+        _evitar_excesso()
+    return df.copy()
+
+
+# =====================================================
+# CONTROLE
+# =====================================================
+
+def limpar():
+    """Descarta todas as entradas (as versões das tabelas são mantidas)."""
+    global _bytes
+    with _lock:
+        _entradas.clear()
+        _bytes = 0
+
+
+def get_stats() -> Dict:
+    """Métricas do cache: hits, misses, taxa de acerto, entradas e memória."""
+    with _lock:
+        dados = dict(_stats)
+        dados['entradas'] = len(_entradas)
+        dados['memoria_mb'] = round(_bytes / (1024 * 1024), 2)
+        dados['versoes'] = dict(_versoes)
+    total = dados['hits'] + dados['misses']
+    dados['taxa_acerto'] = round(dados['hits'] / total, 3) if total else 0.0
+    return dados
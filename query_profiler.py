@@ -0,0 +1,403 @@
+"""
+Profiler de Consultas - Sistema Lopes & Ribeiro
+
+Instrumentação do DatabaseAdapter (fetch_all / fetch_one / execute_query),
+o que cobre sql_get_query, sql_run, select e crud_*. Para cada consulta
+registra tempo, linhas, origem (arquivo:linha fora da camada de banco) e
+a "impressão digital" do SQL (literais trocados por '?').
+
+Agregados mantidos em memória:
+- Global e por impressão digital: chamadas, tempo total/máximo, p50/p95
+- Por sessão Streamlit: consultas e tempo de cada rerun (ver iniciar_rerun)
+- Log de consultas lentas (acima de SLOW_QUERY_MS) com o plano EXPLAIN,
+  também gravado em logs/slow_queries.log (logging_config)
+
+O EXPLAIN roda numa thread de segundo plano (em_segundo_plano), nunca no
+caminho da consulta: no PostgreSQL ele pegaria uma segunda conexão do pool
+enquanto o chamador ainda segura a primeira.
+
+Uso:
+    import query_profiler
+    query_profiler.iniciar_rerun(session_id)   # no topo do app.py
+    query_profiler.resumo()                    # visão global
+    query_profiler.consultas_lentas()
+"""
+
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILER_ATIVO = os.getenv('QUERY_PROFILER', '1') != '0'
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+
+_MAX_AMOSTRAS = 1000          # durações guardadas para percentis (global)
+_MAX_AMOSTRAS_CONSULTA = 200  # por impressão digital
+_MAX_CONSULTAS = 500          # impressões digitais distintas
+_MAX_SESSOES = 100
+_MAX_RERUNS = 50
+_MAX_LENTAS = 200
+_MAX_PLANOS = 200             # planos EXPLAIN em cache (LRU)
+_MAX_TAREFAS = 100           # EXPLAINs aguardando o worker
+
+_RE_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s")
+_RE_ESPACOS = re.compile(r'\s+')
+_RE_LISTA_IN = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+# Arquivos da camada de banco: a origem é o primeiro frame fora deles
+_ARQUIVOS_INTERNOS = ('database.py', 'database_adapter.py', 'query_profiler.py', 'index_advisor.py')
+
+_lock = threading.Lock()
+_local = threading.local()
+
+_global = {
+    'consultas': 0,
+    'tempo_total_ms': 0.0,
+    'linhas': 0,
+    'duracoes': deque(maxlen=_MAX_AMOSTRAS),
+    'desde': datetime.now().isoformat(timespec='seconds'),
+}
+_por_consulta: Dict[str, Dict] = {}
+_sessoes: "OrderedDict[str, Dict]" = OrderedDict()
+_lentas: deque = deque(maxlen=_MAX_LENTAS)
+_planos: "OrderedDict[str, List[str]]" = OrderedDict()
+_explain_pendente = set()
+
+_tarefas: "queue.Queue" = queue.Queue(maxsize=_MAX_TAREFAS)
+_worker: Optional[threading.Thread] = None
+_worker_lock = threading.Lock()
+
+
+# =====================================================
+# HELPERS
+# =====================================================
+
+def impressao_digital(sql: str) -> str:
+    """SQL normalizado: literais e listas IN viram '?', espaços colapsados."""
+    texto = _RE_LITERAL.sub('?', sql)
+    texto = _RE_LISTA_IN.sub('(?)', texto)
+    return _RE_ESPACOS.sub(' ', texto).strip()
+
+
+def percentil(valores, p: float) -> float:
+    """Percentil por posição mais próxima (0 se vazio)."""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    idx = min(len(ordenados) - 1, max(0, int(round(p / 100 * len(ordenados))) - 1))
+    return round(ordenados[idx], 2)
+
+
+def _origem() -> str:
+    """arquivo:linha (função) do primeiro frame fora da camada de banco."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        arquivo = frame.f_code.co_filename
+        if not arquivo.endswith(_ARQUIVOS_INTERNOS) and 'contextlib' not in arquivo:
+            return f"{os.path.basename(arquivo)}:{frame.f_lineno} ({frame.f_code.co_name})"
+        frame = frame.f_back
+    return '?'
+
+
+def em_segundo_plano(tarefa) -> bool:
+    """
+    Agenda `tarefa()` no worker do profiler (usado para os EXPLAIN).
+
+    Returns:
+        False se a fila estiver cheia (a tarefa é descartada)
+    """
+    global _worker
+    try:
+        _tarefas.put_nowait(tarefa)
+    except queue.Full:
+        return False
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_executar_tarefas, name='query-profiler', daemon=True)
+            _worker.start()
+    return True
+
+
+def _executar_tarefas():
+    while True:
+        tarefa = _tarefas.get()
+        try:
+            tarefa()
+        except Exception as e:
+            logger.debug(f"Tarefa do profiler falhou: {e}")
+        finally:
+            _tarefas.task_done()
+
+
+@contextmanager
+def sem_registro():
+    """Não registra as consultas executadas dentro do bloco (ex.: EXPLAIN)."""
+    anterior = getattr(_local, 'interno', False)
+    _local.interno = True
+    try:
+        yield
+    finally:
+        _local.interno = anterior
+
+
+# =====================================================
+# SESSÕES / RERUNS
+# =====================================================
+
+def iniciar_rerun(sessao: Optional[str]):
+    """
+    Marca o início de um rerun da sessão na thread atual.
+
+    As consultas seguintes desta thread contam para o rerun; o rerun
+    anterior da sessão vai para o histórico.
+    """
+    if not PROFILER_ATIVO or not sessao:
+        return
+    with _lock:
+        dados = _sessoes.get(sessao)
+        if dados is None:
+            dados = _sessoes[sessao] = {
+                'reruns': deque(maxlen=_MAX_RERUNS),
+                'duracoes': deque(maxlen=_MAX_AMOSTRAS_CONSULTA),
+                'atual': None,
+            }
+            while len(_sessoes) > _MAX_SESSOES:
+                _sessoes.popitem(last=False)
+        else:
+            _sessoes.move_to_end(sessao)
+        if dados['atual'] is not None:
+            dados['reruns'].append(dados['atual'])
+        dados['atual'] = {
+            'inicio': datetime.now().isoformat(timespec='seconds'),
+            'consultas': 0,
+            'tempo_ms': 0.0,
+        }
+    _local.sessao = sessao
+
+
+# =====================================================
+# REGISTRO
+# =====================================================
+
+def registrar(sql: str, params, duracao_ms: float, linhas: int = 0):
+    """
+    Registra uma execução (chamado pelo DatabaseAdapter).
+
+    Args:
+        sql: Consulta executada (já no dialeto do banco)
+        params: Parâmetros (usados no EXPLAIN de consultas lentas)
+        duracao_ms: Tempo de execução em milissegundos
+        linhas: Linhas retornadas ou afetadas
+    """
+    if not PROFILER_ATIVO or getattr(_local, 'interno', False):
+        return
+
+    digital = impressao_digital(sql)
+    origem = _origem()
+    lenta = duracao_ms >= SLOW_QUERY_MS
+
+    with _lock:
+        _global['consultas'] += 1
+        _global['tempo_total_ms'] += duracao_ms
+        _global['linhas'] += max(linhas, 0)
+        _global['duracoes'].append(duracao_ms)
+
+        item = _por_consulta.get(digital)
+        if item is None and len(_por_consulta) < _MAX_CONSULTAS:
+            item = _por_consulta[digital] = {
+                'consulta': digital,
+                'chamadas': 0,
+                'tempo_total_ms': 0.0,
+                'tempo_max_ms': 0.0,
+                'linhas': 0,
+                'duracoes': deque(maxlen=_MAX_AMOSTRAS_CONSULTA),
+                'origem': origem,
+            }
+        if item is not None:
+            item['chamadas'] += 1
+            item['tempo_total_ms'] += duracao_ms
+            item['tempo_max_ms'] = max(item['tempo_max_ms'], duracao_ms)
+            item['linhas'] += max(linhas, 0)
+            item['duracoes'].append(duracao_ms)
+            item['origem'] = origem
+
+        sessao = getattr(_local, 'sessao', None)
+        dados = _sessoes.get(sessao) if sessao else None
+        if dados is not None and dados['atual'] is not None:
+            dados['atual']['consultas'] += 1
+            dados['atual']['tempo_ms'] += duracao_ms
+            dados['duracoes'].append(duracao_ms)
+
+    # Consultas de leitura alimentam o consultor de índices
+    select = sql.lstrip()[:6].upper().startswith(('SELECT', 'WITH'))
+    if select:
+        import index_advisor
+        index_advisor.registrar(sql, params, duracao_ms)
+
+    if lenta:
+        _registrar_lenta(sql, params, digital, duracao_ms, linhas, origem, select)
+
+
+def _registrar_lenta(sql, params, digital, duracao_ms, linhas, origem, select):
+    entrada = {
+        'quando': datetime.now().isoformat(timespec='seconds'),
+        'tempo_ms': round(duracao_ms, 2),
+        'linhas': linhas,
+        'origem': origem,
+        'consulta': digital,
+        'plano': [],
+    }
+    with _lock:
+        plano = _planos.get(digital)
+        if plano is not None:
+            _planos.move_to_end(digital)
+        explicar = plano is None and select and digital not in _explain_pendente
+        if explicar:
+            _explain_pendente.add(digital)
+
+    if explicar:
+        if em_segundo_plano(lambda: _explicar_lenta(sql, params, digital, entrada)):
+            return
+        with _lock:
+            _explain_pendente.discard(digital)
+
+    entrada['plano'] = plano or []
+    _gravar_lenta(entrada)
+
+
+def _explicar_lenta(sql, params, digital, entrada):
+    """Roda no worker: EXPLAIN, guarda o plano no LRU e grava a entrada."""
+    import index_advisor
+    plano = index_advisor.explicar(sql, params)
+    with _lock:
+        _planos[digital] = plano
+        _planos.move_to_end(digital)
+        while len(_planos) > _MAX_PLANOS:
+            _planos.popitem(last=False)
+        _explain_pendente.discard(digital)
+    entrada['plano'] = plano
+    _gravar_lenta(entrada)
+
+
+def _gravar_lenta(entrada):
+    with _lock:
+        _lentas.append(entrada)
+
+    linhas_plano = ''.join(f"\n    PLAN: {linha}" for linha in entrada['plano'])
+    try:
+        import logging_config
+        log_lentas = logging_config.get_slow_query_logger()
+    except Exception:
+        log_lentas = logger
+    log_lentas.warning(
+        f"Consulta lenta ({entrada['tempo_ms']} ms, {entrada['linhas']} linhas) "
+        f"em {entrada['origem']}: {entrada['consulta']}{linhas_plano}"
+    )
+
+
+@contextmanager
+def medir(sql: str, params=None):
+    """
+    Mede o bloco que executa `sql`; o chamador informa as linhas em `m['linhas']`.
+
+    Uso:
+        with query_profiler.medir(query, params) as m:
+            rows = cursor.fetchall()
+            m['linhas'] = len(rows)
+    """
+    medicao = {'linhas': 0}
+    inicio = time.perf_counter()
+    try:
+        yield medicao
+    finally:
+        registrar(sql, params, (time.perf_counter() - inicio) * 1000, medicao['linhas'])
+
+
+# =====================================================
+# CONSULTA DOS DADOS
+# =====================================================
+
+def resumo() -> Dict:
+    """Agregado global: consultas, tempo total, linhas, p50/p95/máx."""
+    with _lock:
+        duracoes = list(_global['duracoes'])
+        return {
+            'desde': _global['desde'],
+            'consultas': _global['consultas'],
+            'tempo_total_ms': round(_global['tempo_total_ms'], 2),
+            'linhas': _global['linhas'],
+            'p50_ms': percentil(duracoes, 50),
+            'p95_ms': percentil(duracoes, 95),
+            'max_ms': round(max(duracoes), 2) if duracoes else 0.0,
+            'lentas': len(_lentas),
+        }
+
+
+def top_consultas(limite: int = 20, ordenar_por: str = 'tempo_total_ms') -> List[Dict]:
+    """Consultas agregadas por impressão digital, das mais custosas às menos."""
+    with _lock:
+        itens = [dict(i, duracoes=list(i['duracoes'])) for i in _por_consulta.values()]
+    saida = []
+    for item in itens:
+        duracoes = item.pop('duracoes')
+        item['tempo_total_ms'] = round(item['tempo_total_ms'], 2)
+        item['tempo_max_ms'] = round(item['tempo_max_ms'], 2)
+        item['p50_ms'] = percentil(duracoes, 50)
+        item['p95_ms'] = percentil(duracoes, 95)
+        saida.append(item)
+    saida.sort(key=lambda i: i.get(ordenar_por, 0), reverse=True)
+    return saida[:limite]
+
+
+def sessao(sessao_id: Optional[str] = None) -> Optional[Dict]:
+    """
+    Agregados de uma sessão (padrão: a da thread atual).
+
+    Returns:
+        {'rerun_atual', 'reruns' (histórico, mais recente por último),
+         'media_consultas_rerun', 'p50_ms', 'p95_ms'} ou None
+    """
+    sessao_id = sessao_id or getattr(_local, 'sessao', None)
+    with _lock:
+        dados = _sessoes.get(sessao_id) if sessao_id else None
+        if dados is None:
+            return None
+        reruns = list(dados['reruns'])
+        atual = dict(dados['atual']) if dados['atual'] else None
+        duracoes = list(dados['duracoes'])
+    return {
+        'rerun_atual': atual,
+        'reruns': reruns,
+        'media_consultas_rerun': round(sum(r['consultas'] for r in reruns) / len(reruns), 1) if reruns else 0,
+        'p50_ms': percentil(duracoes, 50),
+        'p95_ms': percentil(duracoes, 95),
+    }
+
+
+def consultas_lentas(limite: int = 50) -> List[Dict]:
+    """Últimas consultas lentas (mais recentes primeiro), com o plano."""
+    with _lock:
+        return list(_lentas)[-limite:][::-1]
+
+
+def limpar():
+    """Zera todos os agregados (não apaga o arquivo de log)."""
+    with _lock:
+        _global.update(consultas=0, tempo_total_ms=0.0, linhas=0,
+                       desde=datetime.now().isoformat(timespec='seconds'))
+        _global['duracoes'].clear()
+        _por_consulta.clear()
+        _lentas.clear()
+        _planos.clear()
+        for dados in _sessoes.values():
+            dados['reruns'].clear()
+            dados['duracoes'].clear()
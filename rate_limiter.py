@@ -27,9 +27,10 @@ Uso:
 from datetime import datetime, timedelta
 from typing import Dict, Optional
 import logging
-import sqlite3
 import os
 
+import database_adapter
+
 logger = logging.getLogger(__name__)
 
 # Banco de dados separado para rate limiting (mais seguro e performático)
@@ -37,10 +38,8 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 RATE_LIMIT_DB = os.path.join(BASE_DIR, 'rate_limit_events.db')
 
 def _get_connection():
-    """Cria conexão com banco de rate limiting."""
-    conn = sqlite3.connect(RATE_LIMIT_DB)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Cria conexão com banco de rate limiting (perfil WAL/busy_timeout do adapter)."""
+    return database_adapter.connect_sqlite(RATE_LIMIT_DB)
 
 class RateLimiter:
     """
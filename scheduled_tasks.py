@@ -5,7 +5,9 @@ Script para execução via Windows Task Scheduler ou Cron.
 Funcionalidades:
 1. Gerar insights periódicos (prazos, processos parados, inadimplência)
 2. Verificar recorrências financeiras
-3. (Opcional) Verificar e-mails do Gmail
+3. Manutenção dos bancos SQLite (wal_checkpoint + optimize)
+4. Análise por IA dos andamentos na fila (em lote, respeitando a cota)
+5. (Opcional) Verificar e-mails do Gmail
 
 Configuração do Windows Task Scheduler:
     1. Abra o Agendador de Tarefas do Windows (taskschd.msc)
@@ -81,11 +83,55 @@ def run_all_tasks():
         logger.error(f"❌ Erro nas recorrências: {e}")
     
     # =====================================================
-    # 3. (OPCIONAL) VERIFICAR E-MAILS GMAIL
+    # 3. MANUTENÇÃO SQLITE (WAL CHECKPOINT + OPTIMIZE)
+    # =====================================================
+    try:
+        logger.info("\n--- Tarefa 3: Manutenção SQLite ---")
+        
+        import database_adapter
+        
+        if not database_adapter.USE_POSTGRES:
+            arquivos = [
+                os.path.join(BASE_DIR, 'dados_escritorio.db'),
+                os.path.join(BASE_DIR, 'ai_cache.db'),
+                os.path.join(BASE_DIR, 'rate_limit_events.db'),
+            ]
+            resultado = database_adapter.sqlite_maintenance(arquivos)
+            ok = sum(1 for r in resultado.values() if r['ok'])
+            logger.info(f"✅ Manutenção concluída: {ok}/{len(resultado)} banco(s)")
+            
+            import busca_textual
+            busca_textual.otimizar_indice()
+        else:
+            logger.info("PostgreSQL: manutenção gerenciada pela plataforma")
+        
+    except Exception as e:
+        logger.error(f"❌ Erro na manutenção SQLite: {e}")
+    
+    # =====================================================
+    # 4. FILA DE ANÁLISE POR IA (ANDAMENTOS DATAJUD)
+    # =====================================================
+    try:
+        logger.info("\n--- Tarefa 4: Fila de Análise por IA ---")
+        
+        import fila_analise_ia
+        
+        resultado = fila_analise_ia.processar()
+        restante = fila_analise_ia.status()
+        logger.info(
+            f"✅ {resultado['analisados']} andamentos analisados em {resultado['chamadas']} chamadas "
+            f"({resultado['falhas']} falhas, {restante['pendentes']} pendentes na fila)"
+        )
+        
+    except Exception as e:
+        logger.error(f"❌ Erro na fila de análise por IA: {e}")
+    
+    # =====================================================
+    # 5. (OPCIONAL) VERIFICAR E-MAILS GMAIL
     # =====================================================
     # Descomente se quiser integrar com email_scheduler
     # try:
-    #     logger.info("\n--- Tarefa 3: Verificação de E-mails ---")
+    #     logger.info("\n--- Tarefa 5: Verificação de E-mails ---")
     #     from email_scheduler import verificar_emails
     #     verificar_emails()
     #     logger.info("✅ E-mails verificados")
@@ -0,0 +1,1085 @@
+"""
+Migrações de Schema Versionadas - Sistema Lopes & Ribeiro
+
+Substitui a antiga abordagem de executar ~25 CREATE TABLE + sondagens
+SELECT/ALTER a cada rerun do Streamlit.
+
+Funcionamento:
+- Tabela `schema_version` registra cada migração aplicada
+- Registro ordenado de migrações (decorator @migration)
+- `ensure_schema()` aplica apenas as pendentes, protegido por lock
+  (threading.Lock no processo + BEGIN IMMEDIATE / pg_advisory_lock no banco)
+- Flag de processo: após a primeira execução bem-sucedida, reruns e
+  helpers como criar_tabela_notificacoes() não executam DDL algum
+
+Uso:
+    import schema_migrations
+    schema_migrations.ensure_schema()   # normalmente via database.init_db()
+
+Para adicionar uma migração, crie uma função com o próximo número:
+
+    @migration(17, "Descrição curta")
+    def _m017_minha_mudanca(cursor):
+        cursor.execute(_adapt("CREATE TABLE IF NOT EXISTS ..."))
+"""
+
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+import database_adapter as adapter
+import query_cache
+
+logger = logging.getLogger(__name__)
+
+# Registro ordenado: [(versao, descricao, funcao, dialetos)]
+MIGRATIONS: List[Tuple[int, str, Callable, Tuple[str, ...]]] = []
+
+# Chave arbitrária para o advisory lock do PostgreSQL
+_PG_LOCK_KEY = 74102025
+
+_lock = threading.Lock()
+_schema_ready = False
+
+
+def migration(version: int, descricao: str, dialects: Tuple[str, ...] = ('sqlite', 'postgresql')):
+    """
+    Registra uma função de migração.
+    
+    Args:
+        version: Número sequencial e único da migração
+        descricao: Descrição curta (gravada em schema_version)
+        dialects: Bancos em que a migração se aplica
+    """
+    def decorator(func):
+        if any(v == version for v, _, _, _ in MIGRATIONS):
+            raise ValueError(f"Migração {version} registrada em duplicidade")
+        MIGRATIONS.append((version, descricao, func, dialects))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return decorator
+
+
+# =====================================================
+# HELPERS
+# =====================================================
+
+def _dialect() -> str:
+    return 'postgresql' if adapter.USE_POSTGRES else 'sqlite'
+
+
+def _ph() -> str:
+    """Placeholder de parâmetro do banco atual."""
+    return '%s' if adapter.USE_POSTGRES else '?'
+
+
+def _adapt(sql: str) -> str:
+    """Adapta DDL escrito para SQLite ao banco atual."""
+    return adapter.get_adapter().adapt_sql(sql)
+
+
+def column_exists(cursor, table: str, column: str) -> bool:
+    """Verifica se a coluna existe (sem depender de SELECT ... LIMIT 1 com exceção)."""
+    if adapter.USE_POSTGRES:
+        cursor.execute(
+            "SELECT 1 FROM information_schema.columns WHERE table_name = %s AND column_name = %s",
+            (table, column)
+        )
+        return cursor.fetchone() is not None
+    cursor.execute(f"PRAGMA table_info({table})")
+    return any(row[1] == column for row in cursor.fetchall())
+
+
+def add_columns_if_missing(cursor, table: str, columns: dict):
+    """
+    Adiciona colunas ausentes em uma tabela.
+    
+    Args:
+        table: Nome da tabela
+        columns: {nome_coluna: definição SQL}
+    """
+    for column, ddl in columns.items():
+        if not column_exists(cursor, table, column):
+            logger.info(f"Migrando tabela {table}: adicionando coluna {column}")
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+
+def table_exists(cursor, table: str) -> bool:
+    """Verifica se a tabela existe no banco atual."""
+    if adapter.USE_POSTGRES:
+        cursor.execute(
+            "SELECT 1 FROM information_schema.tables WHERE table_name = %s", (table,)
+        )
+    else:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    return cursor.fetchone() is not None
+
+
+def create_index_if_possible(cursor, name: str, table: str, columns: List[str]):
+    """
+    Cria um índice se a tabela e todas as colunas existirem.
+    
+    No Supabase parte das tabelas auxiliares pode não existir (schema
+    criado por script); nesse caso o índice é apenas ignorado.
+    """
+    if not table_exists(cursor, table):
+        logger.debug(f"Índice {name} ignorado: tabela {table} não existe")
+        return
+    ausentes = [c for c in columns if not column_exists(cursor, table, c.strip('"'))]
+    if ausentes:
+        logger.debug(f"Índice {name} ignorado: colunas ausentes em {table}: {ausentes}")
+        return
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table}({', '.join(columns)})")
+
+
+# =====================================================
+# MIGRAÇÕES
+# =====================================================
+
+@migration(1, "Schema base (tabelas principais)", dialects=('sqlite',))
+def _m001_schema_base(cursor):
+    """
+    Schema original do init_db().
+    
+    Apenas SQLite: no Supabase o schema base é criado por
+    scripts/supabase_create_tables.sql.
+    """
+    # 1. Tabela de Usuários
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            nome TEXT NOT NULL,
+            role TEXT DEFAULT 'user',
+            ativo INTEGER DEFAULT 1,
+            criado_em TEXT DEFAULT CURRENT_TIMESTAMP,
+            pergunta_secreta TEXT,
+            resposta_secreta_hash TEXT,
+            email TEXT,
+            reset_token TEXT,
+            reset_expiry TEXT
+        )
+    ''')
+
+    # 2. Tabela de Clientes
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS clientes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            cpf_cnpj TEXT,
+            email TEXT,
+            telefone TEXT,
+            telefone_fixo TEXT,
+            profissao TEXT,
+            estado_civil TEXT,
+            cep TEXT,
+            endereco TEXT,
+            numero_casa TEXT,
+            complemento TEXT,
+            bairro TEXT,
+            cidade TEXT,
+            estado TEXT,
+            obs TEXT,
+            status_cliente TEXT DEFAULT 'EM NEGOCIAÇÃO',
+            link_drive TEXT,
+            data_cadastro TEXT,
+            proposta_valor REAL,
+            proposta_entrada REAL,
+            proposta_parcelas INTEGER,
+            proposta_objeto TEXT,
+            proposta_pagamento TEXT,
+            status_proposta TEXT,
+            tipo_pessoa TEXT,
+            proposta_data_pagamento TEXT,
+            link_procuracao TEXT,
+            link_hipossuficiencia TEXT,
+            nacionalidade TEXT,
+            rg TEXT,
+            orgao_emissor TEXT,
+            data_nascimento TEXT
+        )
+    ''')
+
+    # 3. Tabela de Processos
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS processos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            numero TEXT,
+            cliente_nome TEXT,
+            area TEXT,
+            acao TEXT,
+            vara TEXT,
+            status TEXT DEFAULT 'Ativo',
+            proximo_prazo TEXT,
+            responsavel TEXT,
+            status_processo TEXT,
+            parceiro_nome TEXT,
+            parceiro_percentual REAL,
+            pasta_drive_link TEXT,
+            tipo_honorario TEXT,
+            fase_processual TEXT,
+            id_cliente INTEGER REFERENCES clientes(id),
+            valor_causa REAL,
+            data_distribuicao TEXT,
+            link_drive TEXT,
+            comarca TEXT,
+            obs TEXT
+        )
+    ''')
+
+    # 4. Tabela de Financeiro (NOVA - necessária para outras tabelas)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS financeiro (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            data TEXT NOT NULL,
+            tipo TEXT NOT NULL,
+            categoria TEXT,
+            descricao TEXT,
+            valor REAL NOT NULL,
+            status_pagamento TEXT DEFAULT 'Pendente',
+            vencimento TEXT,
+            id_cliente INTEGER REFERENCES clientes(id),
+            id_processo INTEGER REFERENCES processos(id),
+            meio_pagamento TEXT,
+            comprovante_link TEXT,
+            obs TEXT,
+            cliente TEXT,
+            status TEXT,
+            criado_em TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 5. Tabela de Andamentos (CORRIGIDA - removido PRIMARY KEY duplicado)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS andamentos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_processo INTEGER NOT NULL REFERENCES processos(id) ON DELETE CASCADE,
+            data TEXT NOT NULL,
+            descricao TEXT NOT NULL,
+            tipo TEXT,
+            responsavel TEXT,
+            criado_em TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 6. Tabela de Parcelas (NOVA - separada de andamentos)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS parcelas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_lancamento_financeiro INTEGER NOT NULL REFERENCES financeiro(id) ON DELETE CASCADE,
+            numero_parcela INTEGER NOT NULL,
+            total_parcelas INTEGER NOT NULL,
+            valor_parcela REAL NOT NULL,
+            vencimento TEXT NOT NULL,
+            status_parcela TEXT DEFAULT 'pendente',
+            pago_em TEXT,
+            obs TEXT
+        )
+    ''')
+
+    # 7. Tabela de Agenda (NOVA - necessária para get_agenda_eventos)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS agenda (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            titulo TEXT NOT NULL,
+            descricao TEXT,
+            data_evento TEXT NOT NULL,
+            hora_evento TEXT,
+            tipo_evento TEXT,
+            id_processo INTEGER REFERENCES processos(id),
+            id_cliente INTEGER REFERENCES clientes(id),
+            google_event_id TEXT,
+            status TEXT DEFAULT 'pendente',
+            criado_em TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 8. Tabela de Configurações (NOVA - necessária para get_config/set_config)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS config (
+            key TEXT PRIMARY KEY,
+            value TEXT,
+            criado_em TEXT DEFAULT CURRENT_TIMESTAMP,
+            atualizado_em TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 9. Tabela de Timeline do Cliente (NOVA - para histórico do cliente)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cliente_timeline (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cliente_id INTEGER NOT NULL REFERENCES clientes(id) ON DELETE CASCADE,
+            tipo_evento TEXT NOT NULL,
+            titulo TEXT NOT NULL,
+            descricao TEXT,
+            icone TEXT,
+            data_evento TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 10. Tabela de Documentos Drive (NOVA - para vincular docs do Drive)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS documentos_drive (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome_arquivo TEXT NOT NULL,
+            tipo_arquivo TEXT,
+            drive_id TEXT,
+            web_link TEXT,
+            id_cliente INTEGER REFERENCES clientes(id),
+            id_processo INTEGER REFERENCES processos(id),
+            data_upload TEXT DEFAULT CURRENT_TIMESTAMP,
+            obs TEXT
+        )
+    ''')
+
+    # 11. Tabela Modelos de Proposta
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS modelos_proposta (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome_modelo TEXT UNIQUE NOT NULL,
+            area_atuacao TEXT,
+            titulo TEXT,
+            descricao TEXT,
+            lido INTEGER DEFAULT 0,
+            criado_em TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 12. Tabela Configurações de Aniversários
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS config_aniversarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            dias_antecedencia INTEGER DEFAULT 7,
+            template_mensagem TEXT,
+            ativo INTEGER DEFAULT 1
+        )
+    ''')
+
+    # 13. Tabela Histórico de IA (NOVA)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ai_historico (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            usuario TEXT,
+            tipo TEXT,
+            input TEXT,
+            output TEXT,
+            data_hora TEXT,
+            processo_id INTEGER
+        )
+    ''')
+
+    # 14. Tabela de Logs de Auditoria (EXPANDIDA para Sprint 2)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS audit_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            username TEXT,
+            action TEXT,
+            tabela TEXT,
+            registro_id INTEGER,
+            campo TEXT,
+            valor_anterior TEXT,
+            valor_novo TEXT,
+            details TEXT,
+            timestamp TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 15. Tabela Partes do Processo (NOVA - Faltava no Schema)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS partes_processo (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_processo INTEGER REFERENCES processos(id) ON DELETE CASCADE,
+            nome TEXT NOT NULL,
+            tipo TEXT,
+            cpf_cnpj TEXT,
+            criado_em TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 16. Tabela Modelos de Documentos (NOVA - Faltava no Schema)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS modelos_documentos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            titulo TEXT NOT NULL,
+            categoria TEXT,
+            conteudo TEXT,
+            criado_em TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 17. Tabela Tokens Públicos (Refatorado para o DB principal)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tokens_publicos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            token TEXT UNIQUE NOT NULL,
+            id_processo INTEGER NOT NULL REFERENCES processos(id) ON DELETE CASCADE,
+            data_criacao TEXT DEFAULT CURRENT_TIMESTAMP,
+            data_expiracao TEXT,
+            ativo INTEGER DEFAULT 1,
+            acessos INTEGER DEFAULT 0,
+            ultimo_acesso TEXT
+        )
+    ''')
+
+    # 18. Tabela AI Insights (NOVA - Faltava no Schema)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ai_insights (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tipo TEXT,
+            titulo TEXT,
+            descricao TEXT,
+            prioridade TEXT DEFAULT 'media',
+            acao_sugerida TEXT,
+            link_acao TEXT,
+            lido INTEGER DEFAULT 0,
+            criado_em TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 19. Tabela AI Cache (NOVA - Faltava no Schema)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ai_cache (
+            hash_input TEXT PRIMARY KEY,
+            resposta TEXT,
+            data_criacao TEXT,
+            validade INTEGER
+        )
+    ''')
+
+    # 20. Tabela Alertas de E-mail (NOVA - Workspace Integration)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS alertas_email (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tipo TEXT NOT NULL,
+            remetente TEXT,
+            assunto TEXT,
+            numero_processo TEXT,
+            valor_detectado REAL,
+            data_recebimento TEXT,
+            corpo_resumo TEXT,
+            processado INTEGER DEFAULT 0,
+            criado_em TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 21. Tabela Transações Bancárias (Conciliação)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS transacoes_bancarias (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            data_transacao TEXT NOT NULL,
+            valor REAL NOT NULL,
+            tipo TEXT NOT NULL,
+            descricao TEXT,
+            transaction_id TEXT UNIQUE NOT NULL,
+            arquivo_origem TEXT,
+            data_importacao TEXT DEFAULT CURRENT_TIMESTAMP,
+            status_conciliacao TEXT DEFAULT 'Pendente',
+            id_financeiro INTEGER REFERENCES financeiro(id),
+            conciliado_por TEXT,
+            data_conciliacao TEXT,
+            link_google_drive TEXT,
+            tipo_origem TEXT,
+            conta_origem TEXT
+        )
+    ''')
+
+    # Colunas adicionadas após a criação original das tabelas
+    # (bancos criados antes dessas versões)
+    add_columns_if_missing(cursor, 'usuarios', {
+        'pergunta_secreta': 'TEXT',
+        'resposta_secreta_hash': 'TEXT',
+        'email': 'TEXT',
+        'reset_token': 'TEXT',
+        'reset_expiry': 'TEXT',
+    })
+    add_columns_if_missing(cursor, 'audit_logs', {
+        'action': 'TEXT',
+        'tabela': 'TEXT',
+        'registro_id': 'INTEGER',
+        'campo': 'TEXT',
+        'valor_anterior': 'TEXT',
+        'valor_novo': 'TEXT',
+    })
+    add_columns_if_missing(cursor, 'processos', {
+        'status': "TEXT DEFAULT 'Ativo'",
+        'assunto': 'TEXT',
+        'comarca': 'TEXT',
+    })
+    # LGPD (Fase 2): colunas de consentimento
+    add_columns_if_missing(cursor, 'clientes', {
+        'lgpd_consentimento': 'INTEGER DEFAULT 0',
+        'lgpd_data_consentimento': 'TEXT',
+        'lgpd_ip_consentimento': 'TEXT',
+    })
+    add_columns_if_missing(cursor, 'transacoes_bancarias', {
+        'tipo_origem': 'TEXT',
+        'conta_origem': 'TEXT',
+    })
+    # Andamentos: suporte a análise por IA
+    add_columns_if_missing(cursor, 'andamentos', {
+        'hash_id': 'TEXT',
+        'analise_ia': 'TEXT',
+        'urgente': 'BOOLEAN DEFAULT 0',
+        'data_analise': 'TEXT',
+    })
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_andamentos_hash ON andamentos(hash_id)")
+
+    # Configuração padrão de aniversários
+    cursor.execute("SELECT COUNT(*) as cnt FROM config_aniversarios")
+    if cursor.fetchone()['cnt'] == 0:
+        cursor.execute('''
+            INSERT INTO config_aniversarios (template_mensagem) 
+            VALUES ('Olá {nome}! 🎉🎂\n\nFeliz Aniversário! Desejamos muita saúde, paz e prosperidade neste novo ciclo de vida!\n\nUm abraço da equipe!')
+        ''')
+
+    # Prazo de retenção LGPD (5 anos)
+    cursor.execute("INSERT OR IGNORE INTO config (key, value) VALUES ('lgpd_retencao_anos', '5')")
+
+
+@migration(2, "Cache de partes por número CNJ")
+def _m002_partes_cache(cursor):
+    cursor.execute(_adapt('''
+        CREATE TABLE IF NOT EXISTS partes_cache (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            numero_cnj TEXT NOT NULL,
+            nome TEXT NOT NULL,
+            tipo TEXT,
+            cpf_cnpj TEXT,
+            tipo_pessoa TEXT DEFAULT 'Física',
+            is_cliente INTEGER DEFAULT 0,
+            criado_em TEXT DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(numero_cnj, nome)
+        )
+    '''))
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_partes_cache_cnj ON partes_cache(numero_cnj)')
+
+
+@migration(3, "Notificações in-app")
+def _m003_notificacoes(cursor):
+    cursor.execute(_adapt("""
+        CREATE TABLE IF NOT EXISTS notificacoes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tipo TEXT NOT NULL,
+            titulo TEXT NOT NULL,
+            mensagem TEXT,
+            link_acao TEXT,
+            prioridade TEXT DEFAULT 'media',
+            lida INTEGER DEFAULT 0,
+            arquivada INTEGER DEFAULT 0,
+            usuario_destino TEXT,
+            criado_em TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+
+
+@migration(4, "Regras de conciliação automática")
+def _m004_regras_conciliacao(cursor):
+    cursor.execute(_adapt("""
+        CREATE TABLE IF NOT EXISTS regras_conciliacao (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            padrao_descricao TEXT NOT NULL,
+            id_cliente INTEGER,
+            categoria TEXT,
+            ativo INTEGER DEFAULT 1,
+            criado_em TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+
+
+@migration(5, "Configuração e histórico de aniversários")
+def _m005_aniversarios(cursor):
+    cursor.execute(_adapt("""
+        CREATE TABLE IF NOT EXISTS config_aniversarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            dias_antecedencia INTEGER DEFAULT 7,
+            template_mensagem TEXT,
+            ativo INTEGER DEFAULT 1
+        )
+    """))
+    cursor.execute(_adapt("""
+        CREATE TABLE IF NOT EXISTS historico_aniversarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_cliente INTEGER NOT NULL,
+            nome_cliente TEXT,
+            data_envio TEXT NOT NULL,
+            tipo_envio TEXT DEFAULT 'whatsapp',
+            ano_referencia INTEGER,
+            sucesso INTEGER DEFAULT 1,
+            observacao TEXT
+        )
+    """))
+
+
+@migration(6, "Histórico de documentos gerados")
+def _m006_documentos_historico(cursor):
+    cursor.execute(_adapt("""
+        CREATE TABLE IF NOT EXISTS documentos_historico (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_cliente INTEGER REFERENCES clientes(id),
+            modelo_nome TEXT,
+            categoria TEXT,
+            conteudo TEXT,
+            link_drive TEXT,
+            criado_em TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+
+
+@migration(7, "Índice de busca textual (FTS5 / tsvector)")
+def _m007_busca_textual(cursor):
+    import busca_textual
+    if adapter.USE_POSTGRES:
+        busca_textual.criar_indice_postgres(cursor)
+    else:
+        busca_textual.criar_indice_sqlite(cursor)
+    busca_textual.reset_indice_flag()
+
+
+# Índices dos caminhos quentes: {nome: (tabela, colunas)}
+# Igualdade primeiro, depois a coluna de intervalo/ordenação.
+INDICES_QUENTES = {
+    # Pendências financeiras (tipo = ? AND status_pagamento = ? AND vencimento < ?)
+    'idx_financeiro_tipo_status_venc': ('financeiro', ['tipo', 'status_pagamento', 'vencimento']),
+    'idx_financeiro_id_processo': ('financeiro', ['id_processo']),
+    'idx_financeiro_id_cliente': ('financeiro', ['id_cliente']),
+    'idx_financeiro_data': ('financeiro', ['data']),
+    # Eventos do dia (data_evento = ? AND status = ?)
+    'idx_agenda_data_status': ('agenda', ['data_evento', 'status']),
+    'idx_agenda_id_processo': ('agenda', ['id_processo']),
+    # Histórico do processo (id_processo = ? ORDER BY data DESC)
+    'idx_andamentos_processo_data': ('andamentos', ['id_processo', 'data']),
+    # Não lidas (lida = 0 AND arquivada = 0 AND usuario_destino ...)
+    'idx_notificacoes_lida_destino': ('notificacoes', ['lida', 'arquivada', 'usuario_destino']),
+    'idx_audit_logs_timestamp': ('audit_logs', ['"timestamp"']),
+    # Pendentes de conciliação (status_conciliacao = ? ORDER BY data_transacao)
+    # transaction_id já tem índice pela restrição UNIQUE
+    'idx_transacoes_status_data': ('transacoes_bancarias', ['status_conciliacao', 'data_transacao']),
+    'idx_processos_proximo_prazo': ('processos', ['proximo_prazo']),
+    # Antes criados manualmente por adicionar_indices.py
+    'idx_clientes_nome': ('clientes', ['nome']),
+    'idx_clientes_cpf_cnpj': ('clientes', ['cpf_cnpj']),
+    'idx_clientes_status': ('clientes', ['status_cliente']),
+    'idx_cliente_timeline_cliente_id': ('cliente_timeline', ['cliente_id']),
+    'idx_tokens_publicos_id_processo': ('tokens_publicos', ['id_processo']),
+}
+
+
+@migration(8, "Índices compostos dos caminhos quentes")
+def _m008_indices_quentes(cursor):
+    for nome, (tabela, colunas) in INDICES_QUENTES.items():
+        create_index_if_possible(cursor, nome, tabela, colunas)
+
+
+@migration(9, "Rollups financeiros incrementais (DRE / fluxo / rentabilidade)")
+def _m009_rollups_financeiros(cursor):
+    import financeiro_rollup
+    financeiro_rollup.criar_estrutura(cursor)
+    financeiro_rollup.reset_flag()
+
+
+def _vincular_processos_clientes(cursor):
+    """Preenche processos.id_cliente a partir de cliente_nome e alinha os nomes."""
+    diferente = 'IS DISTINCT FROM' if adapter.USE_POSTGRES else 'IS NOT'
+    # Vínculos para clientes que não existem mais
+    cursor.execute("""
+        UPDATE processos SET id_cliente = NULL
+        WHERE id_cliente IS NOT NULL AND id_cliente NOT IN (SELECT id FROM clientes)
+    """)
+    # Nome exato; depois ignorando maiúsculas e espaços nas pontas
+    for expr in ("c.nome = processos.cliente_nome",
+                 "lower(trim(c.nome)) = lower(trim(processos.cliente_nome))"):
+        cursor.execute(f"""
+            UPDATE processos SET id_cliente = (SELECT MIN(c.id) FROM clientes c WHERE {expr})
+            WHERE id_cliente IS NULL AND cliente_nome IS NOT NULL AND cliente_nome <> ''
+        """)
+    cursor.execute(f"""
+        UPDATE processos SET cliente_nome = (SELECT c.nome FROM clientes c WHERE c.id = processos.id_cliente)
+        WHERE id_cliente IS NOT NULL
+        AND cliente_nome {diferente} (SELECT c.nome FROM clientes c WHERE c.id = processos.id_cliente)
+    """)
+    cursor.execute("SELECT COUNT(*) AS total FROM processos WHERE id_cliente IS NULL")
+    row = cursor.fetchone()
+    sem_vinculo = row['total'] if adapter.USE_POSTGRES else row[0]
+    if sem_vinculo:
+        logger.warning(f"{sem_vinculo} processo(s) sem cliente cadastrado correspondente (id_cliente nulo)")
+
+
+# Os triggers de vínculo reescrevem processos.cliente_nome quando um
+# cliente é renomeado: escrever em clientes invalida o cache de processos
+query_cache.registrar_dependencia('processos', 'clientes')
+
+
+def _criar_triggers_vinculo_sqlite(cursor):
+    # Inserções que informam só o nome (telas/scripts antigos)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS processos_cliente_ai AFTER INSERT ON processos
+        WHEN new.id_cliente IS NULL AND new.cliente_nome IS NOT NULL BEGIN
+            UPDATE processos SET id_cliente = (SELECT MIN(id) FROM clientes WHERE nome = new.cliente_nome)
+            WHERE id = new.id;
+        END
+    """)
+    # Troca de cliente pelo nome: refaz o vínculo (exceto se o nome já é o do cliente atual)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS processos_cliente_nome_au AFTER UPDATE OF cliente_nome ON processos
+        WHEN new.cliente_nome IS NOT old.cliente_nome AND new.id_cliente IS old.id_cliente
+        AND new.cliente_nome IS NOT (SELECT nome FROM clientes WHERE id = new.id_cliente) BEGIN
+            UPDATE processos SET id_cliente = (SELECT MIN(id) FROM clientes WHERE nome = new.cliente_nome)
+            WHERE id = new.id;
+        END
+    """)
+    # Troca de cliente pelo ID: nome acompanha. Não reescreve um nome que já
+    # é o do cliente: o UPDATE encadeado dispararia busca_processos_au para uma
+    # linha que busca_processos_ai ainda não indexou (FTS5 corrompido)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS processos_id_cliente_au AFTER UPDATE OF id_cliente ON processos
+        WHEN new.id_cliente IS NOT NULL AND new.id_cliente IS NOT old.id_cliente
+        AND new.cliente_nome IS NOT (SELECT nome FROM clientes WHERE id = new.id_cliente) BEGIN
+            UPDATE processos SET cliente_nome = (SELECT nome FROM clientes WHERE id = new.id_cliente)
+            WHERE id = new.id AND EXISTS (SELECT 1 FROM clientes WHERE id = new.id_cliente);
+        END
+    """)
+    # Cliente renomeado: processos continuam exibindo o nome atual
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS clientes_nome_au AFTER UPDATE OF nome ON clientes
+        WHEN new.nome IS NOT old.nome BEGIN
+            UPDATE processos SET cliente_nome = new.nome WHERE id_cliente = new.id;
+        END
+    """)
+
+
+def _criar_triggers_vinculo_postgres(cursor):
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION processos_vincular_cliente() RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE
+            nome_atual TEXT;
+        BEGIN
+            IF NEW.id_cliente IS NOT NULL THEN
+                SELECT nome INTO nome_atual FROM clientes WHERE id = NEW.id_cliente;
+            END IF;
+            IF TG_OP = 'UPDATE' AND NEW.cliente_nome IS DISTINCT FROM OLD.cliente_nome
+               AND NEW.id_cliente IS NOT DISTINCT FROM OLD.id_cliente
+               AND NEW.cliente_nome IS DISTINCT FROM nome_atual THEN
+                NEW.id_cliente := (SELECT MIN(id) FROM clientes WHERE nome = NEW.cliente_nome);
+            ELSIF NEW.id_cliente IS NULL AND NEW.cliente_nome IS NOT NULL THEN
+                NEW.id_cliente := (SELECT MIN(id) FROM clientes WHERE nome = NEW.cliente_nome);
+            ELSIF nome_atual IS NOT NULL THEN
+                NEW.cliente_nome := nome_atual;
+            END IF;
+            RETURN NEW;
+        END
+        $$
+    """)
+    cursor.execute("DROP TRIGGER IF EXISTS processos_vincular_cliente ON processos")
+    cursor.execute("""
+        CREATE TRIGGER processos_vincular_cliente
+        BEFORE INSERT OR UPDATE OF id_cliente, cliente_nome ON processos
+        FOR EACH ROW EXECUTE FUNCTION processos_vincular_cliente()
+    """)
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION clientes_propagar_nome() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            UPDATE processos SET cliente_nome = NEW.nome WHERE id_cliente = NEW.id;
+            RETURN NULL;
+        END
+        $$
+    """)
+    cursor.execute("DROP TRIGGER IF EXISTS clientes_propagar_nome ON clientes")
+    cursor.execute("""
+        CREATE TRIGGER clientes_propagar_nome
+        AFTER UPDATE OF nome ON clientes
+        FOR EACH ROW WHEN (NEW.nome IS DISTINCT FROM OLD.nome)
+        EXECUTE FUNCTION clientes_propagar_nome()
+    """)
+    # Chave estrangeira real (o schema do Supabase foi criado sem ela)
+    cursor.execute("SELECT 1 FROM pg_constraint WHERE conname = 'processos_id_cliente_fkey'")
+    if cursor.fetchone() is None:
+        cursor.execute("""
+            ALTER TABLE processos ADD CONSTRAINT processos_id_cliente_fkey
+            FOREIGN KEY (id_cliente) REFERENCES clientes(id)
+        """)
+
+
+@migration(10, "Vínculo processos -> clientes por id_cliente (backfill, índice, triggers)")
+def _m010_processos_id_cliente(cursor):
+    add_columns_if_missing(cursor, 'processos', {'id_cliente': 'INTEGER'})
+    _vincular_processos_clientes(cursor)
+    create_index_if_possible(cursor, 'idx_processos_id_cliente', 'processos', ['id_cliente'])
+    # Consultas por nome foram trocadas por id_cliente (busca textual usa o FTS)
+    cursor.execute("DROP INDEX IF EXISTS idx_processos_cliente_nome")
+    if adapter.USE_POSTGRES:
+        _criar_triggers_vinculo_postgres(cursor)
+    else:
+        _criar_triggers_vinculo_sqlite(cursor)
+
+
+def preencher_indice_cego_clientes(cursor, todos: bool = False, lote: int = 500) -> int:
+    """
+    Calcula clientes.cpf_cnpj_bidx / cpf_cnpj_bidx_prefixo em lotes por id.
+    
+    Args:
+        cursor: Cursor de uma conexão aberta (a transação é de quem chama)
+        todos: Recalcular também as linhas já indexadas (troca de chave)
+        lote: Linhas lidas e atualizadas por vez
+    
+    Returns:
+        Número de clientes atualizados
+    """
+    import crypto
+    
+    if crypto.blind_index("0") is None:
+        logger.warning("Chave do índice cego indisponível; cpf_cnpj_bidx não preenchido")
+        return 0
+    
+    ph = _ph()
+    pendentes = "" if todos else " AND cpf_cnpj_bidx IS NULL"
+    ultimo_id = 0
+    total = 0
+    while True:
+        cursor.execute(
+            f"SELECT id, cpf_cnpj FROM clientes WHERE id > {ph} "
+            f"AND cpf_cnpj IS NOT NULL AND cpf_cnpj <> ''{pendentes} ORDER BY id LIMIT {ph}",
+            (ultimo_id, lote)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        valores = [
+            (crypto.blind_index(row['cpf_cnpj']), crypto.blind_index(row['cpf_cnpj'], prefixo=True), row['id'])
+            for row in rows
+        ]
+        cursor.executemany(
+            f"UPDATE clientes SET cpf_cnpj_bidx = {ph}, cpf_cnpj_bidx_prefixo = {ph} WHERE id = {ph}",
+            valores
+        )
+        ultimo_id = rows[-1]['id']
+        total += len(rows)
+    if total:
+        logger.info(f"Índice cego de CPF/CNPJ calculado para {total} cliente(s)")
+    return total
+
+
+@migration(11, "Índice cego (HMAC) de clientes.cpf_cnpj para busca sem descriptografar")
+def _m011_clientes_cpf_cnpj_bidx(cursor):
+    add_columns_if_missing(cursor, 'clientes', {
+        'cpf_cnpj_bidx': 'TEXT',
+        'cpf_cnpj_bidx_prefixo': 'TEXT',
+    })
+    preencher_indice_cego_clientes(cursor)
+    create_index_if_possible(cursor, 'idx_clientes_cpf_cnpj_bidx', 'clientes', ['cpf_cnpj_bidx'])
+    create_index_if_possible(cursor, 'idx_clientes_cpf_cnpj_bidx_prefixo', 'clientes', ['cpf_cnpj_bidx_prefixo'])
+
+
+@migration(12, "Cursor persistido da rotação de chaves de criptografia")
+def _m012_crypto_rotacao(cursor):
+    cursor.execute(_adapt("""
+        CREATE TABLE IF NOT EXISTS crypto_rotacao (
+            tabela TEXT NOT NULL,
+            coluna TEXT NOT NULL,
+            versao_alvo INTEGER NOT NULL,
+            ultimo_id INTEGER DEFAULT 0,
+            processados INTEGER DEFAULT 0,
+            recifrados INTEGER DEFAULT 0,
+            erros INTEGER DEFAULT 0,
+            iniciado_em TEXT,
+            atualizado_em TEXT,
+            concluido_em TEXT,
+            PRIMARY KEY (tabela, coluna)
+        )
+    """))
+
+
+@migration(13, "Cota persistente da API Gemini (livro-razão diário e token bucket)")
+def _m013_gemini_cota(cursor):
+    cursor.execute(_adapt("""
+        CREATE TABLE IF NOT EXISTS gemini_cota_diaria (
+            dia TEXT PRIMARY KEY,
+            usado INTEGER DEFAULT 0,
+            usado_segundo_plano INTEGER DEFAULT 0,
+            atualizado_em TEXT
+        )
+    """))
+    cursor.execute(_adapt("""
+        CREATE TABLE IF NOT EXISTS gemini_token_bucket (
+            id INTEGER PRIMARY KEY,
+            tokens REAL NOT NULL,
+            atualizado_em REAL NOT NULL
+        )
+    """))
+
+
+@migration(14, "Fila durável de análise por IA dos andamentos do DataJud")
+def _m014_fila_analise_ia(cursor):
+    cursor.execute(_adapt("""
+        CREATE TABLE IF NOT EXISTS fila_analise_ia (
+            hash_id TEXT PRIMARY KEY,
+            id_processo INTEGER NOT NULL,
+            status TEXT DEFAULT 'pendente',
+            tentativas INTEGER DEFAULT 0,
+            proxima_tentativa TEXT NOT NULL,
+            ultimo_erro TEXT,
+            criado_em TEXT
+        )
+    """))
+    create_index_if_possible(cursor, 'idx_fila_analise_ia_status_proxima', 'fila_analise_ia',
+                             ['status', 'proxima_tentativa'])
+    create_index_if_possible(cursor, 'idx_fila_analise_ia_processo', 'fila_analise_ia', ['id_processo'])
+
+    # Andamentos gravados sem análise enquanto a análise automática esteve desativada
+    if table_exists(cursor, 'andamentos'):
+        ph = _ph()
+        agora = datetime.now().isoformat()
+        cursor.execute(f"""
+            INSERT INTO fila_analise_ia (hash_id, id_processo, status, tentativas, proxima_tentativa, criado_em)
+            SELECT hash_id, id_processo, 'pendente', 0, {ph}, {ph}
+            FROM andamentos
+            WHERE hash_id IS NOT NULL AND hash_id <> '' AND analise_ia IS NULL
+            ON CONFLICT DO NOTHING
+        """, (agora, agora))
+
+
+@migration(15, "Índice textual de clientes sem o cpf_cnpj cifrado")
+def _m015_busca_textual_sem_cpf(cursor):
+    import busca_textual
+    busca_textual.remover_indice(cursor, 'clientes')
+    if adapter.USE_POSTGRES:
+        busca_textual.criar_indice_postgres(cursor)
+    else:
+        busca_textual.criar_indice_sqlite(cursor)
+    busca_textual.reset_indice_flag()
+
+
+@migration(16, "Trigger processos_id_cliente_au não reescreve nome inalterado", dialects=('sqlite',))
+def _m016_trigger_id_cliente_sem_reescrita(cursor):
+    cursor.execute("DROP TRIGGER IF EXISTS processos_id_cliente_au")
+    _criar_triggers_vinculo_sqlite(cursor)
+
+
+# =====================================================
+# EXECUÇÃO
+# =====================================================
+
+def _criar_tabela_versao(conn, cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            descricao TEXT,
+            aplicado_em TEXT
+        )
+    """)
+    conn.commit()
+
+
+def _versoes_aplicadas(cursor) -> set:
+    cursor.execute("SELECT version FROM schema_version")
+    return {row['version'] for row in cursor.fetchall()}
+
+
+def _aplicar_pendentes(conn) -> int:
+    """Aplica cada migração pendente em sua própria transação."""
+    cursor = conn.cursor()
+    _criar_tabela_versao(conn, cursor)
+    dialect = _dialect()
+    aplicadas = 0
+
+    for version, descricao, func, dialects in MIGRATIONS:
+        if not adapter.USE_POSTGRES:
+            # Lock de escrita entre processos (app + scheduled_tasks)
+            cursor.execute("BEGIN IMMEDIATE")
+        try:
+            # Reler dentro do lock: outro processo pode ter aplicado
+            if version in _versoes_aplicadas(cursor):
+                conn.rollback()
+                continue
+
+            if dialect in dialects:
+                logger.info(f"Aplicando migração {version}: {descricao}")
+                func(cursor)
+            else:
+                logger.debug(f"Migração {version} não se aplica a {dialect}, marcando como aplicada")
+
+            cursor.execute(
+                f"INSERT INTO schema_version (version, descricao, aplicado_em) VALUES ({_ph()}, {_ph()}, {_ph()})",
+                (version, descricao, datetime.now().isoformat())
+            )
+            conn.commit()
+            aplicadas += 1
+        except Exception:
+            conn.rollback()
+            raise
+
+    return aplicadas
+
+
+def ensure_schema(force: bool = False) -> int:
+    """
+    Aplica migrações pendentes (uma única vez por processo).
+    
+    Args:
+        force: Reverificar o banco mesmo se o schema já foi validado
+    
+    Returns:
+        Número de migrações aplicadas nesta chamada
+    """
+    global _schema_ready
+
+    if _schema_ready and not force:
+        return 0
+
+    with _lock:
+        if _schema_ready and not force:
+            return 0
+
+        with adapter.get_connection() as conn:
+            # Fechar transação implícita eventualmente aberta na conexão do pool
+            conn.commit()
+
+            if adapter.USE_POSTGRES:
+                cursor = conn.cursor()
+                cursor.execute("SELECT pg_advisory_lock(%s)", (_PG_LOCK_KEY,))
+                try:
+                    aplicadas = _aplicar_pendentes(conn)
+                finally:
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", (_PG_LOCK_KEY,))
+                    conn.commit()
+            else:
+                aplicadas = _aplicar_pendentes(conn)
+
+        _schema_ready = True
+
+    if aplicadas:
+        logger.info(f"Schema atualizado: {aplicadas} migração(ões) aplicada(s)")
+    return aplicadas
+
+
+def is_schema_ready() -> bool:
+    """True se o schema já foi validado neste processo."""
+    return _schema_ready
+
+
+def reset_schema_flag():
+    """Força nova verificação na próxima chamada (ex.: após restaurar backup)."""
+    global _schema_ready
+    _schema_ready = False
+
+
+def get_schema_version() -> int:
+    """Retorna a versão atual registrada no banco (0 se nenhuma)."""
+    try:
+        res = adapter.get_adapter().fetch_one("SELECT MAX(version) as v FROM schema_version")
+        return (res['v'] if res else None) or 0
+    except Exception:
+        return 0
+
+
+def get_pending_migrations() -> list:
+    """Lista (versao, descricao) das migrações ainda não aplicadas."""
+    try:
+        rows = adapter.get_adapter().fetch_all("SELECT version FROM schema_version")
+        aplicadas = {row['version'] for row in rows}
+    except Exception:
+        aplicadas = set()
+    return [(v, d) for v, d, _, _ in MIGRATIONS if v not in aplicadas]
@@ -2,11 +2,15 @@
 Script de Migração de Criptografia de CPFs
 
 Este script criptografa todos os CPF/CNPJ existentes no banco de dados
-usando o módulo crypto.py.
+usando o módulo crypto.py, e recifra com a chave ativa os valores
+gravados com chaves antigas (rotação, ver crypto_rotacao.py).
+
+A gravação é feita em lotes transacionais com cursor persistido: se
+interrompido, basta rodar de novo para continuar de onde parou.
 
 IMPORTANTE: Faça backup do banco antes de executar!
 
-Uso: python scripts/crypto_migration.py [--dry-run | --execute]
+Uso: python scripts/crypto_migration.py [--dry-run | --execute | --rotate | --verify]
 """
 
 import argparse
@@ -19,6 +23,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import database as db
 import crypto
+import crypto_rotacao
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -48,25 +53,39 @@ def migrate_clientes(dry_run: bool = True):
     print(f"\n[INFO] Encontrados {len(clientes)} registros para criptografar")
     if dry_run:
         print("\n[SIMULACAO - Nenhuma alteracao sera feita]\n")
-    
-    success = 0
-    for _, row in clientes.iterrows():
-        cpf_criptografado = crypto.encrypt(row['cpf_cnpj'])
-        if dry_run:
+        for _, row in clientes.iterrows():
             masked = crypto.mask_document(row['cpf_cnpj'])
             print(f"   ID {row['id']}: {masked} -> [ENCRYPTED]")
-            success += 1
-        else:
-            try:
-                db.sql_run("UPDATE clientes SET cpf_cnpj = ? WHERE id = ?", (cpf_criptografado, row['id']))
-                success += 1
-            except Exception as e:
-                logger.error(f"Erro no cliente {row['id']}: {e}")
+        print(f"\n[SIMULACAO] Sucesso: {len(clientes)}")
+        return len(clientes)
     
-    print(f"\n{'[SIMULACAO] ' if dry_run else ''}Sucesso: {success}")
+    resultados = crypto_rotacao.executar(incluir_texto_puro=True, progresso=_imprimir_progresso)
+    success = sum(r['recifrados'] for r in resultados)
+    print(f"\nSucesso: {success} | Erros: {sum(r['erros'] for r in resultados)}")
     return success
 
 
+def rotate_keys():
+    """Recifra com a chave ativa os valores gravados com chaves antigas."""
+    print("\n" + "="*60)
+    print(f"[CRYPTO] ROTACAO DE CHAVES - versao ativa v{crypto.versao_ativa()}")
+    print("="*60)
+    
+    if not crypto.is_crypto_available():
+        print("[ERRO] Criptografia indisponivel!")
+        return 0
+    
+    resultados = crypto_rotacao.executar(progresso=_imprimir_progresso)
+    success = sum(r['recifrados'] for r in resultados)
+    print(f"\nRecifrados: {success} | Erros: {sum(r['erros'] for r in resultados)}")
+    return success
+
+
+def _imprimir_progresso(status):
+    print(f"   {status['tabela']}.{status['coluna']}: {status['processados']} lidos, "
+          f"{status['recifrados']} gravados (ate id {status['ultimo_id']})")
+
+
 def verify_encryption():
     """Verifica status da criptografia no banco."""
     print("\n[STATUS] CRIPTOGRAFIA DE CPFs")
@@ -74,6 +93,8 @@ def verify_encryption():
     enc = db.sql_get_query("SELECT COUNT(*) as t FROM clientes WHERE cpf_cnpj LIKE 'ENC:%'")
     t, e = total.iloc[0]['t'], enc.iloc[0]['t']
     print(f"   Total: {t} | Criptografados: {e} | Pendentes: {t-e}")
+    for coluna, qtd in crypto_rotacao.pendentes().items():
+        print(f"   {coluna}: {qtd} em chave antiga (ativa: v{crypto.versao_ativa()})")
 
 
 if __name__ == "__main__":
@@ -81,6 +102,7 @@ if __name__ == "__main__":
     parser.add_argument('--dry-run', action='store_true', help='Simular')
     parser.add_argument('--execute', action='store_true', help='Executar')
     parser.add_argument('--verify', action='store_true', help='Verificar')
+    parser.add_argument('--rotate', action='store_true', help='Recifrar com a chave ativa')
     args = parser.parse_args()
     
     db.init_db()
@@ -94,6 +116,9 @@ if __name__ == "__main__":
             verify_encryption()
         else:
             print("Cancelado.")
+    elif args.rotate:
+        rotate_keys()
+        verify_encryption()
     elif args.dry_run:
         migrate_clientes(dry_run=True)
     else:
@@ -5,12 +5,32 @@ Sistema Jurídico Lopes & Ribeiro
 Uso:
 1. Configure DATABASE_URL no .streamlit/secrets.toml
 2. Execute: python scripts/migrar_dados_supabase.py
+
+Cada tabela é lida em lotes e enviada por COPY FROM STDIN; tabelas sem
+dependência entre si (FKs) são migradas em paralelo. Os ids são mantidos
+e as sequences ajustadas ao final. O progresso fica na tabela
+_migracao_sqlite do PostgreSQL: rodar de novo retoma de onde parou.
+
+Opções:
+    --tabelas clientes processos   Migrar apenas estas tabelas
+    --workers 4                    Tabelas em paralelo
+    --lote 10000                   Linhas por lote
+    --reiniciar                    Ignorar checkpoints e migrar do início
+    --verificar                    Apenas comparar contagem/hash SQLite x PostgreSQL
 """
 
+import argparse
+import datetime
+import decimal
+import hashlib
+import io
 import os
+import re
 import sys
 import sqlite3
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Adicionar diretório pai ao path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -102,74 +122,396 @@ def get_table_columns(cursor, table_name, is_postgres=False):
         return [row[1] for row in cursor.fetchall()]
 
 
-def migrate_table(table_name, sqlite_conn, pg_conn):
-    """Migra uma tabela do SQLite para PostgreSQL"""
-    sqlite_cursor = sqlite_conn.cursor()
-    pg_cursor = pg_conn.cursor()
+# Tabela de checkpoints no PostgreSQL (gravada na mesma transação de cada lote)
+CHECKPOINT_TABLE = '_migracao_sqlite'
+
+# Linhas por lote (um COPY + um commit por lote)
+CHUNK_SIZE = int(os.getenv('MIGRACAO_LOTE', '10000'))
+
+_RE_ISO_DATETIME = re.compile(r'^(\d{4}-\d{2}-\d{2})T(\d{2}:\d{2})')
+
+
+def sqlite_table_exists(cursor, table_name):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
+    return cursor.fetchone() is not None
+
+
+def ensure_checkpoint_table(pg_conn):
+    """Cria a tabela de checkpoints da migração no PostgreSQL."""
+    with pg_conn.cursor() as cur:
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} (
+                tabela TEXT PRIMARY KEY,
+                ultimo_rowid BIGINT NOT NULL DEFAULT 0,
+                lidas BIGINT NOT NULL DEFAULT 0,
+                inseridas BIGINT NOT NULL DEFAULT 0,
+                rejeitadas BIGINT NOT NULL DEFAULT 0,
+                concluida BOOLEAN NOT NULL DEFAULT FALSE,
+                segundos DOUBLE PRECISION NOT NULL DEFAULT 0,
+                atualizado_em TIMESTAMP DEFAULT NOW()
+            )
+        """)
+    pg_conn.commit()
+
+
+def load_checkpoint(pg_cursor, table_name):
+    pg_cursor.execute(
+        f"SELECT ultimo_rowid, lidas, inseridas, rejeitadas, concluida, segundos "
+        f"FROM {CHECKPOINT_TABLE} WHERE tabela = %s",
+        (table_name,)
+    )
+    row = pg_cursor.fetchone()
+    if not row:
+        return {'ultimo_rowid': 0, 'lidas': 0, 'inseridas': 0, 'rejeitadas': 0,
+                'concluida': False, 'segundos': 0.0}
+    return dict(zip(('ultimo_rowid', 'lidas', 'inseridas', 'rejeitadas', 'concluida', 'segundos'), row))
+
+
+def save_checkpoint(pg_cursor, table_name, ckpt):
+    pg_cursor.execute(f"""
+        INSERT INTO {CHECKPOINT_TABLE}
+            (tabela, ultimo_rowid, lidas, inseridas, rejeitadas, concluida, segundos, atualizado_em)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
+        ON CONFLICT (tabela) DO UPDATE SET
+            ultimo_rowid = EXCLUDED.ultimo_rowid, lidas = EXCLUDED.lidas,
+            inseridas = EXCLUDED.inseridas, rejeitadas = EXCLUDED.rejeitadas,
+            concluida = EXCLUDED.concluida, segundos = EXCLUDED.segundos,
+            atualizado_em = NOW()
+    """, (table_name, ckpt['ultimo_rowid'], ckpt['lidas'], ckpt['inseridas'],
+          ckpt['rejeitadas'], ckpt['concluida'], ckpt['segundos']))
+
+
+def reset_checkpoints(pg_conn, tables):
+    with pg_conn.cursor() as cur:
+        cur.execute(f"DELETE FROM {CHECKPOINT_TABLE} WHERE tabela = ANY(%s)", (list(tables),))
+    pg_conn.commit()
+
+
+def copy_value(value):
+    """Valor no formato texto do COPY (NULL = \\N, bytea em hex)."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, (bytes, memoryview)):
+        return '\\\\x' + bytes(value).hex()
+    if isinstance(value, float):
+        return repr(value)
+    text = str(value)
+    return (text.replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def copy_buffer(rows):
+    """Monta o buffer de um lote para COPY FROM STDIN (formato texto)."""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(copy_value(v) for v in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    return buffer
+
+
+def dependency_levels(pg_conn, tables):
+    """
+    Agrupa as tabelas em níveis pelas chaves estrangeiras do PostgreSQL:
+    as tabelas de um nível só referenciam tabelas de níveis anteriores e
+    podem ser migradas em paralelo.
+    """
+    with pg_conn.cursor() as cur:
+        cur.execute("""
+            SELECT c.conrelid::regclass::text, c.confrelid::regclass::text
+            FROM pg_constraint c
+            WHERE c.contype = 'f' AND c.conrelid <> c.confrelid
+        """)
+        deps = {t: set() for t in tables}
+        for tabela, referencia in cur.fetchall():
+            tabela, referencia = tabela.split('.')[-1], referencia.split('.')[-1]
+            if tabela in deps and referencia in deps:
+                deps[tabela].add(referencia)
+
+    levels = []
+    done = set()
+    while deps:
+        level = [t for t in tables if t in deps and deps[t] <= done]
+        if not level:
+            # Ciclo de FKs: migrar o restante na ordem da lista
+            level = [t for t in tables if t in deps]
+        levels.append(level)
+        done.update(level)
+        for t in level:
+            deps.pop(t)
+    return levels
+
+
+def reset_sequence(pg_cursor, table_name, pg_cols):
+    """Ajusta a sequence do id para continuar após o maior id migrado."""
+    if 'id' not in pg_cols:
+        return
+    pg_cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", (table_name,))
+    row = pg_cursor.fetchone()
+    if not row or not row[0]:
+        return
+    pg_cursor.execute(
+        f"SELECT setval(%s, COALESCE((SELECT MAX(id) FROM {table_name}), 0) + 1, false)",
+        (row[0],)
+    )
+
+
+def _insert_rows_one_by_one(pg_cursor, table_name, cols, rows):
+    """Fallback de um lote rejeitado pelo COPY: insere linha a linha com savepoint."""
+    cols_str = ', '.join(cols)
+    placeholders = ', '.join(['%s'] * len(cols))
+    sql = (f"INSERT INTO {table_name} ({cols_str}) OVERRIDING SYSTEM VALUE "
+           f"VALUES ({placeholders}) ON CONFLICT DO NOTHING")
+    inserted = rejected = 0
+    for row in rows:
+        pg_cursor.execute("SAVEPOINT migracao_linha")
+        try:
+            pg_cursor.execute(sql, [bytes(v) if isinstance(v, memoryview) else v for v in row])
+            inserted += pg_cursor.rowcount
+            pg_cursor.execute("RELEASE SAVEPOINT migracao_linha")
+        except psycopg2.Error as e:
+            pg_cursor.execute("ROLLBACK TO SAVEPOINT migracao_linha")
+            rejected += 1
+            logger.debug(f"    {table_name}: linha rejeitada ({e})")
+    return inserted, rejected
+
+
+def migrate_table(table_name, sqlite_path=None, chunk_size=None):
+    """
+    Migra uma tabela do SQLite para o PostgreSQL em lotes.
+    
+    Cada lote é lido em ordem de rowid, enviado por COPY para uma tabela
+    temporária e inserido com ON CONFLICT DO NOTHING (mantendo os ids);
+    o checkpoint é gravado na mesma transação, então uma execução
+    interrompida retoma a partir do último lote confirmado.
+    
+    Args:
+        table_name: Nome da tabela
+        sqlite_path: Arquivo SQLite (padrão: SQLITE_DB)
+        chunk_size: Linhas por lote (padrão: CHUNK_SIZE)
+        
+    Returns:
+        Dict com lidas, inseridas, rejeitadas, segundos, linhas_por_segundo e status
+    """
+    chunk_size = chunk_size or CHUNK_SIZE
+    result = {'tabela': table_name, 'lidas': 0, 'inseridas': 0, 'rejeitadas': 0,
+              'segundos': 0.0, 'linhas_por_segundo': 0.0, 'status': 'ok'}
     
+    sqlite_conn = sqlite3.connect(sqlite_path or SQLITE_DB)
+    pg_conn = get_postgres_connection()
     try:
-        # Verificar se tabela existe no SQLite
-        sqlite_cursor.execute(
-            "SELECT name FROM sqlite_master WHERE type='table' AND name=?",
-            (table_name,)
-        )
-        if not sqlite_cursor.fetchone():
+        sqlite_cursor = sqlite_conn.cursor()
+        pg_cursor = pg_conn.cursor()
+        
+        if not sqlite_table_exists(sqlite_cursor, table_name):
             logger.info(f"⏭️  {table_name}: Tabela não existe no SQLite, pulando...")
-            return 0
+            result['status'] = 'ausente_sqlite'
+            return result
         
-        # Obter colunas do SQLite
         sqlite_cols = get_table_columns(sqlite_cursor, table_name, is_postgres=False)
-        
-        # Obter colunas do PostgreSQL
         pg_cols = get_table_columns(pg_cursor, table_name, is_postgres=True)
-        
         if not pg_cols:
             logger.warning(f"⚠️  {table_name}: Tabela não existe no PostgreSQL, pule!")
-            return 0
-        
-        # Colunas comuns (sem 'id' para evitar conflito de SERIAL)
-        common_cols = [col for col in sqlite_cols if col in pg_cols and col != 'id']
+            result['status'] = 'ausente_postgres'
+            return result
         
+        # Colunas comuns, incluindo id (ids preservados para manter as referências)
+        common_cols = [col for col in sqlite_cols if col in pg_cols]
         if not common_cols:
             logger.warning(f"⚠️  {table_name}: Sem colunas comuns para migrar")
-            return 0
+            result['status'] = 'sem_colunas'
+            return result
         
-        # Buscar dados do SQLite
-        sqlite_cursor.execute(f"SELECT * FROM {table_name}")
-        rows = sqlite_cursor.fetchall()
+        ckpt = load_checkpoint(pg_cursor, table_name)
+        if ckpt['concluida']:
+            logger.info(f"⏭️  {table_name}: já migrada (checkpoint), pulando...")
+            result.update({k: ckpt[k] for k in ('lidas', 'inseridas', 'rejeitadas', 'segundos')})
+            result['status'] = 'checkpoint'
+            return result
+        if ckpt['ultimo_rowid']:
+            logger.info(f"↩️  {table_name}: retomando após rowid {ckpt['ultimo_rowid']} "
+                        f"({ckpt['lidas']} linhas já migradas)")
         
-        if not rows:
-            logger.info(f"⏭️  {table_name}: Tabela vazia, pulando...")
-            return 0
+        cols_str = ', '.join(common_cols)
+        staging = f"_stg_{table_name}"
+        pg_cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS {staging} "
+                          f"(LIKE {table_name} INCLUDING DEFAULTS)")
+        pg_conn.commit()
         
-        # Inserir no PostgreSQL
-        migrated = 0
-        for row in rows:
-            # Montar dicionário com valores
-            row_dict = dict(zip(sqlite_cols, row))
-            
-            # Filtrar apenas colunas comuns
-            values = [row_dict.get(col) for col in common_cols]
-            
-            # Montar INSERT
-            cols_str = ', '.join(common_cols)
-            placeholders = ', '.join(['%s'] * len(common_cols))
-            insert_sql = f"INSERT INTO {table_name} ({cols_str}) VALUES ({placeholders}) ON CONFLICT DO NOTHING"
+        inicio = time.monotonic()
+        segundos_anteriores = ckpt['segundos']
+        while True:
+            sqlite_cursor.execute(
+                f"SELECT rowid, {cols_str} FROM {table_name} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (ckpt['ultimo_rowid'], chunk_size)
+            )
+            batch = sqlite_cursor.fetchall()
+            if not batch:
+                break
+            rows = [row[1:] for row in batch]
             
             try:
-                pg_cursor.execute(insert_sql, values)
-                migrated += 1
-            except Exception as e:
-                logger.debug(f"    Erro ao inserir: {e}")
+                pg_cursor.copy_expert(
+                    f"COPY {staging} ({cols_str}) FROM STDIN", copy_buffer(rows)
+                )
+                pg_cursor.execute(
+                    f"INSERT INTO {table_name} ({cols_str}) OVERRIDING SYSTEM VALUE "
+                    f"SELECT {cols_str} FROM {staging} ON CONFLICT DO NOTHING"
+                )
+                inserted, rejected = pg_cursor.rowcount, 0
+                pg_cursor.execute(f"TRUNCATE {staging}")
+            except psycopg2.Error as e:
+                # Algum valor incompatível no lote: refazer linha a linha
+                pg_conn.rollback()
+                logger.warning(f"⚠️  {table_name}: COPY do lote falhou ({e}), inserindo linha a linha")
+                inserted, rejected = _insert_rows_one_by_one(pg_cursor, table_name, common_cols, rows)
+            
+            ckpt['ultimo_rowid'] = batch[-1][0]
+            ckpt['lidas'] += len(rows)
+            ckpt['inseridas'] += inserted
+            ckpt['rejeitadas'] += rejected
+            ckpt['segundos'] = segundos_anteriores + (time.monotonic() - inicio)
+            save_checkpoint(pg_cursor, table_name, ckpt)
+            pg_conn.commit()
+            logger.debug(f"    {table_name}: {ckpt['lidas']} linhas (rowid {ckpt['ultimo_rowid']})")
         
+        reset_sequence(pg_cursor, table_name, pg_cols)
+        ckpt['concluida'] = True
+        ckpt['segundos'] = segundos_anteriores + (time.monotonic() - inicio)
+        save_checkpoint(pg_cursor, table_name, ckpt)
         pg_conn.commit()
-        logger.info(f"✅ {table_name}: {migrated}/{len(rows)} registros migrados")
-        return migrated
+        
+        result.update({k: ckpt[k] for k in ('lidas', 'inseridas', 'rejeitadas', 'segundos')})
+        if result['segundos'] > 0:
+            result['linhas_por_segundo'] = round(result['lidas'] / result['segundos'], 1)
+        rejeitadas = f", {result['rejeitadas']} rejeitados" if result['rejeitadas'] else ''
+        logger.info(
+            f"✅ {table_name}: {result['inseridas']}/{result['lidas']} registros migrados"
+            f"{rejeitadas} ({result['linhas_por_segundo']:.0f} linhas/s)"
+        )
+        return result
         
     except Exception as e:
         logger.error(f"❌ {table_name}: Erro na migração - {e}")
         pg_conn.rollback()
-        return 0
+        result['status'] = f'erro: {e}'
+        return result
+    finally:
+        sqlite_conn.close()
+        pg_conn.close()
+
+
+def _normalize(value):
+    """Representação comum a SQLite e PostgreSQL para o hash de verificação."""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, (int, float, decimal.Decimal)):
+        numero = float(value)
+        return str(int(numero)) if numero.is_integer() else repr(round(numero, 6))
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        if isinstance(value, datetime.datetime):
+            value = value.replace(tzinfo=None)
+        return value.isoformat(sep=' ') if isinstance(value, datetime.datetime) else value.isoformat()
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).hex()
+    return _RE_ISO_DATETIME.sub(r'\1 \2', str(value))
+
+
+def _table_digest(cursor, sql, params=()):
+    """
+    Contagem e hash das linhas normalizadas, lidas em lotes.
+    
+    O hash é a soma (mod 2^256) do SHA-256 de cada linha: independe da ordem,
+    que varia entre SQLite e PostgreSQL conforme a collation.
+    """
+    total = 0
+    count = 0
+    cursor.execute(sql, params)
+    while True:
+        rows = cursor.fetchmany(CHUNK_SIZE)
+        if not rows:
+            break
+        for row in rows:
+            linha = '\x1f'.join(_normalize(v) for v in row).encode('utf-8')
+            total = (total + int.from_bytes(hashlib.sha256(linha).digest(), 'big')) % (1 << 256)
+        count += len(rows)
+    return count, f"{total:064x}"
+
+
+def verify_table(table_name, sqlite_path=None):
+    """
+    Compara contagem de linhas e hash do conteúdo entre SQLite e PostgreSQL.
+    
+    As linhas são normalizadas (números, datas, NULL) antes do hash;
+    divergência de hash com contagem igual costuma indicar conversão de
+    tipo, não perda de dados.
+    """
+    sqlite_conn = sqlite3.connect(sqlite_path or SQLITE_DB)
+    pg_conn = get_postgres_connection()
+    try:
+        sqlite_cursor = sqlite_conn.cursor()
+        if not sqlite_table_exists(sqlite_cursor, table_name):
+            return {'tabela': table_name, 'status': 'ausente_sqlite'}
+        sqlite_cols = get_table_columns(sqlite_cursor, table_name, is_postgres=False)
+        with pg_conn.cursor() as pg_cursor:
+            pg_cols = get_table_columns(pg_cursor, table_name, is_postgres=True)
+        common_cols = [col for col in sqlite_cols if col in pg_cols]
+        if not common_cols:
+            return {'tabela': table_name, 'status': 'sem_colunas'}
+        
+        sql = f"SELECT {', '.join(common_cols)} FROM {table_name}"
+        
+        sqlite_count, sqlite_hash = _table_digest(sqlite_cursor, sql)
+        # Cursor nomeado: o PostgreSQL entrega as linhas em lotes
+        with pg_conn.cursor(name=f"verifica_{table_name}") as pg_cursor:
+            pg_cursor.itersize = CHUNK_SIZE
+            pg_count, pg_hash = _table_digest(pg_cursor, sql)
+        
+        return {
+            'tabela': table_name,
+            'sqlite': sqlite_count,
+            'postgres': pg_count,
+            'contagem_ok': sqlite_count == pg_count,
+            'hash_ok': sqlite_hash == pg_hash,
+            'status': 'ok',
+        }
+    finally:
+        sqlite_conn.close()
+        pg_conn.close()
+
+
+def migrate_all(tables=None, workers=4, chunk_size=None, restart=False, sqlite_path=None):
+    """
+    Migra as tabelas em paralelo, nível a nível de dependência (FKs).
+    
+    Args:
+        tables: Tabelas a migrar (padrão: TABELAS)
+        workers: Tabelas migradas simultaneamente
+        chunk_size: Linhas por lote
+        restart: Descartar checkpoints e migrar do início
+        sqlite_path: Arquivo SQLite (padrão: SQLITE_DB)
+        
+    Returns:
+        Lista de resultados de migrate_table
+    """
+    tables = list(tables or TABELAS)
+    pg_conn = get_postgres_connection()
+    try:
+        ensure_checkpoint_table(pg_conn)
+        if restart:
+            reset_checkpoints(pg_conn, tables)
+        levels = dependency_levels(pg_conn, tables)
+    finally:
+        pg_conn.close()
+    
+    results = []
+    for level in levels:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = [executor.submit(migrate_table, t, sqlite_path, chunk_size) for t in level]
+            results.extend(f.result() for f in futures)
+    return results
 
 
 def test_connection():
@@ -186,8 +528,34 @@ def test_connection():
         return False
 
 
+def print_verification(tables):
+    print()
+    print(f"{'TABELA':<24}{'SQLITE':>10}{'POSTGRES':>10}  CONTAGEM  HASH")
+    for table in tables:
+        try:
+            v = verify_table(table)
+        except Exception as e:
+            print(f"{table:<24}  erro: {e}")
+            continue
+        if v['status'] != 'ok':
+            print(f"{table:<24}  {v['status']}")
+            continue
+        print(f"{table:<24}{v['sqlite']:>10}{v['postgres']:>10}  "
+              f"{'OK' if v['contagem_ok'] else 'DIVERGE':<8}  {'OK' if v['hash_ok'] else 'DIVERGE'}")
+
+
 def main():
     """Executa a migração completa"""
+    parser = argparse.ArgumentParser(description="Migração SQLite -> Supabase/PostgreSQL")
+    parser.add_argument('--tabelas', nargs='+', help='Tabelas a migrar (padrão: todas)')
+    parser.add_argument('--workers', type=int, default=4, help='Tabelas migradas em paralelo')
+    parser.add_argument('--lote', type=int, default=CHUNK_SIZE, help='Linhas por lote')
+    parser.add_argument('--reiniciar', action='store_true', help='Descartar checkpoints')
+    parser.add_argument('--verificar', action='store_true', help='Apenas verificar contagem/hash')
+    args = parser.parse_args()
+    
+    tables = args.tabelas or TABELAS
+    
     print("=" * 50)
     print("MIGRACAO SQLite -> Supabase/PostgreSQL")
     print("=" * 50)
@@ -197,31 +565,47 @@ def main():
     if not test_connection():
         return
     
-    # Conectar
-    sqlite_conn = get_sqlite_connection()
-    pg_conn = get_postgres_connection()
+    # Garante que o arquivo SQLite existe
+    get_sqlite_connection().close()
     
-    total_migrated = 0
+    if args.verificar:
+        print_verification(tables)
+        return
     
     print()
     print("Iniciando migração das tabelas...")
     print("-" * 50)
     
-    for table in TABELAS:
-        count = migrate_table(table, sqlite_conn, pg_conn)
-        total_migrated += count
+    inicio = time.monotonic()
+    results = migrate_all(tables, workers=args.workers, chunk_size=args.lote, restart=args.reiniciar)
+    total_seconds = time.monotonic() - inicio
+    
+    total_migrated = sum(r['inseridas'] for r in results)
+    total_read = sum(r['lidas'] for r in results)
+    errors = [r for r in results if r['status'].startswith('erro')]
     
     print("-" * 50)
-    print("\n[OK] MIGRACAO CONCLUIDA!")
-    print(f"   Total de registros migrados: {total_migrated}")
+    print(f"{'TABELA':<24}{'LIDAS':>10}{'INSERIDAS':>11}{'REJEIT.':>9}{'LINHAS/S':>10}")
+    for r in results:
+        if r['status'] in ('ok', 'checkpoint'):
+            print(f"{r['tabela']:<24}{r['lidas']:>10}{r['inseridas']:>11}{r['rejeitadas']:>9}"
+                  f"{r['linhas_por_segundo']:>10.0f}")
+    
+    print_verification([r['tabela'] for r in results if r['status'] in ('ok', 'checkpoint')])
+    
+    if errors:
+        print(f"\n[!] {len(errors)} tabela(s) com erro; rode novamente para retomar:")
+        for r in errors:
+            print(f"   {r['tabela']}: {r['status']}")
+    else:
+        print("\n[OK] MIGRACAO CONCLUIDA!")
+    print(f"   Total de registros migrados: {total_migrated} de {total_read} lidos "
+          f"em {total_seconds:.1f}s")
     print()
     print("[!] PROXIMOS PASSOS:")
     print("   1. Configure DATABASE_URL no .streamlit/secrets.toml")
     print("   2. Reinicie o Streamlit")
     print("   3. Teste o sistema")
-    
-    sqlite_conn.close()
-    pg_conn.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,64 @@
+"""
+Verificação de regressão: inserção de processo só pelo nome do cliente.
+
+Em SQLite, processos_cliente_ai preenche id_cliente; o trigger
+processos_id_cliente_au não pode reescrever o mesmo nome, senão o UPDATE
+encadeado dispara busca_processos_au antes de busca_processos_ai indexar a
+linha e o FTS5 fica corrompido ("database disk image is malformed").
+
+Roda num banco novo em diretório temporário (não toca dados_escritorio.db).
+"""
+
+import os
+import sys
+import tempfile
+import logging
+from pathlib import Path
+
+# Adiciona o diretório raiz ao path para importar módulos
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.append(str(ROOT_DIR))
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def verificar() -> bool:
+    import pandas as pd
+    import database as db
+    import database_adapter as adapter
+
+    if adapter.USE_POSTGRES:
+        logger.info("PostgreSQL configurado: verificação é específica do SQLite.")
+        return True
+
+    db.init_db()
+    db.crud_insert('clientes', {'nome': 'João da Silva'})
+    db.crud_insert('processos', {'numero': '0001', 'cliente_nome': 'João da Silva', 'acao': 'Cobrança'})
+
+    df = db.sql_get_query("SELECT id_cliente, cliente_nome FROM processos WHERE numero = '0001'")
+    if df.empty or pd.isna(df.iloc[0]['id_cliente']):
+        logger.error("Processo não foi inserido ou ficou sem id_cliente.")
+        return False
+    logger.info(f"Processo vinculado ao cliente {df.iloc[0]['id_cliente']}.")
+
+    # sql_run registra o erro no log e retorna False
+    if not db.sql_run("INSERT INTO busca_processos(busca_processos) VALUES('integrity-check')"):
+        logger.error("Índice FTS de processos inconsistente.")
+        return False
+    logger.info("integrity-check do índice FTS de processos OK.")
+    return True
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as pasta:
+        # O adaptador SQLite abre 'dados_escritorio.db' relativo ao diretório atual
+        os.chdir(pasta)
+        try:
+            ok = verificar()
+        finally:
+            import database_adapter
+            database_adapter.get_adapter().close_pool()
+            os.chdir(ROOT_DIR)
+    print("\n✅ Verificação concluída com SUCESSO" if ok else "\n❌ Verificação FALHOU")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,116 @@
+"""
+Coalescência de Chamadas Idênticas (Single-Flight)
+
+Quando várias threads pedem o mesmo trabalho ao mesmo tempo (mesma chave),
+só a primeira executa; as demais esperam o resultado dela. Usado para não
+repetir chamadas caras e idênticas à API do Gemini vindas de sessões
+diferentes do mesmo processo Streamlit.
+
+Features:
+- Resultado compartilhado com todas as chamadas que chegaram enquanto a
+  primeira estava em andamento
+- Exceção da chamada líder repassada às que esperavam
+- Espera limitada por `timeout` (SingleFlightTimeout); a líder continua
+  e o resultado dela vale para quem ainda estiver esperando
+- Contadores para diagnóstico
+
+Uso:
+    em_voo = SingleFlight(timeout=120)
+    resultado, compartilhado = em_voo.executar(chave, lambda: chamar_api(prompt))
+"""
+
+import logging
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlightTimeout(TimeoutError):
+    """A chamada líder não terminou dentro do tempo de espera."""
+
+
+class _Chamada:
+    __slots__ = ('evento', 'resultado', 'erro', 'aguardando')
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.erro = None
+        self.aguardando = 0
+
+
+class SingleFlight:
+    """Executa no máximo uma chamada por chave ao mesmo tempo."""
+
+    def __init__(self, timeout: float = 120.0):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._em_andamento: Dict[str, _Chamada] = {}
+        self.stats = {
+            'lideres': 0,
+            'compartilhadas': 0,
+            'timeouts': 0,
+            'erros': 0,
+        }
+
+    def executar(self, chave: str, funcao: Callable[[], Any], timeout: float = None) -> Tuple[Any, bool]:
+        """
+        Executa `funcao` ou espera a execução em andamento com a mesma chave.
+
+        Args:
+            chave: Identificador do trabalho (ex.: hash do prompt)
+            funcao: Trabalho a executar, sem argumentos
+            timeout: Espera máxima pela chamada líder (padrão: self.timeout)
+
+        Returns:
+            (resultado, compartilhado) - compartilhado=True se veio de outra chamada
+
+        Raises:
+            SingleFlightTimeout: a líder não terminou a tempo
+            Exception: a mesma exceção levantada pela líder
+        """
+        with self._lock:
+            chamada = self._em_andamento.get(chave)
+            lider = chamada is None
+            if lider:
+                chamada = _Chamada()
+                self._em_andamento[chave] = chamada
+                self.stats['lideres'] += 1
+            else:
+                chamada.aguardando += 1
+                self.stats['compartilhadas'] += 1
+
+        if lider:
+            try:
+                chamada.resultado = funcao()
+            except BaseException as e:
+                chamada.erro = e
+                with self._lock:
+                    self.stats['erros'] += 1
+                raise
+            finally:
+                with self._lock:
+                    self._em_andamento.pop(chave, None)
+                chamada.evento.set()
+            return chamada.resultado, False
+
+        logger.debug(f"Aguardando chamada idêntica em andamento ({chave[:12]})")
+        if not chamada.evento.wait(self.timeout if timeout is None else timeout):
+            with self._lock:
+                self.stats['timeouts'] += 1
+            raise SingleFlightTimeout(f"Tempo esgotado aguardando chamada idêntica ({chave[:12]})")
+        if chamada.erro is not None:
+            raise chamada.erro
+        return chamada.resultado, True
+
+    def em_andamento(self) -> int:
+        """Quantidade de chaves sendo executadas agora."""
+        with self._lock:
+            return len(self._em_andamento)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            dados = dict(self.stats)
+            dados['em_andamento'] = len(self._em_andamento)
+        return dados
@@ -217,6 +217,55 @@ def salvar_transacao_bancaria(transacao_data):
     except Exception as e:
         raise Exception(f"Erro ao salvar transação: {str(e)}")
 
+def filtrar_transacoes_existentes(transaction_ids):
+    """
+    Retorna quais FITIDs já foram importados (uma única consulta).
+    
+    Args:
+        transaction_ids: Lista de FITIDs
+    
+    Returns:
+        set: FITIDs já presentes em transacoes_bancarias
+    """
+    ids = [t for t in set(transaction_ids) if t]
+    if not ids:
+        return set()
+    
+    existentes = set()
+    # Lotes para respeitar o limite de parâmetros do SQLite
+    for inicio in range(0, len(ids), 500):
+        lote = ids[inicio:inicio + 500]
+        placeholders = ', '.join(['?'] * len(lote))
+        df = db.sql_get_query(
+            f"SELECT transaction_id FROM transacoes_bancarias WHERE transaction_id IN ({placeholders})",
+            tuple(lote)
+        )
+        if not df.empty:
+            existentes.update(df['transaction_id'].tolist())
+    return existentes
+
+def salvar_transacoes_bancarias(transacoes):
+    """
+    Salva várias transações bancárias em uma única transação.
+    
+    Duplicidades de FITID (constraint UNIQUE) são ignoradas.
+    
+    Args:
+        transacoes: Lista de dicionários com dados das transações
+    
+    Returns:
+        list: IDs das transações efetivamente gravadas
+    """
+    try:
+        return db.crud_insert_many(
+            'transacoes_bancarias',
+            transacoes,
+            "Transações bancárias importadas",
+            on_conflict='ignore'
+        )
+    except Exception as e:
+        raise Exception(f"Erro ao salvar transações: {str(e)}")
+
 def buscar_matches_inteligente(transacao):
     """
     Busca lançamentos financeiros que podem corresponder à transação bancária.
@@ -306,6 +355,9 @@ def conciliar_transacao(id_transacao_bancaria, id_financeiro, usuario):
     """
     Realiza conciliação entre transação bancária e lançamento financeiro.
     
+    As duas atualizações são gravadas na mesma transação: ou a conciliação
+    e a baixa acontecem juntas, ou nenhuma delas.
+    
     Args:
         id_transacao_bancaria: ID da transação bancária
         id_financeiro: ID do lançamento financeiro
@@ -315,44 +367,45 @@ def conciliar_transacao(id_transacao_bancaria, id_financeiro, usuario):
         dict: {'sucesso': bool, 'erro': str}
     """
     try:
-        # 1. Buscar dados da transação bancária
-        query_trans = "SELECT * FROM transacoes_bancarias WHERE id = ?"
-        import database_adapter as adapter
-        if adapter.USE_POSTGRES:
-            query_trans = query_trans.replace('?', '%s')
-        
-        transacao = db.run_query(query_trans, (id_transacao_bancaria,))
-        if not transacao or len(transacao) == 0:
-            return {'sucesso': False, 'erro': 'Transação bancária não encontrada'}
-        
-        transacao = transacao[0]
-        data_pagamento = transacao.get('data_transacao')
-        
-        # 2. Atualizar transação bancária
-        db.crud_update(
-            'transacoes_bancarias',
-            {
-                'id_financeiro': id_financeiro,
-                'status_conciliacao': 'Conciliado',
-                'conciliado_por': usuario,
-                'data_conciliacao': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            },
-            'id = ?',
-            (id_transacao_bancaria,),
-            f'Conciliação realizada por {usuario}'
-        )
-        
-        # 3. Atualizar lançamento financeiro
-        db.crud_update(
-            'financeiro',
-            {
-                'status_pagamento': 'Pago',
-                'data_pagamento': data_pagamento
-            },
-            'id = ?',
-            (id_financeiro,),
-            f'Baixa automática via conciliação bancária'
-        )
+        with db.transaction():
+            # 1. Buscar dados da transação bancária
+            query_trans = "SELECT * FROM transacoes_bancarias WHERE id = ?"
+            import database_adapter as adapter
+            if adapter.USE_POSTGRES:
+                query_trans = query_trans.replace('?', '%s')
+            
+            transacao = db.run_query(query_trans, (id_transacao_bancaria,))
+            if not transacao or len(transacao) == 0:
+                return {'sucesso': False, 'erro': 'Transação bancária não encontrada'}
+            
+            transacao = dict(transacao[0])
+            data_pagamento = transacao.get('data_transacao')
+            
+            # 2. Atualizar transação bancária
+            db.crud_update(
+                'transacoes_bancarias',
+                {
+                    'id_financeiro': id_financeiro,
+                    'status_conciliacao': 'Conciliado',
+                    'conciliado_por': usuario,
+                    'data_conciliacao': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                },
+                'id = ?',
+                (id_transacao_bancaria,),
+                f'Conciliação realizada por {usuario}'
+            )
+            
+            # 3. Atualizar lançamento financeiro
+            db.crud_update(
+                'financeiro',
+                {
+                    'status_pagamento': 'Pago',
+                    'data_pagamento': data_pagamento
+                },
+                'id = ?',
+                (id_financeiro,),
+                f'Baixa automática via conciliação bancária'
+            )
         
         return {'sucesso': True}
         